@@ -24,6 +24,48 @@ type ident = Ident
 type string = str
 """
 
+# With --slots, identifiers are interned and constructors without fields are singletons
+SLOTS_IMPORTS = IMPORTS + """from typing import Any, Self
+import weakref
+"""
+
+SLOTS_PRELUDE = """
+type optional[T] = T | None
+
+# There is only one Ident for every name, so identifiers are compared and hashed by identity.
+# The table holds its Idents weakly, so a long-running process (e.g. the compiler server)
+# only keeps the identifiers still in use.
+_idents: weakref.WeakValueDictionary[str, Ident] = weakref.WeakValueDictionary()
+
+@dataclass(frozen=True, slots=True, eq=False, weakref_slot=True)
+class Ident:
+    name: str
+    def __new__(cls, name: str) -> Ident:
+        x = _idents.get(name)
+        if x is None:
+            x = _idents.setdefault(name, object.__new__(cls))
+        return x
+    def __getnewargs__(self) -> tuple[str]:
+        return (self.name,)
+
+type ident = Ident
+type string = str
+
+# At most one entry per class, so this table stays small
+_singletons: dict[type, Any] = {}
+
+class Singleton:
+    \"\"\"
+    Base class of the constructors without fields, every such constructor has only one instance.
+    \"\"\"
+    __slots__ = ()
+    def __new__(cls) -> Self:
+        x = _singletons.get(cls)
+        if x is None:
+            x = _singletons.setdefault(cls, object.__new__(cls))
+        return x
+"""
+
 def abort(msg: str):
     sys.stderr.write(f'ERROR: {msg}\n')
     sys.exit(1)
@@ -32,7 +74,13 @@ def abort(msg: str):
 class Record:
     name: str
     fields: list[tuple[str, str, Optional[str]]]
+    slots: bool = False
     def generate(self):
+        if self.slots and not self.fields:
+            return f"""@dataclass(slots=True, eq=False)
+class {self.name}(Singleton):
+    pass
+"""
         fs = []
         for (name, ty, default) in self.fields:
             if default is not None:
@@ -40,7 +88,8 @@ class Record:
             else:
                 fs.append(f'    {name}: {ty}')
         fsStr = '\n'.join(fs) if fs else '    pass'
-        return f"""@dataclass
+        decorator = '@dataclass(slots=True)' if self.slots else '@dataclass'
+        return f"""{decorator}
 class {self.name}:
 {fsStr}
 """
@@ -63,17 +112,18 @@ class Output:
         self.defs = []
     def append(self, d):
         self.defs.append(d)
-    def generate(self, commonModule: Optional[str]):
-        l = [IMPORTS.strip()]
+    def generate(self, commonModule: Optional[str], slots: bool):
+        l = [(SLOTS_IMPORTS if slots and not commonModule else IMPORTS).strip()]
         if commonModule:
             l.append(f'from {commonModule} import *')
         else:
-            l.append(PRELUDE.strip())
+            l.append((SLOTS_PRELUDE if slots else PRELUDE).strip())
         for d in self.defs:
             l.append(d.generate().strip())
         return '\n\n'.join(l)
 
-def generateCodeForConstructor(c: asdl.Constructor, attrs: list[asdl.Field], allTypes: set[str]) -> Record:
+def generateCodeForConstructor(c: asdl.Constructor, attrs: list[asdl.Field], allTypes: set[str],
+                               slots: bool) -> Record:
     fields = []
     inputFields = c.fields + attrs
     for i, f in enumerate(inputFields):
@@ -92,12 +142,12 @@ def generateCodeForConstructor(c: asdl.Constructor, attrs: list[asdl.Field], all
             ty = f.type
         name = f.name if f.name else f.type
         fields.append((name, ty, default))
-    return Record(c.name, fields)
+    return Record(c.name, fields, slots)
 
 asdl.Product.__match_args__ = ('fields', 'attributes')
 asdl.Sum.__match_args__ = ('types', 'attributes')
 
-def generateCode(mod: asdl.Module, out: Output):
+def generateCode(mod: asdl.Module, out: Output, slots: bool):
     allTypes = set(mod.types.keys())
     for ty in mod.dfns:
         match ty.value:
@@ -106,7 +156,7 @@ def generateCode(mod: asdl.Module, out: Output):
             case asdl.Sum(constructors, attrs):
                 alternatives = []
                 for c in constructors:
-                    d = generateCodeForConstructor(c, attrs, allTypes)
+                    d = generateCodeForConstructor(c, attrs, allTypes, slots)
                     out.append(d)
                     alternatives.append(c.name)
                 out.append(Union(ty.name, alternatives))
@@ -119,6 +169,9 @@ def parseArgs():
     parser.add_argument('inputFile')
     parser.add_argument('--out', required=False)
     parser.add_argument('--common', required=False)
+    parser.add_argument('--slots', action='store_true',
+                        help='Generate dataclasses with slots, interned identifiers and ' \
+                            'singletons for constructors without fields')
     return parser.parse_args()
 
 def writeFile(filename: str, content: str):
@@ -138,8 +191,8 @@ def main():
     print(f'Parsing {args.inputFile}')
     mod = asdl.parse(args.inputFile)
     out = Output()
-    generateCode(mod, out)
-    s = out.generate(args.common)
+    generateCode(mod, out, args.slots)
+    s = out.generate(args.common, args.slots)
     if args.out:
         writeFile(args.out, s)
     else:
@@ -11,6 +11,7 @@ from assembly.tacSpillToMips import tacSpillToMips
 from assembly.tac_ast import *
 import common.utils as utils
 import common.log as log
+import common.timing as timing
 import common.genericCompiler as genCompiler
 import assembly.mipsPretty as mipsPretty
 from assembly.loopToTac import loopToTac
@@ -39,8 +40,10 @@ def compileFile(args: genCompiler.Args):
     maxRegs = args.maxRegisters if args.maxRegisters is not None else MAX_REGISTERS
     tacSpillInstrs = tacToTacSpill(tacInstrs, maxRegs)
     log.debug('TAC spill:\n' + tacSpillPretty.prettyInstrs(tacSpillInstrs))
-    mipsInstrs = tacSpillToMips(tacSpillInstrs)
-    s = mipsPretty.mipsPretty(mipsInstrs)
+    with timing.phase('tacSpillToMips'):
+        mipsInstrs = tacSpillToMips(tacSpillInstrs)
+    with timing.phase('mipsPretty'):
+        s = mipsPretty.mipsPretty(mipsInstrs)
     utils.writeTextFile(args.output, MIPS_START + s + MIPS_END)
     log.info(f'Wrote assembly file {args.output}')
 
@@ -12,15 +12,22 @@ import common.genericCompiler as genCompiler
 import assembly.wasmToTac as wasmToTac
 import common.sexp as sexp
 import common.utils as utils
+import common.timing as timing
 
 def loopToTac(args: genCompiler.Args) -> list[tac.instr]:
+    with timing.phase('loopToTac'):
+        return _loopToTac(args)
+
+def _loopToTac(args: genCompiler.Args) -> list[tac.instr]:
     c = utils.importModuleNotInStudent('compilers.lang_loop.loop_compiler')
     import lang_loop.loop_ast as ast
     log.debug(f'Generating TAC from {args.input}')
     wasmMod = genCompiler.compileMain(args, c.compileModule, ast)
+    if wasmMod is None:
+        raise ValueError('Wasm module needed for generating TAC, compile cache must be disabled')
     wasmInstrs = wasmMod.funcs[0].instrs
-    wasmCode = sexp.renderSExp(wasmMod.render())
-    log.debug('Wasm instructions:\n' + wasmCode)
+    if log.isDebug():
+        log.debug('Wasm instructions:\n' + sexp.renderSExp(wasmMod.render()))
     (res, tacInstrs) = wasmToTac.wasmToTac(wasmToTac.downcast(wasmInstrs))
     if res is not None:
         raise ValueError(f'Value returned from tac.toTac is not None: {res}')
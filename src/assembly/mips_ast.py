@@ -1,131 +1,159 @@
-# AUTOMATICALLY GENERATED (2024-04-03 17:32:36)
+# AUTOMATICALLY GENERATED (2026-10-19 16:43:09)
 from __future__ import annotations
 from dataclasses import dataclass
+from typing import Any, Self
+import weakref
 
 type optional[T] = T | None
 
-@dataclass(frozen=True)
+# There is only one Ident for every name, so identifiers are compared and hashed by identity.
+# The table holds its Idents weakly, so a long-running process (e.g. the compiler server)
+# only keeps the identifiers still in use.
+_idents: weakref.WeakValueDictionary[str, Ident] = weakref.WeakValueDictionary()
+
+@dataclass(frozen=True, slots=True, eq=False, weakref_slot=True)
 class Ident:
     name: str
+    def __new__(cls, name: str) -> Ident:
+        x = _idents.get(name)
+        if x is None:
+            x = _idents.setdefault(name, object.__new__(cls))
+        return x
+    def __getnewargs__(self) -> tuple[str]:
+        return (self.name,)
 
 type ident = Ident
 type string = str
 
-@dataclass
-class Add:
+# At most one entry per class, so this table stays small
+_singletons: dict[type, Any] = {}
+
+class Singleton:
+    """
+    Base class of the constructors without fields, every such constructor has only one instance.
+    """
+    __slots__ = ()
+    def __new__(cls) -> Self:
+        x = _singletons.get(cls)
+        if x is None:
+            x = _singletons.setdefault(cls, object.__new__(cls))
+        return x
+
+@dataclass(slots=True, eq=False)
+class Add(Singleton):
     pass
 
-@dataclass
-class Sub:
+@dataclass(slots=True, eq=False)
+class Sub(Singleton):
     pass
 
-@dataclass
-class Mul:
+@dataclass(slots=True, eq=False)
+class Mul(Singleton):
     pass
 
-@dataclass
-class Less:
+@dataclass(slots=True, eq=False)
+class Less(Singleton):
     pass
 
-@dataclass
-class LessEq:
+@dataclass(slots=True, eq=False)
+class LessEq(Singleton):
     pass
 
-@dataclass
-class Greater:
+@dataclass(slots=True, eq=False)
+class Greater(Singleton):
     pass
 
-@dataclass
-class GreaterEq:
+@dataclass(slots=True, eq=False)
+class GreaterEq(Singleton):
     pass
 
-@dataclass
-class Eq:
+@dataclass(slots=True, eq=False)
+class Eq(Singleton):
     pass
 
-@dataclass
-class NotEq:
+@dataclass(slots=True, eq=False)
+class NotEq(Singleton):
     pass
 
 type op = Add | Sub | Mul | Less | LessEq | Greater | GreaterEq | Eq | NotEq
 
-@dataclass
-class AddI:
+@dataclass(slots=True, eq=False)
+class AddI(Singleton):
     pass
 
-@dataclass
-class LessI:
+@dataclass(slots=True, eq=False)
+class LessI(Singleton):
     pass
 
 type opI = AddI | LessI
 
-@dataclass
+@dataclass(slots=True)
 class Imm:
     value: int
 
 type imm = Imm
 
-@dataclass
+@dataclass(slots=True)
 class Reg:
     name: string
 
 type reg = Reg
 
-@dataclass
+@dataclass(slots=True)
 class Op:
     op: op
     target: reg
     left: reg
     right: reg
 
-@dataclass
+@dataclass(slots=True)
 class OpI:
     opI: opI
     target: reg
     left: reg
     right: imm
 
-@dataclass
+@dataclass(slots=True)
 class LoadWord:
     target: reg
     offset: imm
     src: reg
 
-@dataclass
+@dataclass(slots=True)
 class LoadI:
     target: reg
     value: imm
 
-@dataclass
+@dataclass(slots=True)
 class LoadA:
     target: reg
     label: str
 
-@dataclass
+@dataclass(slots=True)
 class StoreWord:
     src: reg
     offset: imm
     baseAddr: reg
 
-@dataclass
+@dataclass(slots=True)
 class BranchNeqZero:
     reg: reg
     label: string
 
-@dataclass
+@dataclass(slots=True)
 class Branch:
     label: string
 
-@dataclass
+@dataclass(slots=True)
 class Move:
     target: reg
     source: reg
 
-@dataclass
-class Syscall:
+@dataclass(slots=True, eq=False)
+class Syscall(Singleton):
     pass
 
-@dataclass
+@dataclass(slots=True)
 class Label:
     label: string
 
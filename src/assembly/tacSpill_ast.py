@@ -1,37 +1,65 @@
-# AUTOMATICALLY GENERATED (2024-06-06 16:09:37)
+# AUTOMATICALLY GENERATED (2026-10-19 16:43:05)
 from __future__ import annotations
 from dataclasses import dataclass
+from typing import Any, Self
+import weakref
 
 type optional[T] = T | None
 
-@dataclass(frozen=True)
+# There is only one Ident for every name, so identifiers are compared and hashed by identity.
+# The table holds its Idents weakly, so a long-running process (e.g. the compiler server)
+# only keeps the identifiers still in use.
+_idents: weakref.WeakValueDictionary[str, Ident] = weakref.WeakValueDictionary()
+
+@dataclass(frozen=True, slots=True, eq=False, weakref_slot=True)
 class Ident:
     name: str
+    def __new__(cls, name: str) -> Ident:
+        x = _idents.get(name)
+        if x is None:
+            x = _idents.setdefault(name, object.__new__(cls))
+        return x
+    def __getnewargs__(self) -> tuple[str]:
+        return (self.name,)
 
 type ident = Ident
 type string = str
 
-@dataclass
+# At most one entry per class, so this table stays small
+_singletons: dict[type, Any] = {}
+
+class Singleton:
+    """
+    Base class of the constructors without fields, every such constructor has only one instance.
+    """
+    __slots__ = ()
+    def __new__(cls) -> Self:
+        x = _singletons.get(cls)
+        if x is None:
+            x = _singletons.setdefault(cls, object.__new__(cls))
+        return x
+
+@dataclass(slots=True)
 class Op:
     name: string
 
 type op = Op
 
-@dataclass
+@dataclass(slots=True)
 class Const:
     value: int
 
-@dataclass
+@dataclass(slots=True)
 class Name:
     var: ident
 
 type prim = Const | Name
 
-@dataclass
+@dataclass(slots=True)
 class Prim:
     p: prim
 
-@dataclass
+@dataclass(slots=True)
 class BinOp:
     left: prim
     op: op
@@ -39,36 +67,36 @@ class BinOp:
 
 type exp = Prim | BinOp
 
-@dataclass
+@dataclass(slots=True)
 class Assign:
     var: ident
     right: exp
 
-@dataclass
+@dataclass(slots=True)
 class Call:
     var: optional[ident]
     name: ident
     args: list[prim]
 
-@dataclass
+@dataclass(slots=True)
 class GotoIf:
     test: prim
     label: string
 
-@dataclass
+@dataclass(slots=True)
 class Goto:
     label: string
 
-@dataclass
+@dataclass(slots=True)
 class Label:
     label: string
 
-@dataclass
+@dataclass(slots=True)
 class Spill:
     var: ident
     origName: string
 
-@dataclass
+@dataclass(slots=True)
 class Unspill:
     var: ident
     origName: string
@@ -27,6 +27,8 @@ import assembly.controlFlow as controlFlow
 import assembly.loopToTac as asCommon
 from common.compilerSupport import *
 import common.utils as utils
+import common.log as log
+import common.timing as timing
 
 class Regs:
     t0 = tacSpill.Ident('$t0')
@@ -102,10 +104,13 @@ def tacToTacSpill(instrs: list[tac.instr], maxRegs: int=asCommon.MAX_REGISTERS)
     log.info(f'Starting TAC to TACspill transformation, maxRegs={maxRegs}')
     liveness =  utils.importModuleNotInStudent('compilers.assembly.liveness')
     graphColoring = utils.importModuleNotInStudent('compilers.assembly.graphColoring')
-    ctrlFlowG = controlFlow.buildControlFlowGraph(instrs)
+    with timing.phase('buildControlFlowGraph'):
+        ctrlFlowG = controlFlow.buildControlFlowGraph(instrs)
     log.debug(f'control flow graph: {ctrlFlowG}')
-    interfGraph = liveness.buildInterfGraph(ctrlFlowG)
+    with timing.phase('buildInterfGraph'):
+        interfGraph = liveness.buildInterfGraph(ctrlFlowG)
     log.debug(f'interference graph: {interfGraph}')
-    regMap = graphColoring.colorInterfGraph(interfGraph, maxRegs=maxRegs)
+    with timing.phase('colorInterfGraph'):
+        regMap = graphColoring.colorInterfGraph(interfGraph, maxRegs=maxRegs)
     log.debug(f'Register map: {regMap}')
     return [x for i in instrs for x in spillInstr(i, regMap)]
@@ -8,32 +8,44 @@ from typing import *
 import assembly.tac_ast as tac
 from common.utils import assertNotNone
 
-class _Emitter:
+class _Counters:
+    """
+    Counters for fresh registers and labels, shared by all emitters of one translation.
+    """
     def __init__(self):
-        self.instrs: list[tac.instr] = []
         self.regCount: int = 0
         self.labelCount: int = 0
+
+class _Emitter:
+    def __init__(self, counters: _Counters):
+        self.instrs: list[tac.instr] = []
+        self.counters = counters
     def emit(self, i: tac.instr):
         self.instrs.append(i)
     def add(self, l: list[tac.instr]):
         self.instrs.extend(l)
     def freshReg(self) -> tac.ident:
-        i = self.regCount
-        self.regCount = i + 1
+        i = self.counters.regCount
+        self.counters.regCount = i + 1
         return tac.Ident(f'%R{i}')
     def freshLabel(self, hint: str) -> str:
-        i = self.labelCount
-        self.labelCount = self.labelCount + 1
+        i = self.counters.labelCount
+        self.counters.labelCount = i + 1
         return f'L_{hint}_{i}'
+    def toTac(self, instrs: list[WasmInstr]) -> tuple[Optional[tac.prim], list[tac.instr]]:
+        """
+        Translates nested instructions, with the same counters as this emitter.
+        """
+        return _toTacR(list(reversed(downcast(instrs))), self.counters)
 
 def wasmToTac(instrs: list[WasmInstrL]) -> tuple[Optional[tac.prim], list[tac.instr]]:
-    return _toTacR(list(reversed(instrs)))
+    return _toTacR(list(reversed(instrs)), _Counters())
 
-def _toTacR(rInstrs: list[WasmInstrL]) -> tuple[Optional[tac.prim], list[tac.instr]]:
-    e = _Emitter()
+def _toTacR(rInstrs: list[WasmInstrL], counters: _Counters) -> tuple[Optional[tac.prim], list[tac.instr]]:
+    e = _Emitter(counters)
     (val, rest) = _toTacSingle(rInstrs, None, e)
     if rest:
-        (_, l) = _toTacR(rest)
+        (_, l) = _toTacR(rest, counters)
     else:
         l = []
     return (val, l + e.instrs)
@@ -106,15 +118,15 @@ def _toTacSingle(rInstrs: list[WasmInstrL], targetVar: Optional[tac.ident], e: _
             (val, rest) = _toTacSingleNotNone(rest, None, e)
             labelEnd = e.freshLabel('end')
             e.emit(tac.GotoIf(val, labelEnd))
-            (_, elseInstrsTac) = wasmToTac(downcast(elseInstrs))
+            (_, elseInstrsTac) = e.toTac(elseInstrs)
             e.add(elseInstrsTac)
             e.emit(tac.Label(labelEnd))
             return (None, rest)
         case [WasmInstrIf(resTy, thenInstrs, elseInstrs), *rest]:
             (val, rest) = _toTacSingleNotNone(rest, None, e)
             targetReg = targetVar or e.freshReg()
-            (valElse, elseInstrsTac) = wasmToTac(downcast(elseInstrs))
-            (valThen, thenInstrsTac) = wasmToTac(downcast(thenInstrs))
+            (valElse, elseInstrsTac) = e.toTac(elseInstrs)
+            (valThen, thenInstrsTac) = e.toTac(thenInstrs)
             labelThen = e.freshLabel('then')
             labelEnd = e.freshLabel('end')
             e.emit(tac.GotoIf(val, labelThen))
@@ -132,12 +144,12 @@ def _toTacSingle(rInstrs: list[WasmInstrL], targetVar: Optional[tac.ident], e: _
             else:
                 return (None, rest)
         case [WasmInstrLoop(label, body), *rest]:
-            (_, instrsTac) = wasmToTac(downcast(body))
+            (_, instrsTac) = e.toTac(body)
             e.emit(tac.Label(label.id))
             e.add(instrsTac)
             return (None, rest)
         case [WasmInstrBlock(label, resultTy, body), *rest]:
-            (val, instrsTac) = wasmToTac(downcast(body))
+            (val, instrsTac) = e.toTac(body)
             e.add(instrsTac)
             if resultTy is not None:
                 targetReg = targetVar or e.freshReg()
@@ -0,0 +1,202 @@
+"""
+Generators for synthetic benchmark programs. A program is determined by the language, the
+size parameters and a seed. All generated programs terminate, do not read input and keep
+their values small, so that the output is the same for python and for the compiled code
+(which uses 64-bit integers).
+"""
+from __future__ import annotations
+from typing import *
+from dataclasses import dataclass
+import random
+
+@dataclass(frozen=True)
+class Params:
+    stmts: int          # number of statements (N)
+    depth: int = 2      # nesting depth of loops, expressions and calls (D)
+    vars: int = 8       # number of live variables (V)
+    arraySize: int = 16 # size of arrays (S), only for lang_array and lang_fun
+
+    def label(self) -> str:
+        return f'N={self.stmts},D={self.depth},V={self.vars},S={self.arraySize}'
+
+# Number of iterations of every generated loop. The innermost loop body runs
+# LOOP_ITERATIONS ** depth times.
+LOOP_ITERATIONS = 2
+# Values of variables are reset when they exceed this bound (only if the language has if)
+VALUE_BOUND = 1000
+# A print statement after every PRINT_EVERY statements
+PRINT_EVERY = 16
+
+class _Gen:
+    def __init__(self, params: Params, seed: int, hasIf: bool):
+        self.p = params
+        self.rand = random.Random(seed)
+        self.hasIf = hasIf
+        self.lines: list[str] = []
+        self.count = 0
+        self.indent = 0
+
+    def var(self) -> str:
+        return f'x{self.rand.randrange(self.p.vars)}'
+
+    def emit(self, line: str, countStmt: bool = True):
+        self.lines.append('    ' * self.indent + line)
+        if countStmt:
+            self.count += 1
+
+    def exp(self, depth: int, leaf: str) -> str:
+        """
+        An expression of the given depth whose only variable is leaf, all other leafs are
+        constants. Hence, the value of the expression differs from the value of leaf by a
+        bounded amount.
+        """
+        if depth == 0:
+            return leaf
+        c = str(self.rand.randrange(1, 10))
+        (op, sub) = (self.rand.choice(['+', '-']), self.exp(depth - 1, leaf))
+        # The constant is always the right operand, c - sub would flip the sign of leaf
+        return f'({sub} {op} {c})'
+
+    def assign(self, target: Optional[str] = None, leaf: Optional[str] = None):
+        x = target or self.var()
+        self.emit(f'{x} = {self.exp(self.p.depth, leaf or self.var())}')
+        if self.hasIf:
+            self.emit(f'if {x} > {VALUE_BOUND} or {x} < -{VALUE_BOUND}:', False)
+            self.indent += 1
+            self.emit(f'{x} = {x} - {x} + {self.rand.randrange(10)}')
+            self.indent -= 1
+        if self.count % PRINT_EVERY == 0:
+            self.emit(f'print({x})')
+
+    def initVars(self):
+        for i in range(self.p.vars):
+            self.emit(f'x{i} = {i}', False)
+
+    def printVars(self):
+        for i in range(self.p.vars):
+            self.emit(f'print(x{i})', False)
+
+    def loop(self, counter: str, body: Callable[[], None]):
+        self.emit(f'{counter} = 0')
+        self.emit(f'while {counter} < {LOOP_ITERATIONS}:')
+        self.indent += 1
+        body()
+        self.emit(f'{counter} = {counter} + 1')
+        self.indent -= 1
+
+    def block(self, n: int, depth: int, simple: Callable[[], None]):
+        """
+        About n statements with loops nested up to the given depth. The function simple
+        generates one statement without a loop.
+        """
+        if depth == 0 or n < 8:
+            for _ in range(max(n, 1)):
+                simple()
+            return
+        outer = n // 2
+        for _ in range(outer):
+            simple()
+        self.loop(f'i{depth}', lambda: self.block(n - outer - 3, depth - 1, simple))
+
+    def source(self) -> str:
+        return '\n'.join(self.lines) + '\n'
+
+def genVar(p: Params, seed: int = 0) -> str:
+    g = _Gen(p, seed, False)
+    g.initVars()
+    for _ in range(p.stmts):
+        g.assign()
+    g.printVars()
+    return g.source()
+
+def genLoop(p: Params, seed: int = 0) -> str:
+    g = _Gen(p, seed, True)
+    g.initVars()
+    g.block(p.stmts, p.depth, g.assign)
+    g.printVars()
+    return g.source()
+
+def _arrayStmt(g: _Gen, arrays: list[str]):
+    a = g.rand.choice(arrays)
+    if g.rand.random() < 0.2:
+        # Update all elements of an array
+        def body():
+            g.emit(f'{a}[j] = {g.exp(1, f"{a}[j]")}')
+            g.emit(f'if {a}[j] > {VALUE_BOUND}:', False)
+            g.indent += 1
+            g.emit(f'{a}[j] = 0')
+            g.indent -= 1
+            g.emit(f'j = j + 1')
+        g.emit('j = 0')
+        g.emit(f'while j < len({a}):')
+        g.indent += 1
+        body()
+        g.indent -= 1
+    elif g.rand.random() < 0.5:
+        i = g.rand.randrange(g.p.arraySize)
+        g.assign(leaf=f'{a}[{i}]')
+    else:
+        i = g.rand.randrange(g.p.arraySize)
+        g.emit(f'{a}[{i}] = {g.exp(g.p.depth, g.var())}')
+        g.emit(f'if {a}[{i}] > {VALUE_BOUND} or {a}[{i}] < -{VALUE_BOUND}:', False)
+        g.indent += 1
+        g.emit(f'{a}[{i}] = 0')
+        g.indent -= 1
+
+def _arrays(g: _Gen) -> list[str]:
+    arrays = [f'a{i}' for i in range(max(1, g.p.vars // 4))]
+    for a in arrays:
+        g.emit(f'{a} = {g.p.arraySize} * [{g.rand.randrange(10)}]', False)
+    return arrays
+
+def genArray(p: Params, seed: int = 0) -> str:
+    g = _Gen(p, seed, True)
+    g.initVars()
+    arrays = _arrays(g)
+    g.block(p.stmts, p.depth, lambda: _arrayStmt(g, arrays))
+    g.printVars()
+    for a in arrays:
+        g.emit(f'print({a}[{p.arraySize - 1}])', False)
+    return g.source()
+
+def genFun(p: Params, seed: int = 0) -> str:
+    """
+    Functions f0, ..., fD where fk calls fk-1, so every call of fD results in a chain of D+1
+    calls. The toplevel statements mix calls, array updates and loops.
+    """
+    g = _Gen(p, seed, True)
+    for k in range(p.depth + 1):
+        g.emit(f'def f{k}(x: int, a: list[int]) -> int:', False)
+        g.indent += 1
+        g.emit(f'a[{k % p.arraySize}] = {g.exp(1, "x")}')
+        g.emit(f'if a[{k % p.arraySize}] > {VALUE_BOUND}:', False)
+        g.indent += 1
+        g.emit(f'a[{k % p.arraySize}] = 0')
+        g.indent -= 1
+        if k == 0:
+            g.emit(f'return {g.exp(1, "x")}')
+        else:
+            g.emit(f'return f{k - 1}({g.exp(1, "x")}, a)')
+        g.indent -= 1
+    g.count = 0
+    g.initVars()
+    arrays = _arrays(g)
+    def stmt():
+        if g.rand.random() < 0.3:
+            x = g.var()
+            g.assign(x, f'f{g.rand.randrange(p.depth + 1)}({g.var()}, {g.rand.choice(arrays)})')
+        else:
+            _arrayStmt(g, arrays)
+    g.block(p.stmts, p.depth, stmt)
+    g.printVars()
+    return g.source()
+
+GENERATORS: dict[str, Callable[[Params, int], str]] = {
+    'var': genVar,
+    'loop': genLoop,
+    'array': genArray,
+    'fun': genFun
+}
+
+def generate(lang: str, p: Params, seed: int = 0) -> str:
+    return GENERATORS[lang](p, seed)
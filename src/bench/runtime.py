@@ -0,0 +1,240 @@
+"""
+Runtime benchmarks: executes programs with python (pyrun), our interpreter, the TAC
+interpreter and the compiled wasm code, and compares the median runtimes and the outputs.
+The engines interp-closure, interp-pyast and interp-vm run the interpreter with the
+corresponding --engine option.
+
+The input of a program FILE.py is taken from FILE.in. Programs that are expected to fail
+(see testsupport.getExpectedError) are skipped. Every run is a separate process; the wasm
+code is compiled once per program, only its execution is measured.
+"""
+from __future__ import annotations
+from typing import *
+from dataclasses import dataclass, asdict, field
+import bench.scaling as scaling
+import common.log as log
+import common.testsupport as testsupport
+import common.utils as utils
+import json
+import os
+import shell
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+type Status = Literal['ok', 'timeout', 'error', 'mismatch']
+
+ENGINES = ['pyrun', 'interp', 'interp-closure', 'interp-pyast', 'interp-vm', 'tacInterp', 'wasm']
+
+# Languages of the interpreter engines that do not support all languages
+_INTERP_ENGINE_LANGS = {'closure': ['array', 'fun'], 'vm': ['array']}
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_MAIN = os.path.join(_SRC_DIR, 'main.py')
+_RUN_IWASM = os.path.join(os.path.dirname(_SRC_DIR), 'wasm-support', 'run_iwasm')
+
+@dataclass(frozen=True)
+class RunArgs:
+    inputs: list[str]          # source files or directories
+    engines: list[str]
+    lang: Optional[str] = None # default: derived from the path
+    warmup: int = 1
+    repeat: int = 5
+    timeout: float = 60
+    runWasm: str = _RUN_IWASM
+    output: str = 'bench_runtime.json'
+
+@dataclass
+class EngineResult:
+    engine: str
+    status: Status
+    median: float = 0.0       # in seconds
+    times: list[float] = field(default_factory=list[float])
+
+@dataclass
+class ProgramResult:
+    file: str
+    lang: str
+    engines: list[EngineResult]
+
+    def median(self, engine: str) -> Optional[float]:
+        for r in self.engines:
+            if r.engine == engine and r.status == 'ok':
+                return r.median
+        return None
+
+    def speedup(self, slow: str, fast: str) -> Optional[float]:
+        """
+        How many times faster engine fast is than engine slow.
+        """
+        (s, f) = (self.median(slow), self.median(fast))
+        if s is None or f is None or f == 0:
+            return None
+        return s / f
+
+def collectPrograms(inputs: list[str], lang: Optional[str]) -> list[tuple[str, str]]:
+    """
+    Returns the programs as tuples (lang, file), without the programs expected to fail.
+    """
+    files: list[str] = []
+    for i in inputs:
+        if shell.isDir(i):
+            for (root, _dirs, names) in os.walk(i):
+                files.extend(shell.pjoin(root, n) for n in names
+                             if n.endswith('.py') and not n.startswith('.'))
+        else:
+            files.append(i)
+    result: list[tuple[str, str]] = []
+    for f in sorted(files):
+        l = lang or utils.langFromPath(f)
+        if l is None:
+            utils.abort(f'Cannot guess the language of {f}, use --lang')
+        if testsupport.getExpectedError(f) is None:
+            result.append((l, f))
+    return result
+
+def _runCmd(cmd: list[str], input: Optional[str],
+            timeout: float) -> tuple[Literal['ok', 'timeout', 'error'], float, str]:
+    start = time.perf_counter()
+    try:
+        res = subprocess.run(cmd, input=input or '', capture_output=True, text=True,
+                             timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return ('timeout', timeout, '')
+    wall = time.perf_counter() - start
+    if res.returncode != 0:
+        return ('error', wall, res.stderr[-2000:])
+    return ('ok', wall, res.stdout)
+
+def commandFor(engine: str, lang: str, src: str, wasmFile: str, runWasm: str) -> list[str]:
+    match engine:
+        case 'pyrun' | 'interp' | 'tacInterp':
+            return [sys.executable, _MAIN, f'--lang={lang}', engine, src]
+        case _ if engine.startswith('interp-'):
+            interpEngine = engine[len('interp-'):]
+            return [sys.executable, _MAIN, f'--lang={lang}', 'interp', f'--engine={interpEngine}',
+                    src]
+        case 'wasm':
+            if shell.isFile(runWasm) and not utils.isExecutable(runWasm):
+                return ['bash', runWasm, wasmFile]
+            return [runWasm, wasmFile]
+        case _:
+            raise ValueError(f'Unknown engine {engine}')
+
+def _supports(engine: str, lang: str) -> bool:
+    if engine == 'tacInterp':
+        return lang in scaling.PIPELINES['tacInterp']
+    if engine.startswith('interp-'):
+        return lang in _INTERP_ENGINE_LANGS.get(engine[len('interp-'):], [lang])
+    return True
+
+def benchEngine(engine: str, cmd: list[str], input: Optional[str], expected: Optional[str],
+                args: RunArgs) -> EngineResult:
+    """
+    Runs cmd args.warmup times without measuring, then args.repeat times. The output of every
+    run must be equal to expected (if given).
+    """
+    times: list[float] = []
+    for i in range(args.warmup + args.repeat):
+        (status, wall, out) = _runCmd(cmd, input, args.timeout)
+        if status != 'ok':
+            return EngineResult(engine, status)
+        if expected is not None and out.strip() != expected.strip():
+            return EngineResult(engine, 'mismatch')
+        if i >= args.warmup:
+            times.append(wall)
+    return EngineResult(engine, 'ok', statistics.median(times), times)
+
+def benchProgram(lang: str, src: str, args: RunArgs, workDir: str) -> ProgramResult:
+    input = testsupport.readFileOpt(shell.removeExt(src) + '.in')
+    # The output of python is the reference for all engines
+    expected: Optional[str] = None
+    (status, _, out) = _runCmd(commandFor('pyrun', lang, src, '', args.runWasm), input,
+                               args.timeout)
+    if status == 'ok':
+        expected = out
+    wasmFile = shell.pjoin(workDir, 'out.wasm')
+    results: list[EngineResult] = []
+    for engine in args.engines:
+        if not _supports(engine, lang):
+            continue
+        if engine == 'wasm':
+            compileCmd = [sys.executable, _MAIN, f'--lang={lang}', 'compile', '--no-cache',
+                          f'--output={wasmFile}', src]
+            (status, _, err) = _runCmd(compileCmd, None, args.timeout)
+            if status != 'ok':
+                log.warn(f'Compiling {src} failed: {err}')
+                results.append(EngineResult(engine, status))
+                continue
+        cmd = commandFor(engine, lang, src, wasmFile, args.runWasm)
+        results.append(benchEngine(engine, cmd, input, expected, args))
+    return ProgramResult(src, lang, results)
+
+def runBenchmarks(args: RunArgs) -> list[ProgramResult]:
+    results: list[ProgramResult] = []
+    with tempfile.TemporaryDirectory(prefix='minipy-bench-') as workDir:
+        for (lang, src) in collectPrograms(args.inputs, args.lang):
+            r = benchProgram(lang, src, args, workDir)
+            print(f'{src}: ' + ', '.join(f'{e.engine} {e.status}' for e in r.engines))
+            results.append(r)
+    return results
+
+def _geomean(xs: list[float]) -> Optional[float]:
+    return statistics.geometric_mean(xs) if xs else None
+
+SPEEDUPS = [('pyrun', 'wasm'), ('interp', 'wasm'), ('pyrun', 'interp'), ('interp', 'tacInterp'),
+            ('interp', 'interp-closure'), ('interp', 'interp-vm'), ('interp-closure', 'interp-vm')]
+
+def summary(results: list[ProgramResult]) -> dict[str, Optional[float]]:
+    """
+    The geometric mean of every speedup in SPEEDUPS over all programs.
+    """
+    d: dict[str, Optional[float]] = {}
+    for (slow, fast) in SPEEDUPS:
+        xs = [s for r in results if (s := r.speedup(slow, fast)) is not None]
+        d[f'{fast} vs {slow}'] = _geomean(xs)
+    return d
+
+def formatTable(results: list[ProgramResult], engines: list[str]) -> str:
+    def fmtTime(r: ProgramResult, e: str) -> str:
+        for x in r.engines:
+            if x.engine == e:
+                return f'{x.median * 1000:.1f}' if x.status == 'ok' else x.status
+        return '-'
+    def fmtSpeedup(s: Optional[float]) -> str:
+        return '-' if s is None else f'{s:.1f}x'
+    header = f'{"Program":<50} ' + ' '.join(f'{e + " (ms)":>15}' for e in engines) + \
+        f' {"wasm/pyrun":>11} {"wasm/interp":>11}'
+    lines = [header, len(header) * '-']
+    for r in results:
+        lines.append(f'{r.file[-50:]:<50} ' + ' '.join(f'{fmtTime(r, e):>15}' for e in engines) +
+                     f' {fmtSpeedup(r.speedup("pyrun", "wasm")):>11}' +
+                     f' {fmtSpeedup(r.speedup("interp", "wasm")):>11}')
+    lines.append('')
+    for (k, v) in summary(results).items():
+        lines.append(f'Speedup {k} (geometric mean): {fmtSpeedup(v)}')
+    return '\n'.join(lines)
+
+def writeResults(path: str, results: list[ProgramResult]):
+    data = {'results': [asdict(r) for r in results], 'summary': summary(results)}
+    shell.mkdirs(shell.dirname(path) or '.')
+    utils.writeTextFile(path, json.dumps(data, indent=2) + '\n')
+
+def runMain(args: RunArgs) -> int:
+    """
+    Runs the runtime benchmarks and writes the results. Returns 1 if some engine produced
+    output different from python, 0 otherwise.
+    """
+    for e in args.engines:
+        if e not in ENGINES:
+            utils.abort(f'Unknown engine {e}, available: {", ".join(ENGINES)}')
+    results = runBenchmarks(args)
+    print(formatTable(results, args.engines))
+    writeResults(args.output, results)
+    print(f'Wrote results to {args.output}')
+    mismatches = [(r.file, e.engine) for r in results for e in r.engines if e.status == 'mismatch']
+    for (f, e) in mismatches:
+        print(f'MISMATCH: output of {e} for {f} differs from python')
+    return 1 if mismatches else 0
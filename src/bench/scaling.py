@@ -0,0 +1,216 @@
+"""
+Scaling benchmarks: runs the pipelines (interp, compile, tacInterp, assembly) on generated
+programs of increasing size and records the time of every phase (see common/timing.py).
+The results can be saved as a baseline and later runs can be compared against it.
+
+Every run is a separate process of src/main.py with --time-passes-json, so a crash or a
+timeout of one run does not affect the others. The compile and parse caches are disabled.
+"""
+from __future__ import annotations
+from typing import *
+from dataclasses import dataclass, asdict, field
+import bench.generators as generators
+import common.constants as constants
+import common.log as log
+import common.utils as utils
+import json
+import os
+import shell
+import subprocess
+import sys
+import tempfile
+import time
+
+type Status = Literal['ok', 'timeout', 'error']
+
+# Languages supported by the pipelines
+PIPELINES: dict[str, list[str]] = {
+    'interp': ['var', 'loop', 'array', 'fun'],
+    'compile': ['var', 'loop', 'array', 'fun'],
+    'tacInterp': ['var', 'loop'],
+    'assembly': ['var', 'loop']
+}
+
+_MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+@dataclass(frozen=True)
+class ScaleArgs:
+    langs: list[str]
+    pipelines: list[str]
+    sizes: list[int]
+    depth: int = 2
+    vars: int = 8
+    arraySize: int = 16
+    repeat: int = 3
+    timeout: float = 60
+    seed: int = 0
+    output: str = 'bench_results.json'
+    baseline: Optional[str] = None
+    saveBaseline: Optional[str] = None
+    tolerance: float = 0.25  # relative slowdown tolerated before reporting a regression
+    minDelta: float = 0.005  # in seconds, smaller slowdowns are never reported
+
+@dataclass
+class BenchResult:
+    lang: str
+    pipeline: str
+    params: str              # label of the generator parameters
+    stmts: int
+    lines: int
+    status: Status
+    wall: float = 0.0        # in seconds, minimum over all repetitions
+    throughput: float = 0.0  # source lines per second
+    phases: dict[str, float] = field(default_factory=dict[str, float]) # wall time per phase
+
+    def key(self) -> tuple[str, str, str]:
+        return (self.lang, self.pipeline, self.params)
+
+def commandFor(pipeline: str, lang: str, src: str, workDir: str, timingFile: str) -> list[str]:
+    cmd = [sys.executable, _MAIN, f'--lang={lang}', f'--time-passes-json={timingFile}']
+    match pipeline:
+        case 'interp' | 'tacInterp':
+            return cmd + [pipeline, src]
+        case 'compile':
+            return cmd + ['compile', '--no-cache', f'--output={shell.pjoin(workDir, "out.wasm")}', src]
+        case 'assembly':
+            return cmd + ['assembly', src, shell.pjoin(workDir, 'out.as')]
+        case _:
+            raise ValueError(f'Unknown pipeline {pipeline}')
+
+def runOnce(pipeline: str, lang: str, src: str, workDir: str,
+            timeout: float) -> tuple[Status, float, dict[str, float]]:
+    timingFile = shell.pjoin(workDir, 'timing.json')
+    cmd = commandFor(pipeline, lang, src, workDir, timingFile)
+    env = dict(os.environ, MINIPY_PARSE_CACHE='')
+    start = time.perf_counter()
+    try:
+        res = subprocess.run(cmd, cwd=workDir, env=env, stdin=subprocess.DEVNULL,
+                             capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return ('timeout', timeout, {})
+    wall = time.perf_counter() - start
+    if res.returncode != 0:
+        log.info(f'{" ".join(cmd)} failed with exit code {res.returncode}: {res.stderr[-2000:]}')
+        return ('error', wall, {})
+    phases = json.loads(utils.readTextFile(timingFile))['phases']
+    return ('ok', wall, {p['phase']: p['wall'] for p in phases})
+
+def benchProgram(pipeline: str, lang: str, p: generators.Params, args: ScaleArgs,
+                 workDir: str) -> BenchResult:
+    src = shell.pjoin(workDir, f'{lang}_{p.stmts}.py')
+    code = generators.generate(lang, p, args.seed)
+    utils.writeTextFile(src, code)
+    lines = code.count('\n')
+    best: Optional[BenchResult] = None
+    for _ in range(args.repeat):
+        (status, wall, phases) = runOnce(pipeline, lang, src, workDir, args.timeout)
+        r = BenchResult(lang, pipeline, p.label(), p.stmts, lines, status, wall,
+                        lines / wall if wall > 0 else 0.0, phases)
+        if status != 'ok':
+            return r
+        if best is None or r.wall < best.wall:
+            best = r
+    assert best is not None
+    return best
+
+def runScaling(args: ScaleArgs) -> list[BenchResult]:
+    results: list[BenchResult] = []
+    with tempfile.TemporaryDirectory(prefix='minipy-bench-') as workDir:
+        for pipeline in args.pipelines:
+            for lang in args.langs:
+                if lang not in PIPELINES[pipeline]:
+                    continue
+                timedOut = False
+                for n in args.sizes:
+                    p = generators.Params(n, args.depth, args.vars, args.arraySize)
+                    if timedOut:
+                        # Larger programs would time out as well
+                        results.append(BenchResult(lang, pipeline, p.label(), n, 0, 'timeout'))
+                        continue
+                    r = benchProgram(pipeline, lang, p, args, workDir)
+                    log.info(f'{pipeline} {lang} {r.params}: {r.status}, {r.wall * 1000:.1f}ms')
+                    timedOut = r.status == 'timeout'
+                    results.append(r)
+    return results
+
+def compareWithBaseline(results: list[BenchResult], baseline: list[BenchResult],
+                        tolerance: float, minDelta: float) -> list[str]:
+    """
+    Returns a description of every regression: a run that failed but succeeded in the
+    baseline, or a run or a phase that is slower than in the baseline.
+    """
+    base = {r.key(): r for r in baseline}
+    regressions: list[str] = []
+    def slower(new: float, old: float) -> bool:
+        return new > old * (1 + tolerance) and new - old > minDelta
+    for r in results:
+        b = base.get(r.key())
+        if b is None or b.status != 'ok':
+            continue
+        what = f'{r.pipeline} {r.lang} {r.params}'
+        if r.status != 'ok':
+            regressions.append(f'{what}: {r.status} (baseline: ok)')
+            continue
+        if slower(r.wall, b.wall):
+            regressions.append(f'{what}: {r.wall * 1000:.1f}ms (baseline: {b.wall * 1000:.1f}ms)')
+        for (phase, t) in r.phases.items():
+            bt = b.phases.get(phase)
+            if bt is not None and slower(t, bt):
+                regressions.append(f'{what}, phase {phase}: {t * 1000:.1f}ms ' \
+                                   f'(baseline: {bt * 1000:.1f}ms)')
+    return regressions
+
+def writeResults(path: str, results: list[BenchResult]):
+    """
+    Writes the results and, for every pipeline and language, the scaling curve (throughput
+    by program size).
+    """
+    curves: dict[str, list[dict[str, Any]]] = {}
+    for r in results:
+        curves.setdefault(f'{r.pipeline}/{r.lang}', []).append(
+            {'stmts': r.stmts, 'lines': r.lines, 'status': r.status, 'wall': r.wall,
+             'throughput': r.throughput})
+    data = {'results': [asdict(r) for r in results], 'curves': curves}
+    shell.mkdirs(shell.dirname(path) or '.')
+    utils.writeTextFile(path, json.dumps(data, indent=2) + '\n')
+
+def readResults(path: str) -> list[BenchResult]:
+    data = json.loads(utils.readTextFile(path))
+    return [BenchResult(**r) for r in data['results']]
+
+def formatTable(results: list[BenchResult]) -> str:
+    header = f'{"Pipeline":<10} {"Lang":<6} {"Stmts":>7} {"Lines":>7} {"Status":<8} ' \
+             f'{"Wall (ms)":>10} {"Lines/s":>10}'
+    lines = [header, len(header) * '-']
+    for r in results:
+        lines.append(f'{r.pipeline:<10} {r.lang:<6} {r.stmts:>7} {r.lines:>7} {r.status:<8} ' \
+                     f'{r.wall * 1000:>10.1f} {r.throughput:>10.0f}')
+    return '\n'.join(lines)
+
+def scaleMain(args: ScaleArgs) -> int:
+    """
+    Runs the scaling benchmarks, writes the results and compares them against the baseline.
+    Returns 1 if there are regressions, 0 otherwise.
+    """
+    for l in args.langs:
+        if l not in constants.ALL_LANGUAGES:
+            utils.abort(f'Unknown language {l}')
+    for p in args.pipelines:
+        if p not in PIPELINES:
+            utils.abort(f'Unknown pipeline {p}, available: {", ".join(PIPELINES)}')
+    results = runScaling(args)
+    print(formatTable(results))
+    writeResults(args.output, results)
+    print(f'Wrote results to {args.output}')
+    if args.saveBaseline:
+        writeResults(args.saveBaseline, results)
+        print(f'Saved baseline to {args.saveBaseline}')
+    if args.baseline:
+        regressions = compareWithBaseline(results, readResults(args.baseline),
+                                          args.tolerance, args.minDelta)
+        for r in regressions:
+            print(f'REGRESSION: {r}')
+        if regressions:
+            return 1
+        print(f'No regressions compared to {args.baseline}')
+    return 0
@@ -0,0 +1,76 @@
+"""
+The store for arrays of the array and fun interpreters.
+
+An array is identified by an integer handle, its index in a list-backed arena. The
+elements are stored compactly according to the element type of the array:
+
+- int arrays in array('q'), 8 bytes per element. If a value does not fit into 64 bits,
+  the array falls back to a python list, because the interpreters use python's unbounded
+  integers.
+- bool arrays in a bytearray, 1 byte per element.
+- arrays of arrays as array('q') of handles.
+- arrays of other values (e.g. functions) in a python list.
+
+Two arrays are identical (Is) iff their handles are equal.
+"""
+from __future__ import annotations
+from typing import *
+from array import array
+
+type Handle = int
+type ElemKind = Literal['int', 'bool', 'array', 'other']
+type Storage = array[int] | bytearray | list[Any]
+
+def _storage(kind: ElemKind, vals: list[Any]) -> Storage:
+    match kind:
+        case 'int':
+            try:
+                return array('q', vals)
+            except OverflowError:
+                return vals
+        case 'bool':
+            return bytearray(vals)
+        case 'array':
+            return array('q', vals)
+        case 'other':
+            return vals
+
+class ArrayStore:
+    def __init__(self):
+        self.arrays: list[Storage] = []
+
+    def alloc(self, kind: ElemKind, vals: list[Any], count: int = 1) -> Handle:
+        """
+        Allocates an array with elements of the given kind, containing count times the
+        values in vals.
+        """
+        storage = _storage(kind, vals)
+        if count != 1:
+            storage = storage * count
+        self.arrays.append(storage)
+        return len(self.arrays) - 1
+
+    def resolve(self, a: Handle) -> Storage:
+        return self.arrays[a]
+
+    def length(self, a: Handle) -> int:
+        return len(self.arrays[a])
+
+    def load(self, a: Handle, i: int) -> Any:
+        l = self.arrays[a]
+        v = l[i]
+        if type(l) is bytearray:
+            return v != 0
+        return v
+
+    def storeValue(self, a: Handle, i: int, v: Any):
+        l = self.arrays[a]
+        try:
+            l[i] = v
+        except OverflowError:
+            l = list(l)
+            l[i] = v
+            self.arrays[a] = l
+
+    def __repr__(self):
+        return f'ArrayStore({dict(enumerate(list(a) for a in self.arrays))})'
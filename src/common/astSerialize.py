@@ -0,0 +1,112 @@
+"""
+A compact binary serialization for the dataclasses generated by asdl2py.
+
+An AST node is encoded as a tuple (i, field1, ..., fieldN) where i is the index of the
+node's class in a class table stored alongside the tree. Lists, strings, ints, bools and
+None are kept as they are. The resulting structure consists of builtin values only and is
+written with marshal, which is fast and, unlike pickle, cannot execute code when loading.
+"""
+from __future__ import annotations
+from typing import *
+import dataclasses
+import importlib
+import marshal
+
+# Increase whenever the encoding changes
+FORMAT_VERSION = 1
+
+class SerializeError(Exception):
+    pass
+
+def _initFieldNames(cls: type) -> tuple[str, ...]:
+    return tuple(f.name for f in dataclasses.fields(cls) if f.init)
+
+def _popArgs(out: list[Any], n: int) -> list[Any]:
+    args = out[len(out) - n:]
+    del out[len(out) - n:]
+    return args
+
+def dumps(x: Any) -> bytes:
+    """
+    Serializes x. The encoding uses an explicit stack instead of recursion, so deeply nested
+    trees do not hit the recursion limit. Trees nested too deeply for marshal raise a
+    SerializeError.
+    """
+    classes: list[str] = []
+    classIndex: dict[type, int] = {}
+    fieldNames: dict[type, tuple[str, ...]] = {}
+    # An entry (False, v) encodes v, an entry (True, (i, n)) combines the last n encoded
+    # values into a node with class index i, or into a list if i is None.
+    todo: list[tuple[bool, Any]] = [(False, x)]
+    out: list[Any] = []
+    while todo:
+        (combine, v) = todo.pop()
+        if combine:
+            (i, n) = v
+            args = _popArgs(out, n)
+            out.append(args if i is None else (i, *args))
+            continue
+        match v:
+            case None | bool() | int() | str():
+                out.append(v)
+            case list():
+                ys = cast(list[Any], v)
+                todo.append((True, (None, len(ys))))
+                todo.extend([(False, y) for y in reversed(ys)])
+            case _ if dataclasses.is_dataclass(v):
+                cls = type(v)
+                i = classIndex.get(cls)
+                if i is None:
+                    i = len(classes)
+                    classes.append(f'{cls.__module__}:{cls.__qualname__}')
+                    classIndex[cls] = i
+                    fieldNames[cls] = _initFieldNames(cls)
+                ys = [getattr(v, f) for f in fieldNames[cls]]
+                todo.append((True, (i, len(ys))))
+                todo.extend([(False, y) for y in reversed(ys)])
+            case _:
+                raise SerializeError(f'Cannot serialize value of type {type(v).__name__}: {v}')
+    try:
+        return marshal.dumps((FORMAT_VERSION, tuple(classes), out[0]))
+    except ValueError as e:
+        # marshal limits the nesting depth
+        raise SerializeError(f'Cannot serialize value: {e}')
+
+def _resolveClass(name: str) -> Callable[..., Any]:
+    (modName, clsName) = name.split(':')
+    try:
+        return getattr(importlib.import_module(modName), clsName)
+    except (ImportError, AttributeError) as e:
+        raise SerializeError(f'Cannot resolve class {name}: {e}')
+
+def loads(data: bytes) -> Any:
+    try:
+        (version, classNames, tree) = marshal.loads(data)
+    except (EOFError, ValueError, TypeError) as e:
+        raise SerializeError(f'Invalid data: {e}')
+    if version != FORMAT_VERSION:
+        raise SerializeError(f'Unsupported format version {version}')
+    classes = [_resolveClass(n) for n in classNames]
+    # As in dumps, an entry (True, (cls, n)) combines the last n decoded values
+    todo: list[tuple[bool, Any]] = [(False, tree)]
+    out: list[Any] = []
+    try:
+        while todo:
+            (combine, v) = todo.pop()
+            if combine:
+                (cls, n) = v
+                args = _popArgs(out, n)
+                out.append(args if cls is None else cls(*args))
+            elif isinstance(v, tuple):
+                t = cast(tuple[Any, ...], v)
+                todo.append((True, (classes[cast(int, t[0])], len(t) - 1)))
+                todo.extend([(False, y) for y in reversed(t[1:])])
+            elif isinstance(v, list):
+                ys = cast(list[Any], v)
+                todo.append((True, (None, len(ys))))
+                todo.extend([(False, y) for y in reversed(ys)])
+            else:
+                out.append(v)
+        return out[0]
+    except (IndexError, TypeError) as e:
+        raise SerializeError(f'Invalid data: {e}')
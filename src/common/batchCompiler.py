@@ -0,0 +1,159 @@
+"""
+Compiles many input files in one go. The files are distributed over a pool of worker
+processes. Every worker imports the compilers once and then compiles one file after
+the other, so the startup costs of the python interpreter are paid only once per worker.
+"""
+from __future__ import annotations
+from typing import *
+from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor
+import common.genericCompiler as genericCompiler
+import common.genericParser as genericParser
+import common.compilerSupport as compilerSupport
+from common.compilerSupport import CompilerConfig
+import common.constants as constants
+import common.sexp as sexp
+import common.utils as utils
+import common.log as log
+import importlib
+import json
+import logging
+import os
+import shell
+import time
+
+type Status = Literal['ok', 'compile error', 'error']
+
+@dataclass(frozen=True)
+class BatchArgs:
+    inputs: list[str]
+    outputDir: str
+    summary: str
+    jobs: Optional[int] = None
+    lang: Optional[str] = None
+    format: Literal['wat', 'wasm'] = 'wasm'
+    wat2wasm: str = 'wat2wasm'
+    maxMemSize: Optional[int] = None
+    maxArraySize: Optional[int] = None
+    fusedFrontend: bool = False
+
+@dataclass(frozen=True)
+class Job:
+    input: str
+    output: str
+    lang: Optional[str]
+    format: Literal['wat', 'wasm']
+    wat2wasm: str
+    cfg: CompilerConfig
+
+@dataclass
+class JobResult:
+    input: str
+    output: Optional[str]
+    lang: Optional[str]
+    status: Status
+    timings: dict[str, float] # in seconds, per phase
+    error: Optional[str] = None
+
+def readManifest(path: str) -> list[str]:
+    """
+    Reads a manifest file with one input file per line. Empty lines and lines starting
+    with # are ignored.
+    """
+    res: list[str] = []
+    for line in utils.readTextFile(path).splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            res.append(line)
+    return res
+
+def outputPath(outputDir: str, input: str, ext: str) -> str:
+    """
+    The output file for the given input. Relative input paths are mirrored below the output
+    directory, so that files with the same name in different directories do not collide.
+    """
+    rel = os.path.normpath(input)
+    if os.path.isabs(rel) or rel.startswith('..'):
+        rel = shell.basename(rel)
+    return shell.pjoin(outputDir, shell.removeExt(rel) + ext)
+
+def _initWorker(level: int):
+    # Workers must not write to the log file of the main process
+    log.init(level, None)
+    for lang in constants.ALL_LANGUAGES:
+        importlib.import_module(f'lang_{lang}.{lang}_ast')
+        importlib.import_module(f'compilers.lang_{lang}.{lang}_compiler')
+
+def compileJob(job: Job) -> JobResult:
+    """
+    Compiles a single file. Runs inside a worker process and never raises an exception,
+    failures are reported in the result.
+    """
+    timings: dict[str, float] = {}
+    def phase[T](name: str, f: Callable[[], T]) -> T:
+        start = time.perf_counter()
+        try:
+            return f()
+        finally:
+            timings[name] = time.perf_counter() - start
+    lang = job.lang or utils.langFromPath(job.input)
+    if lang is None:
+        return JobResult(job.input, None, None, 'error', timings,
+                         'language not given and not guessable from the path of the input file')
+    try:
+        astMod = importlib.import_module(f'lang_{lang}.{lang}_ast')
+        compilerMod = importlib.import_module(f'compilers.lang_{lang}.{lang}_compiler')
+        m = phase('parse', lambda: genericParser.parseFile(job.input, astMod))
+        wasmMod = phase('compile', lambda: compilerMod.compileModule(m, job.cfg))
+        code = phase('render', lambda: sexp.renderSExp(wasmMod.render()))
+        shell.mkdirs(shell.dirname(job.output))
+        outputWat = shell.removeExt(job.output) + '.wat'
+        utils.writeTextFile(outputWat, code)
+        if job.format == 'wasm':
+            phase('wat2wasm', lambda: genericCompiler.wat2wasm(job.wat2wasm, outputWat, job.output))
+        return JobResult(job.input, job.output, lang, 'ok', timings)
+    except compilerSupport.CompileError as e:
+        return JobResult(job.input, None, lang, 'compile error', timings, str(e))
+    except SystemExit as e:
+        return JobResult(job.input, None, lang, 'error', timings, f'aborted with exit code {e.code}')
+    except Exception as e:
+        return JobResult(job.input, None, lang, 'error', timings, f'{type(e).__name__}: {e}')
+
+def compileBatch(args: BatchArgs, level: int = logging.WARNING) -> list[JobResult]:
+    """
+    Compiles all input files and writes a JSON summary with the results to args.summary.
+    """
+    cfg = CompilerConfig(maxMemSize=args.maxMemSize or CompilerConfig.defaultMaxMemSize,
+                         maxArraySize=args.maxArraySize or CompilerConfig.defaultMaxArraySize,
+                         fusedFrontend=args.fusedFrontend)
+    ext = '.' + args.format
+    jobs = [Job(i, outputPath(args.outputDir, i, ext), args.lang, args.format, args.wat2wasm, cfg)
+            for i in args.inputs]
+    log.info(f'Compiling {len(jobs)} files with {args.jobs or os.cpu_count()} workers')
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_initWorker,
+                             initargs=(level,)) as pool:
+        results = list(pool.map(compileJob, jobs))
+    summary = {'results': [asdict(r) for r in results]}
+    shell.mkdirs(shell.dirname(args.summary) or '.')
+    utils.writeTextFile(args.summary, json.dumps(summary, indent=2) + '\n')
+    log.info(f'Wrote summary to {args.summary}')
+    return results
+
+def batchMain(args: BatchArgs, level: int) -> int:
+    """
+    Runs compileBatch and returns the exit code: 0 if all files compiled successfully,
+    COMPILE_ERROR_EXIT_CODE if all failures are compile errors, 1 otherwise.
+    """
+    results = compileBatch(args, level)
+    counts = {s: len([r for r in results if r.status == s]) for s in ['ok', 'compile error', 'error']}
+    print(f'Compiled {len(results)} files: {counts["ok"]} ok, {counts["compile error"]} compile ' \
+          f'errors, {counts["error"]} other errors. Summary: {args.summary}')
+    for r in results:
+        if r.status != 'ok':
+            print(f'{r.status.upper()}: {r.input}: {r.error}')
+    if counts['error'] > 0:
+        return 1
+    elif counts['compile error'] > 0:
+        return constants.COMPILE_ERROR_EXIT_CODE
+    else:
+        return 0
@@ -0,0 +1,40 @@
+"""
+The global options of src/main.py and the commands supported by the compiler server.
+
+This module only depends on argparse, so that src/main.py, src/common/server.py and
+scripts/client can share it without slowing down their startup.
+"""
+from __future__ import annotations
+from typing import *
+import argparse
+
+# Commands executed by the server (see src/common/server.py)
+SERVER_COMMANDS = ['compile', 'interp', 'tacInterp', 'assembly', 'parse']
+
+def addGlobalArgs(parser: argparse.ArgumentParser):
+    """
+    Adds the options of src/main.py that come before the command.
+    """
+    parser.add_argument('--lang', choices=['simple', 'var', 'loop', 'array', 'fun', 'tinyJson'],
+                        help='The language (guessed from path of input file if not given)')
+    parser.add_argument('--level', help='The loglevel (debug, info, warn)')
+    parser.add_argument('--time-passes', action='store_true',
+                        help='Print wall time, CPU time and peak memory of every phase to stderr')
+    parser.add_argument('--time-passes-json', metavar='FILE',
+                        help='Like --time-passes, but write the results as JSON to FILE')
+
+def commandOf(argv: list[str]) -> Optional[str]:
+    """
+    Returns the command of the command-line arguments argv for src/main.py, or None if
+    argv does not contain a command or the global options are invalid. The values of
+    global options (as in --lang fun compile ...) are not mistaken for the command.
+    """
+    parser = argparse.ArgumentParser(add_help=False, exit_on_error=False)
+    addGlobalArgs(parser)
+    parser.add_argument('cmd', nargs='?')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    try:
+        (ns, _) = parser.parse_known_args(argv)
+    except argparse.ArgumentError:
+        return None
+    return ns.cmd
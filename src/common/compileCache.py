@@ -0,0 +1,137 @@
+"""
+A content-addressed cache for the output of the compiler. An entry is keyed by the hash of
+the source file, the language, the compiler configuration and the compiler version (the
+hash of all python files of the compiler). An entry is a directory holding the .wat file
+and, if compiled to binary format, the .wasm file.
+
+The cache is safe to use from several processes: all files are written to a temporary file
+first and then moved into place with os.replace. The total size of the cache is capped,
+the least recently used entries are evicted first.
+"""
+from __future__ import annotations
+from typing import *
+from dataclasses import dataclass
+from common.compilerSupport import CompilerConfig
+import common.log as log
+import common.utils as utils
+import functools
+import hashlib
+import os
+import shutil
+
+DEFAULT_CACHE_DIR = '.compile_cache'
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024 # 100MB
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@functools.cache
+def compilerVersion() -> str:
+    """
+    The hash of all python files below src. Every change to the compiler invalidates the
+    entries compiled with the old version.
+    """
+    h = hashlib.sha256()
+    paths: list[str] = []
+    for (dir, dirs, files) in os.walk(_SRC_DIR):
+        dirs[:] = [d for d in dirs if d != '__pycache__']
+        paths.extend([os.path.join(dir, f) for f in files if f.endswith('.py')])
+    for p in sorted(paths):
+        h.update(os.path.relpath(p, _SRC_DIR).encode('utf-8'))
+        with open(p, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def copyAtomic(src: str, dst: str):
+    """
+    Copies src to dst, see utils.openAtomic.
+    """
+    with utils.openAtomic(dst) as out, open(src, 'rb') as inp:
+        shutil.copyfileobj(inp, out)
+
+@dataclass(frozen=True)
+class CompileCache:
+    dir: str = DEFAULT_CACHE_DIR
+    maxBytes: int = DEFAULT_MAX_BYTES
+
+    @staticmethod
+    def fromEnv() -> CompileCache:
+        """
+        The cache configured by the environment variables MINIPY_COMPILE_CACHE (directory)
+        and MINIPY_COMPILE_CACHE_MB (size limit in megabytes).
+        """
+        dir = os.environ.get('MINIPY_COMPILE_CACHE', DEFAULT_CACHE_DIR)
+        mb = os.environ.get('MINIPY_COMPILE_CACHE_MB')
+        maxBytes = int(mb) * 1024 * 1024 if mb else DEFAULT_MAX_BYTES
+        return CompileCache(dir, maxBytes)
+
+    def key(self, srcFile: str, lang: str, cfg: CompilerConfig) -> str:
+        h = hashlib.sha256()
+        with open(srcFile, 'rb') as f:
+            h.update(f.read())
+        h.update(f'\0{lang}\0{cfg.maxMemSize}\0{cfg.maxArraySize}\0{cfg.fusedFrontend}\0'.encode('utf-8'))
+        h.update(compilerVersion().encode('utf-8'))
+        return h.hexdigest()
+
+    def entryFile(self, key: str, ext: str) -> str:
+        return os.path.join(self.dir, key, 'out' + ext)
+
+    def restore(self, key: str, outputs: dict[str, str]) -> bool:
+        """
+        Copies the cached files for key to the outputs, which map an extension (.wat or
+        .wasm) to the output file. Returns False if not all extensions are cached.
+        """
+        files = {ext: self.entryFile(key, ext) for ext in outputs}
+        try:
+            for (ext, output) in outputs.items():
+                copyAtomic(files[ext], output)
+            # Mark the entry as recently used
+            for f in files.values():
+                os.utime(f)
+        except OSError:
+            # Not cached or evicted concurrently
+            return False
+        log.info(f'Restored {", ".join(outputs.values())} from compile cache {self.dir}')
+        return True
+
+    def store(self, key: str, outputs: dict[str, str]):
+        """
+        Stores the outputs, which map an extension to the output file, in the entry for key
+        and evicts old entries if the cache is too large. Failures are only logged, the
+        cache is an optimization.
+        """
+        try:
+            os.makedirs(os.path.join(self.dir, key), exist_ok=True)
+            for (ext, output) in outputs.items():
+                copyAtomic(output, self.entryFile(key, ext))
+            self.evict()
+        except OSError as e:
+            log.warn(f'Could not store compile result in cache {self.dir}: {e}')
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the size of the cache is at most
+        maxBytes.
+        """
+        entries: list[tuple[float, int, str]] = []
+        total = 0
+        for e in os.scandir(self.dir):
+            if not e.is_dir():
+                continue
+            size = 0
+            lastUse = 0.0
+            try:
+                for f in os.scandir(e.path):
+                    st = f.stat()
+                    size += st.st_size
+                    lastUse = max(lastUse, st.st_mtime)
+            except OSError:
+                continue
+            entries.append((lastUse, size, e.path))
+            total += size
+        entries.sort()
+        for (_, size, path) in entries:
+            if total <= self.maxBytes:
+                break
+            log.debug(f'Evicting {path} from compile cache')
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -0,0 +1,22 @@
+"""
+The exception for errors in the source program. It lives in its own module so that
+type checkers and interpreters can raise it without importing the Wasm AST.
+"""
+from __future__ import annotations
+from typing import *
+import common.constants as constants
+import common.log as log
+import sys
+import traceback
+
+class CompileError(Exception):
+    def __init__(self, prefix: str, msg: str):
+        super().__init__(prefix + ': ' + msg)
+    @staticmethod
+    def typeError(msg: str) -> CompileError:
+        return CompileError('type error', msg)
+    def displayAndDie(self) -> Never:
+        lines = traceback.format_exception(self)
+        msg = 'Compile error: ' + str(self) + '\n' + ''.join(lines)
+        log.error(msg)
+        sys.exit(constants.COMPILE_ERROR_EXIT_CODE)
@@ -8,6 +8,8 @@ import common.sexp as sexp
 import common.utils as utils
 from common.compilerSupport import CompilerConfig
 import common.compilerSupport as compilerSupport
+import common.compileCache as compileCache
+import common.timing as timing
 import shell
 
 type CompileFun = Callable[[Any, CompilerConfig], WasmModule]
@@ -17,10 +19,12 @@ def compileToWat(compileFun: CompileFun, astMod: Any, cfg: CompilerConfig,
     ast = parser.parseFile(input, astMod)
     log.info(f'Compiling AST with {compileFun}')
     try:
-        wasmMod = compileFun(ast, cfg)
+        with timing.phase('compileModule'):
+            wasmMod = compileFun(ast, cfg)
     except compilerSupport.CompileError as e:
         e.displayAndDie()
-    code = sexp.renderSExp(wasmMod.render())
+    with timing.phase('renderSExp'):
+        code = sexp.renderSExp(wasmMod.render())
     utils.writeTextFile(output, code)
     log.info(f'Wrote textual representation of wasm to {output}')
     return wasmMod
@@ -28,7 +32,8 @@ def compileToWat(compileFun: CompileFun, astMod: Any, cfg: CompilerConfig,
 def wat2wasm(wat2wasmCmd: str, input: str, output: str):
     cmd = [wat2wasmCmd, '--output=' + output, input]
     log.info(f'Converting textual format of wasm to binary format, cmd: {cmd}')
-    res = shell.run(cmd, onError='ignore')
+    with timing.phase('wat2wasm'):
+        res = shell.run(cmd, onError='ignore')
     if res.exitcode != 0:
         utils.abort(f'wat2wasm failed with exit code {res.exitcode}')
     log.info(f'Successfully converted wat to wasm')
@@ -41,20 +46,36 @@ class Args:
     maxMemSize: Optional[int] = None
     maxArraySize: Optional[int] = None
     maxRegisters: Optional[int] = None
+    fusedFrontend: bool = False
+    useCache: bool = False
 
-def compileMain(args: Args, compileFun: CompileFun, astMod: Any) -> WasmModule:
+def compileMain(args: Args, compileFun: CompileFun, astMod: Any) -> Optional[WasmModule]:
+    """
+    Compiles args.input to args.output. If args.useCache is set, the output is taken from
+    the compile cache if possible and None is returned in this case.
+    """
     output = args.output
     outputBase, outputExt = shell.splitExt(output)
     outputWat = outputBase + '.wat'
     if outputExt not in ['.wat', '.wasm', '.as']:
         utils.abort(f'Extension of output file must be .wat or .wasm or .as')
     cfg = CompilerConfig(maxMemSize=args.maxMemSize or CompilerConfig.defaultMaxMemSize,
-                         maxArraySize=args.maxArraySize or CompilerConfig.defaultMaxArraySize)
+                         maxArraySize=args.maxArraySize or CompilerConfig.defaultMaxArraySize,
+                         fusedFrontend=args.fusedFrontend)
+    outputs = {'.wat': outputWat}
+    if outputExt == '.wasm':
+        outputs['.wasm'] = outputBase + '.wasm'
+    cache = compileCache.CompileCache.fromEnv() if args.useCache else None
+    key = ''
+    if cache is not None:
+        key = cache.key(args.input, astMod.__name__, cfg)
+        if cache.restore(key, outputs):
+            return None
     wasmMod = compileToWat(compileFun, astMod, cfg, args.input, outputWat)
-    if outputExt == '.wat':
-        return wasmMod
-    outputBin = outputBase + '.wasm'
-    wat2wasm(args.wat2wasm, outputWat, outputBin)
+    if outputExt == '.wasm':
+        wat2wasm(args.wat2wasm, outputWat, outputs['.wasm'])
+    if cache is not None:
+        cache.store(key, outputs)
     return wasmMod
 
 
@@ -1,7 +1,9 @@
 import common.genericParser as parser
 import common.log as log
-import common.compilerSupport as compilerSupport
+import common.compileError as compileError
 import common.constants as constants
+import common.timing as timing
+import common.utils as utils
 from typing import *
 import inspect
 from dataclasses import dataclass
@@ -11,14 +13,25 @@ import sys
 @dataclass(frozen=True)
 class Args:
     filename: str
+    maxCallDepth: Optional[int] = None # only for interpreters with a maxCallDepth parameter
 
-def interpMain(args: Args, interpFun: Callable[[Any], None], astMod: Any):
+def interpMain(args: Args, interpFun: Callable[..., None], astMod: Any):
+    kwArgs: dict[str, Any] = {}
+    if args.maxCallDepth is not None:
+        if 'maxCallDepth' not in inspect.signature(interpFun).parameters:
+            utils.abort(f'The interpreter does not support a maximum call depth')
+        kwArgs['maxCallDepth'] = args.maxCallDepth
     ast = parser.parseFile(args.filename, astMod)
     log.info(f'Interpreting AST with {interpFun} from file {inspect.getmodule(interpFun)}')
     try:
-        interpFun(ast)
-    except compilerSupport.CompileError as e:
+        with timing.phase('interpModule'):
+            interpFun(ast, **kwArgs)
+    except compileError.CompileError as e:
         e.displayAndDie()
+    except RecursionError as e:
+        # The traceback would only repeat the frames of the interpreter
+        log.error(f'RecursionError: {e}')
+        sys.exit(constants.RUN_ERROR_EXIT_CODE)
     except Exception:
         traceback.print_exc()
         sys.exit(constants.RUN_ERROR_EXIT_CODE)
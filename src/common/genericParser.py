@@ -1,3 +1,4 @@
+from __future__ import annotations
 from typing import *
 import ast
 import common.utils as utils
@@ -6,8 +7,18 @@ import common.log as log
 import pprint
 import common.constants as constants
 from common.constants import Language
-import parsers.common as p
+if TYPE_CHECKING:
+    import parsers.common as p
+else:
+    # parsers.common imports lark and pydot, only needed when parsing with our own parser
+    p = utils.lazyImport('parsers.common')
+import common.astSerialize as astSerialize
+import common.timing as timing
 import dataclasses
+import functools
+import hashlib
+import os
+import sys
 
 # Display the AST of some python code:
 # print(ast.dump(ast.parse('5 * [1]', mode='eval'), indent=4))    # or mode='exec'
@@ -186,20 +197,90 @@ class ModWrapper:
         except AttributeError:
             abort(f'Language {self.lang} does not support AST node {name}')
 
+# Directory of the parse cache, the empty string disables the cache
+PARSE_CACHE_DIR = os.environ.get('MINIPY_PARSE_CACHE', '.parse_cache')
+
+@functools.cache
+def _astVersion(modName: str) -> str:
+    """
+    Hash of the sources of the parser, of the serialization and of all modules defining
+    classes of the given AST module. Changing the AST classes invalidates the cache.
+    """
+    m = sys.modules[modName]
+    mods = {modName, __name__, astSerialize.__name__}
+    for x in vars(m).values():
+        if isinstance(x, type) and dataclasses.is_dataclass(x):
+            mods.add(x.__module__)
+    h = hashlib.sha256()
+    for n in sorted(mods):
+        with open(cast(str, sys.modules[n].__file__), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def _parseCacheFile(src: str, m: Any) -> Optional[str]:
+    if not PARSE_CACHE_DIR:
+        return None
+    h = hashlib.sha256(src.encode('utf-8'))
+    h.update(f'\0{m.__name__}\0{_astVersion(m.__name__)}'.encode('utf-8'))
+    return os.path.join(PARSE_CACHE_DIR, h.hexdigest() + '.ast')
+
+def _loadCachedAst(cacheFile: str) -> Any:
+    try:
+        with open(cacheFile, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    try:
+        return astSerialize.loads(data)
+    except astSerialize.SerializeError as e:
+        log.debug(f'Ignoring invalid parse cache file {cacheFile}: {e}')
+        return None
+
+def _storeCachedAst(cacheFile: str, x: Any):
+    try:
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        utils.writeFileAtomic(cacheFile, astSerialize.dumps(x))
+    except (OSError, astSerialize.SerializeError) as e:
+        log.debug(f'Could not write parse cache file {cacheFile}: {e}')
+
 def parseFile(filename: str, m: Any) -> Any:
+    """
+    Parses filename into an AST of the AST module m. The result is cached in
+    PARSE_CACHE_DIR, keyed by the source code and the AST module, so parsing the same file
+    again only deserializes the AST.
+    """
+    with timing.phase('parseFile'):
+        return _parseFile(filename, m)
+
+def _parseFile(filename: str, m: Any) -> Any:
     log.info(f'Parsing {filename} with ast module {m}')
     modName: str = m.__name__
     l = utils.stripPrefix('lang_', modName[:modName.index('.')])
     lang = constants.asLanguage(l)
     with open(filename, 'r') as f:
         src = f.read()
+    cacheFile = _parseCacheFile(src, m)
+    x = _loadCachedAst(cacheFile) if cacheFile else None
+    if x is None:
         module = ast.parse(src, filename)
         w = ModWrapper(m, lang)
         x = transModule(module, w, lang)
+        if cacheFile:
+            _storeCachedAst(cacheFile, x)
+    else:
+        log.info(f'Loaded AST of {filename} from parse cache {cacheFile}')
+    if log.isDebug():
         log.debug(f'AST: {pprint.pformat(x)}')
-        return x
+    return x
 
-ParserArgs = p.ParserArgs
+if TYPE_CHECKING:
+    ParserArgs = p.ParserArgs
+else:
+    def __getattr__(name: str) -> Any:
+        # Defined lazily, accessing p.ParserArgs loads parsers.common
+        if name == 'ParserArgs':
+            return p.ParserArgs
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 def parseWithOwnParser(filename: str, args: ParserArgs, astMod: Any,
                        parseFun: Callable[[p.ParserArgs], None]):
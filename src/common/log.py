@@ -1,16 +1,22 @@
+import contextlib
+import io
 import logging
 import sys
+from typing import *
 import common.utils as utils
-import lark
 
 def _setupLogging(consoleLevel: int, logfile: str|None):
     log = logging.getLogger('minipy')
     _setupLoggingForLogger(log, consoleLevel, logfile)
-    _setupLoggingForLogger(lark.logger, consoleLevel, logfile)
+    # The logger of lark, looked up by name so that lark is only imported when parsing
+    _setupLoggingForLogger(logging.getLogger('lark'), consoleLevel, logfile)
     return log
 
 def _setupLoggingForLogger(log: logging.Logger, consoleLevel: int, logfile: str|None):
-    log.setLevel(logging.DEBUG)
+    # Debug messages (e.g. dumps of ASTs) are expensive to format, so they are only
+    # produced if requested
+    fileLevel = min(consoleLevel, logging.INFO)
+    log.setLevel(consoleLevel if logfile is None else fileLevel)
     fmt = logging.Formatter('[%(asctime)s %(levelname)s %(filename)s:%(lineno)d] %(message)s',
                             datefmt='%Y-%m-%dT%H:%M:%S')
     consoleH = logging.StreamHandler()
@@ -19,7 +25,7 @@ def _setupLoggingForLogger(log: logging.Logger, consoleLevel: int, logfile: str|
     log.addHandler(consoleH)
     if logfile is not None:
         fileH = logging.FileHandler(filename=logfile, mode='w', encoding='utf-8')
-        fileH.setLevel(logging.DEBUG)
+        fileH.setLevel(fileLevel)
         fileH.setFormatter(fmt)
         log.addHandler(fileH)
     return log
@@ -40,15 +46,38 @@ def removeAllHandlers(log: logging.Logger):
     for h in log.handlers[:]:
         log.removeHandler(h)
 
-def init(level: int, filename: str):
+def init(level: int, filename: str|None):
     global _log
     if _log:
         removeAllHandlers(_log)
-    removeAllHandlers(lark.logger)
+    removeAllHandlers(logging.getLogger('lark'))
     _log = _setupLogging(level, filename)
 
+@contextlib.contextmanager
+def capture(level: int = logging.ERROR) -> Generator[io.StringIO, None, None]:
+    """
+    Additionally writes all messages with at least the given level to the returned buffer.
+    Used to check error messages without running a separate process.
+    """
+    buf = io.StringIO()
+    h = logging.StreamHandler(buf)
+    h.setLevel(level)
+    h.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+    _log.addHandler(h)
+    try:
+        yield buf
+    finally:
+        _log.removeHandler(h)
+
 STACKLEVEL=2
 
+def isDebug() -> bool:
+    """
+    True if debug messages are logged. Check this before formatting expensive
+    debug messages.
+    """
+    return _log.isEnabledFor(logging.DEBUG)
+
 def debug(s: str):
     _log.debug(s, stacklevel=STACKLEVEL)
 
@@ -0,0 +1,176 @@
+"""
+Transpiles a type-checked module of lang_var, lang_loop, lang_array or lang_fun to a python
+AST and runs it with CPython (interp --engine=pyast).
+
+The ASTs of these languages use the same class names and the same order of fields, so the
+transpiler dispatches on the class name and works for all of them. The generated code
+follows the semantics of our interpreters:
+
+- Variables are prefixed with v_ and functions with f_, so they never clash with the
+  builtins print and len or with the input_int shim.
+- Arrays are python lists, so they are shared like addresses in the store of the
+  interpreters. Is compares arrays with python's is, the type checker allows Eq and NotEq
+  only for int and bool.
+- Operands, arguments and subscript assignments are evaluated in the same order as in the
+  interpreters.
+- The toplevel statements become the body of a function, so their variables are fast
+  locals and invisible in user-defined functions.
+"""
+from __future__ import annotations
+from typing import *
+import ast as py
+import common.log as log
+import common.timing as timing
+import common.utils as utils
+
+_ARITH_OPS: dict[str, Callable[[], py.operator]] = {
+    'Add': py.Add, 'Sub': py.Sub, 'Mul': py.Mult
+}
+_CMP_OPS: dict[str, Callable[[], py.cmpop]] = {
+    'Less': py.Lt, 'LessEq': py.LtE, 'Greater': py.Gt, 'GreaterEq': py.GtE,
+    'Eq': py.Eq, 'NotEq': py.NotEq, 'Is': py.Is
+}
+_BUILTINS = ['print', 'input_int', 'len']
+_MAIN = '__main'
+
+def _fields(node: Any) -> tuple[Any, ...]:
+    return tuple(getattr(node, f) for f in node.__match_args__)
+
+def _kind(node: Any) -> str:
+    return type(node).__name__
+
+def _name(id: str, write: bool = False) -> py.Name:
+    return py.Name(id, py.Store() if write else py.Load())
+
+def varName(x: Any) -> str:
+    return 'v_' + x.name
+
+def funName(x: Any) -> str:
+    return 'f_' + x.name
+
+def _hasCall(node: Any) -> bool:
+    if isinstance(node, list):
+        return any(_hasCall(x) for x in cast(list[Any], node))
+    if not hasattr(node, '__match_args__'):
+        return False
+    return _kind(node) == 'Call' or any(_hasCall(x) for x in _fields(node))
+
+def _builtinName(target: Any) -> Optional[str]:
+    """
+    The name of the builtin function called via target, None for user-defined functions.
+    """
+    match _kind(target):
+        case 'Ident':
+            return target.name
+        case 'Name':
+            x = _fields(target)[0]
+            return x.name if x.name in _BUILTINS else None
+        case _:
+            return None
+
+class Transpiler:
+    def __init__(self):
+        self.tmpCount = 0
+
+    def fresh(self) -> str:
+        self.tmpCount += 1
+        return f'tmp_{self.tmpCount}'
+
+    def exp(self, e: Any) -> py.expr:
+        f = _fields(e)
+        match _kind(e):
+            case 'IntConst' | 'BoolConst':
+                return py.Constant(f[0])
+            case 'Name':
+                # The scope exists only in lang_fun
+                if _kind(getattr(e, 'scope', None)) == 'UserFun':
+                    return _name(funName(f[0]))
+                return _name(varName(f[0]))
+            case 'Call':
+                (target, args) = f[:2]
+                builtin = _builtinName(target)
+                pyArgs = [self.exp(a) for a in args]
+                if builtin is not None:
+                    return py.Call(_name(builtin), pyArgs, [])
+                return py.Call(self.exp(target), pyArgs, [])
+            case 'UnOp':
+                op = py.USub() if _kind(f[0]) == 'USub' else py.Not()
+                return py.UnaryOp(op, self.exp(f[1]))
+            case 'BinOp':
+                (left, op, right) = (self.exp(f[0]), _kind(f[1]), self.exp(f[2]))
+                if op in _ARITH_OPS:
+                    return py.BinOp(left, _ARITH_OPS[op](), right)
+                if op in _CMP_OPS:
+                    return py.Compare(left, [_CMP_OPS[op]()], [right])
+                return py.BoolOp(py.And() if op == 'And' else py.Or(), [left, right])
+            case 'ArrayInitDyn':
+                return py.BinOp(self.exp(f[0]), py.Mult(), py.List([self.exp(f[1])], py.Load()))
+            case 'ArrayInitStatic':
+                return py.List([self.exp(x) for x in f[0]], py.Load())
+            case 'Subscript':
+                return py.Subscript(self.exp(f[0]), self.exp(f[1]), py.Load())
+            case k:
+                raise ValueError(f'Unknown expression {k}: {e}')
+
+    def stmt(self, s: Any) -> list[py.stmt]:
+        f = _fields(s)
+        match _kind(s):
+            case 'StmtExp':
+                return [py.Expr(self.exp(f[0]))]
+            case 'Assign':
+                return [py.Assign([_name(varName(f[0]), True)], self.exp(f[1]))]
+            case 'IfStmt':
+                return [py.If(self.exp(f[0]), self.stmts(f[1]), self.stmts(f[2]))]
+            case 'WhileStmt':
+                return [py.While(self.exp(f[0]), self.stmts(f[1]), [])]
+            case 'SubscriptAssign':
+                (left, index, right) = f
+                if not _hasCall(s):
+                    target = py.Subscript(self.exp(left), self.exp(index), py.Store())
+                    return [py.Assign([target], self.exp(right))]
+                # The interpreters evaluate index, right and left in this order
+                (i, v) = (self.fresh(), self.fresh())
+                target = py.Subscript(self.exp(left), _name(i), py.Store())
+                return [py.Assign([_name(i, True)], self.exp(index)),
+                        py.Assign([_name(v, True)], self.exp(right)),
+                        py.Assign([target], _name(v))]
+            case 'Return':
+                return [py.Return(None if f[0] is None else self.exp(f[0]))]
+            case k:
+                raise ValueError(f'Unknown statement {k}: {s}')
+
+    def stmts(self, ss: list[Any]) -> list[py.stmt]:
+        result = [x for s in ss for x in self.stmt(s)]
+        return result or [py.Pass()]
+
+    def funDef(self, name: str, params: list[str], body: list[Any]) -> py.FunctionDef:
+        args = py.arguments(posonlyargs=[], args=[py.arg(p) for p in params], kwonlyargs=[],
+                            kw_defaults=[], defaults=[])
+        return py.FunctionDef(name, args, self.stmts(body), decorator_list=[], returns=None,
+                              type_params=[])
+
+    def module(self, m: Any) -> py.Module:
+        body: list[py.stmt] = []
+        for d in getattr(m, 'funs', []):
+            params = [varName(p.var) for p in d.params]
+            body.append(self.funDef(funName(d.name), params, d.body))
+        body.append(self.funDef(_MAIN, [], m.stmts))
+        body.append(py.Expr(py.Call(_name(_MAIN), [], [])))
+        return py.fix_missing_locations(py.Module(body, type_ignores=[]))
+
+def transpileModule(m: Any) -> py.Module:
+    return Transpiler().module(m)
+
+def _inputInt() -> int:
+    return int(utils.inputInt('Enter some int: '))
+
+def runModule(m: Any, filename: str = '<minipy>'):
+    """
+    Transpiles the type-checked module m and runs it.
+    """
+    with timing.phase('transpile'):
+        pyMod = transpileModule(m)
+        if log.isDebug():
+            log.debug(f'Transpiled module:\n{py.unparse(pyMod)}')
+        code = compile(pyMod, filename, 'exec')
+    exec(code, {'__name__': '__minipy__', 'input_int': _inputInt})
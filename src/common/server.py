@@ -0,0 +1,148 @@
+"""
+A persistent compiler server. The server keeps all compilers and interpreters loaded and
+executes requests in-process, so callers do not pay the startup costs of python for
+every invocation.
+
+The protocol is line-based: every request and every response is a JSON object on a
+single line. A request has the form
+
+    {"id": 1, "argv": ["--lang=fun", "compile", "--output=out.wat", "prog.py"],
+     "cwd": "/path/to/repo", "stdin": "42\\n"}
+
+where argv holds the command-line arguments for src/main.py. Only the field argv is
+required, cwd defaults to the working directory of the server and stdin to the empty
+input. The response has the form
+
+    {"id": 1, "exitcode": 0, "stdout": "...", "stderr": "..."}
+
+The server reads requests from stdin and writes responses to stdout, or it listens on a
+Unix socket. Requests are executed one after the other.
+"""
+from __future__ import annotations
+from typing import *
+import common.cmdline as cmdline
+import common.constants as constants
+import common.log as log
+import contextlib
+import importlib
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+
+type MainFun = Callable[[list[str]], None]
+
+def preload():
+    """
+    Imports the modules for all languages, so that the first requests are fast as well.
+    Modules not present in this repository (e.g. in the student version) are skipped.
+    """
+    mods = ['common.genericParser', 'assembly.compiler', 'assembly.tacInterp']
+    for lang in constants.ALL_LANGUAGES:
+        mods.extend([f'lang_{lang}.{lang}_ast', f'lang_{lang}.{lang}_interp',
+                     f'compilers.lang_{lang}.{lang}_compiler'])
+    for m in mods:
+        try:
+            importlib.import_module(m)
+        except ImportError as e:
+            log.debug(f'Cannot preload module {m}: {e}')
+
+def handleRequest(mainFun: MainFun, req: Any) -> dict[str, Any]:
+    """
+    Executes a single request and returns the response.
+    """
+    def error(msg: str, reqId: Any = None) -> dict[str, Any]:
+        return {'id': reqId, 'exitcode': 1, 'stdout': '', 'stderr': f'ERROR: {msg}\n'}
+    if not isinstance(req, dict):
+        return error('request must be a JSON object')
+    req = cast(dict[str, Any], req)
+    reqId = req.get('id')
+    argv = req.get('argv')
+    if not isinstance(argv, list) or not all(isinstance(a, str) for a in cast(list[Any], argv)):
+        return error('argv must be a list of strings', reqId)
+    argv = cast(list[str], argv)
+    cmd = cmdline.commandOf(argv)
+    if cmd not in cmdline.SERVER_COMMANDS:
+        return error(f'unsupported command {cmd}, supported commands: ' \
+                     f'{", ".join(cmdline.SERVER_COMMANDS)}', reqId)
+    cwd = req.get('cwd') or os.getcwd()
+    stdin = req.get('stdin') or ''
+    out = io.StringIO()
+    err = io.StringIO()
+    oldCwd = os.getcwd()
+    oldStdin = sys.stdin
+    exitcode = 0
+    try:
+        os.chdir(cwd)
+        sys.stdin = io.StringIO(stdin)
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                mainFun(argv)
+            except SystemExit as e:
+                match e.code:
+                    case None: exitcode = 0
+                    case int(c): exitcode = c
+                    case msg:
+                        err.write(f'{msg}\n')
+                        exitcode = 1
+            except Exception:
+                traceback.print_exc()
+                exitcode = 1
+    except OSError as e:
+        return error(str(e), reqId)
+    finally:
+        sys.stdin = oldStdin
+        os.chdir(oldCwd)
+    return {'id': reqId, 'exitcode': exitcode, 'stdout': out.getvalue(), 'stderr': err.getvalue()}
+
+def handleLine(mainFun: MainFun, line: str) -> str:
+    try:
+        req = json.loads(line)
+    except json.JSONDecodeError as e:
+        resp: dict[str, Any] = {'id': None, 'exitcode': 1, 'stdout': '',
+                                'stderr': f'ERROR: invalid JSON: {e}\n'}
+    else:
+        resp = handleRequest(mainFun, req)
+    return json.dumps(resp) + '\n'
+
+def serveStdio(mainFun: MainFun):
+    # The real stdout is reserved for the responses
+    output = sys.stdout
+    for line in sys.stdin:
+        if line.strip():
+            output.write(handleLine(mainFun, line))
+            output.flush()
+
+def serveSocket(mainFun: MainFun, path: str):
+    if os.path.exists(path):
+        os.remove(path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(path)
+        server.listen()
+        log.info(f'Listening on {path}')
+        # Remove the socket also when the server is terminated
+        signal.signal(signal.SIGTERM, lambda _sig, _frame: sys.exit(0))
+        try:
+            while True:
+                conn, _ = server.accept()
+                with conn, conn.makefile('r', encoding='utf-8') as r, \
+                        conn.makefile('w', encoding='utf-8') as w:
+                    for line in r:
+                        if line.strip():
+                            w.write(handleLine(mainFun, line))
+                            w.flush()
+        finally:
+            os.remove(path)
+
+def serve(mainFun: MainFun, socketPath: Optional[str]):
+    """
+    Runs the server until stdin is closed (if socketPath is None) or forever.
+    """
+    preload()
+    if socketPath is None:
+        serveStdio(mainFun)
+    else:
+        serveSocket(mainFun, socketPath)
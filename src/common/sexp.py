@@ -1,7 +1,12 @@
 from __future__ import annotations
 from dataclasses import dataclass
-import common.pretty as pretty
 from typing import *
+import common.utils as utils
+if TYPE_CHECKING:
+    import common.pretty as pretty
+else:
+    # prettyprinter is only needed when rendering
+    pretty = utils.lazyImport('common.pretty')
 import json
 
 type RenderResult = pretty.Doc
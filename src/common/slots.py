@@ -0,0 +1,38 @@
+"""
+Resolution of variables to slots of a frame, used by the interpreters.
+
+The type checker knows all variables of the toplevel and of every function. The
+interpreters give every variable an index (its slot) and store the index in the slot
+field of the Name and Assign nodes, so that a frame is a list and looking up a variable
+does not hash its Ident.
+"""
+from typing import *
+
+def layout[K](vars: Iterable[K]) -> dict[K, int]:
+    """
+    Assigns consecutive slots to vars, in the order given.
+    """
+    slots: dict[K, int] = {}
+    for x in vars:
+        if x not in slots:
+            slots[x] = len(slots)
+    return slots
+
+def assignSlots(node: Any, slots: Mapping[Any, int]):
+    """
+    Sets the slot of every node below node (a node or a list of nodes) that has a slot
+    field and whose variable (the first field) is in slots. Nodes whose variable is not in
+    slots (e.g. names of functions) keep slot None.
+    """
+    if isinstance(node, list):
+        for x in cast(list[Any], node):
+            assignSlots(x, slots)
+        return
+    fields: Optional[tuple[str, ...]] = getattr(node, '__match_args__', None)
+    if fields is None:
+        return
+    if hasattr(node, 'slot'):
+        x: Any = getattr(node, fields[0])
+        node.slot = slots.get(x)
+    for f in fields:
+        assignSlots(getattr(node, f), slots)
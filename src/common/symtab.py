@@ -1,6 +1,6 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from common.compilerSupport import CompileError
+from common.compileError import CompileError
 import common.log as log
 import pprint
 from typing import *
@@ -44,44 +44,85 @@ class VarInfo[T]:
     scope: Scope
 
 class Symtab[K, T]:
-    def __init__(self):
+    """
+    Symbol table with O(1) copies. A copy is an empty layer on top of the original, the
+    assignments to the copy go to this layer. Hence, the original must not change while a
+    copy is still in use (this is checked when looking up a variable). mergeBack only visits
+    the variables assigned in the copies.
+    """
+    def __init__(self, parent: Optional[Symtab[K, T]] = None):
         self.__vars: dict[K, VarInfo[T]] = {}
+        self.__parent = parent
+        self.__version = 0 # incremented on every change
+        self.__parentVersion = parent.__version if parent else 0
     def __repr__(self):
-        return f'Symtab({self.__vars})'
+        return f'Symtab({self.__flatten()})'
+    def __flatten(self) -> dict[K, VarInfo[T]]:
+        if self.__parent is None:
+            return self.__vars
+        d = dict(self.__parent.__flatten())
+        d.update(self.__vars)
+        return d
+    def lookup(self, var: K) -> Optional[VarInfo[T]]:
+        st = self
+        while True:
+            info = st.__vars.get(var)
+            if info is not None:
+                return info
+            parent = st.__parent
+            if parent is None:
+                return None
+            if parent.__version != st.__parentVersion:
+                raise ValueError(f'Symtab changed after it was copied')
+            st = parent
     def assign(self, var: K, ty: T, scope: Scope = 'var'):
-        info = self.__vars.get(var)
+        info = self.lookup(var)
         if info and ty != info.ty:
             raise CompileError.typeError(
                 f'Inconsistent types for variable {var}: {info.ty} and {ty}')
         if info and info.scope == 'fun':
             raise CompileError.typeError(f'Cannot re-assign global function variable {var}')
         self.__vars[var] = VarInfo(ty, True, scope)
+        self.__version += 1
     def use(self, var: K) -> T:
         return self.info(var).ty
     def scope(self, var: K) -> Scope:
         return self.info(var).scope
     def unsafeInfo(self, var: K) -> VarInfo[T]:
-        return self.__vars[var]
+        info = self.lookup(var)
+        if info is None:
+            raise KeyError(var)
+        return info
     def items(self) -> Iterable[tuple[K, VarInfo[T]]]:
-        return self.__vars.items()
+        return self.__flatten().items()
+    def assignedVars(self) -> Iterable[K]:
+        """
+        The variables assigned since this symtab was copied (all variables for a symtab
+        that is not a copy).
+        """
+        return self.__vars.keys()
     def info(self, var: K) -> VarInfo[T]:
-        if var not in self.__vars:
-            log.debug(f"Symtab: {pprint.pformat(self.__vars)}")
+        info = self.lookup(var)
+        if info is None:
+            if log.isDebug():
+                log.debug(f"Symtab: {pprint.pformat(self.__flatten())}")
             raise CompileError.typeError(f'Unknown variable: {var}')
-        info = self.__vars[var]
         if not info.definitelyAssigned:
             raise CompileError.typeError(f'Variable {var} might not have been initialized')
         return info
     def types(self, scope: Optional[Scope] = None) -> list[tuple[K, T]]:
-        return [(x, info.ty) for x, info in self.__vars.items()
+        return [(x, info.ty) for x, info in self.items()
                 if scope is None or info.scope == scope]
     def hasVar(self, var: K):
-        return var in self.__vars
+        return self.lookup(var) is not None
     def copy(self) -> Symtab[K, T]:
-        st = Symtab[K, T]()
-        st.__vars.update(self.__vars)
-        return st
+        return Symtab[K, T](self)
     def mergeBack(self, st1: Symtab[K, T], st2: Symtab[K, T]):
         import common.symtab_merge as symtab_merge
-        merged = symtab_merge.merge(st1, st2)
-        self.__vars = merged
+        if st1.__parent is self and st2.__parent is self:
+            # All other variables have the same info in st1, st2 and self
+            self.__vars.update(symtab_merge.mergeAssigned(st1, st2))
+        else:
+            self.__vars = symtab_merge.merge(st1, st2)
+            self.__parent = None
+        self.__version += 1
@@ -1,5 +1,5 @@
 from common.symtab import Symtab, VarInfo
-from common.compilerSupport import CompileError
+from common.compileError import CompileError
 
 def isDefinitelyAssigned[K, T](x: K, nested: list[Symtab[K, T]]) -> bool:
     for st in nested:
@@ -9,24 +9,36 @@ def isDefinitelyAssigned[K, T](x: K, nested: list[Symtab[K, T]]) -> bool:
             return False
     return True
 
+def mergeVar[K, T](x: K, st1: Symtab[K, T], st2: Symtab[K, T]) -> VarInfo[T]:
+    """
+    The info of x after a branch that continues either with st1 or with st2.
+    """
+    l = [v for v in (st1.lookup(x), st2.lookup(x)) if v is not None]
+    first = l[0]
+    rest = l[1:]
+    for v in rest:
+        if v.ty != first.ty:
+            raise CompileError.typeError(f'Inconsistent types for variable {x}')
+        if v.scope != first.scope:
+            raise CompileError.typeError(f'Inconsistent scope for variable {x}')
+    return VarInfo(first.ty, isDefinitelyAssigned(x, [st1, st2]), first.scope)
+
 def merge[K, T](st1: Symtab[K, T], st2: Symtab[K, T]) -> dict[K, VarInfo[T]]:
-    envs = [st1, st2]
-    union: dict[K, list[VarInfo[T]]] = {}
-    for st in envs:
-        for k, v in st.items():
-            old = union.get(k)
-            if old:
-                old.append(v)
-            else:
-                union[k] = [v]
     res: dict[K, VarInfo[T]] = {}
-    for x, l in union.items():
-        first = l[0]
-        rest = l[1:]
-        for v in rest:
-            if v.ty != first.ty:
-                raise CompileError.typeError(f'Inconsistent types for variable {x}')
-            if v.scope != first.scope:
-                raise CompileError.typeError(f'Inconsistent scope for variable {x}')
-        res[x] = VarInfo(first.ty, isDefinitelyAssigned(x, [st1, st2]), first.scope)
+    for st in [st1, st2]:
+        for x, _ in st.items():
+            if x not in res:
+                res[x] = mergeVar(x, st1, st2)
+    return res
+
+def mergeAssigned[K, T](st1: Symtab[K, T], st2: Symtab[K, T]) -> dict[K, VarInfo[T]]:
+    """
+    Like merge, but only for the variables assigned in st1 or st2. st1 and st2 must be
+    copies of the same symtab, so all other variables have the same info in both.
+    """
+    res: dict[K, VarInfo[T]] = {}
+    for st in [st1, st2]:
+        for x in st.assignedVars():
+            if x not in res:
+                res[x] = mergeVar(x, st1, st2)
     return res
@@ -5,22 +5,100 @@ import common.utils as utils
 import common.log as log
 import threading
 import common.constants as constants
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import importlib
+import inspect
+import io
+import shutil
+import signal
+import sys
 
 _CACHE_DIR = '.test_cache'
-_CACHE_LOCK = threading.Lock()
+# Golden outputs are computed under one of _LOCK_COUNT lock files in _CACHE_DIR/.locks,
+# chosen by the hash of the cache file, so the number of lock files stays fixed.
+_LOCK_COUNT = 64
+# Protects the process-global sys.stdin and sys.stdout while running a program in-process.
+# Goldens for different files are computed in parallel by the processes of pytest-xdist.
+_EXEC_LOCK = threading.Lock()
+_GOLDEN_TIMEOUT_SECS = 10
 
 # If IGNORE_HASH is True, the golden file from .test_cache is considered as the only
 # source if truth. This can be useful if you changed test cases but want to make sure
 # that their output is still the same
 IGNORE_HASH = False
 
+@contextlib.contextmanager
+def _fileLock(key: str):
+    """
+    Exclusive lock for key, held across processes. Different keys may share a lock.
+    """
+    lockDir = shell.pjoin(_CACHE_DIR, '.locks')
+    shell.mkdirs(lockDir)
+    n = int(hashlib.md5(key.encode('utf-8')).hexdigest(), 16) % _LOCK_COUNT
+    with open(shell.pjoin(lockDir, f'{n}.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _stackDepth() -> int:
+    n = 0
+    f = inspect.currentframe()
+    while f is not None:
+        n += 1
+        f = f.f_back
+    return n
+
+def runInProcess(run: Callable[[], None], input: str|None, what: str) -> str:
+    """
+    Calls run in-process with input on stdin and returns its output. run gets the same
+    recursion depth as a program running in a separate process and must finish within
+    _GOLDEN_TIMEOUT_SECS. If run raises an exception, the output is lost.
+    """
+    out = io.StringIO()
+    def timeout(_sig: int, _frame: Any):
+        raise TimeoutError(f'{what} did not terminate within {_GOLDEN_TIMEOUT_SECS}s')
+    useAlarm = threading.current_thread() is threading.main_thread()
+    with _EXEC_LOCK:
+        oldStdin = sys.stdin
+        oldLimit = sys.getrecursionlimit()
+        oldHandler = signal.signal(signal.SIGALRM, timeout) if useAlarm else None
+        try:
+            sys.stdin = io.StringIO(input or '')
+            sys.setrecursionlimit(oldLimit + _stackDepth())
+            if useAlarm:
+                signal.alarm(_GOLDEN_TIMEOUT_SECS)
+            with contextlib.redirect_stdout(out):
+                run()
+        finally:
+            if useAlarm:
+                signal.alarm(0)
+                signal.signal(signal.SIGALRM, oldHandler)
+            sys.setrecursionlimit(oldLimit)
+            sys.stdin = oldStdin
+    return out.getvalue()
+
+def runPython(srcFile: str, input: str|None) -> str:
+    """
+    Runs srcFile in-process with the python interpreter and returns its output. Equivalent to
+    the pyrun command of src/main.py, but without the costs of starting a new process.
+    """
+    code = compile(utils.readTextFile(srcFile), srcFile, 'exec')
+    return runInProcess(lambda: exec(code, utils.pyrunGlobals()), input, srcFile)
+
 def getGolden(srcFile: str, input: str|None):
-    with _CACHE_LOCK:
-        base = shell.removeExt(srcFile)
-        srcMd5 = utils.md5(srcFile)
-        cacheFile = shell.pjoin(_CACHE_DIR, base + '.golden')
-        hashFile = shell.pjoin(_CACHE_DIR, base + '.hash')
-        shell.mkdirs(shell.dirname(cacheFile))
+    base = shell.removeExt(srcFile)
+    srcMd5 = utils.md5(srcFile)
+    cacheFile = shell.pjoin(_CACHE_DIR, base + '.golden')
+    hashFile = shell.pjoin(_CACHE_DIR, base + '.hash')
+    shell.mkdirs(shell.dirname(cacheFile))
+    # Tests for the same file run in parallel for different languages and test modules,
+    # only one of them computes the golden output.
+    with _fileLock(cacheFile):
         if IGNORE_HASH and shell.isFile(cacheFile):
             return utils.readTextFile(cacheFile).strip()
         if shell.isFile(cacheFile) and shell.isFile(hashFile):
@@ -28,15 +106,14 @@ def getGolden(srcFile: str, input: str|None):
             if srcMd5 == haveMd5:
                 return utils.readTextFile(cacheFile).strip()
         # We do not have a cache file or it's out-of-date
-        # Be careful to avoid race conditions
-        cmd = ['timeout', '10s', 'python', 'src/main.py', 'pyrun', srcFile]
-        log.info('Running command: {" ".join(cmd)}')
-        res = shell.run(cmd, captureStdout=True, input=input, onError='ignore')
-        if res.exitcode != 0:
-            raise Exception(f'Running test file {srcFile} with python failed!')
-        golden = res.stdout.strip()
-        utils.writeTextFile(cacheFile, golden)
-        utils.writeTextFile(hashFile, srcMd5)
+        log.info(f'Computing golden output of {srcFile}')
+        try:
+            golden = runPython(srcFile, input).strip()
+        except (Exception, SystemExit) as e:
+            raise Exception(f'Running test file {srcFile} with python failed!') from e
+        # Written atomically, so an interrupted test run never leaves a truncated file
+        utils.writeFileAtomic(cacheFile, golden.encode('utf-8'))
+        utils.writeFileAtomic(hashFile, srcMd5.encode('utf-8'))
         return golden
 
 type ErrorKind = Literal['type error', 'run error']
@@ -106,6 +183,99 @@ def runFileTest(srcFile: str,
             realErr = result.stderr.strip().lower()
             assert errDetails in realErr
 
+# inProcess: the compiler runs inside the test process, only wat2wasm and the wasm
+# runtime are started as separate processes.
+# subprocess: every test runs python src/main.py compile.
+type CompileMode = Literal['inProcess', 'subprocess']
+
+COMPILE_MODE: CompileMode = \
+    'subprocess' if os.environ.get('MINIPY_TEST_COMPILE') == 'subprocess' else 'inProcess'
+
+def _compilerArgsParser() -> argparse.ArgumentParser:
+    # The options of the compile command that may appear in .args files
+    p = argparse.ArgumentParser(exit_on_error=False)
+    p.add_argument('--max-mem-size', type=int)
+    p.add_argument('--max-array-size', type=int)
+    p.add_argument('--fused-frontend', action='store_true')
+    return p
+
+def compileInProcess(lang: str, srcFile: str, output: str, extraArgs: str|None) -> shell.RunResult:
+    """
+    Compiles srcFile like python src/main.py compile, but inside the current process. The
+    result has the exit code of the compiler and its error messages in stderr.
+    """
+    return _compileInProcess(lang, srcFile, output, extraArgs)[0]
+
+def _compileInProcess(lang: str, srcFile: str, output: str, extraArgs: str|None) \
+        -> tuple[shell.RunResult, Any]:
+    opts = _compilerArgsParser().parse_args(extraArgs.split() if extraArgs else [])
+    import common.genericCompiler as genericCompiler
+    astMod = importlib.import_module(f'lang_{lang}.{lang}_ast')
+    compilerMod = importlib.import_module(f'compilers.lang_{lang}.{lang}_compiler')
+    args = genericCompiler.Args(srcFile, output, maxMemSize=opts.max_mem_size,
+                                maxArraySize=opts.max_array_size,
+                                fusedFrontend=opts.fused_frontend)
+    err = io.StringIO()
+    exitcode = 0
+    wasmMod = None
+    with log.capture() as logged, contextlib.redirect_stderr(err):
+        try:
+            wasmMod = genericCompiler.compileMain(args, compilerMod.compileModule, astMod)
+        except SystemExit as e:
+            exitcode = e.code if isinstance(e.code, int) else 1
+    return (shell.RunResult('', logged.getvalue() + err.getvalue(), exitcode), wasmMod)
+
+# iwasm: the compiled code runs with wasm-support/run_iwasm
+# py: the compiled code runs in-process with common.wasmInterp
+type WasmRuntime = Literal['iwasm', 'py']
+
+WASM_RUNTIME: WasmRuntime = cast(WasmRuntime, os.environ.get('MINIPY_TEST_RUNTIME') or \
+    ('iwasm' if shutil.which('iwasm') else 'py'))
+
+def compileAndRunInProcess(lang: str, srcFile: str, output: str, input: str|None,
+                           extraArgs: str|None) -> shell.RunResult:
+    """
+    Compiles srcFile to output (a .wat file) and runs the module with common.wasmInterp,
+    everything inside the current process. The result is the result of the compiler if
+    compilation fails.
+    """
+    import common.wasmInterp as wasmInterp
+    (res, wasmMod) = _compileInProcess(lang, srcFile, output, extraArgs)
+    if res.exitcode != 0:
+        return res
+    err = io.StringIO()
+    exitcode = 0
+    def run():
+        nonlocal exitcode
+        with contextlib.redirect_stderr(err):
+            try:
+                wasmInterp.runModule(wasmMod)
+            except wasmInterp.WasmTrap as e:
+                print(f'Exception: {e}', file=sys.stderr)
+                exitcode = constants.RUN_ERROR_EXIT_CODE
+    try:
+        out = runInProcess(run, input, srcFile)
+    except TimeoutError as e:
+        return shell.RunResult('', str(e), constants.RUN_ERROR_EXIT_CODE)
+    return shell.RunResult(out, err.getvalue(), exitcode)
+
+def compileFile(lang: str, srcFile: str, output: str, captureErr: bool, extraArgs: str|None,
+                mode: CompileMode = COMPILE_MODE) -> shell.RunResult:
+    """
+    Compiles srcFile to output for a test, see CompileMode.
+    """
+    if mode == 'inProcess':
+        return compileInProcess(lang, srcFile, output, extraArgs)
+    cmd = f'python src/main.py --lang={lang} compile --output={output}'
+    if extraArgs:
+        cmd = cmd + ' ' + extraArgs
+    cmd = cmd + ' ' + srcFile
+    log.info(f'Running command {cmd}')
+    res = shell.run(cmd, captureStderr=captureErr, captureStdout=False, onError='ignore')
+    if captureErr and res.stderr:
+        log.info(f'Output on stderr: {res.stderr}')
+    return res
+
 def collectTestFiles(baseDirs: list[str] = ['test_files'],
                      langOnly: Optional[list[str]] = None,
                      ignoreErrorFiles: bool = False) -> list[tuple[str, str]]:
@@ -0,0 +1,142 @@
+"""
+Records wall time, CPU time and peak memory of the phases of the compiler (--time-passes).
+
+Phases are marked with a context manager:
+
+    with timing.phase('tycheckModule'):
+        ...
+
+Phases may be nested, a nested phase is reported below its enclosing phase. If timing is
+not enabled, phase returns a shared no-op context manager, so marking phases costs only a
+function call.
+"""
+from __future__ import annotations
+from typing import *
+from dataclasses import dataclass, field
+import contextlib
+import json
+import sys
+import time
+import tracemalloc
+
+@dataclass
+class PhaseStats:
+    path: tuple[str, ...] # names of the enclosing phases and of the phase itself
+    calls: int = 0
+    wall: float = 0.0     # in seconds
+    cpu: float = 0.0      # in seconds
+    peakMem: int = 0      # in bytes, above the memory in use when the phase started
+
+@dataclass
+class _Frame:
+    stats: PhaseStats
+    wallStart: float
+    cpuStart: float
+    memStart: int
+    childPeak: int = 0    # peak memory reached in nested phases, absolute
+
+@dataclass
+class Recorder:
+    trackMemory: bool
+    phases: dict[tuple[str, ...], PhaseStats] = field(default_factory=dict[tuple[str, ...], PhaseStats])
+    stack: list[_Frame] = field(default_factory=list[_Frame])
+
+    def enter(self, name: str):
+        parent = self.stack[-1].stats.path if self.stack else ()
+        path = parent + (name,)
+        stats = self.phases.get(path)
+        if stats is None:
+            stats = PhaseStats(path)
+            self.phases[path] = stats
+        memStart = 0
+        if self.trackMemory:
+            (memStart, peak) = tracemalloc.get_traced_memory()
+            # tracemalloc has only one peak, remember the one of the enclosing phase
+            if self.stack:
+                self.stack[-1].childPeak = max(self.stack[-1].childPeak, peak)
+            tracemalloc.reset_peak()
+        self.stack.append(_Frame(stats, time.perf_counter(), time.process_time(), memStart))
+
+    def exit(self):
+        f = self.stack.pop()
+        f.stats.calls += 1
+        f.stats.wall += time.perf_counter() - f.wallStart
+        f.stats.cpu += time.process_time() - f.cpuStart
+        if self.trackMemory:
+            (_, peak) = tracemalloc.get_traced_memory()
+            peak = max(peak, f.childPeak)
+            f.stats.peakMem = max(f.stats.peakMem, peak - f.memStart)
+            if self.stack:
+                self.stack[-1].childPeak = max(self.stack[-1].childPeak, peak)
+
+_recorder: Optional[Recorder] = None
+_NO_PHASE = contextlib.nullcontext()
+
+def enable(trackMemory: bool = True):
+    global _recorder
+    if trackMemory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _recorder = Recorder(trackMemory)
+
+def disable():
+    global _recorder
+    if _recorder is not None and _recorder.trackMemory:
+        tracemalloc.stop()
+    _recorder = None
+
+def isEnabled() -> bool:
+    return _recorder is not None
+
+@contextlib.contextmanager
+def _phase(r: Recorder, name: str) -> Generator[None, None, None]:
+    r.enter(name)
+    try:
+        yield
+    finally:
+        r.exit()
+
+def phase(name: str) -> ContextManager[None]:
+    """
+    Marks a phase. The phase ends when the context manager is left.
+    """
+    r = _recorder
+    if r is None:
+        return _NO_PHASE
+    return _phase(r, name)
+
+def results() -> list[PhaseStats]:
+    """
+    The statistics of all phases, every phase is directly followed by its nested phases.
+    """
+    if _recorder is None:
+        return []
+    phases = _recorder.phases
+    order = {p: i for (i, p) in enumerate(phases)}
+    def key(s: PhaseStats) -> list[int]:
+        return [order[s.path[:k]] for k in range(1, len(s.path) + 1)]
+    return sorted(phases.values(), key=key)
+
+def formatTable(stats: list[PhaseStats]) -> str:
+    header = f'{"Phase":<40} {"Calls":>6} {"Wall (ms)":>10} {"CPU (ms)":>10} {"Peak mem (KB)":>14}'
+    lines = [header, len(header) * '-']
+    for s in stats:
+        name = '  ' * (len(s.path) - 1) + s.path[-1]
+        lines.append(f'{name:<40} {s.calls:>6} {s.wall * 1000:>10.2f} {s.cpu * 1000:>10.2f} ' \
+                     f'{s.peakMem / 1024:>14.1f}')
+    return '\n'.join(lines)
+
+def toJson(stats: list[PhaseStats]) -> str:
+    l = [{'phase': '/'.join(s.path), 'calls': s.calls, 'wall': s.wall, 'cpu': s.cpu,
+          'peakMem': s.peakMem} for s in stats]
+    return json.dumps({'phases': l}, indent=2)
+
+def report(jsonFile: Optional[str]):
+    """
+    Writes the statistics as JSON to jsonFile or as a table to stderr.
+    """
+    stats = results()
+    if jsonFile is None:
+        sys.stderr.write(formatTable(stats) + '\n')
+    else:
+        with open(jsonFile, 'w') as f:
+            f.write(toJson(stats) + '\n')
@@ -1,7 +1,9 @@
 import sys
 from typing import *
+import contextlib
 import hashlib
 import importlib
+import importlib.util
 import os
 import stat
 
@@ -21,6 +23,41 @@ def writeTextFile(path: str, content: str):
     with open(path, 'w') as f:
         return f.write(content)
 
+@contextlib.contextmanager
+def openAtomic(path: str) -> Generator[BinaryIO, None, None]:
+    """
+    Opens a temporary file for writing in binary mode and moves it to path when the block
+    exits without an exception. Other processes and threads either see the old or the new
+    content of path, but never a partially written file.
+    """
+    import tempfile # only needed for writing, keeps the startup time small
+    (fd, tmp) = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def writeFileAtomic(path: str, content: bytes):
+    """
+    Writes content to path, see openAtomic.
+    """
+    with openAtomic(path) as f:
+        f.write(content)
+
+def pyrunGlobals() -> dict[str, Any]:
+    """
+    Fresh globals for running a source program with the python interpreter.
+    """
+    return {
+        '__name__': '__main__',
+        'input_int': lambda: inputInt('Input some int: '),
+        'Callable': Callable
+    }
+
 def inputInt(prompt: str) -> int:
     if sys.stdout.isatty():
         s = input(prompt)
@@ -73,6 +110,16 @@ def flatten[T](ls: Iterable[list[T]]) -> list[T]:
         res.extend(x)
     return res
 
+def langFromPath(path: str) -> str|None:
+    """
+    Guesses the language of a source file from a lang_* component of its path.
+    """
+    lang = None
+    for x in path.split(os.sep):
+        if x.startswith('lang_'):
+            lang = x[len('lang_'):]
+    return lang
+
 def stripPrefix(prefix: str, s: str) -> str:
     if s.startswith(prefix):
         return s[len(prefix):]
@@ -93,6 +140,24 @@ def importModuleNotInStudent(modName: str) -> Any:
         e.add_note(f'Could not import {modName}. Are in the student repo?')
         raise e
 
+def lazyImport(modName: str) -> Any:
+    """
+    Returns the module modName without executing it. The module is executed on the first
+    access to one of its attributes. Use this for expensive modules that are only needed by
+    some commands. To keep the types, combine it with an import guarded by TYPE_CHECKING.
+    """
+    if modName in sys.modules:
+        return sys.modules[modName]
+    spec = importlib.util.find_spec(modName)
+    if spec is None or spec.loader is None:
+        raise ImportError(f'No module named {modName}', name=modName)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    m = importlib.util.module_from_spec(spec)
+    sys.modules[modName] = m
+    loader.exec_module(m)
+    return m
+
 def splitIf[T](l: list[T], pred: Callable[[T], bool],
                includeMatch: Literal['left', 'right']='right') -> tuple[list[T], list[T]]:
     """
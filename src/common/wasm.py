@@ -159,13 +159,18 @@ class WasmInstrDrop:
     def render(self) -> SExp:
         return SExpId('drop')
 
+@dataclass(frozen=True)
+class WasmInstrReturn:
+    def render(self) -> SExp:
+        return SExpId('return')
+
 @dataclass(frozen=True)
 class WasmInstrNumBinOp:
     """
     Binary operators on numbers, e.g. i32.add
     """
     ty: WasmValtype
-    op: Literal['add', 'sub', 'mul', 'shr_u', 'shl', 'xor']
+    op: Literal['add', 'sub', 'mul', 'shr_u', 'shl', 'xor', 'and', 'or']
     def render(self) -> SExp:
         return SExpId(f'{self.ty}.{self.op}')
 
@@ -232,6 +237,23 @@ class WasmInstrMem:
     def render(self) -> SExp:
         return SExpId(f'{self.ty}.{self.op}')
 
+@dataclass(frozen=True)
+class WasmInstrMemSize:
+    """
+    Current size of the memory in pages, i.e. memory.size
+    """
+    def render(self) -> SExp:
+        return SExpId('memory.size')
+
+@dataclass(frozen=True)
+class WasmInstrMemGrow:
+    """
+    Grows the memory by the number of pages on top of the stack, i.e. memory.grow.
+    Pushes the old size in pages, or -1 if the memory cannot grow.
+    """
+    def render(self) -> SExp:
+        return SExpId('memory.grow')
+
 @dataclass(frozen=True)
 class WasmInstrBranch:
     """
@@ -298,7 +320,8 @@ class WasmInstrTrap:
 type WasmInstr = WasmInstrConst | WasmInstrNumBinOp | WasmInstrIntRelOp | WasmInstrConvOp \
                | WasmInstrCall | WasmInstrCallIndirect | WasmInstrVarLocal | WasmInstrVarGlobal \
                | WasmInstrBranch | WasmInstrIf | WasmInstrLoop | WasmInstrBlock | WasmInstrMem \
-               | WasmInstrComment | WasmInstrTrap | WasmInstrDrop
+               | WasmInstrMemSize | WasmInstrMemGrow | WasmInstrComment | WasmInstrTrap | WasmInstrDrop \
+               | WasmInstrReturn
 
 # instructions used for loop and for compiling to assembly
 type WasmInstrL = WasmInstrConst | WasmInstrNumBinOp | WasmInstrIntRelOp \
@@ -0,0 +1,574 @@
+"""
+Pure-python interpreter for the wasm modules produced by our compilers (run --runtime=py).
+
+The interpreter takes the WasmModule of the compiler directly, so neither wat2wasm nor iwasm
+is needed. Before running, the structured control flow of every function is decoded into a
+flat list of instructions (op, a, b) with resolved jump targets: br to a block jumps to its
+end, br to a loop to its start, and if jumps to its else branch. The height of the operand
+stack is known statically, so a branch only has to unwind the stack if the stack holds more
+values than the target expects.
+
+Values of type i32 and i64 are python ints in the signed range of their type. The linear
+memory is a bytearray, function calls push a frame on an explicit stack, so deep recursion
+in the wasm code does not need a deep python stack. The env imports print like the native
+library of iwasm (wasm-support/native-lib/env.c), traps raise WasmTrap.
+"""
+from __future__ import annotations
+from typing import *
+from dataclasses import dataclass, field
+from common.wasm import *
+from common.compilerSupport import CompilerConfig
+import common.log as log
+import common.timing as timing
+import common.utils as utils
+import struct
+import sys
+
+class WasmTrap(Exception):
+    """
+    A trap of the wasm code, e.g. unreachable or an out of bounds memory access.
+    """
+    pass
+
+DEFAULT_MAX_CALL_DEPTH = 100000
+_MAX_PAGES = 65536
+
+_BITS: dict[WasmValtype, int] = {'i32': 32, 'i64': 64}
+
+def wrap(x: int, bits: int) -> int:
+    """
+    x modulo 2^bits, in the signed range.
+    """
+    half = 1 << (bits - 1)
+    return ((x + half) & ((1 << bits) - 1)) - half
+
+# Opcodes of the decoded code. a (an int) and b are the operands of an instruction.
+CONST = 0          # a: value
+LOCAL_GET = 1      # a: index
+LOCAL_SET = 2      # a: index
+LOCAL_TEE = 3      # a: index
+ADD64 = 4
+SUB64 = 5
+MUL64 = 6
+ADD32 = 7
+SUB32 = 8
+MUL32 = 9
+EQ = 10
+NE = 11
+LT_S = 12
+LE_S = 13
+GT_S = 14
+GE_S = 15
+LT_U = 16          # a: mask of the type
+LE_U = 17
+GT_U = 18
+GE_U = 19
+BR = 20            # a: target
+BR_IF = 21         # a: target
+BR_UNWIND = 22     # a: target, b: (height, arity)
+BR_IF_UNWIND = 23  # a: target, b: (height, arity)
+IF = 24            # a: start of the else branch
+LOAD = 25          # b: unpack_from of the struct
+STORE = 26         # b: pack_into of the struct
+GLOBAL_GET = 27    # a: index
+GLOBAL_SET = 28    # a: index
+CALL = 29          # b: Function
+CALL_HOST = 30     # b: HostFunction
+CALL_INDIRECT = 31 # b: signature
+RETURN = 32        # a: 1 if the function has a result, 0 otherwise
+AND = 33
+OR = 34
+XOR = 35
+SHL = 36           # a: bits
+SHR_U = 37         # a: bits
+WRAP = 38
+EXTEND_U = 39
+DROP = 40
+MEM_SIZE = 41
+MEM_GROW = 42
+TRAP = 43          # b: message
+
+type Instr = tuple[int, int, Any]
+type Signature = tuple[tuple[WasmValtype, ...], Optional[WasmValtype]]
+
+@dataclass
+class Function:
+    name: str
+    sig: Signature
+    locals: list[int] = field(default_factory=list[int]) # initial values, without params
+    code: list[Instr] = field(default_factory=list[Instr])
+
+@dataclass
+class HostFunction:
+    name: str
+    sig: Signature
+    fun: Callable[..., Optional[int]]
+
+type AnyFunction = Function | HostFunction
+
+_BINOPS: dict[tuple[WasmValtype, str], int] = {
+    ('i64', 'add'): ADD64, ('i64', 'sub'): SUB64, ('i64', 'mul'): MUL64,
+    ('i32', 'add'): ADD32, ('i32', 'sub'): SUB32, ('i32', 'mul'): MUL32,
+}
+_BITOPS = {'and': AND, 'or': OR, 'xor': XOR, 'shl': SHL, 'shr_u': SHR_U}
+_RELOPS = {'eq': EQ, 'ne': NE, 'lt_s': LT_S, 'le_s': LE_S, 'gt_s': GT_S, 'ge_s': GE_S,
+           'lt_u': LT_U, 'le_u': LE_U, 'gt_u': GT_U, 'ge_u': GE_U}
+_STRUCTS: dict[WasmValtype, struct.Struct] = {'i32': struct.Struct('<i'), 'i64': struct.Struct('<q')}
+
+@dataclass
+class _Label:
+    target: int          # jump target, -1 until known
+    height: int          # height of the operand stack when entering the construct
+    arity: int           # number of values passed by a branch to the label
+    patches: list[int]   # positions of branches whose target is not yet known
+
+class _Decoder:
+    """
+    Decodes the structured instructions of a single function.
+    """
+    def __init__(self, fun: Function, localIds: dict[WasmId, int], mod: Instance):
+        self.fun = fun
+        self.localIds = localIds
+        self.mod = mod
+        self.code: list[Instr] = []
+        self.labels: dict[WasmId, list[_Label]] = {}
+        # Static height of the operand stack, None in unreachable code
+        self.height: Optional[int] = 0
+
+    def emit(self, op: int, a: int = 0, b: Any = None):
+        self.code.append((op, a, b))
+
+    def effect(self, pop: int, push: int):
+        if self.height is not None:
+            self.height = self.height - pop + push
+
+    def unreachable(self):
+        self.height = None
+
+    def branch(self, id: WasmId, conditional: bool):
+        if conditional:
+            self.effect(1, 0)
+        label = self.labels[id][-1]
+        h = self.height
+        if h is None or h == label.height + label.arity:
+            self.emit(BR_IF if conditional else BR, label.target)
+        else:
+            unwind = (label.height, label.arity)
+            self.emit(BR_IF_UNWIND if conditional else BR_UNWIND, label.target, unwind)
+        if label.target < 0:
+            label.patches.append(len(self.code) - 1)
+        if not conditional:
+            self.unreachable()
+
+    def patchLabel(self, label: _Label):
+        label.target = len(self.code)
+        for i in label.patches:
+            (op, _, b) = self.code[i]
+            self.code[i] = (op, label.target, b)
+
+    def call(self, f: AnyFunction):
+        (params, result) = f.sig
+        self.emit(CALL if isinstance(f, Function) else CALL_HOST, 0, f)
+        self.effect(len(params), 0 if result is None else 1)
+
+    def instrs(self, instrs: list[WasmInstr]):
+        for i in instrs:
+            self.instr(i)
+
+    def instr(self, i: WasmInstr):
+        match i:
+            case WasmInstrConst(ty, val):
+                self.emit(CONST, wrap(int(val), _BITS[ty]))
+                self.effect(0, 1)
+            case WasmInstrVarLocal(op, id):
+                idx = self.localIds[id]
+                match op:
+                    case 'get':
+                        self.emit(LOCAL_GET, idx)
+                        self.effect(0, 1)
+                    case 'set':
+                        self.emit(LOCAL_SET, idx)
+                        self.effect(1, 0)
+                    case 'tee':
+                        self.emit(LOCAL_TEE, idx)
+            case WasmInstrVarGlobal(op, id):
+                idx = self.mod.globalIds[id]
+                if op == 'get':
+                    self.emit(GLOBAL_GET, idx)
+                    self.effect(0, 1)
+                else:
+                    self.emit(GLOBAL_SET, idx)
+                    self.effect(1, 0)
+            case WasmInstrNumBinOp(ty, op):
+                if (ty, op) in _BINOPS:
+                    self.emit(_BINOPS[(ty, op)])
+                elif op in _BITOPS:
+                    self.emit(_BITOPS[op], _BITS[ty])
+                else:
+                    raise ValueError(f'Unsupported instruction {ty}.{op}')
+                self.effect(2, 1)
+            case WasmInstrIntRelOp(ty, op):
+                self.emit(_RELOPS[op], (1 << _BITS[ty]) - 1)
+                self.effect(2, 1)
+            case WasmInstrConvOp(op):
+                match op:
+                    case 'i32.wrap_i64': self.emit(WRAP)
+                    case 'i64.extend_i32_u': self.emit(EXTEND_U)
+                    case 'i64.extend_i32_s': pass # signed values stay the same
+            case WasmInstrMem(ty, op):
+                s = _STRUCTS[ty]
+                if op == 'load':
+                    self.emit(LOAD, 0, s.unpack_from)
+                    self.effect(1, 1)
+                else:
+                    self.emit(STORE, 0, s.pack_into)
+                    self.effect(2, 0)
+            case WasmInstrCall(id):
+                self.call(self.mod.funcIds[id])
+            case WasmInstrCallIndirect(params, result):
+                self.emit(CALL_INDIRECT, 0, (tuple(params), result))
+                self.effect(len(params) + 1, 0 if result is None else 1)
+            case WasmInstrBranch(target, conditional):
+                self.branch(target, conditional)
+            case WasmInstrIf(resultType, thenInstrs, elseInstrs):
+                self.effect(1, 0)
+                h = self.height
+                arity = 0 if resultType is None else 1
+                self.emit(IF)
+                ifPos = len(self.code) - 1
+                self.instrs(thenInstrs)
+                if elseInstrs:
+                    self.emit(BR)
+                    brPos = len(self.code) - 1
+                    self.code[ifPos] = (IF, len(self.code), None)
+                    self.height = h
+                    self.instrs(elseInstrs)
+                    self.code[brPos] = (BR, len(self.code), None)
+                else:
+                    self.code[ifPos] = (IF, len(self.code), None)
+                self.height = None if h is None else h + arity
+            case WasmInstrBlock(label, result, body):
+                h = self.height
+                arity = 0 if result is None else 1
+                l = _Label(-1, h or 0, arity, [])
+                self.labels.setdefault(label, []).append(l)
+                self.instrs(body)
+                self.labels[label].pop()
+                self.patchLabel(l)
+                self.height = None if h is None else h + arity
+            case WasmInstrLoop(label, body):
+                h = self.height
+                l = _Label(len(self.code), h or 0, 0, [])
+                self.labels.setdefault(label, []).append(l)
+                self.instrs(body)
+                self.labels[label].pop()
+                self.height = h
+            case WasmInstrMemSize():
+                self.emit(MEM_SIZE)
+                self.effect(0, 1)
+            case WasmInstrMemGrow():
+                self.emit(MEM_GROW)
+            case WasmInstrDrop():
+                self.emit(DROP)
+                self.effect(1, 0)
+            case WasmInstrReturn():
+                self.emit(RETURN, 0 if self.fun.sig[1] is None else 1)
+                self.unreachable()
+            case WasmInstrTrap():
+                self.emit(TRAP, 0, 'unreachable')
+                self.unreachable()
+            case WasmInstrComment():
+                pass
+
+def _globalValue(g: WasmGlobal) -> int:
+    match g.init:
+        case [WasmInstrConst(ty, val)]:
+            return wrap(int(val), _BITS[ty])
+        case _:
+            raise ValueError(f'Unsupported initializer of global {g.id.id}: {g.init}')
+
+class Instance:
+    """
+    An instantiated module: its functions, globals, table and memory.
+    """
+    def __init__(self, m: WasmModule, maxCallDepth: int = DEFAULT_MAX_CALL_DEPTH):
+        self.maxCallDepth = maxCallDepth
+        self.mem = bytearray()
+        self.maxPages = _MAX_PAGES
+        self.funcIds: dict[WasmId, AnyFunction] = {}
+        for imp in m.imports:
+            match imp.desc:
+                case WasmImportMemory(minPages, maxPages):
+                    self.mem = bytearray(minPages * CompilerConfig.pageSize)
+                    self.maxPages = _MAX_PAGES if maxPages is None else maxPages
+                case WasmImportFunc(id, params, result):
+                    sig = (tuple(params), result)
+                    self.funcIds[id] = HostFunction(imp.name, sig, self.hostFunction(imp))
+        for d in m.data:
+            content = d.content.encode('utf-8')
+            self.mem[d.start:d.start + len(content)] = content
+        self.globalIds = {g.id: i for (i, g) in enumerate(m.globals)}
+        self.globals = [_globalValue(g) for g in m.globals]
+        funcs: list[tuple[WasmFunc, Function]] = []
+        for f in m.funcs:
+            sig: Signature = (tuple(t for (_, t) in f.params), f.result)
+            fun = Function(f.id.id, sig, [0 for _ in f.locals])
+            self.funcIds[f.id] = fun
+            funcs.append((f, fun))
+        with timing.phase('decodeWasm'):
+            for (f, fun) in funcs:
+                localIds = {x: i for (i, (x, _)) in enumerate(f.params + f.locals)}
+                d = _Decoder(fun, localIds, self)
+                d.instrs(f.instrs)
+                d.emit(RETURN, 0 if f.result is None else 1)
+                fun.code = d.code
+        self.table = [self.funcIds[id] for id in m.funcTable.elems]
+        self.exports = {e.name: self.funcIds[e.desc.id] for e in m.exports}
+
+    def readString(self, ptr: int, n: int) -> str:
+        return self.mem[ptr:ptr + n].decode('utf-8', errors='replace')
+
+    def hostFunction(self, imp: WasmImport) -> Callable[..., Optional[int]]:
+        def printStr(ptr: int, n: int):
+            print(self.readString(ptr, n))
+        def printErr(ptr: int, n: int):
+            sys.stdout.flush()
+            print(f'ERROR: {self.readString(ptr, n)}', file=sys.stderr)
+        def printBool(x: int):
+            print('True' if x else 'False')
+        def inputInt(bits: int) -> Callable[[], int]:
+            def read() -> int:
+                try:
+                    return wrap(utils.inputInt('input int: '), bits)
+                except (ValueError, EOFError):
+                    raise WasmTrap('Invalid input')
+            return read
+        match imp.name:
+            case 'print': return printStr
+            case 'print_err': return printErr
+            case 'print_i32' | 'print_i64': return print
+            case 'print_bool': return printBool
+            case 'input_i32': return inputInt(32)
+            case 'input_i64': return inputInt(64)
+            case n: raise ValueError(f'Unknown import {imp.module}.{n}')
+
+    def run(self, name: str = 'main'):
+        """
+        Runs the exported function name without arguments.
+        """
+        f = self.exports.get(name)
+        if not isinstance(f, Function) or f.sig[0]:
+            raise ValueError(f'Module does not export a function {name} without parameters')
+        _execute(self, f)
+
+def _execute(inst: Instance, f: Function):
+    """
+    The dispatch loop. The opcodes are tested in the order of their expected frequency.
+    """
+    mem = inst.mem
+    globals_ = inst.globals
+    table = inst.table
+    maxCallDepth = inst.maxCallDepth
+    frames: list[tuple[list[Instr], int, list[int], list[int]]] = []
+    code: list[Instr] = f.code
+    locals_: list[int] = list(f.locals)
+    stack: list[int] = []
+    push = stack.append
+    pop = stack.pop
+    pc = 0
+    while True:
+        (op, a, b) = code[pc]
+        pc += 1
+        if op == LOCAL_GET:
+            push(locals_[a])
+        elif op == CONST:
+            push(a)
+        elif op == LOCAL_SET:
+            locals_[a] = pop()
+        elif op == ADD64:
+            y = pop()
+            x = stack[-1] + y
+            if x > 0x7FFFFFFFFFFFFFFF or x < -0x8000000000000000:
+                x = wrap(x, 64)
+            stack[-1] = x
+        elif op == ADD32:
+            y = pop()
+            x = stack[-1] + y
+            if x > 0x7FFFFFFF or x < -0x80000000:
+                x = wrap(x, 32)
+            stack[-1] = x
+        elif op == BR_IF:
+            if pop():
+                pc = a
+        elif op == IF:
+            if not pop():
+                pc = a
+        elif op == BR:
+            pc = a
+        elif op == LOAD:
+            addr = stack[-1]
+            if addr < 0:
+                raise WasmTrap('out of bounds memory access')
+            try:
+                (stack[-1],) = b(mem, addr)
+            except struct.error:
+                raise WasmTrap('out of bounds memory access')
+        elif op == STORE:
+            v = pop()
+            addr = pop()
+            if addr < 0:
+                raise WasmTrap('out of bounds memory access')
+            try:
+                b(mem, addr, v)
+            except struct.error:
+                raise WasmTrap('out of bounds memory access')
+        elif op == LOCAL_TEE:
+            locals_[a] = stack[-1]
+        elif op == EQ:
+            y = pop()
+            stack[-1] = 1 if stack[-1] == y else 0
+        elif op == NE:
+            y = pop()
+            stack[-1] = 1 if stack[-1] != y else 0
+        elif op == LT_S:
+            y = pop()
+            stack[-1] = 1 if stack[-1] < y else 0
+        elif op == GT_S:
+            y = pop()
+            stack[-1] = 1 if stack[-1] > y else 0
+        elif op == LE_S:
+            y = pop()
+            stack[-1] = 1 if stack[-1] <= y else 0
+        elif op == GE_S:
+            y = pop()
+            stack[-1] = 1 if stack[-1] >= y else 0
+        elif op == SUB64:
+            y = pop()
+            x = stack[-1] - y
+            if x > 0x7FFFFFFFFFFFFFFF or x < -0x8000000000000000:
+                x = wrap(x, 64)
+            stack[-1] = x
+        elif op == MUL64:
+            y = pop()
+            x = stack[-1] * y
+            if x > 0x7FFFFFFFFFFFFFFF or x < -0x8000000000000000:
+                x = wrap(x, 64)
+            stack[-1] = x
+        elif op == GLOBAL_GET:
+            push(globals_[a])
+        elif op == GLOBAL_SET:
+            globals_[a] = pop()
+        elif op == CALL or op == CALL_INDIRECT:
+            if op == CALL_INDIRECT:
+                i = pop()
+                if i < 0 or i >= len(table):
+                    raise WasmTrap('undefined element')
+                g = table[i]
+                if g.sig != b:
+                    raise WasmTrap('indirect call type mismatch')
+            else:
+                g = b
+            n = len(g.sig[0])
+            args = stack[len(stack) - n:]
+            del stack[len(stack) - n:]
+            if isinstance(g, HostFunction):
+                r = g.fun(*args)
+                if r is not None:
+                    push(r)
+                continue
+            if len(frames) >= maxCallDepth:
+                raise WasmTrap('wasm call stack exhausted')
+            frames.append((code, pc, locals_, stack))
+            code = g.code
+            pc = 0
+            locals_ = args + g.locals
+            stack = []
+            push = stack.append
+            pop = stack.pop
+        elif op == RETURN:
+            if not frames:
+                return
+            r = stack[-1] if a else None
+            (code, pc, locals_, stack) = frames.pop()
+            push = stack.append
+            pop = stack.pop
+            if r is not None:
+                push(r)
+        elif op == CALL_HOST:
+            n = len(b.sig[0])
+            args = stack[len(stack) - n:]
+            del stack[len(stack) - n:]
+            r = b.fun(*args)
+            if r is not None:
+                push(r)
+        elif op == BR_UNWIND or op == BR_IF_UNWIND:
+            if op == BR_IF_UNWIND and not pop():
+                continue
+            (h, arity) = b
+            if arity:
+                v = stack[-1]
+                del stack[h:]
+                push(v)
+            else:
+                del stack[h:]
+            pc = a
+        elif op == SUB32 or op == MUL32:
+            y = pop()
+            x = stack[-1] - y if op == SUB32 else stack[-1] * y
+            stack[-1] = wrap(x, 32)
+        elif op == AND:
+            y = pop()
+            stack[-1] &= y
+        elif op == OR:
+            y = pop()
+            stack[-1] |= y
+        elif op == XOR:
+            y = pop()
+            stack[-1] ^= y
+        elif op == SHL:
+            y = pop()
+            stack[-1] = wrap(stack[-1] << (y & (a - 1)), a)
+        elif op == SHR_U:
+            y = pop()
+            stack[-1] = wrap((stack[-1] & ((1 << a) - 1)) >> (y & (a - 1)), a)
+        elif op == LT_U:
+            y = pop()
+            stack[-1] = 1 if stack[-1] & a < y & a else 0
+        elif op == LE_U:
+            y = pop()
+            stack[-1] = 1 if stack[-1] & a <= y & a else 0
+        elif op == GT_U:
+            y = pop()
+            stack[-1] = 1 if stack[-1] & a > y & a else 0
+        elif op == GE_U:
+            y = pop()
+            stack[-1] = 1 if stack[-1] & a >= y & a else 0
+        elif op == WRAP:
+            stack[-1] = wrap(stack[-1], 32)
+        elif op == EXTEND_U:
+            stack[-1] &= 0xFFFFFFFF
+        elif op == DROP:
+            pop()
+        elif op == MEM_SIZE:
+            push(len(mem) // CompilerConfig.pageSize)
+        elif op == MEM_GROW:
+            n = stack[-1]
+            pages = len(mem) // CompilerConfig.pageSize
+            if n < 0 or pages + n > inst.maxPages:
+                stack[-1] = -1
+            else:
+                mem.extend(bytes(n * CompilerConfig.pageSize))
+                stack[-1] = pages
+        elif op == TRAP:
+            raise WasmTrap(b)
+        else:
+            raise ValueError(f'Invalid opcode {op} in {code[pc - 1]}')
+
+def runModule(m: WasmModule, maxCallDepth: int = DEFAULT_MAX_CALL_DEPTH):
+    """
+    Runs the function main of m. Raises WasmTrap if the code traps.
+    """
+    inst = Instance(m, maxCallDepth)
+    log.info('Running wasm module with the python runtime')
+    with timing.phase('runWasm'):
+        inst.run()
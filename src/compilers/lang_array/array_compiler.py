@@ -3,43 +3,72 @@ import lang_array.array_ast as plainAst
 from common.wasm import *
 import lang_array.array_tychecker as array_tychecker
 import lang_array.array_transform as array_transform
+import lang_array.array_tycheckTransform as array_tycheckTransform
 from lang_array.array_compilerSupport import *
 from common.compilerSupport import *
+import common.timing as timing
 # import common.utils as utils
 
-config: CompilerConfig
+class Ctx:
+    """
+    State of a single compilation. Every call of compileModule uses a fresh context,
+    so that compiling a module does not depend on earlier compilations in the same process.
+    """
+    def __init__(self, cfg: CompilerConfig, layout: Layout):
+        self.cfg = cfg
+        self.layout = layout
+        self.whileCount = 0
+    def freshLoopLabels(self) -> tuple[WasmId, WasmId]:
+        """
+        Returns a pair of fresh labels for the start and the exit of a loop.
+        """
+        n = self.whileCount
+        self.whileCount += 1
+        return (identToWasmId(Ident(f'loop_{n}_start')), identToWasmId(Ident(f'loop_{n}_exit')))
 
 def compileModule(m: plainAst.mod, cfg: CompilerConfig) -> WasmModule:
     """
     Compiles the given module.
     """
 
-    # # Set config as global (for max array size)
-    global config
-    config = cfg
-
     # Get array context
-    ctx = array_transform.Ctx()
+    transCtx = array_transform.Ctx()
 
-    vars = array_tychecker.tycheckModule(m)
+    if cfg.fusedFrontend:
+        # Typecheck and transform in a single pass
+        with timing.phase('tycheckTransModule'):
+            (vars, arr_stmts) = array_tycheckTransform.tycheckTransModule(m, transCtx)
+    else:
+        with timing.phase('tycheckModule'):
+            vars = array_tychecker.tycheckModule(m)
 
-    # Transform (atomic subexpressions)
-    arr_stmts = array_transform.transStmts(m.stmts, ctx)
+        # Transform (atomic subexpressions)
+        with timing.phase('transStmts'):
+            arr_stmts = array_transform.transStmts(m.stmts, transCtx)
 
-    instrs = compileStmts(arr_stmts)
+    # Roots for the garbage collector (all variables holding arrays), needed before compiling
+    varTys: list[tuple[ident, ty]] = [(x[0], x[1].ty) for x in vars.items()] + list(transCtx.freshVars.items())
+    roots = [identToWasmId(x) for (x, t) in varTys if isinstance(t, Array)] + [Locals.tmp_root]
+    layout = Layout(roots)
+
+    # Compilation context (config for max array size, layout for the roots)
+    ctx = Ctx(cfg, layout)
+
+    with timing.phase('compileStmts'):
+        instrs = compileStmts(arr_stmts, ctx)
     idMain = WasmId('$main')
 
     # Locals (tycheck-vars + tmp + ctx)
     locals: list[tuple[WasmId, WasmValtype]] = [(identToWasmId(x[0]), tyToWasmValtype(x[1].ty)) for x in vars.items()]
     locals.extend(Locals.decls())
-    locals.extend([(identToWasmId(x[0]), tyToWasmValtype(x[1])) for x in ctx.freshVars.items()] )
+    locals.extend([(identToWasmId(x[0]), tyToWasmValtype(x[1])) for x in transCtx.freshVars.items()] )
     
-    return WasmModule(imports=wasmImports(config.maxMemSize),
+    return WasmModule(imports=wasmImports(cfg.maxMemSize),
                         exports=[WasmExport("main", WasmExportFunc(idMain))],
-                        globals=Globals.decls(),
+                        globals=Globals.decls(layout),
                         data=Errors.data(),
                         funcTable=WasmFuncTable([]),
-                        funcs=[WasmFunc(idMain, [], None, locals, instrs)])
+                        funcs=[WasmFunc(idMain, [], None, locals, instrs)] + Funcs.decls(layout))
 
 def identToWasmId(x: ident, ty: Optional[Literal['i32', 'i64']] = None) -> WasmId:
     name = x.name
@@ -75,51 +104,47 @@ def tyToWasmValtype(ty: ty) -> Literal['i32', 'i64']:
         case Array():
             return 'i32'
 
-whileCount = 0
-
-def compileStmts(stmts: list[stmt]) -> list[WasmInstr]:
+def compileStmts(stmts: list[stmt], ctx: Ctx) -> list[WasmInstr]:
     instructions: list[WasmInstr] = []
     for statement in stmts:
         match statement:
             case StmtExp(e):
-                instructions.extend(compileExp(e))
+                instructions.extend(compileExp(e, ctx))
                 
             case Assign(var, right):
-                instructions.extend(compileExp(right))
+                instructions.extend(compileExp(right, ctx))
                 instructions.append(WasmInstrVarLocal('set', identToWasmId(var)))
 
             case IfStmt(cond, thenBody, elseBody):
-                instructions.extend(compileExp(cond))
+                instructions.extend(compileExp(cond, ctx))
 
                 instructions.append(
                     WasmInstrIf(
                         None,
-                        compileStmts(thenBody),
-                        compileStmts(elseBody)
+                        compileStmts(thenBody, ctx),
+                        compileStmts(elseBody, ctx)
                     )
                 )
             case WhileStmt(cond, body):
-                global whileCount
-                currentWhileNo = whileCount
-                whileCount += 1
+                (startLabel, exitLabel) = ctx.freshLoopLabels()
 
-                whileInstr = compileExp(cond)
+                whileInstr = compileExp(cond, ctx)
                 
-                whileExit = WasmInstrBranch(identToWasmId(Ident(f'loop_{currentWhileNo}_exit')), False)
+                whileExit = WasmInstrBranch(exitLabel, False)
                 whileInstr.append(WasmInstrIf(None, [], [whileExit]))
                 
-                whileInstr.extend(compileStmts(body))
+                whileInstr.extend(compileStmts(body, ctx))
                 
-                whileStart = WasmInstrBranch(identToWasmId(Ident(f'loop_{currentWhileNo}_start')), False)
+                whileStart = WasmInstrBranch(startLabel, False)
                 whileInstr.append(whileStart)
                 
                 loop = WasmInstrLoop(
-                    identToWasmId(Ident(f'loop_{currentWhileNo}_start')),
+                    startLabel,
                     whileInstr
                 )
 
                 block = WasmInstrBlock(
-                    identToWasmId(Ident(f'loop_{currentWhileNo}_exit')),
+                    exitLabel,
                     None,
                     [loop]
                 )
@@ -134,7 +159,7 @@ def compileStmts(stmts: list[stmt]) -> list[WasmInstr]:
                     case _:
                         raise TypeError
                 instructions.extend(arrayOffsetInstrs(left, index, arrType))    # Get address of left side array item
-                instructions.extend(compileExp(right))                          # Get right side
+                instructions.extend(compileExp(right, ctx))                          # Get right side
                 instructions.append(storeInstr)                                 # Store right side into item
 
     return instructions
@@ -148,21 +173,21 @@ def compileAtomExp(atomExp: AtomExp) -> WasmInstr:
         case Name(name):
             return WasmInstrVarLocal('get', identToWasmId(name, tyToWasmValtype(tyOfAtomExp(atomExp.e))))
 
-def compileExp(exp: exp) -> list[WasmInstr]:
+def compileExp(exp: exp, ctx: Ctx) -> list[WasmInstr]:
     match exp:
         case AtomExp():
             return [compileAtomExp(exp)]
         case Call(name, args):
-            return compileCall(name, args)
+            return compileCall(name, args, ctx)
         case UnOp(op, arg):
-            return compileUnOp(op, arg)
+            return compileUnOp(op, arg, ctx)
         case BinOp(left, op, right, ty):
-            return compileBinOp(left, op, right, ty)
+            return compileBinOp(left, op, right, ty, ctx)
         case ArrayInitDyn(length, elemInit, ty):
             ret: list[WasmInstr] = []
 
             # Initialization of array, leaves array address on top of stack
-            ret.extend(compileInitArray(length, tyOfAtomExp(elemInit)))
+            ret.extend(compileInitArray(length, tyOfAtomExp(elemInit), ctx))
             ret.append(WasmInstrVarLocal('tee', Locals.tmp_i32))  # Set $@tmp_i32 to array address, leave it on top of stack
             ret.append(WasmInstrVarLocal('get', Locals.tmp_i32))
             ret.append(WasmInstrConst('i32', 4))
@@ -172,17 +197,25 @@ def compileExp(exp: exp) -> list[WasmInstr]:
             # Loop
             elemLen = 4 if ((elemInit.ty is None) or tyToWasmValtype(elemInit.ty) == 'i32') else 8  # Item length in bytes
 
-            global whileCount
-            currentWhileNo = whileCount
-            whileCount += 1
+            # Set $@tmp2_i32 to the end of the array
+            ret.append(WasmInstrVarLocal('get', Locals.tmp_i32))
+            ret.append(compileAtomExp(AtomExp(length)))
+            ret.extend([
+                WasmInstrConvOp('i32.wrap_i64'),
+                WasmInstrConst('i32', elemLen),
+                WasmInstrNumBinOp('i32', 'mul'),
+                WasmInstrNumBinOp('i32', 'add')])
+            ret.append(WasmInstrVarLocal('set', Locals.tmp2_i32))
+
+            (startLabel, exitLabel) = ctx.freshLoopLabels()
 
             whileInstr: list[WasmInstr] = []
             
             whileInstr.append(WasmInstrVarLocal('get', Locals.tmp_i32))
-            whileInstr.append(WasmInstrVarGlobal('get', Globals.freePtr))
+            whileInstr.append(WasmInstrVarLocal('get', Locals.tmp2_i32))
             whileInstr.append(WasmInstrIntRelOp('i32','lt_u'))
 
-            branchToExit = WasmInstrBranch(identToWasmId(Ident(f'loop_{currentWhileNo}_exit')), False)
+            branchToExit = WasmInstrBranch(exitLabel, False)
             whileInstr.append(WasmInstrIf(None, [], [branchToExit]))
 
             whileInstr.append(WasmInstrVarLocal('get', Locals.tmp_i32))
@@ -193,17 +226,17 @@ def compileExp(exp: exp) -> list[WasmInstr]:
             whileInstr.append(WasmInstrNumBinOp('i32','add'))
             whileInstr.append(WasmInstrVarLocal('set', Locals.tmp_i32))
 
-            branchToStart = WasmInstrBranch(identToWasmId(Ident(f'loop_{currentWhileNo}_start')), False)
+            branchToStart = WasmInstrBranch(startLabel, False)
             whileInstr.append(branchToStart)
 
 
             loop = WasmInstrLoop(
-                identToWasmId(Ident(f'loop_{currentWhileNo}_start')),
+                startLabel,
                 whileInstr
             )
 
             ret.append(WasmInstrBlock(
-                identToWasmId(Ident(f'loop_{currentWhileNo}_exit')),
+                exitLabel,
                 None,
                 [loop]
             ))
@@ -211,7 +244,7 @@ def compileExp(exp: exp) -> list[WasmInstr]:
             return ret
         case ArrayInitStatic(elemInit, ty):
             ret: list[WasmInstr] = []
-            ret.extend(compileInitArray(IntConst(len(elemInit)), tyOfAtomExp(elemInit[0])))
+            ret.extend(compileInitArray(IntConst(len(elemInit)), tyOfAtomExp(elemInit[0]), ctx))
 
             match elemInit[0].ty:
                 case Int(): 
@@ -230,7 +263,7 @@ def compileExp(exp: exp) -> list[WasmInstr]:
                 ret += [WasmInstrConst('i32', 4 + (elemLen*(i))), WasmInstrNumBinOp('i32','add')]
 
                 # Evaluate expr and store it
-                ret += compileExp(AtomExp(e))
+                ret += compileExp(AtomExp(e), ctx)
                 ret += [WasmInstrMem(elemType, 'store')]
             return ret
         case Subscript(array, index):
@@ -238,7 +271,7 @@ def compileExp(exp: exp) -> list[WasmInstr]:
             ret.append(WasmInstrMem(tyToWasmValtype(tyOfExp(exp)), 'load'))
             return ret
 
-def checkLength(lenExp: atomExp, elemTy: ty) -> list[WasmInstr]:
+def checkLength(lenExp: atomExp, elemTy: ty, ctx: Ctx) -> list[WasmInstr]:
     ret: list[WasmInstr] = []
 
     # 1.1. Check > 0
@@ -252,8 +285,7 @@ def checkLength(lenExp: atomExp, elemTy: ty) -> list[WasmInstr]:
     ))
 
     # 1.2. Check <= maxArraySize
-    global config
-    maxArraySize = config.maxArraySize                      # Max array size in bytes
+    maxArraySize = ctx.cfg.maxArraySize                      # Max array size in bytes
     elemLen = 4 if tyToWasmValtype(elemTy) == 'i32' else 8  # Item length in bytes
     maxElemCount = maxArraySize // elemLen                  # Max number of elements
     ret.append(compileAtomExp(AtomExp(lenExp)))             # Length to stack
@@ -267,46 +299,45 @@ def checkLength(lenExp: atomExp, elemTy: ty) -> list[WasmInstr]:
 
     return ret
 
-def compileInitArray(lenExp: atomExp, elemTy: ty) -> list[WasmInstr]:
+def compileInitArray(lenExp: atomExp, elemTy: ty, ctx: Ctx) -> list[WasmInstr]:
     ret: list[WasmInstr] = []
 
     # 1. Check length
-    ret = checkLength(lenExp, elemTy)
+    ret = checkLength(lenExp, elemTy, ctx)
 
-    # 3.1. Read free_ptr (yes, step 3 begins before step 2)
-    ret.append(WasmInstrVarGlobal('get', Globals.freePtr))
+    elemLen = 4 if tyToWasmValtype(elemTy) == 'i32' else 8                      # Item length in bytes
 
-    # 2. Compute header value
-    # 2.1. Get value of M
+    # 2. Allocate memory for the array (the garbage collector might run)
+    ret.extend(ctx.layout.spillRoots())                                         # Roots to shadow stack
+    ret.append(compileAtomExp(AtomExp(lenExp)))                                 # Length to stack
+    ret.extend([                                                                # Multiply length with the size of each element
+        WasmInstrConvOp('i32.wrap_i64'),
+        WasmInstrConst('i32', elemLen),
+        WasmInstrNumBinOp('i32', 'mul')])
+    ret.extend([WasmInstrConst('i32', 4), WasmInstrNumBinOp('i32', 'add')])     # Add 4 for the header
+    ret.append(WasmInstrCall(Funcs.alloc))                                      # Address of the array to stack
+    ret.append(WasmInstrVarLocal('tee', Locals.tmp_i32))
+
+    # 3. Compute header value
+    # 3.1. Get value of bits 0-3 (M = 3 for arrays of arrays, elements of type int need 8 bytes)
     match elemTy:
         case Array():
-            m = 3
-        case _:
-            m = 1
+            m = Header.array | Header.pointers
+        case Int():
+            m = Header.array | Header.wide
+        case Bool():
+            m = Header.array
 
-    # 2.2. Compute 
+    # 3.2. Compute
     ret.append(compileAtomExp(AtomExp(lenExp)))                                 # Length to stack
     ret.append(WasmInstrConvOp('i32.wrap_i64'))                                 # Convert length to i32
     ret.extend([WasmInstrConst('i32', 4), WasmInstrNumBinOp('i32','shl')])      # Shift length left by 4 bit
     ret.append(WasmInstrConst('i32', m))                                        # Value for bits 0-3
     ret.append(WasmInstrNumBinOp('i32', 'xor'))                                 # Integrate bits 0-3
 
-    # 3.2. Store header at free_ptr
+    # 4. Store header at the array address and return the array address
     ret.append(WasmInstrMem('i32', 'store'))
-
-    elemLen = 4 if tyToWasmValtype(elemTy) == 'i32' else 8                      # Item length in bytes
-
-    # 4. Move $@free_ptr and return array address
-    ret.append(WasmInstrVarGlobal('get', Globals.freePtr))
-    ret.append(compileAtomExp(AtomExp(lenExp)))                                 # Length to stack
-    ret.extend([                                                                # Multiply length with the size of each element
-        WasmInstrConvOp('i32.wrap_i64'),
-        WasmInstrConst('i32', elemLen),
-        WasmInstrNumBinOp('i32', 'mul')]) 
-    ret.extend([WasmInstrConst('i32', 4), WasmInstrNumBinOp('i32', 'add')])     # Add 4 for the header
-    ret.append(WasmInstrVarGlobal('get', Globals.freePtr))
-    ret.append(WasmInstrNumBinOp('i32', 'add'))                                 # Add the space required by the array to $@free_ptr
-    ret.append(WasmInstrVarGlobal('set', Globals.freePtr))    # Set free_ptr
+    ret.append(WasmInstrVarLocal('get', Locals.tmp_i32))
 
     return ret
 
@@ -366,17 +397,17 @@ def arrayOffsetInstrs(arrayExp: atomExp, indexExp: atomExp, subTy: ty) -> list[W
 
     return ret
 
-def compileCall(name: ident, args: list[exp]):
+def compileCall(name: ident, args: list[exp], ctx: Ctx):
     ret: list[WasmInstr] = []
 
     # If len is called
     if name.name == 'len':
-        ret.extend(compileExp(args[0]))
+        ret.extend(compileExp(args[0], ctx))
         ret.extend(arrayLenInstrs())
     else:
         # Firstly compile arguments of function call
         for arg in args:
-            ret.extend(compileExp(arg))
+            ret.extend(compileExp(arg, ctx))
 
         wasmType = tyToWasmValtype(tyOfExp(args[0])) if len(args) == 1 else None
 
@@ -384,7 +415,7 @@ def compileCall(name: ident, args: list[exp]):
         ret.append(WasmInstrCall(identToWasmId(name, wasmType)))
     return ret
 
-def compileUnOp(op: unaryop, arg: exp) -> list[WasmInstr]:
+def compileUnOp(op: unaryop, arg: exp, ctx: Ctx) -> list[WasmInstr]:
     ret: list[WasmInstr] = []
 
     # Get 
@@ -393,15 +424,15 @@ def compileUnOp(op: unaryop, arg: exp) -> list[WasmInstr]:
     match op:
         case USub():        
             ret.append(WasmInstrConst(condWasmType, 0))
-            ret.extend(compileExp(arg))
+            ret.extend(compileExp(arg, ctx))
             ret.append(WasmInstrNumBinOp(condWasmType, 'sub'))
         case Not():
-            ret.extend(compileExp(arg))                 
+            ret.extend(compileExp(arg, ctx))                 
             ret.append(WasmInstrConst(condWasmType, 0))        
             ret.append(WasmInstrIntRelOp(condWasmType, 'eq'))  
     return ret
 
-def compileBinOp(left: exp, op: binaryop, right: exp, ty: optional[resultTy]) -> list[WasmInstr]:
+def compileBinOp(left: exp, op: binaryop, right: exp, ty: optional[resultTy], ctx: Ctx) -> list[WasmInstr]:
     ret: list[WasmInstr] = []
 
     condWasmTypeLeft = tyToWasmValtype(tyOfExp(left))
@@ -414,60 +445,63 @@ def compileBinOp(left: exp, op: binaryop, right: exp, ty: optional[resultTy]) ->
 
     match op:
         case Add():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrNumBinOp(condWasmType, 'add'))
         case Sub():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrNumBinOp(condWasmType, 'sub'))
         case Mul():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrNumBinOp(condWasmType, 'mul'))
         case Less():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'lt_s'))
         case LessEq():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'le_s'))
         case Greater():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'gt_s'))
         case GreaterEq():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'ge_s'))
         case Eq():     
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'eq'))
         case NotEq():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'ne'))
         case Is():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            # Keep left side in a root variable, evaluating the right side might run the garbage collector
+            ret.extend(compileExp(left, ctx))
+            ret.append(WasmInstrVarLocal('set', Locals.tmp_root))
+            ret.extend(compileExp(right, ctx))
+            ret.append(WasmInstrVarLocal('get', Locals.tmp_root))
             ret.append(WasmInstrIntRelOp('i32','eq')) 
         case And():
             # AND Evaluate left side. If true, then get result of right side (which determines outcome). Otherwise push 0 to stack.
-            ret.extend(compileExp(left))
+            ret.extend(compileExp(left, ctx))
             ret.append(WasmInstrIf(
                 'i32',
-                thenInstrs=compileExp(right),
+                thenInstrs=compileExp(right, ctx),
                 elseInstrs=[WasmInstrConst(condWasmType, 0)]
             ))
         case Or():
             # OR Evaluate left side. If true, push 1 to stack. Otherwise get result of right side (which determines outcome).
-            ret.extend(compileExp(left))
+            ret.extend(compileExp(left, ctx))
             ret.append(WasmInstrIf(
                 'i32',
                 thenInstrs=[WasmInstrConst(condWasmType, 1)],
-                elseInstrs=compileExp(right)
+                elseInstrs=compileExp(right, ctx)
             ))
 
     return ret
\ No newline at end of file
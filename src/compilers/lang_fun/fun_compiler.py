@@ -0,0 +1,446 @@
+from lang_fun.fun_astAtom import *
+import lang_fun.fun_ast as plainAst
+from common.wasm import *
+import lang_fun.fun_tychecker as fun_tychecker
+import lang_fun.fun_transform as fun_transform
+import lang_fun.fun_tycheckTransform as fun_tycheckTransform
+from lang_array.array_compilerSupport import *
+from common.compilerSupport import *
+import common.utils as utils
+import common.timing as timing
+
+class Ctx:
+    """
+    Context for compiling the body of a single function, or the toplevel statements.
+
+    The roots of a function (its variables holding arrays) are spilled to a frame on the
+    shadow stack. The frame is pushed when the function is entered and popped when it
+    returns. Functions without roots do not need a frame. The roots of the toplevel
+    statements live in the static part of the shadow stack (see class Layout).
+    """
+    def __init__(self, cfg: CompilerConfig, layout: Layout, funIndices: dict[ident, int],
+                 roots: list[WasmId], toplevel: bool):
+        self.cfg = cfg
+        self.layout = layout
+        self.funIndices = funIndices
+        self.roots = roots
+        self.toplevel = toplevel
+        self.labelCount = 0
+    def hasFrame(self) -> bool:
+        return not self.toplevel and len(self.roots) > 0
+    def freshLabel(self, prefix: str) -> WasmId:
+        n = self.labelCount
+        self.labelCount += 1
+        return WasmId(f'${prefix}_{n}')
+    def spillRoots(self) -> list[WasmInstr]:
+        """
+        Returns a list of Wasm instructions that store the current values of all roots
+        on the shadow stack. Must be used before every instruction that might run the
+        garbage collector.
+        """
+        if self.toplevel:
+            return self.layout.spillRoots()
+        res: list[WasmInstr] = []
+        for i, x in enumerate(self.roots):
+            res.extend([WasmInstrVarLocal('get', Locals.frame),
+                        WasmInstrConst('i32', 4 * i),
+                        WasmInstrNumBinOp('i32', 'add'),
+                        WasmInstrVarLocal('get', x),
+                        WasmInstrMem('i32', 'store')])
+        return res
+    def pushFrame(self) -> list[WasmInstr]:
+        if not self.hasFrame():
+            return []
+        return [WasmInstrVarGlobal('get', Globals.shadowSp),
+                WasmInstrVarLocal('tee', Locals.frame),
+                WasmInstrConst('i32', 4 * len(self.roots)),
+                WasmInstrNumBinOp('i32', 'add'),
+                WasmInstrVarGlobal('set', Globals.shadowSp),
+                WasmInstrVarGlobal('get', Globals.shadowSp),
+                WasmInstrConst('i32', self.layout.shadowStackLimit),
+                WasmInstrIntRelOp('i32', 'gt_u'),
+                WasmInstrIf(None,
+                            Errors.outputError(Errors.shadowStackOverflow) + [WasmInstrTrap()],
+                            [])]
+    def popFrame(self) -> list[WasmInstr]:
+        if not self.hasFrame():
+            return []
+        return [WasmInstrVarLocal('get', Locals.frame),
+                WasmInstrVarGlobal('set', Globals.shadowSp)]
+
+def compileModule(m: plainAst.mod, cfg: CompilerConfig) -> WasmModule:
+    """
+    Compiles the given module. Every function of the module becomes a Wasm function,
+    the toplevel statements become the body of the exported main function.
+    """
+    funIndices = {f.name: i for i, f in enumerate(m.funs)}
+    if cfg.fusedFrontend:
+        # Typecheck and transform in a single pass
+        with timing.phase('tycheckTransModule'):
+            res = fun_tycheckTransform.tycheckTransModule(m)
+        (tyResult, funs, mainStmts, mainCtx) = (res.tyResult, res.funs, res.mainStmts, res.mainCtx)
+    else:
+        with timing.phase('tycheckModule'):
+            tyResult = fun_tychecker.tycheckModule(m)
+        funs: list[tuple[FunDef, fun_transform.Ctx]] = []
+        mainCtx = fun_transform.Ctx()
+        with timing.phase('transStmts'):
+            for f in m.funs:
+                transCtx = fun_transform.Ctx()
+                funs.append((fun_transform.transFun(f, transCtx), transCtx))
+            mainStmts = fun_transform.transStmts(m.stmts, mainCtx)
+    mainVars = varsWithTys(tyResult.toplevelLocals, mainCtx)
+    mainRoots = rootsOf(mainVars, mainStmts)
+    funsVars = [varsWithTys(tyResult.funLocals[f.name], c) for (f, c) in funs]
+    funsRoots = [rootsOf([(p.var, p.ty) for p in f.params] + vs, f.body)
+                 for ((f, _), vs) in zip(funs, funsVars)]
+    layout = Layout(mainRoots, any(funsRoots))
+    wasmFuns: list[WasmFunc] = []
+    idMain = WasmId('$main')
+    with timing.phase('compileStmts'):
+        for ((f, _), vs, roots) in zip(funs, funsVars, funsRoots):
+            ctx = Ctx(cfg, layout, funIndices, roots, False)
+            wasmFuns.append(compileFun(f, vs, ctx))
+        ctx = Ctx(cfg, layout, funIndices, mainRoots, True)
+        mainFun = WasmFunc(idMain, [], None, localDecls(mainVars), compileStmts(mainStmts, ctx))
+    return WasmModule(imports=wasmImports(cfg.maxMemSize),
+                      exports=[WasmExport("main", WasmExportFunc(idMain))],
+                      globals=Globals.decls(layout),
+                      data=Errors.data(),
+                      funcTable=WasmFuncTable([funToWasmId(f.name) for f in m.funs]),
+                      funcs=[mainFun] + wasmFuns + Funcs.decls(layout))
+
+def varsWithTys(locals: list[fun_tychecker.LocalVar], ctx: fun_transform.Ctx) -> list[tuple[ident, ty]]:
+    return [(x.name, x.ty) for x in locals] + list(ctx.freshVars.items())
+
+def rootsOf(vars: list[tuple[ident, ty]], body: list[stmt]) -> list[WasmId]:
+    """
+    Returns the roots of the garbage collector for a function with the given variables
+    (including the parameters) and body.
+    """
+    roots = [identToWasmId(x) for (x, t) in vars if isinstance(t, Array)]
+    if usesIs(body):
+        roots.append(Locals.tmp_root)
+    return roots
+
+def localDecls(vars: list[tuple[ident, ty]]) -> list[tuple[WasmId, WasmValtype]]:
+    locals: list[tuple[WasmId, WasmValtype]] = [(identToWasmId(x), tyToWasmValtype(t)) for (x, t) in vars]
+    return locals + Locals.decls()
+
+def compileFun(f: FunDef, vars: list[tuple[ident, ty]], ctx: Ctx) -> WasmFunc:
+    params: list[tuple[WasmId, WasmValtype]] = [(identToWasmId(p.var), tyToWasmValtype(p.ty))
+                                                 for p in f.params]
+    locals = localDecls(vars)
+    instrs = ctx.pushFrame() + compileStmts(f.body, ctx)
+    match f.result:
+        case Void():
+            result = None
+            instrs.extend(ctx.popFrame())
+        case NotVoid(t):
+            result = tyToWasmValtype(t)
+            # The type checker ensures that the function always returns a value
+            instrs.append(WasmInstrTrap())
+    if ctx.hasFrame():
+        locals.append((Locals.frame, 'i32'))
+    return WasmFunc(funToWasmId(f.name), params, result, locals, instrs)
+
+def identToWasmId(x: ident) -> WasmId:
+    return WasmId(f'${x.name}')
+
+def funToWasmId(f: ident) -> WasmId:
+    return WasmId(f'$fun_{f.name}')
+
+def tyOfExp(e: exp) -> ty:
+    match e.ty:
+        case NotVoid(t):
+            return t
+        case Void():
+            utils.abort(f'Unexpected type void of expression {e}')
+
+def tyToWasmValtype(t: ty) -> Literal['i32', 'i64']:
+    match t:
+        case Int():
+            return 'i64'
+        case Bool() | Array() | Fun():
+            return 'i32'
+
+def elemLen(t: ty) -> int:
+    return 8 if tyToWasmValtype(t) == 'i64' else 4
+
+def usesIs(stmts: list[stmt]) -> bool:
+    """
+    Checks whether an is-expression occurs in the given statements. Compiling it requires
+    $@tmp_root as an additional root.
+    """
+    def exps(e: exp) -> bool:
+        match e:
+            case BinOp(_, Is(), _):
+                return True
+            case BinOp(left, _, right):
+                return exps(left) or exps(right)
+            case UnOp(_, arg):
+                return exps(arg)
+            case Call(_, args):
+                return any([exps(a) for a in args])
+            case AtomExp() | ArrayInitDyn() | ArrayInitStatic() | Subscript():
+                return False
+    def stmts_(ss: list[stmt]) -> bool:
+        for s in ss:
+            match s:
+                case StmtExp(e) | Assign(_, e) | SubscriptAssign(_, _, e) | Return(e):
+                    found = e is not None and exps(e)
+                case IfStmt(cond, thenBody, elseBody):
+                    found = exps(cond) or stmts_(thenBody) or stmts_(elseBody)
+                case WhileStmt(cond, body):
+                    found = exps(cond) or stmts_(body)
+            if found:
+                return True
+        return False
+    return stmts_(stmts)
+
+def compileStmts(stmts: list[stmt], ctx: Ctx) -> list[WasmInstr]:
+    instrs: list[WasmInstr] = []
+    for s in stmts:
+        instrs.extend(compileStmt(s, ctx))
+    return instrs
+
+def compileStmt(s: stmt, ctx: Ctx) -> list[WasmInstr]:
+    match s:
+        case StmtExp(e):
+            return compileExp(e, ctx)
+        case Assign(x, e):
+            return compileExp(e, ctx) + [WasmInstrVarLocal('set', identToWasmId(x))]
+        case IfStmt(cond, thenBody, elseBody):
+            return compileExp(cond, ctx) + \
+                [WasmInstrIf(None, compileStmts(thenBody, ctx), compileStmts(elseBody, ctx))]
+        case WhileStmt(cond, body):
+            exit = ctx.freshLabel('loop_exit')
+            start = ctx.freshLabel('loop_start')
+            loopBody = compileExp(cond, ctx) + \
+                [WasmInstrIf(None, [], [WasmInstrBranch(exit, False)])] + \
+                compileStmts(body, ctx) + \
+                [WasmInstrBranch(start, False)]
+            return [WasmInstrBlock(exit, None, [WasmInstrLoop(start, loopBody)])]
+        case SubscriptAssign(left, index, right):
+            elemTy = arrayElemTy(left.ty)
+            return arrayOffset(left, index, elemTy, ctx) + compileExp(right, ctx) + \
+                [WasmInstrMem(tyToWasmValtype(elemTy), 'store')]
+        case Return(e):
+            instrs = [] if e is None else compileExp(e, ctx)
+            return instrs + ctx.popFrame() + [WasmInstrReturn()]
+
+def compileAtomExp(e: atomExp, ctx: Ctx) -> WasmInstr:
+    match e:
+        case IntConst(v):
+            return WasmInstrConst('i64', v)
+        case BoolConst(v):
+            return WasmInstrConst('i32', 1 if v else 0)
+        case VarName(x):
+            return WasmInstrVarLocal('get', identToWasmId(x))
+        case FunName(f):
+            # Functions are represented by their index in the function table
+            return WasmInstrConst('i32', ctx.funIndices[f])
+
+def compileExp(e: exp, ctx: Ctx) -> list[WasmInstr]:
+    match e:
+        case AtomExp(a):
+            return [compileAtomExp(a, ctx)]
+        case Call(target, args):
+            return compileCall(target, args, ctx)
+        case UnOp(op, arg):
+            match op:
+                case USub():
+                    return [WasmInstrConst('i64', 0)] + compileExp(arg, ctx) + \
+                        [WasmInstrNumBinOp('i64', 'sub')]
+                case Not():
+                    return compileExp(arg, ctx) + \
+                        [WasmInstrConst('i32', 0), WasmInstrIntRelOp('i32', 'eq')]
+        case BinOp(left, op, right):
+            return compileBinOp(left, op, right, ctx)
+        case ArrayInitDyn(length, elemInit):
+            elemTy = tyOfAtomExp(elemInit)
+            n = elemLen(elemTy)
+            exit = ctx.freshLabel('loop_exit')
+            start = ctx.freshLabel('loop_start')
+            # $@tmp_i32 runs from the first element to the end of the array in $@tmp2_i32
+            loopBody: list[WasmInstr] = [
+                WasmInstrVarLocal('get', Locals.tmp_i32),
+                WasmInstrVarLocal('get', Locals.tmp2_i32),
+                WasmInstrIntRelOp('i32', 'lt_u'),
+                WasmInstrIf(None, [], [WasmInstrBranch(exit, False)]),
+                WasmInstrVarLocal('get', Locals.tmp_i32),
+                compileAtomExp(elemInit, ctx),
+                WasmInstrMem(tyToWasmValtype(elemTy), 'store'),
+                WasmInstrVarLocal('get', Locals.tmp_i32),
+                WasmInstrConst('i32', n),
+                WasmInstrNumBinOp('i32', 'add'),
+                WasmInstrVarLocal('set', Locals.tmp_i32),
+                WasmInstrBranch(start, False)
+            ]
+            return allocArray(length, elemTy, ctx) + [
+                WasmInstrVarLocal('get', Locals.tmp_i32),
+                WasmInstrConst('i32', 4),
+                WasmInstrNumBinOp('i32', 'add'),
+                WasmInstrVarLocal('tee', Locals.tmp_i32),
+                compileAtomExp(length, ctx),
+                WasmInstrConvOp('i32.wrap_i64'),
+                WasmInstrConst('i32', n),
+                WasmInstrNumBinOp('i32', 'mul'),
+                WasmInstrNumBinOp('i32', 'add'),
+                WasmInstrVarLocal('set', Locals.tmp2_i32),
+                WasmInstrBlock(exit, None, [WasmInstrLoop(start, loopBody)])
+            ]
+        case ArrayInitStatic(elemInit):
+            elemTy = tyOfAtomExp(elemInit[0])
+            n = elemLen(elemTy)
+            instrs = allocArray(IntConst(len(elemInit), Int()), elemTy, ctx)
+            for i, a in enumerate(elemInit):
+                instrs.extend([WasmInstrVarLocal('tee', Locals.tmp_i32),
+                               WasmInstrVarLocal('get', Locals.tmp_i32),
+                               WasmInstrConst('i32', 4 + n * i),
+                               WasmInstrNumBinOp('i32', 'add'),
+                               compileAtomExp(a, ctx),
+                               WasmInstrMem(tyToWasmValtype(elemTy), 'store')])
+            return instrs
+        case Subscript(array, index):
+            elemTy = tyOfExp(e)
+            return arrayOffset(array, index, elemTy, ctx) + \
+                [WasmInstrMem(tyToWasmValtype(elemTy), 'load')]
+
+def compileCall(target: callTarget, args: list[exp], ctx: Ctx) -> list[WasmInstr]:
+    instrs: list[WasmInstr] = []
+    for a in args:
+        instrs.extend(compileExp(a, ctx))
+    match target:
+        case CallTargetBuiltin(Ident('print')):
+            match tyOfExp(args[0]):
+                case Int():
+                    return instrs + [WasmInstrCall(WasmId('$print_i64'))]
+                case _:
+                    return instrs + [WasmInstrCall(WasmId('$print_bool'))]
+        case CallTargetBuiltin(Ident('input_int')):
+            return [WasmInstrCall(WasmId('$input_i64'))]
+        case CallTargetBuiltin(Ident('len')):
+            return instrs + arrayLen()
+        case CallTargetBuiltin(f):
+            utils.abort(f'Unknown builtin function {f}')
+        case CallTargetDirect(f):
+            # The called function might run the garbage collector
+            return ctx.spillRoots() + instrs + [WasmInstrCall(funToWasmId(f))]
+        case CallTargetIndirect(x, params, result):
+            match result:
+                case Void():
+                    resultTy = None
+                case NotVoid(t):
+                    resultTy = tyToWasmValtype(t)
+            return ctx.spillRoots() + instrs + [
+                WasmInstrVarLocal('get', identToWasmId(x)),
+                WasmInstrCallIndirect([tyToWasmValtype(p) for p in params], resultTy)
+            ]
+
+def compileBinOp(left: exp, op: binaryop, right: exp, ctx: Ctx) -> list[WasmInstr]:
+    t = tyToWasmValtype(tyOfExp(left))
+    match op:
+        case And():
+            return compileExp(left, ctx) + \
+                [WasmInstrIf('i32', compileExp(right, ctx), [WasmInstrConst('i32', 0)])]
+        case Or():
+            return compileExp(left, ctx) + \
+                [WasmInstrIf('i32', [WasmInstrConst('i32', 1)], compileExp(right, ctx))]
+        case Is():
+            # Keep left side in a root variable, evaluating the right side might run the garbage collector
+            return compileExp(left, ctx) + [WasmInstrVarLocal('set', Locals.tmp_root)] + \
+                compileExp(right, ctx) + \
+                [WasmInstrVarLocal('get', Locals.tmp_root), WasmInstrIntRelOp('i32', 'eq')]
+        case Add():
+            instr = WasmInstrNumBinOp(t, 'add')
+        case Sub():
+            instr = WasmInstrNumBinOp(t, 'sub')
+        case Mul():
+            instr = WasmInstrNumBinOp(t, 'mul')
+        case Less():
+            instr = WasmInstrIntRelOp(t, 'lt_s')
+        case LessEq():
+            instr = WasmInstrIntRelOp(t, 'le_s')
+        case Greater():
+            instr = WasmInstrIntRelOp(t, 'gt_s')
+        case GreaterEq():
+            instr = WasmInstrIntRelOp(t, 'ge_s')
+        case Eq():
+            instr = WasmInstrIntRelOp(t, 'eq')
+        case NotEq():
+            instr = WasmInstrIntRelOp(t, 'ne')
+    return compileExp(left, ctx) + compileExp(right, ctx) + [instr]
+
+def tyOfAtomExp(e: atomExp) -> ty:
+    return e.ty
+
+def arrayElemTy(t: ty) -> ty:
+    match t:
+        case Array(elemTy):
+            return elemTy
+        case _:
+            utils.abort(f'Expected an array type, got {t}')
+
+def raiseError(err: str) -> list[WasmInstr]:
+    return [WasmInstrIf(None, Errors.outputError(err) + [WasmInstrTrap()], [])]
+
+def allocArray(length: atomExp, elemTy: ty, ctx: Ctx) -> list[WasmInstr]:
+    """
+    Allocates an array of the given length and element type, and initializes its header.
+    Leaves the address of the array on the stack and in $@tmp_i32.
+    """
+    n = elemLen(elemTy)
+    match elemTy:
+        case Array():
+            m = Header.array | Header.pointers
+        case Int():
+            m = Header.array | Header.wide
+        case Bool() | Fun():
+            m = Header.array
+    return [
+        # 0 <= length < maxArraySize / n
+        compileAtomExp(length, ctx), WasmInstrConst('i64', 0), WasmInstrIntRelOp('i64', 'lt_s'),
+        *raiseError(Errors.arraySize),
+        compileAtomExp(length, ctx), WasmInstrConst('i64', ctx.cfg.maxArraySize // n),
+        WasmInstrIntRelOp('i64', 'ge_u'),
+        *raiseError(Errors.arraySize),
+        # allocation might run the garbage collector
+        *ctx.spillRoots(),
+        compileAtomExp(length, ctx), WasmInstrConvOp('i32.wrap_i64'),
+        WasmInstrConst('i32', n), WasmInstrNumBinOp('i32', 'mul'),
+        WasmInstrConst('i32', 4), WasmInstrNumBinOp('i32', 'add'),
+        WasmInstrCall(Funcs.alloc),
+        WasmInstrVarLocal('tee', Locals.tmp_i32),
+        # header
+        compileAtomExp(length, ctx), WasmInstrConvOp('i32.wrap_i64'),
+        WasmInstrConst('i32', Header.shift), WasmInstrNumBinOp('i32', 'shl'),
+        WasmInstrConst('i32', m), WasmInstrNumBinOp('i32', 'xor'),
+        WasmInstrMem('i32', 'store'),
+        WasmInstrVarLocal('get', Locals.tmp_i32)
+    ]
+
+def arrayLen() -> list[WasmInstr]:
+    """
+    Replaces the address of an array on top of the stack with its length (as i64).
+    """
+    return [WasmInstrMem('i32', 'load'),
+            WasmInstrConst('i32', Header.shift), WasmInstrNumBinOp('i32', 'shr_u'),
+            WasmInstrConvOp('i64.extend_i32_u')]
+
+def arrayOffset(array: atomExp, index: atomExp, elemTy: ty, ctx: Ctx) -> list[WasmInstr]:
+    """
+    Checks the bounds and pushes the address of the element at the given index.
+    """
+    return [
+        compileAtomExp(index, ctx), WasmInstrConst('i64', 0), WasmInstrIntRelOp('i64', 'lt_s'),
+        *raiseError(Errors.arrayIndexOutOfBounds),
+        compileAtomExp(index, ctx), compileAtomExp(array, ctx), *arrayLen(),
+        WasmInstrIntRelOp('i64', 'ge_u'),
+        *raiseError(Errors.arrayIndexOutOfBounds),
+        compileAtomExp(array, ctx),
+        compileAtomExp(index, ctx), WasmInstrConvOp('i32.wrap_i64'),
+        WasmInstrConst('i32', elemLen(elemTy)), WasmInstrNumBinOp('i32', 'mul'),
+        WasmInstrConst('i32', 4), WasmInstrNumBinOp('i32', 'add'),
+        WasmInstrNumBinOp('i32', 'add')
+    ]
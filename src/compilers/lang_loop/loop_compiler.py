@@ -2,14 +2,35 @@ from lang_loop.loop_ast import *
 from common.wasm import *
 import lang_loop.loop_tychecker as loop_tychecker
 from common.compilerSupport import *
+import common.timing as timing
 import common.utils as utils
 
+class Ctx:
+    """
+    Holds the configuration and the number of while loops compiled so far, which makes
+    the loop labels unique within the module. compileModule creates a new Ctx, so the
+    labels always start at loop_0.
+    """
+    def __init__(self, cfg: CompilerConfig):
+        self.cfg = cfg
+        self.whileCount = 0
+    def freshLoopLabels(self) -> tuple[WasmId, WasmId]:
+        """
+        Returns a pair of fresh labels for the start and the exit of a loop.
+        """
+        n = self.whileCount
+        self.whileCount += 1
+        return (identToWasmId(Ident(f'loop_{n}_start')), identToWasmId(Ident(f'loop_{n}_exit')))
+
 def compileModule(m: mod, cfg: CompilerConfig) -> WasmModule:
     """
     Compiles the given module.
     """
-    vars = loop_tychecker.tycheckModule(m)
-    instrs = compileStmts(m.stmts)
+    with timing.phase('tycheckModule'):
+        vars = loop_tychecker.tycheckModule(m)
+    ctx = Ctx(cfg)
+    with timing.phase('compileStmts'):
+        instrs = compileStmts(m.stmts, ctx)
     idMain = WasmId('$main')
     locals: list[tuple[WasmId, WasmValtype]] = [(identToWasmId(x[0]), tyToWasmValtype(x[1].ty)) for x in vars.items()]
     return WasmModule(imports=wasmImports(cfg.maxMemSize),
@@ -46,49 +67,45 @@ def tyToWasmValtype(ty: ty) -> Literal['i32', 'i64']:
         case Int():
             return 'i64'
 
-whileCount = 0
-
-def compileStmts(stmts: list[stmt]) -> list[WasmInstr]:
+def compileStmts(stmts: list[stmt], ctx: Ctx) -> list[WasmInstr]:
     instructions: list[WasmInstr] = []
     for statement in stmts:
         match statement:
             case StmtExp(e):
-                instructions.extend(compileExp(e))
+                instructions.extend(compileExp(e, ctx))
             case Assign(var, right):
-                instructions.extend(compileExp(right))
+                instructions.extend(compileExp(right, ctx))
                 instructions.append(WasmInstrVarLocal('set', identToWasmId(var)))
             case IfStmt(cond, thenBody, elseBody):
-                instructions.extend(compileExp(cond))
+                instructions.extend(compileExp(cond, ctx))
 
                 instructions.append(
                     WasmInstrIf(
                         None,
-                        compileStmts(thenBody),
-                        compileStmts(elseBody)
+                        compileStmts(thenBody, ctx),
+                        compileStmts(elseBody, ctx)
                     )
                 )
             case WhileStmt(cond, body):
-                global whileCount
-                currentWhileNo = whileCount
-                whileCount += 1
+                (startLabel, exitLabel) = ctx.freshLoopLabels()
 
-                whileInstr = compileExp(cond)
+                whileInstr = compileExp(cond, ctx)
                 
-                whileExit = WasmInstrBranch(identToWasmId(Ident(f'loop_{currentWhileNo}_exit')), False)
+                whileExit = WasmInstrBranch(exitLabel, False)
                 whileInstr.append(WasmInstrIf(None, [], [whileExit]))
                 
-                whileInstr.extend(compileStmts(body))
+                whileInstr.extend(compileStmts(body, ctx))
                 
-                whileStart = WasmInstrBranch(identToWasmId(Ident(f'loop_{currentWhileNo}_start')), False)
+                whileStart = WasmInstrBranch(startLabel, False)
                 whileInstr.append(whileStart)
                 
                 loop = WasmInstrLoop(
-                    identToWasmId(Ident(f'loop_{currentWhileNo}_start')),
+                    startLabel,
                     whileInstr
                 )
 
                 block = WasmInstrBlock(
-                    identToWasmId(Ident(f'loop_{currentWhileNo}_exit')),
+                    exitLabel,
                     None,
                     [loop]
                 )
@@ -97,7 +114,7 @@ def compileStmts(stmts: list[stmt]) -> list[WasmInstr]:
 
     return instructions
 
-def compileExp(exp: exp) -> list[WasmInstr]:
+def compileExp(exp: exp, ctx: Ctx) -> list[WasmInstr]:
     match exp:
         case IntConst(num):
             return [WasmInstrConst('i64', num)]
@@ -106,13 +123,13 @@ def compileExp(exp: exp) -> list[WasmInstr]:
         case Name(name, ty):
             return [WasmInstrVarLocal('get', identToWasmId(name, tyToWasmValtype(tyOfExp(exp))))]
         case Call(name, args):
-            return compileCall(name, args)
+            return compileCall(name, args, ctx)
         case UnOp(op, arg):
-            return compileUnOp(op, arg)
+            return compileUnOp(op, arg, ctx)
         case BinOp(left, op, right, ty):
-            return compileBinOp(left, op, right, ty)
+            return compileBinOp(left, op, right, ty, ctx)
 
-def compileCall(name: ident, args: list[exp]):
+def compileCall(name: ident, args: list[exp], ctx: Ctx):
     '''
     type: str = ""
     for arg in args:
@@ -125,7 +142,7 @@ def compileCall(name: ident, args: list[exp]):
 
     # Firstly compile arguments of function call
     for arg in args:
-        ret.extend(compileExp(arg))
+        ret.extend(compileExp(arg, ctx))
 
     wasmType = tyToWasmValtype(tyOfExp(args[0])) if len(args) == 1 else None
 
@@ -133,7 +150,7 @@ def compileCall(name: ident, args: list[exp]):
     ret.append(WasmInstrCall(identToWasmId(name, wasmType)))
     return ret
 
-def compileUnOp(op: unaryop, arg: exp) -> list[WasmInstr]:
+def compileUnOp(op: unaryop, arg: exp, ctx: Ctx) -> list[WasmInstr]:
     ret: list[WasmInstr] = []
 
     # Get 
@@ -142,15 +159,15 @@ def compileUnOp(op: unaryop, arg: exp) -> list[WasmInstr]:
     match op:
         case USub():        
             ret.append(WasmInstrConst(condWasmType, 0))
-            ret.extend(compileExp(arg))
+            ret.extend(compileExp(arg, ctx))
             ret.append(WasmInstrNumBinOp(condWasmType, 'sub'))
         case Not():
-            ret.extend(compileExp(arg))                 
+            ret.extend(compileExp(arg, ctx))                 
             ret.append(WasmInstrConst(condWasmType, 0))        
             ret.append(WasmInstrIntRelOp(condWasmType, 'eq'))  
     return ret
 
-def compileBinOp(left: exp, op: binaryop, right: exp, ty: optional[resultTy]) -> list[WasmInstr]:
+def compileBinOp(left: exp, op: binaryop, right: exp, ty: optional[resultTy], ctx: Ctx) -> list[WasmInstr]:
     ret: list[WasmInstr] = []
 
     condWasmTypeLeft = tyToWasmValtype(tyOfExp(left))
@@ -163,56 +180,56 @@ def compileBinOp(left: exp, op: binaryop, right: exp, ty: optional[resultTy]) ->
 
     match op:
         case Add():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrNumBinOp(condWasmType, 'add'))
         case Sub():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrNumBinOp(condWasmType, 'sub'))
         case Mul():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrNumBinOp(condWasmType, 'mul'))
         case Less():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'lt_s'))
         case LessEq():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'le_s'))
         case Greater():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'gt_s'))
         case GreaterEq():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'ge_s'))
         case Eq():     
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'eq'))
         case NotEq():
-            ret.extend(compileExp(left))
-            ret.extend(compileExp(right))
+            ret.extend(compileExp(left, ctx))
+            ret.extend(compileExp(right, ctx))
             ret.append(WasmInstrIntRelOp(condWasmType, 'ne'))
         case And():
             # AND Evaluate left side. If true, then get result of right side (which determines outcome). Otherwise push 0 to stack.
-            ret.extend(compileExp(left))
+            ret.extend(compileExp(left, ctx))
             ret.append(WasmInstrIf(
                 'i32',
-                thenInstrs=compileExp(right),
+                thenInstrs=compileExp(right, ctx),
                 elseInstrs=[WasmInstrConst(condWasmType, 0)]
             ))
         case Or():
             # OR Evaluate left side. If true, push 1 to stack. Otherwise get result of right side (which determines outcome).
-            ret.extend(compileExp(left))
+            ret.extend(compileExp(left, ctx))
             ret.append(WasmInstrIf(
                 'i32',
                 thenInstrs=[WasmInstrConst(condWasmType, 1)],
-                elseInstrs=compileExp(right)
+                elseInstrs=compileExp(right, ctx)
             ))
 
     return ret
\ No newline at end of file
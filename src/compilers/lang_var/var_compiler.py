@@ -2,14 +2,17 @@ from lang_var.var_ast import *
 from common.wasm import *
 import lang_var.var_tychecker as var_tychecker
 from common.compilerSupport import *
+import common.timing as timing
 # import common.utils as utils
 
 def compileModule(m: mod, cfg: CompilerConfig) -> WasmModule:
     """
     Compiles the given module.
     """
-    vars = var_tychecker.tycheckModule(m)
-    instrs = compileStmts(m.stmts)
+    with timing.phase('tycheckModule'):
+        vars = var_tychecker.tycheckModule(m)
+    with timing.phase('compileStmts'):
+        instrs = compileStmts(m.stmts)
     idMain = WasmId('$main')
     locals: list[tuple[WasmId, WasmValtype]] = [(identToWasmId(x), 'i64') for x in vars]
     return WasmModule(imports=wasmImports(cfg.maxMemSize),
@@ -1,55 +1,56 @@
-# AUTOMATICALLY GENERATED (2024-03-01 17:42:38)
+# AUTOMATICALLY GENERATED (2026-10-19 15:17:03)
 from __future__ import annotations
 from dataclasses import dataclass
 
 from lang_array.array_astCommon import *
 
-@dataclass
+@dataclass(slots=True)
 class IntConst:
     value: int
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class BoolConst:
     value: bool
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class Name:
     var: ident
+    slot: optional[int] = None
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class Call:
     var: ident
     args: list[exp]
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class UnOp:
     op: unaryop
     arg: exp
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class BinOp:
     left: exp
     op: binaryop
     right: exp
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class ArrayInitDyn:
     len: exp
     elemInit: exp
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class ArrayInitStatic:
     elemInit: list[exp]
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class Subscript:
     array: exp
     index: exp
@@ -57,27 +58,28 @@ class Subscript:
 
 type exp = IntConst | BoolConst | Name | Call | UnOp | BinOp | ArrayInitDyn | ArrayInitStatic | Subscript
 
-@dataclass
+@dataclass(slots=True)
 class StmtExp:
     exp: exp
 
-@dataclass
+@dataclass(slots=True)
 class Assign:
     var: ident
     right: exp
+    slot: optional[int] = None
 
-@dataclass
+@dataclass(slots=True)
 class IfStmt:
     cond: exp
     thenBody: list[stmt]
     elseBody: list[stmt]
 
-@dataclass
+@dataclass(slots=True)
 class WhileStmt:
     cond: exp
     body: list[stmt]
 
-@dataclass
+@dataclass(slots=True)
 class SubscriptAssign:
     left: exp
     index: exp
@@ -85,7 +87,7 @@ class SubscriptAssign:
 
 type stmt = StmtExp | Assign | IfStmt | WhileStmt | SubscriptAssign
 
-@dataclass
+@dataclass(slots=True)
 class Module:
     stmts: list[stmt]
 
@@ -1,96 +1,124 @@
-# AUTOMATICALLY GENERATED (2024-03-13 15:00:04)
+# AUTOMATICALLY GENERATED (2026-10-19 16:42:48)
 from __future__ import annotations
 from dataclasses import dataclass
+from typing import Any, Self
+import weakref
 
 type optional[T] = T | None
 
-@dataclass(frozen=True)
+# There is only one Ident for every name, so identifiers are compared and hashed by identity.
+# The table holds its Idents weakly, so a long-running process (e.g. the compiler server)
+# only keeps the identifiers still in use.
+_idents: weakref.WeakValueDictionary[str, Ident] = weakref.WeakValueDictionary()
+
+@dataclass(frozen=True, slots=True, eq=False, weakref_slot=True)
 class Ident:
     name: str
+    def __new__(cls, name: str) -> Ident:
+        x = _idents.get(name)
+        if x is None:
+            x = _idents.setdefault(name, object.__new__(cls))
+        return x
+    def __getnewargs__(self) -> tuple[str]:
+        return (self.name,)
 
 type ident = Ident
 type string = str
 
-@dataclass
-class USub:
+# At most one entry per class, so this table stays small
+_singletons: dict[type, Any] = {}
+
+class Singleton:
+    """
+    Base class of the constructors without fields, every such constructor has only one instance.
+    """
+    __slots__ = ()
+    def __new__(cls) -> Self:
+        x = _singletons.get(cls)
+        if x is None:
+            x = _singletons.setdefault(cls, object.__new__(cls))
+        return x
+
+@dataclass(slots=True, eq=False)
+class USub(Singleton):
     pass
 
-@dataclass
-class Not:
+@dataclass(slots=True, eq=False)
+class Not(Singleton):
     pass
 
 type unaryop = USub | Not
 
-@dataclass
-class Add:
+@dataclass(slots=True, eq=False)
+class Add(Singleton):
     pass
 
-@dataclass
-class Sub:
+@dataclass(slots=True, eq=False)
+class Sub(Singleton):
     pass
 
-@dataclass
-class Mul:
+@dataclass(slots=True, eq=False)
+class Mul(Singleton):
     pass
 
-@dataclass
-class Less:
+@dataclass(slots=True, eq=False)
+class Less(Singleton):
     pass
 
-@dataclass
-class LessEq:
+@dataclass(slots=True, eq=False)
+class LessEq(Singleton):
     pass
 
-@dataclass
-class Greater:
+@dataclass(slots=True, eq=False)
+class Greater(Singleton):
     pass
 
-@dataclass
-class GreaterEq:
+@dataclass(slots=True, eq=False)
+class GreaterEq(Singleton):
     pass
 
-@dataclass
-class Eq:
+@dataclass(slots=True, eq=False)
+class Eq(Singleton):
     pass
 
-@dataclass
-class NotEq:
+@dataclass(slots=True, eq=False)
+class NotEq(Singleton):
     pass
 
-@dataclass
-class Is:
+@dataclass(slots=True, eq=False)
+class Is(Singleton):
     pass
 
-@dataclass
-class And:
+@dataclass(slots=True, eq=False)
+class And(Singleton):
     pass
 
-@dataclass
-class Or:
+@dataclass(slots=True, eq=False)
+class Or(Singleton):
     pass
 
 type binaryop = Add | Sub | Mul | Less | LessEq | Greater | GreaterEq | Eq | NotEq | Is | And | Or
 
-@dataclass
-class Int:
+@dataclass(slots=True, eq=False)
+class Int(Singleton):
     pass
 
-@dataclass
-class Bool:
+@dataclass(slots=True, eq=False)
+class Bool(Singleton):
     pass
 
-@dataclass
+@dataclass(slots=True)
 class Array:
     elemTy: ty
 
 type ty = Int | Bool | Array
 
-@dataclass
+@dataclass(slots=True)
 class NotVoid:
     ty: ty
 
-@dataclass
-class Void:
+@dataclass(slots=True, eq=False)
+class Void(Singleton):
     pass
 
 type resultTy = NotVoid | Void
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+Closure-compiling interpreter for lang_array (interp --engine=closure).
+
+After type checking, the AST is compiled once into nested python closures. Variables are
+resolved to slots of a frame, operators are bound when compiling, and while/if become
+python loops and conditionals. Running the program means calling the closure of the module.
+Arrays are represented as python lists, so the output is the same as with array_interp.
+"""
+from lang_array.array_ast import *
+import lang_array.array_tychecker as array_tychecker
+import common.utils as utils
+import common.timing as timing
+from typing import *
+import operator
+
+type Frame = list[Any]
+type Code = Callable[[Frame], Any]
+type Slots = dict[Ident, int]
+
+# Closures for binary operators without short-circuit evaluation, for arbitrary operands
+# and for a constant right operand.
+_BINOPS: dict[type, Callable[[Code, Code], Code]] = {
+    Add: lambda l, r: lambda f: l(f) + r(f),
+    Sub: lambda l, r: lambda f: l(f) - r(f),
+    Mul: lambda l, r: lambda f: l(f) * r(f),
+    Less: lambda l, r: lambda f: l(f) < r(f),
+    LessEq: lambda l, r: lambda f: l(f) <= r(f),
+    Greater: lambda l, r: lambda f: l(f) > r(f),
+    GreaterEq: lambda l, r: lambda f: l(f) >= r(f),
+    Eq: lambda l, r: lambda f: l(f) == r(f),
+    NotEq: lambda l, r: lambda f: l(f) != r(f),
+    Is: lambda l, r: lambda f: l(f) is r(f),
+}
+_BINOPS_CONST: dict[type, Callable[[Code, Any], Code]] = {
+    Add: lambda l, c: lambda f: l(f) + c,
+    Sub: lambda l, c: lambda f: l(f) - c,
+    Mul: lambda l, c: lambda f: l(f) * c,
+    Less: lambda l, c: lambda f: l(f) < c,
+    LessEq: lambda l, c: lambda f: l(f) <= c,
+    Greater: lambda l, c: lambda f: l(f) > c,
+    GreaterEq: lambda l, c: lambda f: l(f) >= c,
+    Eq: lambda l, c: lambda f: l(f) == c,
+    NotEq: lambda l, c: lambda f: l(f) != c,
+}
+
+def _const(v: Any) -> Code:
+    return lambda _f: v
+
+def compileFuncall(id: ident, args: list[exp], slots: Slots) -> Code:
+    match (id.name, args):
+        case ('input_int', []):
+            return lambda _f: int(utils.inputInt('Enter some int: '))
+        case ('print', [e]):
+            c = compileExp(e, slots)
+            def run(f: Frame):
+                print(c(f))
+            return run
+        case ('len', [e]):
+            c = compileExp(e, slots)
+            return lambda f: len(c(f))
+        case _:
+            raise ValueError(f'Invalid function call of {id.name} with {len(args)} arguments')
+
+def compileExp(e: exp, slots: Slots) -> Code:
+    match e:
+        case IntConst(value):
+            return _const(value)
+        case BoolConst(value):
+            return _const(value)
+        case Call(id, args):
+            return compileFuncall(id, args, slots)
+        case UnOp(op, sub):
+            c = compileExp(sub, slots)
+            match op:
+                case USub(): return lambda f: -c(f)
+                case Not(): return lambda f: not c(f)
+        case BinOp(left, And(), right):
+            (l, r) = (compileExp(left, slots), compileExp(right, slots))
+            return lambda f: r(f) if l(f) else False
+        case BinOp(left, Or(), right):
+            (l, r) = (compileExp(left, slots), compileExp(right, slots))
+            return lambda f: True if l(f) else r(f)
+        case BinOp(left, op, IntConst(value) | BoolConst(value)) if type(op) in _BINOPS_CONST:
+            return _BINOPS_CONST[type(op)](compileExp(left, slots), value)
+        case BinOp(left, op, right):
+            return _BINOPS[type(op)](compileExp(left, slots), compileExp(right, slots))
+        case Name(name):
+            return operator.itemgetter(slots[name])
+        case ArrayInitDyn(lenExp, initExp):
+            (n, v) = (compileExp(lenExp, slots), compileExp(initExp, slots))
+            return lambda f: n(f) * [v(f)]
+        case ArrayInitStatic(es):
+            cs = [compileExp(e, slots) for e in es]
+            return lambda f: [c(f) for c in cs]
+        case Subscript(arrayExp, indexExp):
+            (a, i) = (compileExp(arrayExp, slots), compileExp(indexExp, slots))
+            return lambda f: a(f)[i(f)]
+    raise Exception(f'No match for expression {e}')
+
+def compileStmt(s: stmt, slots: Slots) -> Code:
+    match s:
+        case StmtExp(e):
+            return compileExp(e, slots)
+        case Assign(x, e):
+            (i, c) = (slots[x], compileExp(e, slots))
+            def assign(f: Frame):
+                f[i] = c(f)
+            return assign
+        case IfStmt(cond, thenBody, elseBody):
+            (c, t, el) = (compileExp(cond, slots), compileStmts(thenBody, slots),
+                          compileStmts(elseBody, slots))
+            def ifStmt(f: Frame):
+                if c(f):
+                    t(f)
+                else:
+                    el(f)
+            return ifStmt
+        case WhileStmt(cond, body):
+            (c, b) = (compileExp(cond, slots), compileStmts(body, slots))
+            def whileStmt(f: Frame):
+                while c(f):
+                    b(f)
+            return whileStmt
+        case SubscriptAssign(leftExp, idxExp, rightExp):
+            # Same evaluation order as in array_interp
+            (i, r, a) = (compileExp(idxExp, slots), compileExp(rightExp, slots),
+                         compileExp(leftExp, slots))
+            def subscriptAssign(f: Frame):
+                idx = i(f)
+                v = r(f)
+                a(f)[idx] = v
+            return subscriptAssign
+
+def compileStmts(stmts: list[stmt], slots: Slots) -> Code:
+    cs = tuple(compileStmt(s, slots) for s in stmts)
+    match cs:
+        case ():
+            return _const(None)
+        case (c,):
+            return c
+        case _:
+            def block(f: Frame):
+                for c in cs:
+                    c(f)
+            return block
+
+def assignedVars(stmts: list[stmt], acc: Slots):
+    """
+    Assigns a slot to every variable assigned in stmts.
+    """
+    for s in stmts:
+        match s:
+            case Assign(x, _):
+                if x not in acc:
+                    acc[x] = len(acc)
+            case IfStmt(_, thenBody, elseBody):
+                assignedVars(thenBody, acc)
+                assignedVars(elseBody, acc)
+            case WhileStmt(_, body):
+                assignedVars(body, acc)
+            case _:
+                pass
+
+def interpModule(m: mod):
+    utils.assertType(m, Module)
+    with timing.phase('tycheckModule'):
+        array_tychecker.tycheckModule(m)
+    slots: Slots = {}
+    with timing.phase('compileClosures'):
+        assignedVars(m.stmts, slots)
+        code = compileStmts(m.stmts, slots)
+    code(len(slots) * [None])
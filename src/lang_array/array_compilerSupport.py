@@ -8,7 +8,9 @@ class Errors:
     """
     arraySize = 'ArraySizeError'
     arrayIndexOutOfBounds = 'IndexError'
-    allErrors = [arraySize, arrayIndexOutOfBounds]
+    outOfMemory = 'MemoryError'
+    shadowStackOverflow = 'RecursionError'
+    allErrors = [arraySize, arrayIndexOutOfBounds, outOfMemory, shadowStackOverflow]
     @staticmethod
     def data() -> list[WasmData]:
         """
@@ -21,6 +23,12 @@ class Errors:
             start += len(e)
         return res
     @staticmethod
+    def dataLen() -> int:
+        """
+        Returns the number of bytes occupied by the error messages.
+        """
+        return sum([len(e) for e in Errors.allErrors])
+    @staticmethod
     def outputError(s: str) -> list[WasmInstr]:
         """
         Returns a list of Wasm instructions for outputting an error message.
@@ -38,34 +46,425 @@ class Errors:
                 WasmInstrConst('i32', len(s)),
                 WasmInstrCall(WasmId('$print_err'))]
 
+class Header:
+    """
+    Bits of the 4-byte header in front of every block on the heap.
+
+    - bit 0: 1 for an array, 0 for a free block
+    - bit 1: 1 if the elements of the array are arrays (M = 3 instead of M = 1)
+    - bit 2: mark bit of the garbage collector
+    - bit 3: 1 if the elements of the array have 8 bytes, 0 if they have 4 bytes
+    - bits 4-31: length of an array, or size of a free block in bytes
+    """
+    array = 1
+    pointers = 2
+    mark = 4
+    wide = 8
+    shift = 4
+
+class Layout:
+    """
+    Layout of the static part of the memory. The error messages start at address 0,
+    followed by the shadow stack with one slot for every local variable (of the toplevel
+    code) holding an array. If frames is true, the shadow stack reserves frameStackSize
+    bytes after these slots for the frames of function calls (see $@shadow_sp).
+    The heap starts after the shadow stack, but not before address 100.
+    """
+    minHeapStart = 100 # must be 4-byte aligned
+    frameStackSize = 16 * 1024 # (in bytes)
+    def __init__(self, roots: list[WasmId], frames: bool = False):
+        self.roots = roots
+        self.shadowStackStart = (Errors.dataLen() + 3) // 4 * 4
+        self.shadowStackEnd = self.shadowStackStart + 4 * len(roots)
+        self.shadowStackLimit = self.shadowStackEnd + (Layout.frameStackSize if frames else 0)
+        self.heapStart = max(Layout.minHeapStart, self.shadowStackLimit)
+    def spillRoots(self) -> list[WasmInstr]:
+        """
+        Returns a list of Wasm instructions that store the current values of all
+        root variables in their slots on the shadow stack.
+        """
+        res: list[WasmInstr] = []
+        for i, x in enumerate(self.roots):
+            res.extend([WasmInstrConst('i32', self.shadowStackStart + 4 * i),
+                        WasmInstrVarLocal('get', x),
+                        WasmInstrMem('i32', 'store')])
+        return res
+
 class Globals:
     """
     Class giving access to the names of global variables.
     """
     freePtr = WasmId('$@free_ptr')
+    freeList = WasmId('$@free_list')
+    shadowSp = WasmId('$@shadow_sp') # end of the used part of the shadow stack
     @staticmethod
-    def decls() -> list[WasmGlobal]:
+    def decls(layout: Layout) -> list[WasmGlobal]:
         """
         Returns a list of Wasm global declarations.
         """
-        errsLen = 0
-        for e in Errors.allErrors:
-            errsLen += len(e)
-        offset = 100 # must be 4-byte aligned
-        if errsLen > offset:
-            utils.abort(f'Offset for free_ptr is {offset}, but error messages take {errsLen} bytes')
-        return [WasmGlobal(Globals.freePtr, 'i32', True, [WasmInstrConst('i32', 100)])]
+        return [WasmGlobal(Globals.freePtr, 'i32', True, [WasmInstrConst('i32', layout.heapStart)]),
+                WasmGlobal(Globals.freeList, 'i32', True, [WasmInstrConst('i32', 0)]),
+                WasmGlobal(Globals.shadowSp, 'i32', True,
+                           [WasmInstrConst('i32', layout.shadowStackEnd)])]
 
 class Locals:
     """
     Class giving access to the names of temporary local variables.
     """
     tmp_i32 = WasmId('$@tmp_i32')
+    tmp2_i32 = WasmId('$@tmp2_i32')
     tmp_i64 = WasmId('$@tmp_i64')
+    tmp_root = WasmId('$@tmp_root') # holds an array, part of the roots of the garbage collector
+    frame = WasmId('$@frame') # start of the frame of a function on the shadow stack, not part of decls()
     @staticmethod
     def decls() -> list[tuple[WasmId, WasmValtype]]:
         """
         Returns a list of local variable declarations to be used in a function definition.
         """
         return [(Locals.tmp_i32, 'i32'),
-                (Locals.tmp_i64, 'i64')]
+                (Locals.tmp2_i32, 'i32'),
+                (Locals.tmp_i64, 'i64'),
+                (Locals.tmp_root, 'i32')]
+
+def _get(x: WasmId) -> WasmInstr:
+    return WasmInstrVarLocal('get', x)
+
+def _set(x: WasmId) -> WasmInstr:
+    return WasmInstrVarLocal('set', x)
+
+def _tee(x: WasmId) -> WasmInstr:
+    return WasmInstrVarLocal('tee', x)
+
+def _const(n: int) -> WasmInstr:
+    return WasmInstrConst('i32', n)
+
+def _op(op: Literal['add', 'sub', 'mul', 'shr_u', 'shl', 'xor', 'and', 'or']) -> WasmInstr:
+    return WasmInstrNumBinOp('i32', op)
+
+def _rel(op: Literal['eq', 'ne', 'lt_u', 'gt_u', 'le_u', 'ge_u']) -> WasmInstr:
+    return WasmInstrIntRelOp('i32', op)
+
+def _load() -> WasmInstr:
+    return WasmInstrMem('i32', 'load')
+
+def _store() -> WasmInstr:
+    return WasmInstrMem('i32', 'store')
+
+def _memBytes() -> list[WasmInstr]:
+    return [WasmInstrMemSize(), _const(CompilerConfig.pageSize.bit_length() - 1), _op('shl')]
+
+class Funcs:
+    """
+    Class giving access to the runtime functions that are part of every module.
+
+    Memory is managed by a mark-sweep garbage collector. Free blocks are kept in a
+    free list, ordered by address. Every free block has a header (see class Header)
+    storing its size, followed by the address of the next free block. Free blocks of
+    size 4 do not have room for the address, so they are not part of the free list
+    but are merged with their neighbors by the next collection.
+
+    An allocation first searches the free list, then takes the memory between
+    $@free_ptr and the end of the memory. If both fail, the garbage collector runs
+    and the allocation is retried, growing the memory if necessary.
+
+    The roots of the garbage collector are the slots of the shadow stack between its
+    start and $@shadow_sp (see class Layout). Code calling $@alloc must spill the root
+    variables to the shadow stack before the call.
+    """
+    alloc = WasmId('$@alloc')
+    allocFree = WasmId('$@alloc_free')
+    allocTop = WasmId('$@alloc_top')
+    grow = WasmId('$@grow')
+    gc = WasmId('$@gc')
+    mark = WasmId('$@mark')
+    sweep = WasmId('$@sweep')
+    freeRun = WasmId('$@free_run')
+    blockSize = WasmId('$@block_size')
+    @staticmethod
+    def decls(layout: Layout) -> list[WasmFunc]:
+        """
+        Returns a list of Wasm function definitions.
+        """
+        return [Funcs.allocDecl(), Funcs.allocFreeDecl(), Funcs.allocTopDecl(),
+                Funcs.growDecl(), Funcs.gcDecl(layout), Funcs.markDecl(),
+                Funcs.sweepDecl(layout), Funcs.freeRunDecl(), Funcs.blockSizeDecl()]
+    @staticmethod
+    def allocDecl() -> WasmFunc:
+        """
+        Takes the number of bytes to allocate (a multiple of 4) and returns the address
+        of the fresh memory block.
+        """
+        size = WasmId('$size')
+        ptr = WasmId('$ptr')
+        afterGc: list[WasmInstr] = [
+            _get(size), WasmInstrCall(Funcs.grow),
+            _get(size), WasmInstrCall(Funcs.allocTop), _set(ptr)
+        ]
+        noTop: list[WasmInstr] = [
+            WasmInstrCall(Funcs.gc),
+            _get(size), WasmInstrCall(Funcs.allocFree), _tee(ptr),
+            _const(0), _rel('eq'),
+            WasmInstrIf(None, afterGc, [])
+        ]
+        noFree: list[WasmInstr] = [
+            _get(size), WasmInstrCall(Funcs.allocTop), _tee(ptr),
+            _const(0), _rel('eq'),
+            WasmInstrIf(None, noTop, [])
+        ]
+        instrs: list[WasmInstr] = [
+            _get(size), WasmInstrCall(Funcs.allocFree), _tee(ptr),
+            _const(0), _rel('eq'),
+            WasmInstrIf(None, noFree, []),
+            _get(ptr)
+        ]
+        return WasmFunc(Funcs.alloc, [(size, 'i32')], 'i32', [(ptr, 'i32')], instrs)
+    @staticmethod
+    def allocFreeDecl() -> WasmFunc:
+        """
+        Takes a block of the given size from the free list (first fit). Returns 0 if
+        there is no such block. A larger block is split, the front part stays in the list.
+        """
+        size = WasmId('$size')
+        prev = WasmId('$prev')
+        cur = WasmId('$cur')
+        bsize = WasmId('$bsize')
+        ptr = WasmId('$ptr')
+        exit = WasmId('$exit')
+        loop = WasmId('$loop')
+        unlink: list[WasmInstr] = [
+            _get(prev),
+            WasmInstrIf(None,
+                        [_get(prev), _const(4), _op('add'),
+                         _get(cur), _const(4), _op('add'), _load(), _store()],
+                        [_get(cur), _const(4), _op('add'), _load(),
+                         WasmInstrVarGlobal('set', Globals.freeList)])
+        ]
+        body: list[WasmInstr] = [
+            _get(cur), _const(0), _rel('eq'), WasmInstrBranch(exit, True),
+            _get(cur), _load(), _const(Header.shift), _op('shr_u'), _set(bsize),
+            # exact fit
+            _get(bsize), _get(size), _rel('eq'),
+            WasmInstrIf(None, unlink + [_get(cur), _set(ptr), WasmInstrBranch(exit, False)], []),
+            # the rest of the block is large enough to stay in the list
+            _get(bsize), _get(size), _const(8), _op('add'), _rel('ge_u'),
+            WasmInstrIf(None,
+                        [_get(cur), _get(bsize), _get(size), _op('sub'),
+                         _const(Header.shift), _op('shl'), _store(),
+                         _get(cur), _get(bsize), _op('add'), _get(size), _op('sub'), _set(ptr),
+                         WasmInstrBranch(exit, False)],
+                        []),
+            # the rest of the block has 4 bytes, it becomes a free block outside the list
+            _get(bsize), _get(size), _const(4), _op('add'), _rel('eq'),
+            WasmInstrIf(None,
+                        unlink +
+                        [_get(cur), _const(4 << Header.shift), _store(),
+                         _get(cur), _const(4), _op('add'), _set(ptr),
+                         WasmInstrBranch(exit, False)],
+                        []),
+            _get(cur), _set(prev),
+            _get(cur), _const(4), _op('add'), _load(), _set(cur),
+            WasmInstrBranch(loop, False)
+        ]
+        instrs: list[WasmInstr] = [
+            WasmInstrVarGlobal('get', Globals.freeList), _set(cur),
+            WasmInstrBlock(exit, None, [WasmInstrLoop(loop, body)]),
+            _get(ptr)
+        ]
+        return WasmFunc(Funcs.allocFree, [(size, 'i32')], 'i32',
+                        [(prev, 'i32'), (cur, 'i32'), (bsize, 'i32'), (ptr, 'i32')], instrs)
+    @staticmethod
+    def allocTopDecl() -> WasmFunc:
+        """
+        Takes a block of the given size from the memory after $@free_ptr. Returns 0
+        if the block does not fit into the current memory.
+        """
+        size = WasmId('$size')
+        end = WasmId('$end')
+        instrs: list[WasmInstr] = [
+            WasmInstrVarGlobal('get', Globals.freePtr), _get(size), _op('add'), _tee(end),
+            *_memBytes(),
+            _rel('gt_u'),
+            WasmInstrIf('i32',
+                        [_const(0)],
+                        [WasmInstrVarGlobal('get', Globals.freePtr),
+                         _get(end), WasmInstrVarGlobal('set', Globals.freePtr)])
+        ]
+        return WasmFunc(Funcs.allocTop, [(size, 'i32')], 'i32', [(end, 'i32')], instrs)
+    @staticmethod
+    def growDecl() -> WasmFunc:
+        """
+        Grows the memory such that a block of the given size fits after $@free_ptr.
+        To avoid frequent collections, the memory grows at least by its current size
+        if possible. Outputs an error and traps if the memory cannot grow.
+        """
+        size = WasmId('$size')
+        end = WasmId('$end')
+        need = WasmId('$need')
+        pages = WasmId('$pages')
+        pageBits = CompilerConfig.pageSize.bit_length() - 1
+        grow: list[WasmInstr] = [
+            _get(end), _const(CompilerConfig.pageSize - 1), _op('add'),
+            _const(pageBits), _op('shr_u'),     # number of pages required for $end
+            WasmInstrMemSize(), _op('sub'), _tee(need),
+            WasmInstrMemSize(), _set(pages),
+            _get(pages), _rel('gt_u'),
+            WasmInstrIf(None, [_get(need), _set(pages)], []),
+            _get(pages), WasmInstrMemGrow(), _const(-1), _rel('eq'),
+            WasmInstrIf(None,
+                        [_get(need), WasmInstrMemGrow(), _const(-1), _rel('eq'),
+                         WasmInstrIf(None,
+                                     Errors.outputError(Errors.outOfMemory) + [WasmInstrTrap()],
+                                     [])],
+                        [])
+        ]
+        instrs: list[WasmInstr] = [
+            WasmInstrVarGlobal('get', Globals.freePtr), _get(size), _op('add'), _tee(end),
+            *_memBytes(),
+            _rel('gt_u'),
+            WasmInstrIf(None, grow, [])
+        ]
+        return WasmFunc(Funcs.grow, [(size, 'i32')], None,
+                        [(end, 'i32'), (need, 'i32'), (pages, 'i32')], instrs)
+    @staticmethod
+    def gcDecl(layout: Layout) -> WasmFunc:
+        """
+        Runs the garbage collector: marks all blocks reachable from the shadow stack,
+        then sweeps the heap.
+        """
+        slot = WasmId('$slot')
+        exit = WasmId('$exit')
+        loop = WasmId('$loop')
+        body: list[WasmInstr] = [
+            _get(slot), WasmInstrVarGlobal('get', Globals.shadowSp), _rel('ge_u'),
+            WasmInstrBranch(exit, True),
+            _get(slot), _load(),
+            WasmInstrIf(None, [_get(slot), _load(), WasmInstrCall(Funcs.mark)], []),
+            _get(slot), _const(4), _op('add'), _set(slot),
+            WasmInstrBranch(loop, False)
+        ]
+        instrs: list[WasmInstr] = [
+            _const(layout.shadowStackStart), _set(slot),
+            WasmInstrBlock(exit, None, [WasmInstrLoop(loop, body)]),
+            WasmInstrCall(Funcs.sweep)
+        ]
+        return WasmFunc(Funcs.gc, [], None, [(slot, 'i32')], instrs)
+    @staticmethod
+    def markDecl() -> WasmFunc:
+        """
+        Marks the array at the given address and, recursively, all arrays reachable from it.
+        """
+        p = WasmId('$p')
+        h = WasmId('$h')
+        i = WasmId('$i')
+        n = WasmId('$n')
+        q = WasmId('$q')
+        exit = WasmId('$exit')
+        loop = WasmId('$loop')
+        body: list[WasmInstr] = [
+            _get(i), _get(n), _rel('ge_u'), WasmInstrBranch(exit, True),
+            _get(p), _const(4), _op('add'), _get(i), _const(4), _op('mul'), _op('add'),
+            _load(), _tee(q),
+            WasmInstrIf(None, [_get(q), WasmInstrCall(Funcs.mark)], []),
+            _get(i), _const(1), _op('add'), _set(i),
+            WasmInstrBranch(loop, False)
+        ]
+        markElems: list[WasmInstr] = [
+            _get(h), _const(Header.shift), _op('shr_u'), _set(n),
+            WasmInstrBlock(exit, None, [WasmInstrLoop(loop, body)])
+        ]
+        unmarked: list[WasmInstr] = [
+            _get(p), _get(h), _const(Header.mark), _op('or'), _store(),
+            _get(h), _const(Header.pointers), _op('and'),
+            WasmInstrIf(None, markElems, [])
+        ]
+        instrs: list[WasmInstr] = [
+            _get(p), _load(), _tee(h), _const(Header.mark), _op('and'),
+            _const(0), _rel('eq'),
+            WasmInstrIf(None, unmarked, [])
+        ]
+        return WasmFunc(Funcs.mark, [(p, 'i32')], None,
+                        [(h, 'i32'), (i, 'i32'), (n, 'i32'), (q, 'i32')], instrs)
+    @staticmethod
+    def sweepDecl(layout: Layout) -> WasmFunc:
+        """
+        Walks the heap, clears the mark bits of all live arrays and turns every run of
+        garbage and free blocks into a single free block. A run at the end of the heap
+        is given back by lowering $@free_ptr.
+        """
+        p = WasmId('$p')
+        h = WasmId('$h')
+        run = WasmId('$run')
+        last = WasmId('$last')
+        exit = WasmId('$exit')
+        loop = WasmId('$loop')
+        live = Header.array | Header.mark
+        body: list[WasmInstr] = [
+            _get(p), WasmInstrVarGlobal('get', Globals.freePtr), _rel('ge_u'),
+            WasmInstrBranch(exit, True),
+            _get(p), _load(), _set(h),
+            _get(h), _const(live), _op('and'), _const(live), _rel('eq'),
+            WasmInstrIf(None,
+                        [_get(p), _get(h), _const(Header.mark), _op('xor'), _store(),
+                         _get(run),
+                         WasmInstrIf(None,
+                                     [_get(run), _get(p), _get(last),
+                                      WasmInstrCall(Funcs.freeRun), _set(last),
+                                      _const(0), _set(run)],
+                                     [])],
+                        [_get(run), _const(0), _rel('eq'),
+                         WasmInstrIf(None, [_get(p), _set(run)], [])]),
+            _get(p), _get(h), WasmInstrCall(Funcs.blockSize), _op('add'), _set(p),
+            WasmInstrBranch(loop, False)
+        ]
+        instrs: list[WasmInstr] = [
+            _const(0), WasmInstrVarGlobal('set', Globals.freeList),
+            _const(layout.heapStart), _set(p),
+            WasmInstrBlock(exit, None, [WasmInstrLoop(loop, body)]),
+            _get(run),
+            WasmInstrIf(None, [_get(run), WasmInstrVarGlobal('set', Globals.freePtr)], [])
+        ]
+        return WasmFunc(Funcs.sweep, [], None,
+                        [(p, 'i32'), (h, 'i32'), (run, 'i32'), (last, 'i32')], instrs)
+    @staticmethod
+    def freeRunDecl() -> WasmFunc:
+        """
+        Turns the memory between start and end into a free block and appends it to the
+        free list, given the last block of the list (or 0). Returns the new last block.
+        """
+        start = WasmId('$start')
+        end = WasmId('$end')
+        last = WasmId('$last')
+        size = WasmId('$size')
+        link: list[WasmInstr] = [
+            _get(start), _const(4), _op('add'), _const(0), _store(),
+            _get(last),
+            WasmInstrIf(None,
+                        [_get(last), _const(4), _op('add'), _get(start), _store()],
+                        [_get(start), WasmInstrVarGlobal('set', Globals.freeList)]),
+            _get(start), _set(last)
+        ]
+        instrs: list[WasmInstr] = [
+            _get(end), _get(start), _op('sub'), _set(size),
+            _get(start), _get(size), _const(Header.shift), _op('shl'), _store(),
+            _get(size), _const(8), _rel('ge_u'),
+            WasmInstrIf(None, link, []),
+            _get(last)
+        ]
+        return WasmFunc(Funcs.freeRun, [(start, 'i32'), (end, 'i32'), (last, 'i32')], 'i32',
+                        [(size, 'i32')], instrs)
+    @staticmethod
+    def blockSizeDecl() -> WasmFunc:
+        """
+        Returns the size in bytes of a block with the given header.
+        """
+        h = WasmId('$h')
+        instrs: list[WasmInstr] = [
+            _get(h), _const(Header.array), _op('and'),
+            WasmInstrIf('i32',
+                        [_get(h), _const(Header.shift), _op('shr_u'),
+                         _get(h), _const(Header.wide), _op('and'),
+                         WasmInstrIf('i32', [_const(8)], [_const(4)]),
+                         _op('mul'), _const(4), _op('add')],
+                        [_get(h), _const(Header.shift), _op('shr_u')])
+        ]
+        return WasmFunc(Funcs.blockSize, [(h, 'i32')], 'i32', [], instrs)
@@ -3,33 +3,15 @@ import lang_array.array_tychecker as array_tychecker
 import common.utils as utils
 import common.log as log
 from typing import *
+import common.timing as timing
+import common.slots as slots
+import common.arrayStore as arrayStore
 
-@dataclass(frozen=True)
-class Address:
-    value: int
-    def __repr__(self):
-        return f'Address({self.value})'
-
-type Env = dict[Ident, TyValue]
+type Env = list[Any] # indexed by the slots of the variables
+type Address = arrayStore.Handle
 type TyValue = int | bool | Address
-type StoreValue = list[TyValue]
 
-class Store:
-    def __init__(self):
-        self.content: dict[Address, StoreValue] = {}
-        self.__freshAddress = Address(0)
-    def alloc(self, val: StoreValue):
-        x = self.__freshAddress
-        self.__freshAddress = Address(x.value + 1)
-        self.content[x] = val
-        return x
-    def resolve(self, a: Address) -> StoreValue:
-        return self.content[a]
-    def storeValue(self, a: Address, i: int, v: TyValue):
-        l = self.content[a]
-        l[i] = v
-    def __repr__(self):
-        return f'Store({self.content})'
+type Store = arrayStore.ArrayStore
 
 def interpFuncall(id: ident, args: list[exp], env: Env, store: Store) -> Optional[TyValue]:
     match (id.name, args):
@@ -41,7 +23,7 @@ def interpFuncall(id: ident, args: list[exp], env: Env, store: Store) -> Optiona
             return None
         case ('len', [e]):
             v = asAddress(interpExp(e, env, store))
-            return len(store.resolve(v))
+            return store.length(v)
         case _:
             raise ValueError(f'Invalid function call of {id.name} with {len(args)} arguments')
 
@@ -58,9 +40,19 @@ def asValue(v: Optional[TyValue]) -> TyValue:
     return v
 
 def asAddress(v: Optional[TyValue]) -> Address:
-    assert isinstance(v, Address)
+    assert isinstance(v, int)
     return v
 
+def elemKind(t: Optional[resultTy]) -> arrayStore.ElemKind:
+    """
+    The kind of the elements of an array of type t.
+    """
+    match t:
+        case NotVoid(Array(Int())): return 'int'
+        case NotVoid(Array(Bool())): return 'bool'
+        case NotVoid(Array(Array())): return 'array'
+        case _: return 'other'
+
 def interpExp(e: exp, env: Env, store: Store) -> Optional[TyValue]:
     match e:
         case IntConst(value):
@@ -86,7 +78,7 @@ def interpExp(e: exp, env: Env, store: Store) -> Optional[TyValue]:
                 case GreaterEq(): return x >= interpExp(right, env, store)
                 case Eq(): return x == interpExp(right, env, store)
                 case NotEq(): return x != interpExp(right, env, store)
-                case Is(): return x == interpExp(right, env, store) # compare Address values by ==
+                case Is(): return x == interpExp(right, env, store) # compare handles by ==
                 case And():
                     if x:
                         return interpExp(right, env, store)
@@ -97,58 +89,60 @@ def interpExp(e: exp, env: Env, store: Store) -> Optional[TyValue]:
                         return True
                     else:
                         return interpExp(right, env, store)
-        case Name(name):
-            return env[name]
-        case ArrayInitDyn(lenExp, initExp):
+        case Name(slot=int(i)):
+            return env[i]
+        case Name(x):
+            raise ValueError(f'Variable {x.name} has no slot')
+        case ArrayInitDyn(lenExp, initExp, t):
             n = asInt(interpExp(lenExp, env, store))
             v = asValue(interpExp(initExp, env, store))
-            return store.alloc(n * [v])
-        case ArrayInitStatic(es):
+            return store.alloc(elemKind(t), [v], n)
+        case ArrayInitStatic(es, t):
             l = [asValue(interpExp(e, env, store)) for e in es]
-            return store.alloc(l)
+            return store.alloc(elemKind(t), l)
         case Subscript(arrayExp, indexExp):
             a = asAddress(interpExp(arrayExp, env, store))
             i = asInt(interpExp(indexExp, env, store))
-            l = store.resolve(a)
-            return l[i]
+            return store.load(a, i)
     raise Exception(f'No match for expression {e}')
 
-def interpStmt(s: stmt, env: Env, store: Store, cont: list[stmt]) -> None:
+def interpStmt(s: stmt, env: Env, store: Store) -> None:
     match s:
         case StmtExp(e):
             interpExp(e, env, store)
-            interpStmts(cont, env, store)
-        case Assign(x, e):
+        case Assign(_, e, int(i)):
             v: Any = interpExp(e, env, store)
-            env[x] = v
-            interpStmts(cont, env, store)
+            env[i] = v
+        case Assign(x, _):
+            raise ValueError(f'Variable {x.name} has no slot')
         case IfStmt(cond, thenBody, elseBody):
             v = asBool(interpExp(cond, env, store))
             if v:
-                interpStmts(thenBody + cont, env, store)
+                interpStmts(thenBody, env, store)
             else:
-                interpStmts(elseBody + cont, env, store)
+                interpStmts(elseBody, env, store)
         case WhileStmt(cond, body):
-            v = asBool(interpExp(cond, env, store))
-            if v:
-                interpStmts(body + [s] + cont, env, store)
-            else:
-                interpStmts(cont, env, store)
+            # As in loop_interp, the python stack grows with the nesting depth of the
+            # statements, not with the number of iterations.
+            while asBool(interpExp(cond, env, store)):
+                interpStmts(body, env, store)
         case SubscriptAssign(leftExp, idxExp, rightExp):
             idx = asInt(interpExp(idxExp, env, store))
             v = interpExp(rightExp, env, store)
             a = asAddress(interpExp(leftExp, env, store))
             store.storeValue(a, idx, v)
-            interpStmts(cont, env, store)
 
 def interpStmts(stmts: list[stmt], env: Env, store: Store) -> None:
-    if len(stmts) > 0:
-        interpStmt(stmts[0], env, store, stmts[1:])
+    for s in stmts:
+        interpStmt(s, env, store)
 
 def interpModule(m: mod):
     utils.assertType(m, Module)
-    array_tychecker.tycheckModule(m)
-    env: Env = {}
-    store = Store()
+    with timing.phase('tycheckModule'):
+        st = array_tychecker.tycheckModule(m)
+    layout = slots.layout(x for (x, _) in st.types('var'))
+    slots.assignSlots(m.stmts, layout)
+    env: Env = len(layout) * [None]
+    store = arrayStore.ArrayStore()
     interpStmts(m.stmts, env, store)
     log.debug(f'After executing program.\nEnv: {env}\nStore: {store}')
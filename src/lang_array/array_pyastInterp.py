@@ -0,0 +1,15 @@
+"""
+Runs lang_array programs by transpiling them to python (interp --engine=pyast), see
+common/pyastTranspiler.py.
+"""
+from lang_array.array_ast import *
+import lang_array.array_tychecker as array_tychecker
+import common.pyastTranspiler as pyastTranspiler
+import common.utils as utils
+import common.timing as timing
+
+def interpModule(m: mod):
+    utils.assertType(m, Module)
+    with timing.phase('tycheckModule'):
+        array_tychecker.tycheckModule(m)
+    pyastTranspiler.runModule(m)
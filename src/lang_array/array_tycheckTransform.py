@@ -0,0 +1,186 @@
+"""
+Type checking and atomization of array programs in a single traversal of the AST.
+
+tycheckTransModule is an alternative to array_tychecker.tycheckModule followed by
+array_transform.transStmts. It produces the same symtab, the same statements and the
+same temporaries, but visits every node only once. The type rules are those of
+array_tychecker, the fresh variables are allocated with an array_transform.Ctx.
+"""
+from __future__ import annotations
+from lang_array.array_ast import *
+import lang_array.array_astAtom as atom
+import lang_array.array_tychecker as array_tychecker
+import lang_array.array_transform as array_transform
+from lang_array.array_transform import Ctx, Temporaries, mkAssigns
+from common.compileError import CompileError
+import common.log as log
+import common.symtab as symtab
+import common.utils as utils
+
+type Symtab = array_tychecker.Symtab
+
+# Types are never modified, so all constants share their types
+intTy = NotVoid(Int())
+boolTy = NotVoid(Bool())
+
+def tyOf(a: atom.exp) -> resultTy:
+    return utils.assertNotNone(a.ty)
+
+def toAtomic(a: atom.exp, tmps: Temporaries, ctx: Ctx) -> tuple[atom.atomExp, Temporaries]:
+    """
+    Converts the translated expression a to an atomic expression, introducing a temporary
+    if a is not already atomic.
+    """
+    match a:
+        case atom.AtomExp(x):
+            return (x, tmps)
+        case _:
+            match array_transform.atomic(True, a, tmps, ctx):
+                case (atom.AtomExp(x), tmps):
+                    return (x, tmps)
+                case _:
+                    utils.abort(f'atomic with needAtomic=True failed to return an atomic expression: {a}')
+
+def tyTransExp(e: exp, st: Symtab, ctx: Ctx) -> tuple[atom.exp, Temporaries]:
+    """
+    Type checks e and translates it to an expression of type array_astAtom.exp, together
+    with the temporaries used by the translated expression. Like array_tychecker.tycheckExp,
+    the type of e is also stored in e.ty.
+    """
+    (a, tmps) = _tyTransExp(e, st, ctx)
+    e.ty = a.ty
+    return (a, tmps)
+
+def tyTransExpNotVoid(e: exp, st: Symtab, ctx: Ctx) -> tuple[atom.exp, Temporaries, ty]:
+    (a, tmps) = tyTransExp(e, st, ctx)
+    return (a, tmps, array_tychecker.assertNotVoid(tyOf(a), e))
+
+def _tyTransExp(e: exp, st: Symtab, ctx: Ctx) -> tuple[atom.exp, Temporaries]:
+    match e:
+        case IntConst(v):
+            if v < -2**63 or v > 2.**63 - 1:
+                raise CompileError.typeError(f'int constant too large: {v}')
+            return (atom.AtomExp(atom.IntConst(v, intTy.ty), intTy), [])
+        case BoolConst(v):
+            return (atom.AtomExp(atom.BoolConst(v, boolTy.ty), boolTy), [])
+        case Call(id, args):
+            array_tychecker.checkFuncallArity(id, args)
+            atomArgs: list[atom.exp] = []
+            tmps: Temporaries = []
+            argTys: list[ty] = []
+            for arg in args:
+                (a, argTmps, argTy) = tyTransExpNotVoid(arg, st, ctx)
+                atomArgs.append(a)
+                tmps.extend(argTmps)
+                argTys.append(argTy)
+            t = array_tychecker.funcallTy(id, args, argTys)
+            return (atom.Call(id, atomArgs, t), tmps)
+        case UnOp(op, sub):
+            (atomSub, tmps) = tyTransExp(sub, st, ctx)
+            t = array_tychecker.unOpTy(e, op, tyOf(atomSub))
+            return (atom.UnOp(op, atomSub, t), tmps)
+        case BinOp(left, op, right):
+            (l, tmps1, leftTy) = tyTransExpNotVoid(left, st, ctx)
+            (r, tmps2, rightTy) = tyTransExpNotVoid(right, st, ctx)
+            t = array_tychecker.binOpTy(left, op, right, leftTy, rightTy)
+            return (atom.BinOp(l, op, r, t), tmps1 + tmps2)
+        case Name(x):
+            xt = st.use(x)
+            return (atom.AtomExp(atom.Name(x, xt), NotVoid(xt)), [])
+        case ArrayInitDyn(lenExp, initExp):
+            (l, tmps1) = tyTransExp(lenExp, st, ctx)
+            array_tychecker.assertLenTy(lenExp, tyOf(l))
+            (atomLen, tmps1) = toAtomic(l, tmps1, ctx)
+            (i, tmps2) = tyTransExp(initExp, st, ctx)
+            elemTy = array_tychecker.assertElemTy(initExp, tyOf(i))
+            (atomElem, tmps2) = toAtomic(i, tmps2, ctx)
+            t = NotVoid(Array(elemTy))
+            return (atom.ArrayInitDyn(atomLen, atomElem, t), tmps1 + tmps2)
+        case ArrayInitStatic([]):
+            raise CompileError.typeError(f'Cannot construct empty array')
+        case ArrayInitStatic(es):
+            atomElems: list[atom.atomExp] = []
+            tmps: Temporaries = []
+            elemTys: list[ty] = []
+            for elem in es:
+                (a, elemTmps, elemTy) = tyTransExpNotVoid(elem, st, ctx)
+                (atomElem, tmps) = toAtomic(a, tmps + elemTmps, ctx)
+                atomElems.append(atomElem)
+                elemTys.append(elemTy)
+            t = array_tychecker.arrayInitStaticTy(es, elemTys)
+            return (atom.ArrayInitStatic(atomElems, t), tmps)
+        case Subscript(arrayExp, indexExp):
+            (arr, tmps1, arrayTy) = tyTransExpNotVoid(arrayExp, st, ctx)
+            (atomArr, tmps1) = toAtomic(arr, tmps1, ctx)
+            (index, tmps2, indexTy) = tyTransExpNotVoid(indexExp, st, ctx)
+            (atomIndex, tmps2) = toAtomic(index, tmps2, ctx)
+            t = array_tychecker.subscriptTy(arrayExp, arrayTy, indexTy)
+            return (atom.Subscript(atomArr, atomIndex, t), tmps1 + tmps2)
+    raise Exception(f'No match for expression {e} ({e.__module__})')
+
+def tyTransStmt(s: stmt, st: Symtab, ctx: Ctx) -> list[atom.stmt]:
+    match s:
+        case StmtExp(e):
+            (a, tmps) = tyTransExp(e, st, ctx)
+            match tyOf(a):
+                case Void():
+                    return mkAssigns(tmps) + [atom.StmtExp(a)]
+                case NotVoid(t):
+                    raise CompileError.typeError(f'Statement {s} has type {t} but ignores the result')
+        case Assign(x, e):
+            (a, tmps) = tyTransExp(e, st, ctx)
+            match tyOf(a):
+                case Void():
+                    raise CompileError.typeError(f'Left-hand side of assignment {s} is void')
+                case NotVoid(t):
+                    st.assign(x, t)
+                    return mkAssigns(tmps) + [atom.Assign(x, a)]
+        case IfStmt(cond, thenBody, elseBody):
+            (a, tmps) = tyTransExp(cond, st, ctx)
+            array_tychecker.assertCondTy(cond, tyOf(a))
+            nestedThen = st.copy()
+            stmts1 = tyTransStmts(thenBody, nestedThen, ctx)
+            nestedElse = st.copy()
+            stmts2 = tyTransStmts(elseBody, nestedElse, ctx)
+            st.mergeBack(nestedThen, nestedElse)
+            return mkAssigns(tmps) + [atom.IfStmt(a, stmts1, stmts2)]
+        case WhileStmt(cond, body):
+            (a, tmps) = tyTransExp(cond, st, ctx)
+            array_tychecker.assertCondTy(cond, tyOf(a))
+            nested = st.copy()
+            stmts = tyTransStmts(body, nested, ctx)
+            untaken = st.copy()
+            st.mergeBack(untaken, nested)
+            return mkAssigns(tmps) + [atom.WhileStmt(a, stmts)]
+        case SubscriptAssign(leftExp, indexExp, rightExp):
+            (l, tmps1) = tyTransExp(leftExp, st, ctx)
+            match tyOf(l):
+                case NotVoid(Array(elemTy)):
+                    (atomLeft, tmps1) = toAtomic(l, tmps1, ctx)
+                    (i, tmps2) = tyTransExp(indexExp, st, ctx)
+                    array_tychecker.assertIndexTy(indexExp, tyOf(i))
+                    (atomIndex, tmps2) = toAtomic(i, tmps2, ctx)
+                    (r, tmps3) = tyTransExp(rightExp, st, ctx)
+                    array_tychecker.assertRightTy(rightExp, elemTy, tyOf(r))
+                    return mkAssigns(tmps1 + tmps2 + tmps3) + \
+                        [atom.SubscriptAssign(atomLeft, atomIndex, r)]
+                case _:
+                    raise CompileError.typeError(f'Left-hand side of subscript assignment must ' \
+                        'be an array')
+
+def tyTransStmts(stmts: list[stmt], st: Symtab, ctx: Ctx) -> list[atom.stmt]:
+    result: list[atom.stmt] = []
+    for s in stmts:
+        result.extend(tyTransStmt(s, st, ctx))
+    return result
+
+def tycheckTransModule(m: mod, ctx: Ctx) -> tuple[Symtab, list[atom.stmt]]:
+    """
+    Typechecks and translates the given module. Returns the symtab for all variables used
+    by the module and the translated statements. The temporaries are recorded in ctx.
+    """
+    log.info(f'Typechecking and transforming array program')
+    st: Symtab = symtab.Symtab()
+    stmts = tyTransStmts(m.stmts, st, ctx)
+    log.debug(f'Symtab after typechecking: {st}')
+    return (st, stmts)
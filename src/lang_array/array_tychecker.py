@@ -1,8 +1,9 @@
 from __future__ import annotations
 from lang_array.array_ast import *
 from typing import *
-from common.compilerSupport import *
+from common.compileError import CompileError
 import common.log as log
+import common.utils as utils
 import common.symtab as symtab
 import pprint
 
@@ -34,36 +35,128 @@ def assertTy(expected: ty, given: resultTy | ty, what: str):
             if expected != t:
                 raise CompileError.typeError(f'{what} should have type {expected} but has type {t}')
 
-def assertArrayTy(given: Optional[ty], what: str):
+def assertArrayTy(given: Optional[ty], e: exp):
     if not isArrayTy(given):
-        raise CompileError.typeError(f'{what} should have an array type but has type {given}')
+        raise CompileError.typeError(f'{e} should have an array type but has type {given}')
 
-def assertNotVoid(given: resultTy, what: str) -> ty:
+def assertNotVoid(given: resultTy, e: exp) -> ty:
     match given:
         case Void():
-            raise CompileError.typeError(f'{what} must not be void')
+            raise CompileError.typeError(f'{e} must not be void')
         case NotVoid(t):
             return t
 
+# The checks below only render the expressions for the error message if the check fails,
+# rendering the AST for every check would dominate the time of the type checker.
+
+def assertCondTy(cond: exp, given: resultTy | ty):
+    if given != NotVoid(Bool()):
+        assertTy(Bool(), given, f'Condition {cond} of if')
+
+def assertOperandTy(expected: ty, e: exp, given: ty):
+    if given != expected:
+        assertTy(expected, given, f'Expression {e}')
+
+def assertLenTy(lenExp: exp, given: resultTy):
+    if given != NotVoid(Int()):
+        assertTy(Int(), given, f'Length expression {lenExp} in array initialization')
+
+def assertElemTy(initExp: exp, given: resultTy) -> ty:
+    match given:
+        case NotVoid(t):
+            return t
+        case _:
+            return assertSomeTy(given, f'Element expression {initExp} in array initialization')
+
+def assertIndexTy(indexExp: exp, given: resultTy):
+    if given != NotVoid(Int()):
+        assertTy(Int(), given, f'Index {indexExp} of assignmet')
+
+def assertRightTy(rightExp: exp, elemTy: ty, given: resultTy):
+    if given != NotVoid(elemTy):
+        assertTy(elemTy, given, f'Right-hand side {rightExp} of subscript assigment')
+
 def tycheckExpNotVoid(e: exp, st: Symtab) -> ty:
     t = tycheckExp(e, st)
-    return assertNotVoid(t, str(e))
+    return assertNotVoid(t, e)
 
-def tycheckFuncall(id: ident, args: list[exp], st: Symtab) -> resultTy:
-    match (id.name, args):
-        case ('input_int', []):
+builtinArities = {'input_int': 0, 'print': 1, 'len': 1}
+
+def checkFuncallArity(id: ident, args: list[exp]):
+    if builtinArities.get(id.name) != len(args):
+        raise CompileError.typeError(f'Invalid function call of {id.name} with {len(args)} arguments')
+
+def funcallTy(id: ident, args: list[exp], argTys: list[ty]) -> resultTy:
+    """
+    Returns the result type of a call of a builtin function, given the types of the arguments.
+    The arity of the call must have been checked with checkFuncallArity.
+    """
+    match (id.name, args, argTys):
+        case ('input_int', [], []):
             return NotVoid(Int())
-        case ('print', [e]):
-            t = tycheckExpNotVoid(e, st)
+        case ('print', [e], [t]):
             if t not in [Int(), Bool()]:
                 raise CompileError.typeError(f'{e} should have type int or bool but has type {t}')
             return Void()
-        case ('len', [e]):
-            t = tycheckExpNotVoid(e, st)
-            assertArrayTy(t, str(e))
+        case ('len', [e], [t]):
+            assertArrayTy(t, e)
             return NotVoid(Int())
         case _:
-            raise CompileError.typeError(f'Invalid function call of {id.name} with {len(args)} arguments')
+            utils.abort(f'Invalid call of builtin function {id.name}')
+
+def tycheckFuncall(id: ident, args: list[exp], st: Symtab) -> resultTy:
+    checkFuncallArity(id, args)
+    return funcallTy(id, args, [tycheckExpNotVoid(e, st) for e in args])
+
+def unOpTy(e: exp, op: unaryop, subTy: resultTy) -> resultTy:
+    match op:
+        case USub():
+            expectedTy = Int()
+        case Not():
+            expectedTy = Bool()
+    if subTy != NotVoid(expectedTy):
+        assertTy(expectedTy, subTy, f'Expression {e}')
+    return NotVoid(expectedTy)
+
+def binOpTy(left: exp, op: binaryop, right: exp, leftTy: ty, rightTy: ty) -> resultTy:
+    match op:
+        case Add() | Sub() | Mul():
+            assertOperandTy(Int(), left, leftTy)
+            assertOperandTy(Int(), right, rightTy)
+            return NotVoid(Int())
+        case Less() | LessEq() | Greater() | GreaterEq():
+            assertOperandTy(Int(), left, leftTy)
+            assertOperandTy(Int(), right, rightTy)
+            return NotVoid(Bool())
+        case Eq() | NotEq():
+            if leftTy == rightTy and isBaseTy(leftTy):
+                return NotVoid(Bool())
+            else:
+                raise CompileError.typeError(f'Invalid types for operands of {op}')
+        case Is():
+            if leftTy == rightTy and isArrayTy(leftTy):
+                return NotVoid(Bool())
+            else:
+                raise CompileError.typeError(f'Invalid types for operands of {op}')
+        case And() | Or():
+            assertOperandTy(Bool(), left, leftTy)
+            assertOperandTy(Bool(), right, rightTy)
+            return NotVoid(Bool())
+
+def arrayInitStaticTy(es: list[exp], elemTys: list[ty]) -> resultTy:
+    elemTy = elemTys[0]
+    for t in elemTys[1:]:
+        if t != elemTy:
+            raise CompileError.typeError(f'All array elements must have the same type: {es}')
+    return NotVoid(Array(elemTy))
+
+def subscriptTy(arrayExp: exp, arrayTy: ty, indexTy: ty) -> resultTy:
+    assertTy(Int(), indexTy, f'Index of subscript expression')
+    match arrayTy:
+        case Array(elemTy):
+            return NotVoid(elemTy)
+        case _:
+            raise CompileError.typeError(f'Left-hand side {arrayExp} of subscript must be an array')
 
 def tycheckExp(e: exp, st: Symtab) -> resultTy:
     t = _tycheckExp(e, st)
@@ -81,66 +174,24 @@ def _tycheckExp(e: exp, st: Symtab) -> resultTy:
         case Call(id, args):
             return tycheckFuncall(id, args, st)
         case UnOp(op, sub):
-            subTy = tycheckExp(sub, st)
-            match op:
-                case USub():
-                    expectedTy = Int()
-                case Not():
-                    expectedTy = Bool()
-            assertTy(expectedTy, subTy, f'Expression {e}')
-            return NotVoid(expectedTy)
+            return unOpTy(e, op, tycheckExp(sub, st))
         case BinOp(left, op, right):
             leftTy = tycheckExpNotVoid(left, st)
             rightTy = tycheckExpNotVoid(right, st)
-            match op:
-                case Add() | Sub() | Mul():
-                    assertTy(Int(), leftTy, f'Expression {left}')
-                    assertTy(Int(), rightTy, f'Expression {right}')
-                    return NotVoid(Int())
-                case Less() | LessEq() | Greater() | GreaterEq():
-                    assertTy(Int(), leftTy, f'Expression {left}')
-                    assertTy(Int(), rightTy, f'Expression {right}')
-                    return NotVoid(Bool())
-                case Eq() | NotEq():
-                    if leftTy == rightTy and isBaseTy(leftTy):
-                        return NotVoid(Bool())
-                    else:
-                        raise CompileError.typeError(f'Invalid types for operands of {op}')
-                case Is():
-                    if leftTy == rightTy and isArrayTy(leftTy):
-                        return NotVoid(Bool())
-                    else:
-                        raise CompileError.typeError(f'Invalid types for operands of {op}')
-                case And() | Or():
-                    assertTy(Bool(), leftTy, f'Expression {left}')
-                    assertTy(Bool(), rightTy, f'Expression {right}')
-                    return NotVoid(Bool())
+            return binOpTy(left, op, right, leftTy, rightTy)
         case Name(x):
             return NotVoid(st.use(x))
         case ArrayInitDyn(lenExp, initExp):
-            lenTy = tycheckExp(lenExp, st)
-            assertTy(Int(), lenTy, f'Length expression {lenExp} in array initialization')
-            elemTy = assertSomeTy(tycheckExp(initExp, st),
-                                  f'Element expression {initExp} in array initialization')
-            return NotVoid(Array(elemTy))
+            assertLenTy(lenExp, tycheckExp(lenExp, st))
+            return NotVoid(Array(assertElemTy(initExp, tycheckExp(initExp, st))))
         case ArrayInitStatic([]):
             raise CompileError.typeError(f'Cannot construct empty array')
         case ArrayInitStatic(es):
-            elemTys: list[ty]= [tycheckExpNotVoid(e, st) for e in es]
-            elemTy = elemTys[0]
-            for t in elemTys[1:]:
-                if t != elemTy:
-                    raise CompileError.typeError(f'All array elements must have the same type: {es}')
-            return NotVoid(Array(elemTy))
+            return arrayInitStaticTy(es, [tycheckExpNotVoid(e, st) for e in es])
         case Subscript(arrayExp, indexExp):
             arrayTy = tycheckExpNotVoid(arrayExp, st)
             indexTy = tycheckExpNotVoid(indexExp, st)
-            assertTy(Int(), indexTy, f'Index of subscript expression')
-            match arrayTy:
-                case Array(elemTy):
-                    return NotVoid(elemTy)
-                case _:
-                    raise CompileError.typeError(f'Left-hand side {arrayExp} of subscript must be an array')
+            return subscriptTy(arrayExp, arrayTy, indexTy)
     raise Exception(f'No match for expression {e} ({e.__module__})')
 
 def tycheckStmt(s: stmt, st: Symtab):
@@ -159,7 +210,7 @@ def tycheckStmt(s: stmt, st: Symtab):
                     st.assign(x, t)
         case IfStmt(cond, thenBody, elseBody):
             t = tycheckExp(cond, st)
-            assertTy(Bool(), t, f'Condition {cond} of if')
+            assertCondTy(cond, t)
             nestedThen = st.copy()
             tycheckStmts(thenBody, nestedThen)
             nestedElse = st.copy()
@@ -167,7 +218,7 @@ def tycheckStmt(s: stmt, st: Symtab):
             st.mergeBack(nestedThen, nestedElse)
         case WhileStmt(cond, body):
             t = tycheckExp(cond, st)
-            assertTy(Bool(), t, f'Condition {cond} of if')
+            assertCondTy(cond, t)
             nested = st.copy()
             tycheckStmts(body, nested)
             untaken = st.copy()
@@ -176,10 +227,8 @@ def tycheckStmt(s: stmt, st: Symtab):
             leftTy = tycheckExp(leftExp, st)
             match leftTy:
                 case NotVoid(Array(elemTy)):
-                    indexTy = tycheckExp(indexExp, st)
-                    assertTy(Int(), indexTy, f'Index {indexExp} of assignmet')
-                    rightTy = tycheckExp(rightExp, st)
-                    assertTy(elemTy, rightTy, f'Right-hand side {rightExp} of subscript assigment')
+                    assertIndexTy(indexExp, tycheckExp(indexExp, st))
+                    assertRightTy(rightExp, elemTy, tycheckExp(rightExp, st))
                     return elemTy
                 case _:
                     raise CompileError.typeError(f'Left-hand side of subscript assignment must ' \
@@ -197,5 +246,6 @@ def tycheckModule(m: mod) -> Symtab:
     st: Symtab = symtab.Symtab()
     tycheckStmts(m.stmts, st)
     log.debug(f'Symtab after typechecking: {st}')
-    log.debug(f'AST after typechecking: {pprint.pformat(m)}')
+    if log.isDebug():
+        log.debug(f'AST after typechecking: {pprint.pformat(m)}')
     return st
@@ -0,0 +1,560 @@
+"""
+Register-based bytecode VM for lang_array (interp --engine=vm).
+
+After type checking, the module is transformed to the atomized AST (array_transform, the
+same transformation the wasm compiler uses) and compiled to bytecode. The bytecode is a
+flat array('i') of opcodes, each followed by its operands. Operands are register indices,
+jump targets or immediate values. Variables, temporaries and constants all live in
+registers: the registers of variables start with None, the registers of constants start
+with their value, so no instruction needs to distinguish constants from variables.
+
+Conditions of if and while that compare two values compile to a single fused
+compare-and-branch instruction. Before running, the bytecode is decoded to threaded code
+(see decode), so dispatching an instruction does not compare its opcode with others.
+
+Array operations are bounds-checked and fail with the same errors as the compiled wasm
+code (IndexError, ArraySizeError). This differs on purpose from array_interp, the closure
+and the pyast engine, which index python lists directly: there, a[-1] is the last element
+of a, in the VM it is an IndexError. Apart from these errors, the output is the same as
+with array_interp.
+"""
+from __future__ import annotations
+from lang_array.array_astAtom import *
+import lang_array.array_ast as plainAst
+import lang_array.array_tychecker as array_tychecker
+import lang_array.array_transform as array_transform
+from common.compilerSupport import CompilerConfig
+import common.log as log
+import common.timing as timing
+import common.utils as utils
+from typing import *
+from array import array
+from dataclasses import dataclass
+
+class ArraySizeError(Exception):
+    """
+    Raised if the length of a new array is negative or too large.
+    """
+    pass
+
+# Opcodes. In the comments, d is the destination register, a, b, c, v are source
+# registers, t is a jump target and k is an immediate value.
+MOV = 0       # d a:       d = a
+ADD = 1       # d a b:     d = a + b
+SUB = 2       # d a b
+MUL = 3       # d a b
+JMP = 4       # t:         jump to t
+JNLT = 5      # a b t:     jump to t unless a < b
+JNLE = 6      # a b t
+JNGT = 7      # a b t
+JNGE = 8      # a b t
+JNEQ = 9      # a b t
+JNNE = 10     # a b t
+JFALSE = 11   # c t:       jump to t if c is false
+JTRUE = 12    # c t:       jump to t if c is true
+LOAD = 13     # d a b:     d = a[b]
+STORE = 14    # a b v:     a[b] = v
+LT = 15       # d a b:     d = a < b
+LE = 16       # d a b
+GT = 17       # d a b
+GE = 18       # d a b
+EQ = 19       # d a b
+NE = 20       # d a b
+IS = 21       # d a b
+NEG = 22      # d a:       d = -a
+NOT = 23      # d a:       d = not a
+LEN = 24      # d a:       d = len(a)
+PRINT = 25    # a
+INPUT = 26    # d:         d = input_int()
+NEWARR = 27   # d a v k:   d = a * [v], k is the maximal number of elements
+NEWARRS = 28  # d k a1 .. ak: d = [a1, .., ak]
+HALT = 29
+
+OPNAMES = ['MOV', 'ADD', 'SUB', 'MUL', 'JMP', 'JNLT', 'JNLE', 'JNGT', 'JNGE', 'JNEQ', 'JNNE',
+           'JFALSE', 'JTRUE', 'LOAD', 'STORE', 'LT', 'LE', 'GT', 'GE', 'EQ', 'NE', 'IS', 'NEG',
+           'NOT', 'LEN', 'PRINT', 'INPUT', 'NEWARR', 'NEWARRS', 'HALT']
+
+# Number of operands, None for NEWARRS whose operands follow its immediate k
+_ARITY: list[Optional[int]] = [2, 3, 3, 3, 1, 3, 3, 3, 3, 3, 3, 2, 2, 3, 3, 3, 3, 3, 3, 3, 3, 3,
+                               2, 2, 2, 1, 1, 4, None, 0]
+
+_ARITH_OPS: dict[type, int] = {Add: ADD, Sub: SUB, Mul: MUL}
+_CMP_OPS: dict[type, int] = {Less: LT, LessEq: LE, Greater: GT, GreaterEq: GE, Eq: EQ,
+                             NotEq: NE, Is: IS}
+_BRANCH_OPS: dict[type, int] = {Less: JNLT, LessEq: JNLE, Greater: JNGT, GreaterEq: JNGE,
+                                Eq: JNEQ, NotEq: JNNE}
+# Jumps if the comparison holds: a < b iff not a >= b (comparisons are only between ints or
+# between bools)
+_LOOP_OPS: dict[type, int] = {Less: JNGE, LessEq: JNGT, Greater: JNLE, GreaterEq: JNLT,
+                              Eq: JNNE, NotEq: JNEQ}
+
+@dataclass(frozen=True)
+class Program:
+    code: array[int]
+    registers: list[Any] # initial values of the registers
+
+    def disassemble(self) -> str:
+        lines: list[str] = []
+        pc = 0
+        code = self.code
+        while pc < len(code):
+            op = code[pc]
+            n = _ARITY[op]
+            if n is None:
+                n = code[pc + 2] + 2
+            args = ' '.join(str(x) for x in code[pc + 1:pc + 1 + n])
+            lines.append(f'{pc:5}: {OPNAMES[op]} {args}'.rstrip())
+            pc += 1 + n
+        return '\n'.join(lines)
+
+class Ctx:
+    """
+    State of the bytecode compiler: the code emitted so far and the register layout.
+    """
+    def __init__(self, vars: Iterable[Ident], maxArraySize: int):
+        self.code: list[int] = []
+        self.registers: list[Any] = []
+        self.varRegs: dict[Ident, int] = {}
+        self.constRegs: dict[tuple[type, Any], int] = {}
+        self.tmpRegs: list[int] = []  # registers for intermediate values, not in use
+        self.maxArraySize = maxArraySize
+        for x in vars:
+            self.varRegs[x] = self.newRegister(None)
+
+    def newRegister(self, init: Any) -> int:
+        self.registers.append(init)
+        return len(self.registers) - 1
+
+    def varRegister(self, x: Ident) -> int:
+        return self.varRegs[x]
+
+    def constRegister(self, v: int | bool) -> int:
+        # True == 1, so the type is part of the key
+        k = (type(v), v)
+        if k not in self.constRegs:
+            self.constRegs[k] = self.newRegister(v)
+        return self.constRegs[k]
+
+    def acquireTmp(self) -> int:
+        return self.tmpRegs.pop() if self.tmpRegs else self.newRegister(None)
+
+    def releaseTmp(self, r: int):
+        self.tmpRegs.append(r)
+
+    def isTmp(self, r: int) -> bool:
+        # The registers of the variables come first
+        return r >= len(self.varRegs)
+
+    def emit(self, op: int, *operands: int):
+        self.code.append(op)
+        self.code.extend(operands)
+
+    def emitJump(self, op: int, *operands: int) -> int:
+        """
+        Emits a jump whose target is the last operand and not yet known. Returns the
+        position of the target, see patch.
+        """
+        self.emit(op, *operands, -1)
+        return len(self.code) - 1
+
+    def patch(self, pos: int, target: Optional[int] = None):
+        """
+        Sets the jump target at position pos, by default to the current end of the code.
+        """
+        self.code[pos] = len(self.code) if target is None else target
+
+    def here(self) -> int:
+        return len(self.code)
+
+def maxElemCount(t: Optional[resultTy], maxArraySize: int) -> int:
+    """
+    The maximal number of elements of an array of type t, as in the wasm code: bool
+    elements need 4 bytes, int and array elements 8 bytes.
+    """
+    match t:
+        case NotVoid(Array(Bool())): return maxArraySize // 4
+        case _: return maxArraySize // 8
+
+def compileAtom(a: atomExp, ctx: Ctx) -> int:
+    """
+    The register holding the value of a.
+    """
+    match a:
+        case IntConst(v) | BoolConst(v):
+            return ctx.constRegister(v)
+        case Name(x):
+            return ctx.varRegister(x)
+
+def compileOperand(e: exp, ctx: Ctx, tmps: list[int]) -> int:
+    """
+    The register holding the value of e. A register acquired for e is added to tmps, the
+    caller releases it after its last use.
+    """
+    match e:
+        case AtomExp(a):
+            return compileAtom(a, ctx)
+        case _:
+            r = ctx.acquireTmp()
+            tmps.append(r)
+            compileExp(e, r, ctx)
+            return r
+
+def releaseAll(tmps: list[int], ctx: Ctx):
+    for r in tmps:
+        ctx.releaseTmp(r)
+
+def compileCall(id: Ident, args: list[exp], dst: Optional[int], ctx: Ctx):
+    tmps: list[int] = []
+    match (id.name, args):
+        case ('input_int', []):
+            if dst is None:
+                dst = ctx.acquireTmp()
+                tmps.append(dst)
+            ctx.emit(INPUT, dst)
+        case ('print', [e]):
+            ctx.emit(PRINT, compileOperand(e, ctx, tmps))
+        case ('len', [e]):
+            a = compileOperand(e, ctx, tmps)
+            if dst is not None:
+                ctx.emit(LEN, dst, a)
+        case _:
+            raise ValueError(f'Invalid function call of {id.name} with {len(args)} arguments')
+    releaseAll(tmps, ctx)
+
+def compileExp(e: exp, dst: int, ctx: Ctx):
+    """
+    Emits code that stores the value of e in register dst.
+    """
+    tmps: list[int] = []
+    match e:
+        case AtomExp(a):
+            ctx.emit(MOV, dst, compileAtom(a, ctx))
+        case Call(id, args):
+            compileCall(id, args, dst, ctx)
+        case UnOp(op, sub):
+            r = compileOperand(sub, ctx, tmps)
+            ctx.emit(NEG if isinstance(op, USub) else NOT, dst, r)
+        case BinOp(left, And() | Or() as op, right):
+            # dst may be a variable used in right, so the result goes to a temporary first
+            res = dst if ctx.isTmp(dst) else ctx.acquireTmp()
+            compileExp(left, res, ctx)
+            skip = ctx.emitJump(JFALSE if isinstance(op, And) else JTRUE, res)
+            compileExp(right, res, ctx)
+            ctx.patch(skip)
+            if res != dst:
+                ctx.emit(MOV, dst, res)
+                ctx.releaseTmp(res)
+        case BinOp(left, op, right):
+            (l, r) = (compileOperand(left, ctx, tmps), compileOperand(right, ctx, tmps))
+            opcode = _ARITH_OPS[type(op)] if type(op) in _ARITH_OPS else _CMP_OPS[type(op)]
+            ctx.emit(opcode, dst, l, r)
+        case ArrayInitDyn(lenExp, elemInit, t):
+            ctx.emit(NEWARR, dst, compileAtom(lenExp, ctx), compileAtom(elemInit, ctx),
+                     maxElemCount(t, ctx.maxArraySize))
+        case ArrayInitStatic(elemInit):
+            ctx.emit(NEWARRS, dst, len(elemInit), *[compileAtom(a, ctx) for a in elemInit])
+        case Subscript(array, index):
+            ctx.emit(LOAD, dst, compileAtom(array, ctx), compileAtom(index, ctx))
+    releaseAll(tmps, ctx)
+
+def compileCondJump(cond: exp, ctx: Ctx) -> list[int]:
+    """
+    Emits code that jumps if cond is false and falls through otherwise. Returns the
+    positions of the jump targets, the caller patches them.
+    """
+    tmps: list[int] = []
+    match cond:
+        case BinOp(left, And(), right):
+            return compileCondJump(left, ctx) + compileCondJump(right, ctx)
+        case UnOp(Not(), sub):
+            c = compileOperand(sub, ctx, tmps)
+            releaseAll(tmps, ctx)
+            return [ctx.emitJump(JTRUE, c)]
+        case BinOp(left, op, right) if type(op) in _BRANCH_OPS:
+            (l, r) = (compileOperand(left, ctx, tmps), compileOperand(right, ctx, tmps))
+            releaseAll(tmps, ctx)
+            return [ctx.emitJump(_BRANCH_OPS[type(op)], l, r)]
+        case _:
+            c = compileOperand(cond, ctx, tmps)
+            releaseAll(tmps, ctx)
+            return [ctx.emitJump(JFALSE, c)]
+
+def compileStmts(stmts: list[stmt], ctx: Ctx):
+    tmps: list[int]
+    for s in stmts:
+        match s:
+            case StmtExp(Call(id, args)):
+                compileCall(id, args, None, ctx)
+            case StmtExp(e):
+                r = ctx.acquireTmp()
+                compileExp(e, r, ctx)
+                ctx.releaseTmp(r)
+            case Assign(x, e):
+                compileExp(e, ctx.varRegister(x), ctx)
+            case IfStmt(cond, thenBody, elseBody):
+                jumps = compileCondJump(cond, ctx)
+                compileStmts(thenBody, ctx)
+                if elseBody:
+                    end = ctx.emitJump(JMP)
+                    for j in jumps:
+                        ctx.patch(j)
+                    compileStmts(elseBody, ctx)
+                    ctx.patch(end)
+                else:
+                    for j in jumps:
+                        ctx.patch(j)
+            case WhileStmt(BinOp(left, op, right) as cond, body) if type(op) in _LOOP_OPS:
+                # The condition is tested before the first iteration and at the end of the
+                # body, so an iteration needs only one jump
+                jumps = compileCondJump(cond, ctx)
+                start = ctx.here()
+                compileStmts(body, ctx)
+                tmps = []
+                (l, r) = (compileOperand(left, ctx, tmps), compileOperand(right, ctx, tmps))
+                releaseAll(tmps, ctx)
+                ctx.emit(_LOOP_OPS[type(op)], l, r, start)
+                for j in jumps:
+                    ctx.patch(j)
+            case WhileStmt(cond, body):
+                start = ctx.here()
+                jumps = compileCondJump(cond, ctx)
+                compileStmts(body, ctx)
+                ctx.emit(JMP, start)
+                for j in jumps:
+                    ctx.patch(j)
+            case SubscriptAssign(left, index, right):
+                tmps = []
+                v = compileOperand(right, ctx, tmps)
+                ctx.emit(STORE, compileAtom(left, ctx), compileAtom(index, ctx), v)
+                releaseAll(tmps, ctx)
+
+def compileModule(m: plainAst.mod, maxArraySize: int = CompilerConfig.defaultMaxArraySize) \
+        -> Program:
+    """
+    Type checks m and compiles it to bytecode.
+    """
+    utils.assertType(m, plainAst.Module)
+    with timing.phase('tycheckModule'):
+        st = array_tychecker.tycheckModule(m)
+    transCtx = array_transform.Ctx()
+    with timing.phase('transStmts'):
+        stmts = array_transform.transStmts(m.stmts, transCtx)
+    with timing.phase('compileBytecode'):
+        vars = [x for (x, _) in st.types()] + list(transCtx.freshVars)
+        ctx = Ctx(vars, maxArraySize)
+        compileStmts(stmts, ctx)
+        ctx.emit(HALT)
+    return Program(array('i', ctx.code), ctx.registers)
+
+# Threaded code: before running a program, every instruction is decoded once into a
+# handler, a closure over the registers and its operands. Calling the handler executes the
+# instruction and returns the position of the next instruction, or -1 after HALT. The
+# dispatch loop is just pc = handlers[pc](), no opcode is compared with another one.
+
+type Handler = Callable[[], int]
+type Registers = list[Any]
+
+def _indexError(a: list[Any], i: int) -> IndexError:
+    return IndexError(f'array index {i} out of bounds for length {len(a)}')
+
+def _mov(r: Registers, nxt: int, d: int, a: int) -> Handler:
+    def h() -> int:
+        r[d] = r[a]
+        return nxt
+    return h
+
+def _add(r: Registers, nxt: int, d: int, a: int, b: int) -> Handler:
+    def h() -> int:
+        r[d] = r[a] + r[b]
+        return nxt
+    return h
+
+def _sub(r: Registers, nxt: int, d: int, a: int, b: int) -> Handler:
+    def h() -> int:
+        r[d] = r[a] - r[b]
+        return nxt
+    return h
+
+def _mul(r: Registers, nxt: int, d: int, a: int, b: int) -> Handler:
+    def h() -> int:
+        r[d] = r[a] * r[b]
+        return nxt
+    return h
+
+def _jmp(r: Registers, nxt: int, t: int) -> Handler:
+    return lambda: t
+
+def _jnlt(r: Registers, nxt: int, a: int, b: int, t: int) -> Handler:
+    return lambda: nxt if r[a] < r[b] else t
+
+def _jnle(r: Registers, nxt: int, a: int, b: int, t: int) -> Handler:
+    return lambda: nxt if r[a] <= r[b] else t
+
+def _jngt(r: Registers, nxt: int, a: int, b: int, t: int) -> Handler:
+    return lambda: nxt if r[a] > r[b] else t
+
+def _jnge(r: Registers, nxt: int, a: int, b: int, t: int) -> Handler:
+    return lambda: nxt if r[a] >= r[b] else t
+
+def _jneq(r: Registers, nxt: int, a: int, b: int, t: int) -> Handler:
+    return lambda: nxt if r[a] == r[b] else t
+
+def _jnne(r: Registers, nxt: int, a: int, b: int, t: int) -> Handler:
+    return lambda: nxt if r[a] != r[b] else t
+
+def _jfalse(r: Registers, nxt: int, c: int, t: int) -> Handler:
+    return lambda: nxt if r[c] else t
+
+def _jtrue(r: Registers, nxt: int, c: int, t: int) -> Handler:
+    return lambda: t if r[c] else nxt
+
+def _load(r: Registers, nxt: int, d: int, a: int, b: int) -> Handler:
+    def h() -> int:
+        arr = r[a]
+        i = r[b]
+        # Unlike python lists, arrays have no negative indices (as in the wasm code)
+        if i < 0 or i >= len(arr):
+            raise _indexError(arr, i)
+        r[d] = arr[i]
+        return nxt
+    return h
+
+def _store(r: Registers, nxt: int, a: int, b: int, v: int) -> Handler:
+    def h() -> int:
+        arr = r[a]
+        i = r[b]
+        if i < 0 or i >= len(arr):
+            raise _indexError(arr, i)
+        arr[i] = r[v]
+        return nxt
+    return h
+
+def _lt(r: Registers, nxt: int, d: int, a: int, b: int) -> Handler:
+    def h() -> int:
+        r[d] = r[a] < r[b]
+        return nxt
+    return h
+
+def _le(r: Registers, nxt: int, d: int, a: int, b: int) -> Handler:
+    def h() -> int:
+        r[d] = r[a] <= r[b]
+        return nxt
+    return h
+
+def _gt(r: Registers, nxt: int, d: int, a: int, b: int) -> Handler:
+    def h() -> int:
+        r[d] = r[a] > r[b]
+        return nxt
+    return h
+
+def _ge(r: Registers, nxt: int, d: int, a: int, b: int) -> Handler:
+    def h() -> int:
+        r[d] = r[a] >= r[b]
+        return nxt
+    return h
+
+def _eq(r: Registers, nxt: int, d: int, a: int, b: int) -> Handler:
+    def h() -> int:
+        r[d] = r[a] == r[b]
+        return nxt
+    return h
+
+def _ne(r: Registers, nxt: int, d: int, a: int, b: int) -> Handler:
+    def h() -> int:
+        r[d] = r[a] != r[b]
+        return nxt
+    return h
+
+def _is(r: Registers, nxt: int, d: int, a: int, b: int) -> Handler:
+    def h() -> int:
+        r[d] = r[a] is r[b]
+        return nxt
+    return h
+
+def _neg(r: Registers, nxt: int, d: int, a: int) -> Handler:
+    def h() -> int:
+        r[d] = -r[a]
+        return nxt
+    return h
+
+def _not(r: Registers, nxt: int, d: int, a: int) -> Handler:
+    def h() -> int:
+        r[d] = not r[a]
+        return nxt
+    return h
+
+def _len(r: Registers, nxt: int, d: int, a: int) -> Handler:
+    def h() -> int:
+        r[d] = len(r[a])
+        return nxt
+    return h
+
+def _print(r: Registers, nxt: int, a: int) -> Handler:
+    def h() -> int:
+        print(r[a])
+        return nxt
+    return h
+
+def _input(r: Registers, nxt: int, d: int) -> Handler:
+    def h() -> int:
+        r[d] = int(utils.inputInt('Enter some int: '))
+        return nxt
+    return h
+
+def _newarr(r: Registers, nxt: int, d: int, a: int, v: int, k: int) -> Handler:
+    def h() -> int:
+        n = r[a]
+        if n < 0 or n >= k:
+            raise ArraySizeError(f'invalid array size {n}')
+        r[d] = n * [r[v]]
+        return nxt
+    return h
+
+def _newarrs(r: Registers, nxt: int, d: int, k: int, *elems: int) -> Handler:
+    def h() -> int:
+        r[d] = [r[x] for x in elems]
+        return nxt
+    return h
+
+def _halt(r: Registers, nxt: int) -> Handler:
+    return lambda: -1
+
+# Indexed by opcode
+_HANDLERS: list[Callable[..., Handler]] = [
+    _mov, _add, _sub, _mul, _jmp, _jnlt, _jnle, _jngt, _jnge, _jneq, _jnne, _jfalse, _jtrue,
+    _load, _store, _lt, _le, _gt, _ge, _eq, _ne, _is, _neg, _not, _len, _print, _input,
+    _newarr, _newarrs, _halt]
+
+def decode(prog: Program, r: Registers) -> list[Optional[Handler]]:
+    """
+    Decodes prog to threaded code operating on the registers r. The handler of an
+    instruction is at the position of its opcode, the positions of operands are None.
+    """
+    code = prog.code
+    handlers: list[Optional[Handler]] = [None] * len(code)
+    pc = 0
+    while pc < len(code):
+        op = code[pc]
+        n = _ARITY[op]
+        if n is None:
+            n = code[pc + 2] + 2
+        nxt = pc + 1 + n
+        handlers[pc] = _HANDLERS[op](r, nxt, *code[pc + 1:nxt])
+        pc = nxt
+    return handlers
+
+def run(prog: Program):
+    """
+    The dispatch loop, see decode.
+    """
+    r = list(prog.registers)
+    handlers = cast(list[Handler], decode(prog, r))
+    pc = 0
+    while pc >= 0:
+        pc = handlers[pc]()
+
+def interpModule(m: plainAst.mod):
+    prog = compileModule(m)
+    if log.isDebug():
+        log.debug(f'Bytecode:\n{prog.disassemble()}')
+    run(prog)
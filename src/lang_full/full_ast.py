@@ -1,187 +1,215 @@
-# AUTOMATICALLY GENERATED (2024-07-23 16:01:08)
+# AUTOMATICALLY GENERATED (2026-10-19 16:43:13)
 from __future__ import annotations
 from dataclasses import dataclass
+from typing import Any, Self
+import weakref
 
 type optional[T] = T | None
 
-@dataclass(frozen=True)
+# There is only one Ident for every name, so identifiers are compared and hashed by identity.
+# The table holds its Idents weakly, so a long-running process (e.g. the compiler server)
+# only keeps the identifiers still in use.
+_idents: weakref.WeakValueDictionary[str, Ident] = weakref.WeakValueDictionary()
+
+@dataclass(frozen=True, slots=True, eq=False, weakref_slot=True)
 class Ident:
     name: str
+    def __new__(cls, name: str) -> Ident:
+        x = _idents.get(name)
+        if x is None:
+            x = _idents.setdefault(name, object.__new__(cls))
+        return x
+    def __getnewargs__(self) -> tuple[str]:
+        return (self.name,)
 
 type ident = Ident
 type string = str
 
-@dataclass
-class USub:
+# At most one entry per class, so this table stays small
+_singletons: dict[type, Any] = {}
+
+class Singleton:
+    """
+    Base class of the constructors without fields, every such constructor has only one instance.
+    """
+    __slots__ = ()
+    def __new__(cls) -> Self:
+        x = _singletons.get(cls)
+        if x is None:
+            x = _singletons.setdefault(cls, object.__new__(cls))
+        return x
+
+@dataclass(slots=True, eq=False)
+class USub(Singleton):
     pass
 
-@dataclass
-class Not:
+@dataclass(slots=True, eq=False)
+class Not(Singleton):
     pass
 
 type unaryop = USub | Not
 
-@dataclass
-class Add:
+@dataclass(slots=True, eq=False)
+class Add(Singleton):
     pass
 
-@dataclass
-class Sub:
+@dataclass(slots=True, eq=False)
+class Sub(Singleton):
     pass
 
-@dataclass
-class Mul:
+@dataclass(slots=True, eq=False)
+class Mul(Singleton):
     pass
 
-@dataclass
-class Less:
+@dataclass(slots=True, eq=False)
+class Less(Singleton):
     pass
 
-@dataclass
-class LessEq:
+@dataclass(slots=True, eq=False)
+class LessEq(Singleton):
     pass
 
-@dataclass
-class Greater:
+@dataclass(slots=True, eq=False)
+class Greater(Singleton):
     pass
 
-@dataclass
-class GreaterEq:
+@dataclass(slots=True, eq=False)
+class GreaterEq(Singleton):
     pass
 
-@dataclass
-class Eq:
+@dataclass(slots=True, eq=False)
+class Eq(Singleton):
     pass
 
-@dataclass
-class NotEq:
+@dataclass(slots=True, eq=False)
+class NotEq(Singleton):
     pass
 
-@dataclass
-class Is:
+@dataclass(slots=True, eq=False)
+class Is(Singleton):
     pass
 
-@dataclass
-class And:
+@dataclass(slots=True, eq=False)
+class And(Singleton):
     pass
 
-@dataclass
-class Or:
+@dataclass(slots=True, eq=False)
+class Or(Singleton):
     pass
 
 type binaryop = Add | Sub | Mul | Less | LessEq | Greater | GreaterEq | Eq | NotEq | Is | And | Or
 
-@dataclass
-class Int:
+@dataclass(slots=True, eq=False)
+class Int(Singleton):
     pass
 
-@dataclass
-class Bool:
+@dataclass(slots=True, eq=False)
+class Bool(Singleton):
     pass
 
-@dataclass
+@dataclass(slots=True)
 class Array:
     elemTy: ty
 
-@dataclass
+@dataclass(slots=True)
 class Fun:
     params: list[ty]
     result: resultTy
 
-@dataclass
+@dataclass(slots=True)
 class Class:
     name: ident
 
-@dataclass
+@dataclass(slots=True)
 class Interface:
     name: ident
 
 type ty = Int | Bool | Array | Fun | Class | Interface
 
-@dataclass
+@dataclass(slots=True)
 class NotVoid:
     ty: ty
 
-@dataclass
-class Void:
+@dataclass(slots=True, eq=False)
+class Void(Singleton):
     pass
 
 type resultTy = NotVoid | Void
 
-@dataclass
-class Var:
+@dataclass(slots=True, eq=False)
+class Var(Singleton):
     pass
 
-@dataclass
-class UserFun:
+@dataclass(slots=True, eq=False)
+class UserFun(Singleton):
     pass
 
-@dataclass
-class BuiltinFun:
+@dataclass(slots=True, eq=False)
+class BuiltinFun(Singleton):
     pass
 
 type scope = Var | UserFun | BuiltinFun
 
-@dataclass
+@dataclass(slots=True)
 class FunParam:
     var: ident
     ty: ty
 
 type funParam = FunParam
 
-@dataclass
+@dataclass(slots=True)
 class IntConst:
     value: int
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class BoolConst:
     value: bool
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class Name:
     var: ident
     scope: optional[scope] = None
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class Call:
     fun: exp
     args: list[exp]
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class UnOp:
     op: unaryop
     arg: exp
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class BinOp:
     left: exp
     op: binaryop
     right: exp
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class ArrayInitDyn:
     len: exp
     elemInit: exp
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class ArrayInitStatic:
     elemInit: list[exp]
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class Subscript:
     array: exp
     index: exp
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class Closure:
     params: list[funParam]
     body: exp
@@ -189,39 +217,39 @@ class Closure:
 
 type exp = IntConst | BoolConst | Name | Call | UnOp | BinOp | ArrayInitDyn | ArrayInitStatic | Subscript | Closure
 
-@dataclass
+@dataclass(slots=True)
 class StmtExp:
     exp: exp
 
-@dataclass
+@dataclass(slots=True)
 class Assign:
     var: ident
     right: exp
 
-@dataclass
+@dataclass(slots=True)
 class IfStmt:
     cond: exp
     thenBody: list[stmt]
     elseBody: list[stmt]
 
-@dataclass
+@dataclass(slots=True)
 class WhileStmt:
     cond: exp
     body: list[stmt]
 
-@dataclass
+@dataclass(slots=True)
 class SubscriptAssign:
     left: exp
     index: exp
     right: exp
 
-@dataclass
+@dataclass(slots=True)
 class Return:
     result: optional[exp] = None
 
 type stmt = StmtExp | Assign | IfStmt | WhileStmt | SubscriptAssign | Return
 
-@dataclass
+@dataclass(slots=True)
 class FunDef:
     name: ident
     params: list[funParam]
@@ -230,14 +258,14 @@ class FunDef:
 
 type fun = FunDef
 
-@dataclass
+@dataclass(slots=True)
 class FieldDecl:
     ty: ty
     name: ident
 
 type fieldDecl = FieldDecl
 
-@dataclass
+@dataclass(slots=True)
 class MethodSig:
     name: ident
     params: list[funParam]
@@ -245,14 +273,14 @@ class MethodSig:
 
 type methodSig = MethodSig
 
-@dataclass
+@dataclass(slots=True)
 class MethodDecl:
     sig: methodSig
     body: list[stmt]
 
 type methodDecl = MethodDecl
 
-@dataclass
+@dataclass(slots=True)
 class ClassDecl:
     name: ident
     extends: optional[ident]
@@ -262,14 +290,14 @@ class ClassDecl:
 
 type classDecl = ClassDecl
 
-@dataclass
+@dataclass(slots=True)
 class InterfaceDecl:
     name: ident
     methods: list[methodSig]
 
 type interfaceDecl = InterfaceDecl
 
-@dataclass
+@dataclass(slots=True)
 class Module:
     interfaces: list[interfaceDecl]
     classes: list[classDecl]
@@ -0,0 +1,226 @@
+"""
+Closure-compiling interpreter for lang_fun (interp --engine=closure).
+
+After type checking, the AST is compiled once into nested python closures. Variables are
+resolved to slots of the frame of the enclosing function, operators are bound when
+compiling, and while/if become python loops and conditionals. Calls of user-defined
+functions are bound directly to the compiled function if the callee is known.
+
+The closure of a statement returns None if execution continues with the next statement,
+and a tuple (v,) if the statement executed return v.
+"""
+from lang_fun.fun_ast import *
+import lang_fun.fun_tychecker as fun_tychecker
+import common.utils as utils
+import common.timing as timing
+from typing import *
+import operator
+
+type Frame = list[Any]
+type Code = Callable[[Frame], Any]
+type Slots = dict[Ident, int]
+
+class Function:
+    """
+    A compiled function, the value of a function name at runtime.
+    """
+    def __init__(self, name: Ident, slots: Slots):
+        self.name = name
+        self.slots = slots
+        self.body: Code = lambda _f: None
+    def __repr__(self):
+        return f'Function({self.name.name})'
+
+type FunEnv = dict[Ident, Function]
+
+# Closures for binary operators without short-circuit evaluation, for arbitrary operands
+# and for a constant right operand.
+_BINOPS: dict[type, Callable[[Code, Code], Code]] = {
+    Add: lambda l, r: lambda f: l(f) + r(f),
+    Sub: lambda l, r: lambda f: l(f) - r(f),
+    Mul: lambda l, r: lambda f: l(f) * r(f),
+    Less: lambda l, r: lambda f: l(f) < r(f),
+    LessEq: lambda l, r: lambda f: l(f) <= r(f),
+    Greater: lambda l, r: lambda f: l(f) > r(f),
+    GreaterEq: lambda l, r: lambda f: l(f) >= r(f),
+    Eq: lambda l, r: lambda f: l(f) == r(f),
+    NotEq: lambda l, r: lambda f: l(f) != r(f),
+    Is: lambda l, r: lambda f: l(f) is r(f),
+}
+_BINOPS_CONST: dict[type, Callable[[Code, Any], Code]] = {
+    Add: lambda l, c: lambda f: l(f) + c,
+    Sub: lambda l, c: lambda f: l(f) - c,
+    Mul: lambda l, c: lambda f: l(f) * c,
+    Less: lambda l, c: lambda f: l(f) < c,
+    LessEq: lambda l, c: lambda f: l(f) <= c,
+    Greater: lambda l, c: lambda f: l(f) > c,
+    GreaterEq: lambda l, c: lambda f: l(f) >= c,
+    Eq: lambda l, c: lambda f: l(f) == c,
+    NotEq: lambda l, c: lambda f: l(f) != c,
+}
+
+def _const(v: Any) -> Code:
+    return lambda _f: v
+
+def _callFunction(fun: Function, args: list[Any]) -> Any:
+    frame = args + (len(fun.slots) - len(args)) * [None]
+    r = fun.body(frame)
+    return None if r is None else r[0]
+
+def compileFuncall(fun: exp, args: list[exp], slots: Slots, funs: FunEnv) -> Code:
+    match (fun, args):
+        case (Name(Ident('input_int')), []):
+            return lambda _f: int(utils.inputInt('Enter some int: '))
+        case (Name(Ident('print')), [e]):
+            c = compileExp(e, slots, funs)
+            def run(f: Frame):
+                print(c(f))
+            return run
+        case (Name(Ident('len')), [e]):
+            c = compileExp(e, slots, funs)
+            return lambda f: len(c(f))
+        case (Name(x, UserFun()), _):
+            # The callee is known, no need to evaluate it at runtime
+            g = funs[x]
+            cs = [compileExp(a, slots, funs) for a in args]
+            return lambda f: _callFunction(g, [c(f) for c in cs])
+        case _:
+            callee = compileExp(fun, slots, funs)
+            cs = [compileExp(a, slots, funs) for a in args]
+            def call(f: Frame):
+                g = callee(f)
+                return _callFunction(g, [c(f) for c in cs])
+            return call
+
+def compileExp(e: exp, slots: Slots, funs: FunEnv) -> Code:
+    match e:
+        case IntConst(value):
+            return _const(value)
+        case BoolConst(value):
+            return _const(value)
+        case Call(fun, args):
+            return compileFuncall(fun, args, slots, funs)
+        case UnOp(op, sub):
+            c = compileExp(sub, slots, funs)
+            match op:
+                case USub(): return lambda f: -c(f)
+                case Not(): return lambda f: not c(f)
+        case BinOp(left, And(), right):
+            (l, r) = (compileExp(left, slots, funs), compileExp(right, slots, funs))
+            return lambda f: r(f) if l(f) else False
+        case BinOp(left, Or(), right):
+            (l, r) = (compileExp(left, slots, funs), compileExp(right, slots, funs))
+            return lambda f: True if l(f) else r(f)
+        case BinOp(left, op, IntConst(value) | BoolConst(value)) if type(op) in _BINOPS_CONST:
+            return _BINOPS_CONST[type(op)](compileExp(left, slots, funs), value)
+        case BinOp(left, op, right):
+            return _BINOPS[type(op)](compileExp(left, slots, funs), compileExp(right, slots, funs))
+        case Name(name):
+            if name in slots:
+                return operator.itemgetter(slots[name])
+            else:
+                return _const(funs[name])
+        case ArrayInitDyn(lenExp, initExp):
+            (n, v) = (compileExp(lenExp, slots, funs), compileExp(initExp, slots, funs))
+            return lambda f: n(f) * [v(f)]
+        case ArrayInitStatic(es):
+            cs = [compileExp(e, slots, funs) for e in es]
+            return lambda f: [c(f) for c in cs]
+        case Subscript(arrayExp, indexExp):
+            (a, i) = (compileExp(arrayExp, slots, funs), compileExp(indexExp, slots, funs))
+            return lambda f: a(f)[i(f)]
+    raise Exception(f'No match for expression {e}')
+
+def compileStmt(s: stmt, slots: Slots, funs: FunEnv) -> Code:
+    match s:
+        case StmtExp(e):
+            c = compileExp(e, slots, funs)
+            def stmtExp(f: Frame):
+                c(f)
+            return stmtExp
+        case Assign(x, e):
+            (i, c) = (slots[x], compileExp(e, slots, funs))
+            def assign(f: Frame):
+                f[i] = c(f)
+            return assign
+        case IfStmt(cond, thenBody, elseBody):
+            (c, t, el) = (compileExp(cond, slots, funs), compileStmts(thenBody, slots, funs),
+                          compileStmts(elseBody, slots, funs))
+            return lambda f: t(f) if c(f) else el(f)
+        case WhileStmt(cond, body):
+            (c, b) = (compileExp(cond, slots, funs), compileStmts(body, slots, funs))
+            def whileStmt(f: Frame):
+                while c(f):
+                    r = b(f)
+                    if r is not None:
+                        return r
+            return whileStmt
+        case SubscriptAssign(leftExp, idxExp, rightExp):
+            # Same evaluation order as in fun_interp
+            (i, r, a) = (compileExp(idxExp, slots, funs), compileExp(rightExp, slots, funs),
+                         compileExp(leftExp, slots, funs))
+            def subscriptAssign(f: Frame):
+                idx = i(f)
+                v = r(f)
+                a(f)[idx] = v
+            return subscriptAssign
+        case Return(e):
+            if e is None:
+                return _const((None,))
+            c = compileExp(e, slots, funs)
+            return lambda f: (c(f),)
+
+def compileStmts(stmts: list[stmt], slots: Slots, funs: FunEnv) -> Code:
+    cs = tuple(compileStmt(s, slots, funs) for s in stmts)
+    match cs:
+        case ():
+            return _const(None)
+        case (c,):
+            return c
+        case _:
+            def block(f: Frame):
+                for c in cs:
+                    r = c(f)
+                    if r is not None:
+                        return r
+            return block
+
+def assignedVars(stmts: list[stmt], acc: Slots):
+    """
+    Assigns a slot to every variable assigned in stmts.
+    """
+    for s in stmts:
+        match s:
+            case Assign(x, _):
+                if x not in acc:
+                    acc[x] = len(acc)
+            case IfStmt(_, thenBody, elseBody):
+                assignedVars(thenBody, acc)
+                assignedVars(elseBody, acc)
+            case WhileStmt(_, body):
+                assignedVars(body, acc)
+            case _:
+                pass
+
+def compileModule(m: Module) -> Code:
+    funs: FunEnv = {}
+    for d in m.funs:
+        # The parameters occupy the first slots of the frame
+        slots: Slots = {p.var: i for (i, p) in enumerate(d.params)}
+        assignedVars(d.body, slots)
+        funs[d.name] = Function(d.name, slots)
+    for d in m.funs:
+        fun = funs[d.name]
+        fun.body = compileStmts(d.body, fun.slots, funs)
+    slots = {}
+    assignedVars(m.stmts, slots)
+    code = compileStmts(m.stmts, slots, funs)
+    return lambda _f: code(len(slots) * [None])
+
+def interpModule(m: mod):
+    utils.assertType(m, Module)
+    with timing.phase('tycheckModule'):
+        fun_tychecker.tycheckModule(m)
+    with timing.phase('compileClosures'):
+        code = compileModule(m)
+    code([])
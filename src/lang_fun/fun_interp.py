@@ -3,39 +3,72 @@ import lang_fun.fun_tychecker as fun_tychecker
 import common.utils as utils
 import common.log as log
 from typing import *
-
-@dataclass(frozen=True)
-class Address:
-    value: int
-    def __repr__(self):
-        return f'Address({self.value})'
+import common.timing as timing
+import common.slots as slots
+import common.arrayStore as arrayStore
+import sys
 
 type FunEnv = dict[Ident, FunDef]
-type Env = dict[Ident, TyValue]
+type Env = list[Any] # indexed by the slots of the variables
+type Address = arrayStore.Handle
 type TyValue = int | bool | Address | FunDef
-type StoreValue = list[TyValue]
 
-class ReturnException(Exception):
-    def __init__(self, value: TyValue | None):
-        self.value = value
+# Statements signal how execution continues through their result, not through exceptions:
+# None continues with the next statement, Returned leaves the current function and
+# TailCall replaces the current call by a call of another function (see callFunction).
+
+@dataclass(frozen=True)
+class Returned:
+    value: Optional[TyValue]
+
+@dataclass(frozen=True)
+class TailCall:
+    fun: FunDef
+    args: list[TyValue]
+
+type Status = Returned | TailCall | None
+
+DEFAULT_MAX_CALL_DEPTH = 1000
+# Upper bound for the python frames used by the interpreter for one call of a user-defined
+# function, including nested statements and expressions.
+_PYTHON_FRAMES_PER_CALL = 20
 
-class Store:
-    def __init__(self):
-        self.content: dict[Address, StoreValue] = {}
+class Store(arrayStore.ArrayStore):
+    def __init__(self, maxCallDepth: int = DEFAULT_MAX_CALL_DEPTH):
+        super().__init__()
         self.funEnv: FunEnv = {}
-        self.__freshAddress = Address(0)
-    def alloc(self, val: StoreValue):
-        x = self.__freshAddress
-        self.__freshAddress = Address(x.value + 1)
-        self.content[x] = val
-        return x
-    def resolve(self, a: Address) -> StoreValue:
-        return self.content[a]
-    def storeValue(self, a: Address, i: int, v: TyValue):
-        l = self.content[a]
-        l[i] = v
-    def __repr__(self):
-        return f'Store({self.content})'
+        self.frameSizes: dict[Ident, int] = {} # number of slots for every function
+        self.callDepth = 0
+        self.maxCallDepth = maxCallDepth
+
+def isBuiltinCall(fun: exp, args: list[exp]) -> bool:
+    match (fun, args):
+        case (Name(Ident('input_int')), []) | (Name(Ident('print' | 'len')), [_]):
+            return True
+        case _:
+            return False
+
+def callFunction(f: FunDef, args: list[TyValue], store: Store) -> Optional[TyValue]:
+    """
+    Calls f with the given arguments. Tail calls in the body of f do not nest, they
+    continue in the loop of this function.
+    """
+    if store.callDepth >= store.maxCallDepth:
+        raise RecursionError(f'maximum call depth of {store.maxCallDepth} exceeded')
+    store.callDepth += 1
+    try:
+        while True:
+            # The parameters occupy the first slots of the frame
+            localEnv: Env = args + (store.frameSizes[f.name] - len(args)) * [None]
+            match interpStmts(f.body, localEnv, store):
+                case TailCall(g, gArgs):
+                    (f, args) = (g, gArgs)
+                case Returned(v):
+                    return v
+                case None:
+                    return None
+    finally:
+        store.callDepth -= 1
 
 def interpFuncall(fun: exp, args: list[exp], env: Env, store: Store) -> Optional[TyValue]:
     match (fun, args):
@@ -47,17 +80,11 @@ def interpFuncall(fun: exp, args: list[exp], env: Env, store: Store) -> Optional
             return None
         case (Name(Ident('len')), [e]):
             v = asAddress(interpExp(e, env, store))
-            return len(store.resolve(v))
+            return store.length(v)
         case _:
             f = asFunDef(interpExp(fun, env, store))
-            xs = [p.var for p in f.params]
             vs = [asValue(interpExp(a, env, store)) for a in args]
-            localEnv = cast(Env, store.funEnv.copy())
-            localEnv.update(zip(xs, vs))
-            try:
-                interpStmts(f.body, localEnv, store)
-            except ReturnException as e:
-                return e.value
+            return callFunction(f, vs, store)
 
 def asInt(v: Optional[TyValue]) -> int:
     assert isinstance(v, int)
@@ -72,13 +99,23 @@ def asValue(v: Optional[TyValue]) -> TyValue:
     return v
 
 def asAddress(v: Optional[TyValue]) -> Address:
-    assert isinstance(v, Address)
+    assert isinstance(v, int)
     return v
 
 def asFunDef(v: Optional[TyValue]) -> FunDef:
     assert isinstance(v, FunDef)
     return v
 
+def elemKind(t: Optional[resultTy]) -> arrayStore.ElemKind:
+    """
+    The kind of the elements of an array of type t.
+    """
+    match t:
+        case NotVoid(Array(Int())): return 'int'
+        case NotVoid(Array(Bool())): return 'bool'
+        case NotVoid(Array(Array())): return 'array'
+        case _: return 'other'
+
 def interpExp(e: exp, env: Env, store: Store) -> Optional[TyValue]:
     match e:
         case IntConst(value):
@@ -104,7 +141,7 @@ def interpExp(e: exp, env: Env, store: Store) -> Optional[TyValue]:
                 case GreaterEq(): return x >= interpExp(right, env, store)
                 case Eq(): return x == interpExp(right, env, store)
                 case NotEq(): return x != interpExp(right, env, store)
-                case Is(): return x == interpExp(right, env, store) # compare Address values by ==
+                case Is(): return x == interpExp(right, env, store) # compare handles by ==
                 case And():
                     if x:
                         return interpExp(right, env, store)
@@ -115,69 +152,87 @@ def interpExp(e: exp, env: Env, store: Store) -> Optional[TyValue]:
                         return True
                     else:
                         return interpExp(right, env, store)
+        case Name(slot=int(i)):
+            return env[i]
         case Name(name):
-            if name in env:
-                return env[name]
-            else:
-                return store.funEnv[name]
-        case ArrayInitDyn(lenExp, initExp):
+            return store.funEnv[name]
+        case ArrayInitDyn(lenExp, initExp, t):
             n = asInt(interpExp(lenExp, env, store))
             v = asValue(interpExp(initExp, env, store))
-            return store.alloc(n * [v])
-        case ArrayInitStatic(es):
+            return store.alloc(elemKind(t), [v], n)
+        case ArrayInitStatic(es, t):
             l = [asValue(interpExp(e, env, store)) for e in es]
-            return store.alloc(l)
+            return store.alloc(elemKind(t), l)
         case Subscript(arrayExp, indexExp):
             a = asAddress(interpExp(arrayExp, env, store))
             i = asInt(interpExp(indexExp, env, store))
-            l = store.resolve(a)
-            return l[i]
+            return store.load(a, i)
     raise Exception(f'No match for expression {e}')
 
-def interpStmt(s: stmt, env: Env, store: Store, cont: list[stmt]) -> None:
+def interpStmt(s: stmt, env: Env, store: Store) -> Status:
     match s:
         case StmtExp(e):
             interpExp(e, env, store)
-            interpStmts(cont, env, store)
-        case Assign(x, e):
+        case Assign(_, e, int(i)):
             v: Any = interpExp(e, env, store)
-            env[x] = v
-            interpStmts(cont, env, store)
+            env[i] = v
+        case Assign(x, _):
+            raise ValueError(f'Variable {x.name} has no slot')
         case IfStmt(cond, thenBody, elseBody):
             v = asBool(interpExp(cond, env, store))
             if v:
-                interpStmts(thenBody + cont, env, store)
+                return interpStmts(thenBody, env, store)
             else:
-                interpStmts(elseBody + cont, env, store)
+                return interpStmts(elseBody, env, store)
         case WhileStmt(cond, body):
-            v = asBool(interpExp(cond, env, store))
-            if v:
-                interpStmts(body + [s] + cont, env, store)
-            else:
-                interpStmts(cont, env, store)
+            while asBool(interpExp(cond, env, store)):
+                r = interpStmts(body, env, store)
+                if r is not None:
+                    return r
         case SubscriptAssign(leftExp, idxExp, rightExp):
             idx = asInt(interpExp(idxExp, env, store))
             v = interpExp(rightExp, env, store)
             a = asAddress(interpExp(leftExp, env, store))
             store.storeValue(a, idx, v)
-            interpStmts(cont, env, store)
+        case Return(Call(fun, args)) if not isBuiltinCall(fun, args):
+            f = asFunDef(interpExp(fun, env, store))
+            return TailCall(f, [asValue(interpExp(a, env, store)) for a in args])
         case Return(e):
             if e is not None:
-                x = interpExp(e, env, store)
+                return Returned(interpExp(e, env, store))
             else:
-                x = None
-            raise ReturnException(x)
+                return Returned(None)
+    return None
 
-def interpStmts(stmts: list[stmt], env: Env, store: Store) -> None:
-    if len(stmts) > 0:
-        interpStmt(stmts[0], env, store, stmts[1:])
+def interpStmts(stmts: list[stmt], env: Env, store: Store) -> Status:
+    for s in stmts:
+        r = interpStmt(s, env, store)
+        if r is not None:
+            return r
+    return None
 
-def interpModule(m: mod):
+def interpModule(m: mod, maxCallDepth: int = DEFAULT_MAX_CALL_DEPTH):
+    """
+    Runs m. A RecursionError is raised if the depth of the calls (not counting tail calls)
+    exceeds maxCallDepth.
+    """
     utils.assertType(m, Module)
-    fun_tychecker.tycheckModule(m)
-    env: Env = {}
-    store = Store()
+    with timing.phase('tycheckModule'):
+        tyRes = fun_tychecker.tycheckModule(m)
+    store = Store(maxCallDepth)
     for f in m.funs:
         store.funEnv[f.name] = f
-    interpStmts(m.stmts, env, store)
+        layout = slots.layout([p.var for p in f.params] +
+                              [x.name for x in tyRes.funLocals[f.name]])
+        slots.assignSlots(f.body, layout)
+        store.frameSizes[f.name] = len(layout)
+    layout = slots.layout(x.name for x in tyRes.toplevelLocals)
+    slots.assignSlots(m.stmts, layout)
+    env: Env = len(layout) * [None]
+    oldLimit = sys.getrecursionlimit()
+    sys.setrecursionlimit(oldLimit + maxCallDepth * _PYTHON_FRAMES_PER_CALL)
+    try:
+        interpStmts(m.stmts, env, store)
+    finally:
+        sys.setrecursionlimit(oldLimit)
     log.debug(f'After executing program.\nEnv: {env}\nStore: {store}')
@@ -0,0 +1,15 @@
+"""
+Runs lang_fun programs by transpiling them to python (interp --engine=pyast), see
+common/pyastTranspiler.py.
+"""
+from lang_fun.fun_ast import *
+import lang_fun.fun_tychecker as fun_tychecker
+import common.pyastTranspiler as pyastTranspiler
+import common.utils as utils
+import common.timing as timing
+
+def interpModule(m: mod):
+    utils.assertType(m, Module)
+    with timing.phase('tycheckModule'):
+        fun_tychecker.tycheckModule(m)
+    pyastTranspiler.runModule(m)
@@ -46,6 +46,20 @@ def atomic(needAtomic: bool, e: atom.exp, tmps: Temporaries, ctx: Ctx) -> tuple[
     else:
         return (e, tmps)
 
+def isArrayExp(e: exp) -> bool:
+    match e.ty:
+        case NotVoid(Array()):
+            return True
+        case _:
+            return False
+
+def isAtomicExp(e: exp) -> bool:
+    match e:
+        case IntConst() | BoolConst() | Name():
+            return True
+        case _:
+            return False
+
 def callTarget(e: exp, ctx: Ctx) -> tuple[atom.callTarget, Temporaries]:
     match e.ty:
         case NotVoid(Fun(paramTys, resultTy)):
@@ -75,10 +89,13 @@ def transExp(e: exp, needAtomic: bool, ctx: Ctx) -> tuple[atom.exp, Temporaries]
         case BoolConst(v):
             return (atom.AtomExp(atom.BoolConst(v, assertTy(t)), t), [])
         case Call(target, args):
-            (atomArgs, tmps) = utils.unzip([transExp(a, False, ctx) for a in args])
-            (atomTarget, tmps2) = callTarget(target, ctx)
+            (atomTarget, tmps1) = callTarget(target, ctx)
+            # An array passed as argument must not stay on the stack while evaluating a later
+            # argument runs the garbage collector. In this case, all arguments become atomic.
+            needAtomicArgs = any([isArrayExp(a) and not isAtomicExp(a) for a in args[:-1]])
+            (atomArgs, tmps2) = utils.unzip([transExp(a, needAtomicArgs, ctx) for a in args])
             return atomic(needAtomic, atom.Call(atomTarget, atomArgs, t),
-                          utils.flatten(tmps) + tmps2, ctx)
+                          tmps1 + utils.flatten(tmps2), ctx)
         case UnOp(op, sub):
             (atomSub, tmps) = transExp(sub, False, ctx)
             return atomic(needAtomic, atom.UnOp(op, atomSub, t), tmps, ctx)
@@ -128,7 +145,8 @@ def transStmt(s: stmt, ctx: Ctx) -> list[atom.stmt]:
         case WhileStmt(cond, body):
             (a, tmps1) = transExp(cond, False, ctx)
             stmts = transStmts(body, ctx)
-            return mkAssigns(tmps1) + [atom.WhileStmt(a, stmts)]
+            # The temporaries of the condition must be recomputed before every check
+            return mkAssigns(tmps1) + [atom.WhileStmt(a, stmts + mkAssigns(tmps1))]
         case SubscriptAssign(leftExp, indexExp, rightExp):
             (l, tmps1) = transExpAtomic(leftExp, ctx)
             (i, tmps2) = transExpAtomic(indexExp, ctx)
@@ -0,0 +1,283 @@
+"""
+Type checking and atomization of fun programs in a single traversal of the AST.
+
+tycheckTransModule is an alternative to fun_tychecker.tycheckModule followed by
+fun_transform.transFun and fun_transform.transStmts. It produces the same locals, the same
+functions and statements and the same temporaries, but visits every node only once. The
+type rules are those of fun_tychecker, the fresh variables are allocated with a
+fun_transform.Ctx for every function and for the toplevel statements.
+"""
+from __future__ import annotations
+from lang_fun.fun_ast import *
+import lang_fun.fun_astAtom as atom
+import lang_fun.fun_tychecker as fun_tychecker
+import lang_fun.fun_transform as fun_transform
+from lang_fun.fun_tychecker import ReturnType, TycheckResult, LocalVar
+from lang_fun.fun_transform import Ctx, Temporaries, mkAssigns
+from common.compileError import CompileError
+import common.log as log
+import common.symtab as symtab
+import common.utils as utils
+
+type Symtab = fun_tychecker.Symtab
+
+# Types are never modified, so all constants share their types
+intTy = NotVoid(Int())
+boolTy = NotVoid(Bool())
+
+def tyOf(a: atom.exp) -> resultTy:
+    return utils.assertNotNone(a.ty)
+
+def atomicIf(needAtomic: bool, a: atom.exp, tmps: Temporaries, ctx: Ctx) -> tuple[atom.exp, Temporaries]:
+    """
+    Converts the translated expression a to an atomic expression if needAtomic is True and a
+    is not already atomic.
+    """
+    match a:
+        case atom.AtomExp():
+            return (a, tmps)
+        case _:
+            return fun_transform.atomic(needAtomic, a, tmps, ctx)
+
+def toAtomic(a: atom.exp, tmps: Temporaries, ctx: Ctx) -> tuple[atom.atomExp, Temporaries]:
+    match atomicIf(True, a, tmps, ctx):
+        case (atom.AtomExp(x), tmps):
+            return (x, tmps)
+        case _:
+            utils.abort(f'atomic with needAtomic=True failed to return an atomic expression: {a}')
+
+def tyTransExp(e: exp, st: Symtab, ctx: Ctx) -> tuple[atom.exp, Temporaries]:
+    """
+    Type checks e and translates it to an expression of type fun_astAtom.exp, together
+    with the temporaries used by the translated expression. Like fun_tychecker.tycheckExp,
+    the type of e is also stored in e.ty.
+    """
+    (a, tmps) = _tyTransExp(e, st, ctx)
+    e.ty = a.ty
+    return (a, tmps)
+
+def tyTransExpNotVoid(e: exp, st: Symtab, ctx: Ctx) -> tuple[atom.exp, Temporaries, ty]:
+    (a, tmps) = tyTransExp(e, st, ctx)
+    return (a, tmps, fun_tychecker.assertNotVoid(tyOf(a), e))
+
+def tyTransBuiltinFuncall(target: exp, args: list[exp], st: Symtab, ctx: Ctx) \
+        -> tuple[atom.exp, Temporaries]:
+    atomArgs: list[atom.exp] = []
+    tmps: Temporaries = []
+    argTys: list[ty] = []
+    for arg in args:
+        (a, argTmps, argTy) = tyTransExpNotVoid(arg, st, ctx)
+        atomArgs.append(a)
+        tmps.extend(argTmps)
+        argTys.append(argTy)
+    funTy = fun_tychecker.builtinFunTy(target, args, argTys)
+    fun_tychecker.setBuiltinTarget(target, funTy)
+    match target:
+        case Name(x):
+            return (atom.Call(atom.CallTargetBuiltin(x), atomArgs, funTy.result), tmps)
+        case _:
+            utils.abort(f'Invalid target of builtin function call: {target}')
+
+def tyTransUserDefinedFuncall(target: exp, args: list[exp], st: Symtab, ctx: Ctx) \
+        -> tuple[atom.exp, Temporaries]:
+    (t, tmps, targetTy) = tyTransExpNotVoid(target, st, ctx)
+    funTy = fun_tychecker.assertFunTy(targetTy, args)
+    match target:
+        case Name(x, UserFun()):
+            atomTarget = atom.CallTargetDirect(x)
+        case Name(x, Var()):
+            atomTarget = atom.CallTargetIndirect(x, funTy.params, funTy.result)
+        case _:
+            match toAtomic(t, tmps, ctx):
+                case (atom.VarName(x), tmps):
+                    atomTarget = atom.CallTargetIndirect(x, funTy.params, funTy.result)
+                case _:
+                    utils.abort(f'Invalid call target after type checking: {target}')
+    # See fun_transform.transExp, the arguments are known to have the parameter types here.
+    needAtomicArgs = any([isinstance(p, Array) and not fun_transform.isAtomicExp(a)
+                          for (a, p) in zip(args[:-1], funTy.params)])
+    atomArgs: list[atom.exp] = []
+    for i, (arg, expectedTy) in enumerate(zip(args, funTy.params)):
+        (a, argTmps, argTy) = tyTransExpNotVoid(arg, st, ctx)
+        fun_tychecker.assertArgTy(i, expectedTy, argTy)
+        (a, argTmps) = atomicIf(needAtomicArgs, a, argTmps, ctx)
+        atomArgs.append(a)
+        tmps = tmps + argTmps
+    return (atom.Call(atomTarget, atomArgs, funTy.result), tmps)
+
+def _tyTransExp(e: exp, st: Symtab, ctx: Ctx) -> tuple[atom.exp, Temporaries]:
+    match e:
+        case IntConst(v):
+            if v < -2**63 or v > 2.**63 - 1:
+                raise CompileError.typeError(f'int constant too large: {v}')
+            return (atom.AtomExp(atom.IntConst(v, intTy.ty), intTy), [])
+        case BoolConst(v):
+            return (atom.AtomExp(atom.BoolConst(v, boolTy.ty), boolTy), [])
+        case Call(target, args):
+            if fun_tychecker.isBuiltinFuncall(target, args):
+                return tyTransBuiltinFuncall(target, args, st, ctx)
+            else:
+                return tyTransUserDefinedFuncall(target, args, st, ctx)
+        case UnOp(op, sub):
+            (atomSub, tmps, subTy) = tyTransExpNotVoid(sub, st, ctx)
+            t = fun_tychecker.unOpTy(e, op, subTy)
+            return (atom.UnOp(op, atomSub, t), tmps)
+        case BinOp(left, op, right):
+            (l, tmps1, leftTy) = tyTransExpNotVoid(left, st, ctx)
+            (r, tmps2, rightTy) = tyTransExpNotVoid(right, st, ctx)
+            t = fun_tychecker.binOpTy(left, op, right, leftTy, rightTy)
+            return (atom.BinOp(l, op, r, t), tmps1 + tmps2)
+        case Name(x):
+            xt = fun_tychecker.nameTy(x, st)
+            e.scope = fun_tychecker.nameScope(x, st)
+            match e.scope:
+                case UserFun():
+                    name = atom.FunName(x, xt)
+                case _:
+                    name = atom.VarName(x, xt)
+            return (atom.AtomExp(name, NotVoid(xt)), [])
+        case ArrayInitDyn(lenExp, initExp):
+            (l, tmps1, lenTy) = tyTransExpNotVoid(lenExp, st, ctx)
+            fun_tychecker.assertLenTy(lenExp, lenTy)
+            (atomLen, tmps1) = toAtomic(l, tmps1, ctx)
+            (i, tmps2, elemTy) = tyTransExpNotVoid(initExp, st, ctx)
+            (atomElem, tmps2) = toAtomic(i, tmps2, ctx)
+            t = NotVoid(Array(elemTy))
+            return (atom.ArrayInitDyn(atomLen, atomElem, t), tmps1 + tmps2)
+        case ArrayInitStatic([]):
+            raise CompileError.typeError(f'Cannot construct empty array')
+        case ArrayInitStatic(es):
+            atomElems: list[atom.atomExp] = []
+            tmps: Temporaries = []
+            elemTys: list[ty] = []
+            for elem in es:
+                (a, elemTmps, elemTy) = tyTransExpNotVoid(elem, st, ctx)
+                (atomElem, tmps) = toAtomic(a, tmps + elemTmps, ctx)
+                atomElems.append(atomElem)
+                elemTys.append(elemTy)
+            t = fun_tychecker.arrayInitStaticTy(es, elemTys)
+            return (atom.ArrayInitStatic(atomElems, t), tmps)
+        case Subscript(arrayExp, indexExp):
+            (arr, tmps1, arrayTy) = tyTransExpNotVoid(arrayExp, st, ctx)
+            (atomArr, tmps1) = toAtomic(arr, tmps1, ctx)
+            (index, tmps2, indexTy) = tyTransExpNotVoid(indexExp, st, ctx)
+            (atomIndex, tmps2) = toAtomic(index, tmps2, ctx)
+            t = fun_tychecker.subscriptTy(arrayExp, arrayTy, indexTy)
+            return (atom.Subscript(atomArr, atomIndex, t), tmps1 + tmps2)
+    raise Exception(f'No match for expression {e} ({e.__module__})')
+
+def tyTransStmt(s: stmt, st: Symtab, ctx: Ctx) -> tuple[list[atom.stmt], ReturnType | None]:
+    """
+    Type checks and translates s. The result type is not None if s contains a return statement.
+    """
+    match s:
+        case StmtExp(e):
+            (a, tmps) = tyTransExp(e, st, ctx)
+            match tyOf(a):
+                case Void():
+                    return (mkAssigns(tmps) + [atom.StmtExp(a)], None)
+                case NotVoid() as t:
+                    raise CompileError.typeError(
+                                f'Statement {s} has type {t} but ignores the result')
+        case Assign(x, e):
+            (a, tmps) = tyTransExp(e, st, ctx)
+            match tyOf(a):
+                case Void():
+                    raise CompileError.typeError(f'Left-hand side of assignment {s} is void')
+                case NotVoid(t):
+                    st.assign(x, t)
+                    return (mkAssigns(tmps) + [atom.Assign(x, a)], None)
+        case IfStmt(cond, thenBody, elseBody):
+            (a, tmps, t) = tyTransExpNotVoid(cond, st, ctx)
+            fun_tychecker.assertCondTy(cond, t)
+            nestedThen = st.copy()
+            (stmts1, ty1) = tyTransStmts(thenBody, nestedThen, ctx)
+            nestedElse = st.copy()
+            (stmts2, ty2) = tyTransStmts(elseBody, nestedElse, ctx)
+            st.mergeBack(nestedThen, nestedElse)
+            return (mkAssigns(tmps) + [atom.IfStmt(a, stmts1, stmts2)],
+                    fun_tychecker.ifReturnType(ty1, ty2))
+        case WhileStmt(cond, body):
+            (a, tmps, t) = tyTransExpNotVoid(cond, st, ctx)
+            fun_tychecker.assertCondTy(cond, t)
+            nested = st.copy()
+            (stmts, ty) = tyTransStmts(body, nested, ctx)
+            untaken = st.copy()
+            st.mergeBack(untaken, nested)
+            # The temporaries of the condition must be recomputed before every check
+            return (mkAssigns(tmps) + [atom.WhileStmt(a, stmts + mkAssigns(tmps))],
+                    None if ty is None else ty.maybe())
+        case SubscriptAssign(leftExp, indexExp, rightExp):
+            (l, tmps1, leftTy) = tyTransExpNotVoid(leftExp, st, ctx)
+            match leftTy:
+                case Array(elemTy):
+                    (atomLeft, tmps1) = toAtomic(l, tmps1, ctx)
+                    (i, tmps2, indexTy) = tyTransExpNotVoid(indexExp, st, ctx)
+                    fun_tychecker.assertIndexTy(indexExp, indexTy)
+                    (atomIndex, tmps2) = toAtomic(i, tmps2, ctx)
+                    (r, tmps3, rightTy) = tyTransExpNotVoid(rightExp, st, ctx)
+                    fun_tychecker.assertRightTy(rightExp, elemTy, rightTy)
+                    return (mkAssigns(tmps1 + tmps2 + tmps3) + \
+                        [atom.SubscriptAssign(atomLeft, atomIndex, r)], None)
+                case _:
+                    raise CompileError.typeError(f'Left-hand side of subscript assignment must ' \
+                        'be an array')
+        case Return(e):
+            match e:
+                case None:
+                    return ([atom.Return(None)], ReturnType(Void(), 'definite'))
+                case _:
+                    (a, tmps, t) = tyTransExpNotVoid(e, st, ctx)
+                    return (mkAssigns(tmps) + [atom.Return(a)], ReturnType(NotVoid(t), 'definite'))
+
+def tyTransStmts(stmts: list[stmt], st: Symtab, ctx: Ctx) -> tuple[list[atom.stmt], ReturnType | None]:
+    result: list[atom.stmt] = []
+    res: list[ReturnType] = []
+    for s in stmts:
+        (ss, ty) = tyTransStmt(s, st, ctx)
+        result.extend(ss)
+        if ty is not None:
+            res.append(ty)
+    return (result, fun_tychecker.stmtsReturnType(res))
+
+def tyTransFun(f: FunDef, st: Symtab, ctx: Ctx) -> atom.FunDef:
+    if f.name.name in fun_tychecker.builtinFunNames:
+        raise CompileError.typeError(f'Cannot redefine builtin function {f.name.name}')
+    for p in f.params:
+        st.assign(p.var, p.ty)
+    (stmts, res) = tyTransStmts(f.body, st, ctx)
+    fun_tychecker.checkFunResult(f, res)
+    return atom.FunDef(f.name, f.params, f.result, stmts)
+
+@dataclass(frozen=True)
+class TycheckTransResult:
+    tyResult: TycheckResult
+    funs: list[tuple[atom.FunDef, Ctx]]
+    mainStmts: list[atom.stmt]
+    mainCtx: Ctx
+
+def tycheckTransModule(m: mod) -> TycheckTransResult:
+    """
+    Typechecks and translates the given module. Returns the locals of all functions and of the
+    toplevel statements, together with the translated functions and toplevel statements. The
+    temporaries of every function are recorded in its own context.
+    """
+    log.info(f'Typechecking and transforming fun program')
+    st: Symtab = symtab.Symtab()
+    for f in m.funs:
+        ty = Fun([p.ty for p in f.params], f.result)
+        st.assign(f.name, ty, 'fun')
+    funLocalsDict: dict[ident, list[LocalVar]] = {}
+    funs: list[tuple[atom.FunDef, Ctx]] = []
+    for f in m.funs:
+        funSt = st.copy()
+        ctx = Ctx()
+        funs.append((tyTransFun(f, funSt, ctx), ctx))
+        funLocalsDict[f.name] = fun_tychecker.localsFromSymtab(funSt, f.params)
+    mainCtx = Ctx()
+    (mainStmts, t) = tyTransStmts(m.stmts, st, mainCtx)
+    if t is not None:
+        raise CompileError.typeError(f'Return is only allowed inside a function')
+    log.debug(f'Symtab after typechecking: {st}')
+    tyResult = TycheckResult(funLocalsDict, fun_tychecker.localsFromSymtab(st, []))
+    return TycheckTransResult(tyResult, funs, mainStmts, mainCtx)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from lang_fun.fun_ast import *
 from typing import *
-from common.compilerSupport import *
+from common.compileError import CompileError
 import common.log as log
 import common.symtab as symtab
 import common.utils as utils
@@ -27,71 +27,120 @@ def assertTy(expected: ty, given: Optional[ty], what: str):
     if expected != given:
         raise CompileError.typeError(f'{what} should have type {expected} but has type {given}')
 
-def assertArrayTy(given: Optional[ty], what: str):
+def assertArrayTy(given: Optional[ty], e: exp):
     if not isArrayTy(given):
-        raise CompileError.typeError(f'{what} should have an array type but has type {given}')
+        raise CompileError.typeError(f'{e} should have an array type but has type {given}')
 
-def assertNotVoid(given: resultTy, what: str) -> ty:
+def assertNotVoid(given: resultTy, e: exp) -> ty:
     match given:
         case Void():
-            raise CompileError.typeError(f'{what} must not be void')
+            raise CompileError.typeError(f'{e} must not be void')
         case NotVoid(t):
             return t
 
+# The checks below only render the expressions for the error message if the check fails,
+# rendering the AST for every check would dominate the time of the type checker.
+
+def assertCondTy(cond: exp, given: ty):
+    if given != Bool():
+        assertTy(Bool(), given, f'Condition {cond} of if')
+
+def assertOperandTy(expected: ty, e: exp, given: ty):
+    if given != expected:
+        assertTy(expected, given, f'Expression {e}')
+
+def assertLenTy(lenExp: exp, given: ty):
+    if given != Int():
+        assertTy(Int(), given, f'Length expression {lenExp} in array initialization')
+
+def assertIndexTy(indexExp: exp, given: ty):
+    if given != Int():
+        assertTy(Int(), given, f'Index {indexExp} of assignmet')
+
+def assertRightTy(rightExp: exp, elemTy: ty, given: ty):
+    if given != elemTy:
+        assertTy(elemTy, given, f'Right-hand side {rightExp} of subscript assigment')
+
 def tycheckExpNotVoid(e: exp, st: Symtab) -> ty:
     t = tycheckExp(e, st)
-    return assertNotVoid(t, str(e))
+    return assertNotVoid(t, e)
 
 builtinFunNames = ['input_int', 'print', 'len']
 
-def tycheckBuiltinFuncall(target: exp, args: list[exp], st: Symtab) -> optional[ty]:
+def isBuiltinFuncall(target: exp, args: list[exp]) -> bool:
+    match (target, args):
+        case (Name(Ident('input_int')), []) | (Name(Ident('print')), [_]) | (Name(Ident('len')), [_]):
+            return True
+        case _:
+            return False
+
+def builtinFunTy(target: exp, args: list[exp], argTys: list[ty]) -> Fun:
     """
-    Return the *function* type for a call of a builtin function. Our type language cannot
-    express the types of all builtin functions in general because print and len are overloaded.
-    Hence, we have to type check to arguments to get the function type.
+    Return the *function* type for a call of a builtin function, given the types of the
+    arguments. Our type language cannot express the types of all builtin functions in general
+    because print and len are overloaded.
     """
-    match (target, args):
-        case (Name(Ident('input_int')), []):
+    match (target, args, argTys):
+        case (Name(Ident('input_int')), [], []):
             return Fun([], NotVoid(Int()))
-        case (Name(Ident('print')), [e]):
-            t = tycheckExpNotVoid(e, st)
+        case (Name(Ident('print')), [e], [t]):
             if t not in [Int(), Bool()]:
                 raise CompileError.typeError(f'{e} should have type int or bool but has type {t}')
             return Fun([t], Void())
-        case (Name(Ident('len')), [e]):
-            t = tycheckExpNotVoid(e, st)
-            assertArrayTy(t, str(e))
+        case (Name(Ident('len')), [e], [t]):
+            assertArrayTy(t, e)
             return Fun([t], NotVoid(Int()))
         case _:
-            return None
+            utils.abort(f'Not a call of a builtin function: {target}')
 
-def tycheckUserDefinedFuncall(tfun: ty|None, args: list[exp], st: Symtab) -> resultTy:
+def tycheckBuiltinFuncall(target: exp, args: list[exp], st: Symtab) -> optional[ty]:
+    """
+    Return the *function* type for a call of a builtin function. Hence, we have to type check
+    to arguments to get the function type.
+    """
+    if not isBuiltinFuncall(target, args):
+        return None
+    return builtinFunTy(target, args, [tycheckExpNotVoid(e, st) for e in args])
+
+def setBuiltinTarget(target: exp, funTy: Fun):
+    target.ty = NotVoid(funTy)
+    match target:
+        case Name(_):
+            target.scope = BuiltinFun()
+        case _:
+            pass
+
+def assertFunTy(tfun: ty|None, args: list[exp]) -> Fun:
+    """
+    Asserts that tfun is the type of a function that can be called with the given arguments.
+    """
     match tfun:
-        case Fun(params, result):
+        case Fun(params, _):
             if len(params) != len(args):
                 raise CompileError.typeError(f'Function expects {len(params)} '\
                     f'arguments, but called with {len(args)}')
-            for i, (e, expectedTy) in enumerate(zip(args, params)):
-                ty = tycheckExpNotVoid(e, st)
-                if ty != expectedTy:
-                    raise CompileError.typeError(f'Function expects type '\
-                        f'{expectedTy} as argument {i+1}, but given type {ty}')
-            return result
+            return tfun
         case _:
             raise CompileError.typeError(f'Not a function: {tfun}')
 
+def assertArgTy(i: int, expectedTy: ty, ty: ty):
+    if ty != expectedTy:
+        raise CompileError.typeError(f'Function expects type '\
+            f'{expectedTy} as argument {i+1}, but given type {ty}')
+
+def tycheckUserDefinedFuncall(tfun: ty|None, args: list[exp], st: Symtab) -> resultTy:
+    funTy = assertFunTy(tfun, args)
+    for i, (e, expectedTy) in enumerate(zip(args, funTy.params)):
+        assertArgTy(i, expectedTy, tycheckExpNotVoid(e, st))
+    return funTy.result
+
 def tycheckFuncall(target: exp, args: list[exp], st: Symtab) -> resultTy:
     match tycheckBuiltinFuncall(target, args, st):
         case None:
             funTy = tycheckExpNotVoid(target, st)
             return tycheckUserDefinedFuncall(funTy, args, st)
         case Fun() as funTy:
-            target.ty = NotVoid(funTy)
-            match target:
-                case Name(_):
-                    target.scope = BuiltinFun()
-                case _:
-                    pass
+            setBuiltinTarget(target, funTy)
             return funTy.result
         case t:
             utils.abort(f'Invalid type returned by tycheckBuiltinFuncall: {t}')
@@ -102,16 +151,73 @@ def tycheckExp(e: exp, st: Symtab) -> resultTy:
     e.ty = t
     match e:
         case Name(x):
-            match st.scope(x):
-                case 'var':
-                    scope = Var()
-                case 'fun':
-                    scope = UserFun()
-            e.scope = scope
+            e.scope = nameScope(x, st)
         case _:
             pass
     return t
 
+def nameScope(x: ident, st: Symtab) -> scope:
+    match st.scope(x):
+        case 'var':
+            return Var()
+        case 'fun':
+            return UserFun()
+
+def nameTy(x: ident, st: Symtab) -> ty:
+    if not st.hasVar(x) and x.name in builtinFunNames:
+        raise CompileError.typeError(f'Invalid use of builtin function {x}')
+    return st.use(x)
+
+def unOpTy(e: exp, op: unaryop, subTy: ty) -> resultTy:
+    match op:
+        case USub():
+            expectedTy = Int()
+        case Not():
+            expectedTy = Bool()
+    if subTy != expectedTy:
+        assertTy(expectedTy, subTy, f'Expression {e}')
+    return NotVoid(expectedTy)
+
+def binOpTy(left: exp, op: binaryop, right: exp, leftTy: ty, rightTy: ty) -> resultTy:
+    match op:
+        case Add() | Sub() | Mul():
+            assertOperandTy(Int(), left, leftTy)
+            assertOperandTy(Int(), right, rightTy)
+            return NotVoid(Int())
+        case Less() | LessEq() | Greater() | GreaterEq():
+            assertOperandTy(Int(), left, leftTy)
+            assertOperandTy(Int(), right, rightTy)
+            return NotVoid(Bool())
+        case Eq() | NotEq():
+            if leftTy == rightTy and isBaseTy(leftTy):
+                return NotVoid(Bool())
+            else:
+                raise CompileError.typeError(f'Invalid types for operands of {op}')
+        case Is():
+            if leftTy == rightTy and isArrayTy(leftTy):
+                return NotVoid(Bool())
+            else:
+                raise CompileError.typeError(f'Invalid types for operands of {op}')
+        case And() | Or():
+            assertOperandTy(Bool(), left, leftTy)
+            assertOperandTy(Bool(), right, rightTy)
+            return NotVoid(Bool())
+
+def arrayInitStaticTy(es: list[exp], elemTys: list[ty]) -> resultTy:
+    elemTy = elemTys[0]
+    for t in elemTys[1:]:
+        if t != elemTy:
+            raise CompileError.typeError(f'All array elements must have the same type: {es}')
+    return NotVoid(Array(elemTy))
+
+def subscriptTy(arrayExp: exp, arrayTy: ty, indexTy: ty) -> resultTy:
+    assertTy(Int(), indexTy, f'Index of subscript expression')
+    match arrayTy:
+        case Array(elemTy):
+            return NotVoid(elemTy)
+        case _:
+            raise CompileError.typeError(f'Left-hand side {arrayExp} of subscript must be an array')
+
 def _tycheckExp(e: exp, st: Symtab) -> resultTy:
     match e:
         case IntConst(v):
@@ -123,70 +229,24 @@ def _tycheckExp(e: exp, st: Symtab) -> resultTy:
         case Call(e, args):
             return tycheckFuncall(e, args, st)
         case UnOp(op, sub):
-            subTy = tycheckExpNotVoid(sub, st)
-            match op:
-                case USub():
-                    expectedTy = Int()
-                case Not():
-                    expectedTy = Bool()
-            assertTy(expectedTy, subTy, f'Expression {e}')
-            return NotVoid(expectedTy)
+            return unOpTy(e, op, tycheckExpNotVoid(sub, st))
         case BinOp(left, op, right):
             leftTy = tycheckExpNotVoid(left, st)
             rightTy = tycheckExpNotVoid(right, st)
-            match op:
-                case Add() | Sub() | Mul():
-                    assertTy(Int(), leftTy, f'Expression {left}')
-                    assertTy(Int(), rightTy, f'Expression {right}')
-                    return NotVoid(Int())
-                case Less() | LessEq() | Greater() | GreaterEq():
-                    assertTy(Int(), leftTy, f'Expression {left}')
-                    assertTy(Int(), rightTy, f'Expression {right}')
-                    return NotVoid(Bool())
-                case Eq() | NotEq():
-                    if leftTy == rightTy and isBaseTy(leftTy):
-                        return NotVoid(Bool())
-                    else:
-                        raise CompileError.typeError(f'Invalid types for operands of {op}')
-                case Is():
-                    if leftTy == rightTy and isArrayTy(leftTy):
-                        return NotVoid(Bool())
-                    else:
-                        raise CompileError.typeError(f'Invalid types for operands of {op}')
-                case And() | Or():
-                    assertTy(Bool(), leftTy, f'Expression {left}')
-                    assertTy(Bool(), rightTy, f'Expression {right}')
-                    return NotVoid(Bool())
+            return binOpTy(left, op, right, leftTy, rightTy)
         case Name(x):
-            if not st.hasVar(x) and x.name in builtinFunNames:
-                raise CompileError.typeError(f'Invalid use of builtin function {x}')
-            t = st.use(x)
-            return NotVoid(t)
+            return NotVoid(nameTy(x, st))
         case ArrayInitDyn(lenExp, initExp):
-            lenTy = tycheckExpNotVoid(lenExp, st)
-            assertTy(Int(), lenTy, f'Length expression {lenExp} in array initialization')
-            elemTy = assertSomeTy(tycheckExpNotVoid(initExp, st),
-                                  f'Element expression {initExp} in array initialization')
-            return NotVoid(Array(elemTy))
+            assertLenTy(lenExp, tycheckExpNotVoid(lenExp, st))
+            return NotVoid(Array(tycheckExpNotVoid(initExp, st)))
         case ArrayInitStatic([]):
             raise CompileError.typeError(f'Cannot construct empty array')
         case ArrayInitStatic(es):
-            elemTys: list[ty | None]= [tycheckExpNotVoid(e, st) for e in es]
-            elemTy = assertSomeTy(elemTys[0],
-                                  f'Element expression {es[0]} in array initialization')
-            for t in elemTys[1:]:
-                if t != elemTy:
-                    raise CompileError.typeError(f'All array elements must have the same type: {es}')
-            return NotVoid(Array(elemTy))
+            return arrayInitStaticTy(es, [tycheckExpNotVoid(e, st) for e in es])
         case Subscript(arrayExp, indexExp):
             arrayTy = tycheckExpNotVoid(arrayExp, st)
             indexTy = tycheckExpNotVoid(indexExp, st)
-            assertTy(Int(), indexTy, f'Index of subscript expression')
-            match arrayTy:
-                case Array(elemTy):
-                    return NotVoid(elemTy)
-                case _:
-                    raise CompileError.typeError(f'Left-hand side {arrayExp} of subscript must be an array')
+            return subscriptTy(arrayExp, arrayTy, indexTy)
     raise Exception(f'No match for expression {e} ({e.__module__})')
 
 @dataclass
@@ -225,23 +285,16 @@ def tycheckStmt(s: stmt, st: Symtab) -> ReturnType | None:
                     return None
         case IfStmt(cond, thenBody, elseBody):
             t = tycheckExpNotVoid(cond, st)
-            assertTy(Bool(), t, f'Condition {cond} of if')
+            assertCondTy(cond, t)
             nestedThen = st.copy()
             ty1 = tycheckStmts(thenBody, nestedThen)
             nestedElse = st.copy()
             ty2 = tycheckStmts(elseBody, nestedElse)
             st.mergeBack(nestedThen, nestedElse)
-            if ty1 is not None and ty2 is not None:
-                return ty1.merge(ty2)
-            elif ty1 is None and ty2 is None:
-                return None
-            elif ty1 is not None and ty2 is None:
-                return ty1.maybe()
-            elif ty2 is not None and ty1 is None:
-                return ty2.maybe()
+            return ifReturnType(ty1, ty2)
         case WhileStmt(cond, body):
             t = tycheckExpNotVoid(cond, st)
-            assertTy(Bool(), t, f'Condition {cond} of if')
+            assertCondTy(cond, t)
             nested = st.copy()
             ty = tycheckStmts(body, nested)
             untaken = st.copy()
@@ -254,10 +307,8 @@ def tycheckStmt(s: stmt, st: Symtab) -> ReturnType | None:
             leftTy = tycheckExpNotVoid(leftExp, st)
             match leftTy:
                 case Array(elemTy):
-                    indexTy = tycheckExpNotVoid(indexExp, st)
-                    assertTy(Int(), indexTy, f'Index {indexExp} of assignmet')
-                    rightTy = tycheckExpNotVoid(rightExp, st)
-                    assertTy(elemTy, rightTy, f'Right-hand side {rightExp} of subscript assigment')
+                    assertIndexTy(indexExp, tycheckExpNotVoid(indexExp, st))
+                    assertRightTy(rightExp, elemTy, tycheckExpNotVoid(rightExp, st))
                     return None
                 case _:
                     raise CompileError.typeError(f'Left-hand side of subscript assignment must ' \
@@ -270,12 +321,31 @@ def tycheckStmt(s: stmt, st: Symtab) -> ReturnType | None:
                     ty = tycheckExpNotVoid(e, st)
                     return ReturnType(NotVoid(ty), 'definite')
 
+def ifReturnType(ty1: ReturnType | None, ty2: ReturnType | None) -> ReturnType | None:
+    """
+    Returns the result type of an if statement with branches of result types ty1 and ty2.
+    """
+    if ty1 is not None and ty2 is not None:
+        return ty1.merge(ty2)
+    elif ty1 is not None:
+        return ty1.maybe()
+    elif ty2 is not None:
+        return ty2.maybe()
+    else:
+        return None
+
 def tycheckStmts(stmts: list[stmt], st: Symtab) -> ReturnType | None:
     res: list[ReturnType] = []
     for s in stmts:
         ty = tycheckStmt(s, st)
         if ty is not None:
             res.append(ty)
+    return stmtsReturnType(res)
+
+def stmtsReturnType(res: list[ReturnType]) -> ReturnType | None:
+    """
+    Returns the result type of a list of statements with result types res.
+    """
     if not res:
         return None
     ty = res[0].ty
@@ -292,7 +362,12 @@ def tycheckFunDef(f: FunDef, st: Symtab):
         raise CompileError.typeError(f'Cannot redefine builtin function {f.name.name}')
     for p in f.params:
         st.assign(p.var, p.ty)
-    res = tycheckStmts(f.body, st)
+    checkFunResult(f, tycheckStmts(f.body, st))
+
+def checkFunResult(f: FunDef, res: ReturnType | None):
+    """
+    Checks that the body of f, with result type res, matches the declared result type.
+    """
     match res:
         case None:
             if f.result != Void():
@@ -338,5 +413,6 @@ def tycheckModule(m: mod) -> TycheckResult:
     if t is not None:
         raise CompileError.typeError(f'Return is only allowed inside a function')
     log.debug(f'Symtab after typechecking: {st}')
-    log.debug(f'AST after typechecking: {pprint.pformat(m)}')
+    if log.isDebug():
+        log.debug(f'AST after typechecking: {pprint.pformat(m)}')
     return TycheckResult(funLocalsDict, localsFromSymtab(st, []))
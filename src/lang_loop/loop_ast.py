@@ -1,120 +1,149 @@
-# AUTOMATICALLY GENERATED (2024-03-13 15:00:03)
+# AUTOMATICALLY GENERATED (2026-10-19 16:42:43)
 from __future__ import annotations
 from dataclasses import dataclass
+from typing import Any, Self
+import weakref
 
 type optional[T] = T | None
 
-@dataclass(frozen=True)
+# There is only one Ident for every name, so identifiers are compared and hashed by identity.
+# The table holds its Idents weakly, so a long-running process (e.g. the compiler server)
+# only keeps the identifiers still in use.
+_idents: weakref.WeakValueDictionary[str, Ident] = weakref.WeakValueDictionary()
+
+@dataclass(frozen=True, slots=True, eq=False, weakref_slot=True)
 class Ident:
     name: str
+    def __new__(cls, name: str) -> Ident:
+        x = _idents.get(name)
+        if x is None:
+            x = _idents.setdefault(name, object.__new__(cls))
+        return x
+    def __getnewargs__(self) -> tuple[str]:
+        return (self.name,)
 
 type ident = Ident
 type string = str
 
-@dataclass
-class USub:
+# At most one entry per class, so this table stays small
+_singletons: dict[type, Any] = {}
+
+class Singleton:
+    """
+    Base class of the constructors without fields, every such constructor has only one instance.
+    """
+    __slots__ = ()
+    def __new__(cls) -> Self:
+        x = _singletons.get(cls)
+        if x is None:
+            x = _singletons.setdefault(cls, object.__new__(cls))
+        return x
+
+@dataclass(slots=True, eq=False)
+class USub(Singleton):
     pass
 
-@dataclass
-class Not:
+@dataclass(slots=True, eq=False)
+class Not(Singleton):
     pass
 
 type unaryop = USub | Not
 
-@dataclass
-class Add:
+@dataclass(slots=True, eq=False)
+class Add(Singleton):
     pass
 
-@dataclass
-class Sub:
+@dataclass(slots=True, eq=False)
+class Sub(Singleton):
     pass
 
-@dataclass
-class Mul:
+@dataclass(slots=True, eq=False)
+class Mul(Singleton):
     pass
 
-@dataclass
-class Less:
+@dataclass(slots=True, eq=False)
+class Less(Singleton):
     pass
 
-@dataclass
-class LessEq:
+@dataclass(slots=True, eq=False)
+class LessEq(Singleton):
     pass
 
-@dataclass
-class Greater:
+@dataclass(slots=True, eq=False)
+class Greater(Singleton):
     pass
 
-@dataclass
-class GreaterEq:
+@dataclass(slots=True, eq=False)
+class GreaterEq(Singleton):
     pass
 
-@dataclass
-class Eq:
+@dataclass(slots=True, eq=False)
+class Eq(Singleton):
     pass
 
-@dataclass
-class NotEq:
+@dataclass(slots=True, eq=False)
+class NotEq(Singleton):
     pass
 
-@dataclass
-class And:
+@dataclass(slots=True, eq=False)
+class And(Singleton):
     pass
 
-@dataclass
-class Or:
+@dataclass(slots=True, eq=False)
+class Or(Singleton):
     pass
 
 type binaryop = Add | Sub | Mul | Less | LessEq | Greater | GreaterEq | Eq | NotEq | And | Or
 
-@dataclass
-class Int:
+@dataclass(slots=True, eq=False)
+class Int(Singleton):
     pass
 
-@dataclass
-class Bool:
+@dataclass(slots=True, eq=False)
+class Bool(Singleton):
     pass
 
 type ty = Int | Bool
 
-@dataclass
+@dataclass(slots=True)
 class NotVoid:
     ty: ty
 
-@dataclass
-class Void:
+@dataclass(slots=True, eq=False)
+class Void(Singleton):
     pass
 
 type resultTy = NotVoid | Void
 
-@dataclass
+@dataclass(slots=True)
 class IntConst:
     value: int
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class BoolConst:
     value: bool
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class Name:
     name: ident
+    slot: optional[int] = None
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class Call:
     name: ident
     args: list[exp]
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class UnOp:
     op: unaryop
     arg: exp
     ty: optional[resultTy] = None
 
-@dataclass
+@dataclass(slots=True)
 class BinOp:
     left: exp
     op: binaryop
@@ -123,29 +152,30 @@ class BinOp:
 
 type exp = IntConst | BoolConst | Name | Call | UnOp | BinOp
 
-@dataclass
+@dataclass(slots=True)
 class StmtExp:
     exp: exp
 
-@dataclass
+@dataclass(slots=True)
 class Assign:
     var: ident
     right: exp
+    slot: optional[int] = None
 
-@dataclass
+@dataclass(slots=True)
 class IfStmt:
     cond: exp
     thenBody: list[stmt]
     elseBody: list[stmt]
 
-@dataclass
+@dataclass(slots=True)
 class WhileStmt:
     cond: exp
     body: list[stmt]
 
 type stmt = StmtExp | Assign | IfStmt | WhileStmt
 
-@dataclass
+@dataclass(slots=True)
 class Module:
     stmts: list[stmt]
 
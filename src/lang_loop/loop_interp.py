@@ -2,8 +2,10 @@ from lang_loop.loop_ast import *
 import lang_loop.loop_tychecker as loop_tychecker
 import common.utils as utils
 from typing import *
+import common.timing as timing
+import common.slots as slots
 
-type Environ = dict[Ident, TyValue]
+type Environ = list[Any] # indexed by the slots of the variables
 type TyValue = int | bool
 
 def interpFuncall(id: ident, args: list[exp], env: Environ) -> Optional[TyValue]:
@@ -52,37 +54,41 @@ def interpExp(e: exp, env: Environ) -> Optional[TyValue]:
                         return True
                     else:
                         return interpExp(right, env)
-        case Name(name):
-            return env[name]
+        case Name(slot=int(i)):
+            return env[i]
+        case Name(x):
+            raise ValueError(f'Variable {x.name} has no slot')
     raise Exception(f'No match for expression {e}')
 
-def interpStmt(s: stmt, env: Environ, cont: list[stmt]) -> None:
+def interpStmt(s: stmt, env: Environ) -> None:
     match s:
         case StmtExp(e):
             interpExp(e, env)
-            interpStmts(cont, env)
-        case Assign(x, e):
+        case Assign(_, e, int(i)):
             v: Any = interpExp(e, env)
-            env[x] = v
-            interpStmts(cont, env)
+            env[i] = v
+        case Assign(x, _):
+            raise ValueError(f'Variable {x.name} has no slot')
         case IfStmt(cond, thenBody, elseBody):
             v: Any = interpExp(cond, env)
             if v:
-                interpStmts(thenBody + cont, env)
+                interpStmts(thenBody, env)
             else:
-                interpStmts(elseBody + cont, env)
+                interpStmts(elseBody, env)
         case WhileStmt(cond, body):
-            v: Any = interpExp(cond, env)
-            if v:
-                interpStmts(body + [s] + cont, env)
-            else:
-                interpStmts(cont, env)
+            # The python stack grows with the nesting depth of the statements, not with the
+            # number of iterations.
+            while interpExp(cond, env):
+                interpStmts(body, env)
 
 def interpStmts(stmts: list[stmt], env: Environ) -> None:
-    if len(stmts) > 0:
-        interpStmt(stmts[0], env, stmts[1:])
+    for s in stmts:
+        interpStmt(s, env)
 
 def interpModule(m: mod):
     utils.assertType(m, Module)
-    loop_tychecker.tycheckModule(m)
-    interpStmts(m.stmts, {})
+    with timing.phase('tycheckModule'):
+        st = loop_tychecker.tycheckModule(m)
+    layout = slots.layout(x for (x, _) in st.types('var'))
+    slots.assignSlots(m.stmts, layout)
+    interpStmts(m.stmts, len(layout) * [None])
@@ -0,0 +1,15 @@
+"""
+Runs lang_loop programs by transpiling them to python (interp --engine=pyast), see
+common/pyastTranspiler.py.
+"""
+from lang_loop.loop_ast import *
+import lang_loop.loop_tychecker as loop_tychecker
+import common.pyastTranspiler as pyastTranspiler
+import common.utils as utils
+import common.timing as timing
+
+def interpModule(m: mod):
+    utils.assertType(m, Module)
+    with timing.phase('tycheckModule'):
+        loop_tychecker.tycheckModule(m)
+    pyastTranspiler.runModule(m)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from typing import *
 from lang_loop.loop_ast import *
-from common.compilerSupport import *
+from common.compileError import CompileError
 import common.log as log
 import common.symtab as symtab
 import pprint
@@ -125,5 +125,6 @@ def tycheckModule(m: mod) -> Symtab:
     st: Symtab = symtab.Symtab()
     tycheckStmts(m.stmts, st)
     log.debug(f'Symtab after typechecking: {st}')
-    log.debug(f'AST after typechecking: {pprint.pformat(m)}')
+    if log.isDebug():
+        log.debug(f'AST after typechecking: {pprint.pformat(m)}')
     return st
@@ -2,8 +2,10 @@ from lang_var.var_ast import *
 import lang_var.var_tychecker as var_tychecker
 import common.utils as utils
 from typing import *
+import common.timing as timing
+import common.slots as slots
 
-type Env = dict[Ident, TyValue]
+type Env = list[Any] # indexed by the slots of the variables
 type TyValue = int
 
 def interpFuncall(id: ident, args: list[exp], env: Env) -> TyValue | None:
@@ -33,17 +35,21 @@ def interpExp(e: exp, env: Env) -> TyValue | None:
                 case Sub(): return x - y
                 case Add(): return x + y
                 case Mul(): return x * y
-        case Name(name):
-            return env[name]
+        case Name(slot=int(i)):
+            return env[i]
+        case Name(x):
+            raise ValueError(f'Variable {x.name} has no slot')
     raise Exception(f'No match for expression {e}')
 
 def interpStmt(s: stmt, env: Env) -> None:
     match s:
         case StmtExp(e):
             interpExp(e, env)
-        case Assign(x, e):
+        case Assign(_, e, int(i)):
             v: Any = interpExp(e, env)
-            env[x] = v
+            env[i] = v
+        case Assign(x, _):
+            raise ValueError(f'Variable {x.name} has no slot')
 
 def interpStmts(stmts: list[stmt], env: Env) -> None:
     for stmt in stmts:
@@ -51,5 +57,8 @@ def interpStmts(stmts: list[stmt], env: Env) -> None:
 
 def interpModule(m: mod):
     utils.assertType(m, Module)
-    var_tychecker.tycheckModule(m)
-    interpStmts(m.stmts, {})
+    with timing.phase('tycheckModule'):
+        vars = var_tychecker.tycheckModule(m)
+    layout = slots.layout(sorted(vars, key=lambda x: x.name))
+    slots.assignSlots(m.stmts, layout)
+    interpStmts(m.stmts, len(layout) * [None])
@@ -0,0 +1,15 @@
+"""
+Runs lang_var programs by transpiling them to python (interp --engine=pyast), see
+common/pyastTranspiler.py.
+"""
+from lang_var.var_ast import *
+import lang_var.var_tychecker as var_tychecker
+import common.pyastTranspiler as pyastTranspiler
+import common.utils as utils
+import common.timing as timing
+
+def interpModule(m: mod):
+    utils.assertType(m, Module)
+    with timing.phase('tycheckModule'):
+        var_tychecker.tycheckModule(m)
+    pyastTranspiler.runModule(m)
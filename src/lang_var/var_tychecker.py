@@ -1,6 +1,6 @@
 from lang_var.var_ast import *
 from typing import *
-from common.compilerSupport import *
+from common.compileError import CompileError
 import common.log as log
 
 type ty = Literal['Int', 'Void']
@@ -1,27 +1,22 @@
 import argparse
 from typing import *
-import common.genericCompiler as genericCompiler
-import common.genericInterp as genericInterp
-import common.genericParser as genericParser
 import common.utils as utils
 import common.log as log
 import common.constants as constants
-import parsers.lang_simple.simple_parser as simple_parser
-import assembly.compiler as tac_comp
-import assembly.tacInterp as tac_interp
+import common.cmdline as cmdline
 import importlib
-import shell
 import sys
-import os
-import typing
+
+# Every command imports only the modules it needs, see the match in main. This keeps the
+# startup time small, test/test_startup.py checks the import time of the interp command.
 
 DEFAULT_OUTPUT = 'out.wasm'
 
-def parseArgs():
+INTERP_ENGINES = ['tree', 'closure', 'pyast', 'vm']
+
+def parseArgs(argv: Optional[list[str]] = None):
     parser = argparse.ArgumentParser(description=f'Run the compiler or interpreter for some language')
-    parser.add_argument('--lang', choices=['simple', 'var', 'loop', 'array', 'fun', 'tinyJson'],
-                        help='The language (guessed from path of input file if not given)')
-    parser.add_argument('--level', help='The loglevel (debug, info, warn)')
+    cmdline.addGlobalArgs(parser)
     subparsers = parser.add_subparsers(help='Commands', dest='cmd')
 
     helpCompiler = f'''Compiles the given input file. Depending on the extension of the output file,
@@ -39,16 +34,113 @@ exit codes signal a bug in the compiler itself.'''
                        help="Max memory size in number of 64kB pages")
         p.add_argument('--max-array-size', type=int,
                        help="Max size of an array in bytes")
+        p.add_argument('--fused-frontend', action='store_true',
+                       help='Typecheck and transform the program in a single pass (array and fun)')
+        p.add_argument('--no-cache', action='store_true',
+                       help='Do not use the compile cache (directory $MINIPY_COMPILE_CACHE, ' \
+                           'default: .compile_cache)')
         p.add_argument('input', help='Input file .py')
     addCompilerArgs(cp)
     run = subparsers.add_parser('run', help='Compiles the given program and runs it with iwasm. Also see the ' \
         'compile command for help')
     run.add_argument('--run-wasm', default='wasm-support/run_iwasm',
                      help=f'Command to run wasm files')
+    run.add_argument('--runtime', choices=['iwasm', 'py'], default='iwasm',
+                     help='iwasm: runs the wasm file with the command given by --run-wasm ' \
+                         '(default), py: runs the compiled module in-process with a wasm ' \
+                         'interpreter written in python (no wat2wasm and iwasm needed)')
     addCompilerArgs(run)
 
+    batch = subparsers.add_parser('compile-batch',
+                                  help='Compiles many input files with a pool of worker processes ' \
+                                      'and writes a JSON summary of the results')
+    batch.add_argument('--wat2wasm', default='wat2wasm',
+                       help='Path to the wat2wasm tool')
+    batch.add_argument('--output-dir', default='out',
+                       help='Directory for the output files (default: out)')
+    batch.add_argument('--summary', metavar='FILE',
+                       help='JSON file for the summary (default: summary.json in the output directory)')
+    batch.add_argument('--format', choices=['wat', 'wasm'], default='wasm',
+                       help='Format of the output files (default: wasm)')
+    batch.add_argument('--jobs', type=int,
+                       help='Number of worker processes (default: number of CPUs)')
+    batch.add_argument('--manifest', metavar='FILE',
+                       help='File with additional input files, one per line')
+    batch.add_argument('--max-mem-size', type=int,
+                       help="Max memory size in number of 64kB pages")
+    batch.add_argument('--max-array-size', type=int,
+                       help="Max size of an array in bytes")
+    batch.add_argument('--fused-frontend', action='store_true',
+                       help='Typecheck and transform the programs in a single pass (array and fun)')
+    batch.add_argument('inputs', nargs='*', help='Input files .py')
+
+    bench = subparsers.add_parser('bench', help='Runs benchmarks (see src/bench)')
+    benchCmds = bench.add_subparsers(help='Benchmarks', dest='benchCmd', required=True)
+    scale = benchCmds.add_parser('scale',
+                                 help='Runs the pipelines on generated programs of increasing size')
+    scale.add_argument('--langs', default=','.join(constants.ALL_LANGUAGES),
+                       help='Comma-separated list of languages (default: all)')
+    scale.add_argument('--pipelines', default='interp,compile,tacInterp,assembly',
+                       help='Comma-separated list of pipelines (default: all)')
+    scale.add_argument('--sizes', default='10,100,1000',
+                       help='Comma-separated list of numbers of statements (default: 10,100,1000)')
+    scale.add_argument('--depth', type=int, default=2,
+                       help='Nesting depth of loops, expressions and calls (default: 2)')
+    scale.add_argument('--vars', type=int, default=8,
+                       help='Number of live variables (default: 8)')
+    scale.add_argument('--array-size', type=int, default=16,
+                       help='Size of arrays (default: 16)')
+    scale.add_argument('--repeat', type=int, default=3,
+                       help='Number of runs per program, the fastest counts (default: 3)')
+    scale.add_argument('--timeout', type=float, default=60,
+                       help='Timeout in seconds for a single run (default: 60)')
+    scale.add_argument('--seed', type=int, default=0, help='Seed for the generators')
+    scale.add_argument('--output', default='bench_results.json',
+                       help='JSON file for the results (default: bench_results.json)')
+    scale.add_argument('--baseline', metavar='FILE',
+                       help='Compare the results against the baseline in FILE')
+    scale.add_argument('--save-baseline', metavar='FILE',
+                       help='Save the results as baseline in FILE')
+    scale.add_argument('--tolerance', type=float, default=0.25,
+                       help='Relative slowdown tolerated before reporting a regression ' \
+                           '(default: 0.25)')
+    benchRun = benchCmds.add_parser('run',
+                                    help='Compares the runtime of pyrun, interp, tacInterp ' \
+                                        'and the compiled wasm code')
+    benchRun.add_argument('--engines', default='pyrun,interp,tacInterp,wasm',
+                          help='Comma-separated list of engines: pyrun, interp, interp-closure, ' \
+                              'interp-pyast, interp-vm, tacInterp, wasm ' \
+                              '(default: pyrun,interp,tacInterp,wasm)')
+    benchRun.add_argument('--warmup', type=int, default=1,
+                          help='Number of runs before measuring (default: 1)')
+    benchRun.add_argument('--repeat', type=int, default=5,
+                          help='Number of measured runs, the median counts (default: 5)')
+    benchRun.add_argument('--timeout', type=float, default=60,
+                          help='Timeout in seconds for a single run (default: 60)')
+    benchRun.add_argument('--run-wasm', default='wasm-support/run_iwasm',
+                          help='Command to run wasm files, e.g. wasm-support/run_node')
+    benchRun.add_argument('--output', default='bench_runtime.json',
+                          help='JSON file for the results (default: bench_runtime.json)')
+    benchRun.add_argument('inputs', nargs='*', default=['test_files'],
+                          help='Input files .py or directories (default: test_files)')
+
+    serve = subparsers.add_parser('serve',
+                                  help='Runs a server executing compile, interp, tacInterp, ' \
+                                      'assembly and parse requests (see src/common/server.py)')
+    serve.add_argument('--socket', metavar='PATH',
+                       help='Listen on the given Unix socket instead of reading requests from stdin')
+
     interp = subparsers.add_parser('interp', help='Runs the given file through our own interpeter')
     interp.add_argument('--level', help='The loglevel (debug, info, warn)')
+    interp.add_argument('--engine', choices=INTERP_ENGINES, default='tree',
+                        help='tree: walks the AST (default), closure: compiles the AST to ' \
+                            'python closures first (only lang_array and lang_fun), pyast: ' \
+                            'transpiles the AST to python and runs it with CPython, vm: ' \
+                            'compiles the atomized AST to bytecode for a register VM ' \
+                            '(only lang_array)')
+    interp.add_argument('--max-call-depth', type=int,
+                        help='Maximum depth of function calls, deeper calls are a runtime error ' \
+                            '(only lang_fun with the tree engine, default: 1000)')
     interp.add_argument('input', help='Input file .py')
 
     tacInterp = subparsers.add_parser('tacInterp',
@@ -83,7 +175,7 @@ exit codes signal a bug in the compiler itself.'''
                    help='Optional .png for for parse tree visualization')
     p.add_argument('input', help='Input file .py')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     if args.cmd is None:
         utils.abort(f'No command given')
     if args.lang == 'simple' and args.cmd != 'parse':
@@ -105,6 +197,18 @@ def importModule(lang: str, kind: Literal['compile', 'interp', 'ast', 'parse']):
     m = importlib.import_module(modName)
     return m
 
+def importInterp(lang: str, engine: str):
+    """
+    The module of the interpreter for lang. The tree engine is lang_L/L_interp.py, any other
+    engine E is lang_L/L_EInterp.py.
+    """
+    if engine == 'tree':
+        return importModule(lang, 'interp')
+    try:
+        return importlib.import_module(f'lang_{lang}.{lang}_{engine}Interp')
+    except ModuleNotFoundError:
+        utils.abort(f'Engine {engine} is not available for language {lang}')
+
 def getFun(mod: Any, fun: str):
     try:
         return getattr(mod, fun)
@@ -112,6 +216,7 @@ def getFun(mod: Any, fun: str):
         utils.abort(f'Module {mod} does not define function {fun}')
 
 def runWasm(runWasmCmd: str, file: str):
+    import shell
     delim = 80 * '-'
     print(delim)
     print(f'Running wasm file {file}')
@@ -125,26 +230,79 @@ def runWasm(runWasmCmd: str, file: str):
     print(f'Finished running wasm file {file}, exit code: {ecode}')
     sys.exit(ecode)
 
-PRELUDE_DICT = {
-    'input_int': lambda: utils.inputInt('Input some int: '),
-    'Callable': cast(Any, typing.Callable)
-}
+def runWasmPy(wasmMod: Any, file: str):
+    import common.wasmInterp as wasmInterp
+    delim = 80 * '-'
+    print(delim)
+    print(f'Running wasm module {file} with the python runtime')
+    print(delim)
+    ecode = 0
+    try:
+        wasmInterp.runModule(wasmMod)
+    except wasmInterp.WasmTrap as e:
+        sys.stdout.flush()
+        print(f'Exception: {e}', file=sys.stderr)
+        ecode = constants.RUN_ERROR_EXIT_CODE
+    print(delim)
+    print(f'Finished running wasm module {file}, exit code: {ecode}')
+    sys.exit(ecode)
 
 def runWithPython(srcFile: str):
     src = utils.readTextFile(srcFile)
-    exec(src, PRELUDE_DICT)
+    exec(compile(src, srcFile, 'exec'), utils.pyrunGlobals())
 
-def main():
-    args = parseArgs()
+def main(argv: Optional[list[str]] = None):
+    args = parseArgs(argv)
     level = log.resolveLevelName(args.level or 'warn')
     log.init(level, 'minipy.log')
+    if args.time_passes or args.time_passes_json:
+        import common.timing as timing
+        timing.enable()
+        try:
+            runCommand(args, level)
+        finally:
+            timing.report(args.time_passes_json)
+            timing.disable()
+    else:
+        runCommand(args, level)
+
+def runCommand(args: argparse.Namespace, level: int):
+    if args.cmd == "serve":
+        import common.server as server
+        server.serve(main, args.socket)
+        return
+    if args.cmd == "bench" and args.benchCmd == "run":
+        import bench.runtime as runtime
+        runArgs = runtime.RunArgs(args.inputs, args.engines.split(','), args.lang,
+                                  args.warmup, args.repeat, args.timeout, args.run_wasm,
+                                  args.output)
+        sys.exit(runtime.runMain(runArgs))
+    if args.cmd == "bench":
+        import bench.scaling as scaling
+        scaleArgs = scaling.ScaleArgs(args.langs.split(','), args.pipelines.split(','),
+                                      [int(n) for n in args.sizes.split(',')],
+                                      args.depth, args.vars, args.array_size, args.repeat,
+                                      args.timeout, args.seed, args.output, args.baseline,
+                                      args.save_baseline, args.tolerance)
+        sys.exit(scaling.scaleMain(scaleArgs))
+    if args.cmd == "compile-batch":
+        import common.batchCompiler as batchCompiler
+        import shell
+        inputs = list(args.inputs)
+        if args.manifest:
+            inputs.extend(batchCompiler.readManifest(args.manifest))
+        if not inputs:
+            utils.abort('No input files given')
+        batchArgs = batchCompiler.BatchArgs(inputs, args.output_dir,
+                                            args.summary or shell.pjoin(args.output_dir, 'summary.json'),
+                                            args.jobs, args.lang, args.format, args.wat2wasm,
+                                            args.max_mem_size, args.max_array_size,
+                                            args.fused_frontend)
+        sys.exit(batchCompiler.batchMain(batchArgs, level))
     if args.lang:
         lang = args.lang
     else:
-        lang = None
-        for x in args.input.split(os.sep):
-            if x.startswith('lang_'):
-                lang = x[len('lang_'):]
+        lang = utils.langFromPath(args.input)
         if lang is None:
             if args.input.endswith('.json'):
                 lang = 'tinyJson'
@@ -153,28 +311,41 @@ def main():
                     'the language.')
     match args.cmd:
         case "compile" | "run":
+            import common.genericCompiler as genericCompiler
+            import shell
             ast = importModule(lang, 'ast')
             if args.cmd == "run" and not args.output.endswith('.wasm'):
                 utils.abort("For mode=run, output file must be a .wasm file")
             compilerMod = importModule(lang, 'compile')
             compileFun = getFun(compilerMod, 'compileModule')
-            compileArgs = genericCompiler.Args(args.input, args.output, args.wat2wasm,
-                                                args.max_mem_size, args.max_array_size)
-            genericCompiler.compileMain(compileArgs, compileFun, ast)
-            if args.cmd == "run":
+            pyRuntime = args.cmd == "run" and args.runtime == 'py'
+            # The python runtime needs the module itself, not a cached result, and no .wasm file
+            output = shell.removeExt(args.output) + '.wat' if pyRuntime else args.output
+            compileArgs = genericCompiler.Args(args.input, output, args.wat2wasm,
+                                                args.max_mem_size, args.max_array_size,
+                                                fusedFrontend=args.fused_frontend,
+                                                useCache=not args.no_cache and not pyRuntime)
+            wasmMod = genericCompiler.compileMain(compileArgs, compileFun, ast)
+            if pyRuntime:
+                assert wasmMod is not None
+                runWasmPy(wasmMod, output)
+            elif args.cmd == "run":
                 runWasm(args.run_wasm, args.output)
         case "interp":
+            import common.genericInterp as genericInterp
             ast = importModule(lang, 'ast')
-            interpMod = importModule(lang, 'interp')
+            interpMod = importInterp(lang, args.engine)
             interpFun = getFun(interpMod, 'interpModule')
-            interpArgs = genericInterp.Args(args.input)
+            interpArgs = genericInterp.Args(args.input, args.max_call_depth)
             genericInterp.interpMain(interpArgs, interpFun, ast)
         case "pyrun":
             runWithPython(args.input)
         case "parse":
+            import common.genericParser as genericParser
             parserArgs = genericParser.ParserArgs(utils.readTextFile(args.input),
                                                   args.alg, args.png, args.grammar)
             if lang == 'simple':
+                import parsers.lang_simple.simple_parser as simple_parser
                 simple_parser.parse(parserArgs)
             elif lang == 'tinyJson':
                 tinyJson_parser = utils.importModuleNotInStudent('parsers.tinyJson.tinyJson_parser')
@@ -188,9 +359,13 @@ def main():
                 parseFun = getFun(parseMod, 'parseModule')
                 genericParser.parseWithOwnParser(args.input, parserArgs, ast, parseFun)
         case "tacInterp":
+            import common.genericCompiler as genericCompiler
+            import assembly.tacInterp as tac_interp
             compileArgs = genericCompiler.Args(args.input, '/tmp/dummy.wasm', 'wat2wasm', 1, 1)
             tac_interp.interpFile(compileArgs, args.print_tac)
         case "assembly":
+            import common.genericCompiler as genericCompiler
+            import assembly.compiler as tac_comp
             compileArgs = genericCompiler.Args(args.input, args.output, 'wat2wasm', 1, 1,
                                                args.max_registers)
             tac_comp.compileFile(compileArgs)
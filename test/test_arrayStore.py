@@ -0,0 +1,35 @@
+from common.arrayStore import ArrayStore
+from array import array
+import sys
+
+def test_compactStorage():
+    s = ArrayStore()
+    ints = s.alloc('int', [1000], 1000)
+    bools = s.alloc('bool', [True], 1000)
+    assert isinstance(s.resolve(ints), array)
+    assert isinstance(s.resolve(bools), bytearray)
+    boxed = [1000 + i for i in range(1000)]
+    listSize = sys.getsizeof(boxed) + sum(sys.getsizeof(x) for x in boxed)
+    assert sys.getsizeof(s.resolve(ints)) * 4 < listSize
+    assert sys.getsizeof(s.resolve(bools)) * 4 < sys.getsizeof(1000 * [True])
+    assert s.load(bools, 5) is True
+    s.storeValue(bools, 5, False)
+    assert s.load(bools, 5) is False
+    assert s.length(ints) == 1000
+
+def test_aliasing():
+    s = ArrayStore()
+    inner = s.alloc('int', [1, 2, 3])
+    outer = s.alloc('array', [inner, inner])
+    assert s.load(outer, 0) == s.load(outer, 1) == inner
+    s.storeValue(s.load(outer, 0), 2, 42)
+    assert s.load(s.load(outer, 1), 2) == 42
+    assert s.alloc('int', [1, 2, 42]) != inner
+
+def test_bigInts():
+    s = ArrayStore()
+    a = s.alloc('int', [0], 3)
+    s.storeValue(a, 1, 2**70)
+    assert list(s.resolve(a)) == [0, 2**70, 0]
+    b = s.alloc('int', [2**64], 2)
+    assert s.load(b, -1) == 2**64
@@ -3,3 +3,31 @@ from typing import *
 
 def test_asdl():
     shell.run(f'make all > /dev/null')
+
+def test_slots():
+    from lang_fun.fun_ast import Ident, Int, Add, Name, IntConst, NotVoid, Array
+    import common.astSerialize as astSerialize
+    import copy
+    import pickle
+    assert Ident('x') is Ident('x')
+    assert Ident('x') != Ident('y')
+    assert Int() is Int() and Add() is Add()
+    assert NotVoid(Array(Int())) == NotVoid(Array(Int()))
+    e = Name(Ident('x'), None, None, NotVoid(Int()))
+    assert not hasattr(e, '__dict__')
+    assert not hasattr(Ident('x'), '__dict__')
+    for y in [copy.deepcopy(e), pickle.loads(pickle.dumps(e)),
+              astSerialize.loads(astSerialize.dumps(e))]:
+        assert y == e and y.var is e.var
+        assert y.ty == NotVoid(Int())
+    assert IntConst(1) != IntConst(2)
+
+def test_identsNotRetained():
+    import gc
+    import lang_fun.fun_astCommon as fun_astCommon
+    idents = fun_astCommon._idents # pyright: ignore[reportPrivateUsage]
+    xs = [fun_astCommon.Ident(f'unused_ident_{i}') for i in range(100)]
+    assert 'unused_ident_0' in idents
+    del xs
+    gc.collect()
+    assert not any(k.startswith('unused_ident_') for k in idents.keys())
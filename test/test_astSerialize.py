@@ -0,0 +1,60 @@
+from typing import *
+import common.astSerialize as astSerialize
+import common.genericParser as genericParser
+import common.testsupport as testsupport
+import importlib
+import pytest
+import shell
+import sys
+
+@pytest.mark.parametrize("lang, srcFile", testsupport.collectTestFiles())
+def test_roundtrip(lang: str, srcFile: str, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(genericParser, 'PARSE_CACHE_DIR', '')
+    astMod = importlib.import_module(f'lang_{lang}.{lang}_ast')
+    try:
+        m = genericParser.parseFile(srcFile, astMod)
+    except Exception:
+        pytest.skip('not parseable')
+    assert astSerialize.loads(astSerialize.dumps(m)) == m
+
+def test_invalidData():
+    with pytest.raises(astSerialize.SerializeError):
+        astSerialize.loads(b'garbage')
+    with pytest.raises(astSerialize.SerializeError):
+        astSerialize.dumps(object())
+
+def test_parseCache(tmp_path: str, monkeypatch: pytest.MonkeyPatch):
+    import lang_fun.fun_ast as fun_ast
+    monkeypatch.setattr(genericParser, 'PARSE_CACHE_DIR', shell.pjoin(tmp_path, 'cache'))
+    src = 'test_files/lang_fun/gc_calls.py'
+    m = genericParser.parseFile(src, fun_ast)
+    def fail(*_args: Any):
+        raise Exception('parsed again')
+    monkeypatch.setattr(genericParser, 'transModule', fail)
+    assert genericParser.parseFile(src, fun_ast) == m
+
+# Parsing itself is recursive and needs a larger recursion limit for 2500 terms, writing
+# the cache must work with any limit.
+@pytest.mark.parametrize("terms, recursionLimit, cached", [(500, 1000, True), (2500, 100000, False)])
+def test_parseCacheDeepExp(terms: int, recursionLimit: int, cached: bool, tmp_path: str,
+                           monkeypatch: pytest.MonkeyPatch):
+    import lang_var.var_ast as var_ast
+    cacheDir = shell.pjoin(tmp_path, 'cache')
+    monkeypatch.setattr(genericParser, 'PARSE_CACHE_DIR', cacheDir)
+    src = shell.pjoin(tmp_path, 'deep.py')
+    with open(src, 'w') as f:
+        f.write('x = ' + '+'.join(terms * ['1']) + '\nprint(x)\n')
+    oldLimit = sys.getrecursionlimit()
+    sys.setrecursionlimit(recursionLimit)
+    try:
+        m = genericParser.parseFile(src, var_ast)
+    finally:
+        sys.setrecursionlimit(oldLimit)
+    assert isinstance(m, var_ast.Module)
+    # marshal cannot write trees nested that deeply, so they are not cached
+    assert len(shell.ls(cacheDir, '*.ast')) == (1 if cached else 0)
+    if cached:
+        def fail(*_args: Any):
+            raise Exception('parsed again')
+        monkeypatch.setattr(genericParser, 'transModule', fail)
+        assert isinstance(genericParser.parseFile(src, var_ast), var_ast.Module)
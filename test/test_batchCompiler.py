@@ -0,0 +1,32 @@
+import shell
+import json
+import common.batchCompiler as batchCompiler
+import common.utils as utils
+
+def test_compileBatch(tmp_path: str):
+    inputs = ['test_files/lang_loop/factorial.py',
+              'test_files/lang_array/sanity-checks/gc_loop.py',
+              'test_files/lang_fun/return_01.py']
+    summary = shell.pjoin(tmp_path, 'summary.json')
+    args = batchCompiler.BatchArgs(inputs, str(tmp_path), summary, jobs=2, format='wat')
+    results = batchCompiler.compileBatch(args)
+    assert [r.status for r in results] == ['ok', 'ok', 'compile error']
+    assert shell.isFile(shell.pjoin(tmp_path, 'test_files/lang_loop/factorial.wat'))
+    assert shell.isFile(shell.pjoin(tmp_path, 'test_files/lang_array/sanity-checks/gc_loop.wat'))
+    entries = json.loads(shell.readFile(summary))['results']
+    assert [e['input'] for e in entries] == inputs
+    assert set(entries[0]['timings']) == {'parse', 'compile', 'render'}
+    assert entries[2]['output'] is None
+    assert 'type error' in entries[2]['error']
+
+def test_compileBatchFusedFrontend(tmp_path: str):
+    inputs = ['test_files/lang_array/sanity-checks/gc_loop.py', 'test_files/lang_fun/simple.py']
+    outputs: list[list[str]] = []
+    for fused in [False, True]:
+        outDir = shell.pjoin(tmp_path, str(fused))
+        args = batchCompiler.BatchArgs(inputs, outDir, shell.pjoin(outDir, 'summary.json'),
+                                       jobs=1, format='wat', fusedFrontend=fused)
+        results = batchCompiler.compileBatch(args)
+        assert [r.status for r in results] == ['ok', 'ok']
+        outputs.append([shell.readFile(utils.assertNotNone(r.output)) for r in results])
+    assert outputs[0] == outputs[1]
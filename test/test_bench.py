@@ -0,0 +1,64 @@
+import pytest
+import bench.generators as generators
+import bench.runtime as runtime
+import bench.scaling as scaling
+import common.constants as constants
+import common.testsupport as testsupport
+import shell
+import subprocess
+import sys
+
+@pytest.mark.parametrize('lang', constants.ALL_LANGUAGES)
+def test_generatedProgramsRun(lang: str, tmp_path: str):
+    src = shell.pjoin(tmp_path, f'{lang}.py')
+    p = generators.Params(40, depth=2, vars=4, arraySize=4)
+    code = generators.generate(lang, p, seed=1)
+    assert code == generators.generate(lang, p, seed=1)
+    with open(src, 'w') as f:
+        f.write(code)
+    expected = testsupport.runPython(src, '')
+    res = subprocess.run([sys.executable, 'src/main.py', f'--lang={lang}', 'interp', src],
+                         capture_output=True, text=True, stdin=subprocess.DEVNULL)
+    assert res.returncode == 0, res.stderr
+    assert res.stdout.strip() == expected.strip()
+
+def test_compareWithBaseline():
+    def r(wall: float, status: scaling.Status = 'ok') -> scaling.BenchResult:
+        return scaling.BenchResult('loop', 'interp', 'N=10', 10, 20, status, wall,
+                                   phases={'parseFile': wall / 2})
+    assert scaling.compareWithBaseline([r(0.1)], [r(0.1)], 0.25, 0.005) == []
+    assert len(scaling.compareWithBaseline([r(0.2)], [r(0.1)], 0.25, 0.005)) == 2
+    assert len(scaling.compareWithBaseline([r(0.1, 'timeout')], [r(0.1)], 0.25, 0.005)) == 1
+    assert scaling.compareWithBaseline([r(0.2)], [r(0.1, 'error')], 0.25, 0.005) == []
+
+def test_runScaling(tmp_path: str):
+    out = shell.pjoin(tmp_path, 'results.json')
+    args = scaling.ScaleArgs(['loop'], ['interp'], [5, 10], repeat=1, output=out)
+    results = scaling.runScaling(args)
+    assert [r.status for r in results] == ['ok', 'ok']
+    assert all('parseFile' in r.phases for r in results)
+    scaling.writeResults(out, results)
+    assert scaling.readResults(out) == results
+
+def test_runtimeBenchmark(tmp_path: str):
+    out = shell.pjoin(tmp_path, 'runtime.json')
+    # Only self-contained engines: tacInterp fails in some checkouts (like test_tacInterp),
+    # wasm needs iwasm
+    args = runtime.RunArgs(['test_files/lang_loop/factorial.py'],
+                           ['pyrun', 'interp', 'interp-pyast'], warmup=0, repeat=1, output=out)
+    assert runtime.runMain(args) == 0
+    [r] = runtime.runBenchmarks(args)
+    assert [e.status for e in r.engines] == ['ok', 'ok', 'ok']
+    assert r.speedup('pyrun', 'interp') is not None
+    assert r.speedup('pyrun', 'wasm') is None
+
+def test_runtimeBenchmarkInterpEngines(tmp_path: str):
+    out = shell.pjoin(tmp_path, 'runtime.json')
+    args = runtime.RunArgs(['test_files/lang_array/dynarray_01.py'],
+                           ['interp', 'interp-closure', 'interp-vm', 'tacInterp'],
+                           warmup=0, repeat=1, output=out)
+    [r] = runtime.runBenchmarks(args)
+    # tacInterp does not support lang_array
+    assert [(e.engine, e.status) for e in r.engines] == \
+        [('interp', 'ok'), ('interp-closure', 'ok'), ('interp-vm', 'ok')]
+    assert r.speedup('interp', 'interp-vm') is not None
@@ -0,0 +1,45 @@
+from typing import *
+import common.compileCache as compileCache
+import common.genericCompiler as genericCompiler
+import compilers.lang_loop.loop_compiler as loop_compiler
+import lang_loop.loop_ast as loop_ast
+import os
+import pytest
+import shell
+
+SRC = 'test_files/lang_loop/factorial.py'
+
+def compileCounting(tmp_path: str, args: genericCompiler.Args) -> int:
+    calls: list[Any] = []
+    def compileFun(m: Any, cfg: Any):
+        calls.append(m)
+        return loop_compiler.compileModule(m, cfg)
+    genericCompiler.compileMain(args, compileFun, loop_ast)
+    return len(calls)
+
+def test_compileCacheHit(tmp_path: str, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv('MINIPY_COMPILE_CACHE', shell.pjoin(tmp_path, 'cache'))
+    out1 = shell.pjoin(tmp_path, 'out1.wat')
+    out2 = shell.pjoin(tmp_path, 'out2.wat')
+    assert compileCounting(tmp_path, genericCompiler.Args(SRC, out1, useCache=True)) == 1
+    assert compileCounting(tmp_path, genericCompiler.Args(SRC, out2, useCache=True)) == 0
+    assert shell.readFile(out1) == shell.readFile(out2)
+    # Different configuration, different key
+    args = genericCompiler.Args(SRC, out2, maxMemSize=7, useCache=True)
+    assert compileCounting(tmp_path, args) == 1
+    # Cache disabled
+    assert compileCounting(tmp_path, genericCompiler.Args(SRC, out2)) == 1
+
+def test_compileCacheEvict(tmp_path: str):
+    cache = compileCache.CompileCache(shell.pjoin(tmp_path, 'cache'), maxBytes=150)
+    src = shell.pjoin(tmp_path, 'out.wat')
+    keys = [f'key{i}' for i in range(3)]
+    for (i, k) in enumerate(keys):
+        shell.writeFile(src, 100 * 'x')
+        cache.store(k, {'.wat': src})
+        os.utime(cache.entryFile(k, '.wat'), (i, i))
+    cache.evict()
+    assert not cache.restore(keys[0], {'.wat': src})
+    assert not cache.restore(keys[1], {'.wat': src})
+    assert cache.restore(keys[2], {'.wat': src})
+    assert not cache.restore(keys[2], {'.wat': src, '.wasm': src + '.wasm'})
@@ -3,6 +3,11 @@ import common.testsupport as testsupport
 import pytest
 import common.log as log
 import common.constants as constants
+import common.genericParser as genericParser
+import common.sexp as sexp
+from common.compilerSupport import CompilerConfig, CompileError
+from concurrent.futures import ThreadPoolExecutor
+import importlib
 
 pytestmark = pytest.mark.instructor
 
@@ -16,18 +21,16 @@ def run(wasm: str, input: str|None) -> shell.RunResult:
     return res
 
 def runTest(lang: str, srcFile: str, tmp: str, captureErr: bool, input: str|None, extraArgs: str|None) -> shell.RunResult:
+    if testsupport.WASM_RUNTIME == 'py':
+        res = testsupport.compileAndRunInProcess(lang, srcFile, shell.pjoin(tmp, 'out.wat'),
+                                                 input, extraArgs)
+        if res.exitcode == constants.RUN_ERROR_EXIT_CODE:
+            res = shell.RunResult(res.stderr, res.stderr, res.exitcode)
+        return res
     output = shell.pjoin(tmp, 'out.wasm')
-    cmd = f'python src/main.py --lang={lang} compile --output={output}'
-    if extraArgs:
-        cmd = cmd + ' ' + extraArgs
-    cmd = cmd + ' ' + srcFile
-    log.info(f'Running command {cmd}')
-    res = shell.run(cmd,
-                    captureStderr=captureErr, captureStdout=False, onError='ignore')
-    if captureErr and res.stderr:
-        log.info(f'Output on stderr: {res.stderr}')
+    res = testsupport.compileFile(lang, srcFile, output, captureErr, extraArgs)
     if res.exitcode == 0:
-        return run(shell.pjoin(tmp, 'out.wasm'), input)
+        return run(output, input)
     else:
         return res
 
@@ -39,3 +42,41 @@ def test_compiler(lang: str, srcFile: str, tmp_path: str):
             runTest(lang, srcFile, tmp_path, captureErr, input, extraArgs)
     )
 
+
+@pytest.mark.parametrize("lang", ['loop', 'array', 'fun'])
+def test_compilerReentrant(lang: str):
+    """
+    Compiling a module must not depend on earlier or concurrent compilations in the
+    same process.
+    """
+    srcFile = 'test_files/lang_loop/factorial.py'
+    astMod = importlib.import_module(f'lang_{lang}.{lang}_ast')
+    compilerMod = importlib.import_module(f'compilers.lang_{lang}.{lang}_compiler')
+    cfg = CompilerConfig(CompilerConfig.defaultMaxMemSize, CompilerConfig.defaultMaxArraySize)
+    def compile(_i: int) -> str:
+        m = genericParser.parseFile(srcFile, astMod)
+        return sexp.renderSExp(compilerMod.compileModule(m, cfg).render())
+    first = compile(0)
+    assert first == compile(1)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for code in pool.map(compile, range(8)):
+            assert first == code
+
+@pytest.mark.parametrize("lang, srcFile",
+                         [(l, f) for (l, f) in testsupport.collectTestFiles() if l in ['array', 'fun']])
+def test_fusedFrontend(lang: str, srcFile: str):
+    """
+    Typechecking and transforming in a single pass must yield the same code and the same
+    type errors as the separate passes.
+    """
+    astMod = importlib.import_module(f'lang_{lang}.{lang}_ast')
+    compilerMod = importlib.import_module(f'compilers.lang_{lang}.{lang}_compiler')
+    def compile(fused: bool) -> str:
+        cfg = CompilerConfig(CompilerConfig.defaultMaxMemSize, CompilerConfig.defaultMaxArraySize,
+                             fusedFrontend=fused)
+        m = genericParser.parseFile(srcFile, astMod)
+        try:
+            return sexp.renderSExp(compilerMod.compileModule(m, cfg).render())
+        except CompileError as e:
+            return str(e)
+    assert compile(False) == compile(True)
@@ -1,10 +1,15 @@
+from typing import *
+import importlib
+import io
+import sys
 import shell
 import common.testsupport as testsupport
 import common.log as log
 import pytest
 
-def runTest(lang: str, srcFile: str, input: str|None):
-    cmd = ['timeout', '10s', 'python', 'src/main.py', f'--lang={lang}', 'interp', srcFile]
+def runTest(lang: str, srcFile: str, input: str|None, engine: str = 'tree'):
+    cmd = ['timeout', '10s', 'python', 'src/main.py', f'--lang={lang}', 'interp',
+           f'--engine={engine}', srcFile]
     log.info(f'Running command {" ".join(cmd)}')
     res = shell.run(cmd, input=input, captureStdout=True, captureStderr=True, onError='ignore')
     return res
@@ -17,3 +22,112 @@ def test_interp(lang: str, srcFile: str):
         errorMode='lenient'
     )
 
+@pytest.mark.parametrize("lang, srcFile", testsupport.collectTestFiles(langOnly=['array', 'fun']))
+def test_interpClosure(lang: str, srcFile: str):
+    testsupport.runFileTest(
+        srcFile,
+        lambda captureErr, input, _extraArgs: runTest(lang, srcFile, input, 'closure'),
+        errorMode='lenient'
+    )
+
+@pytest.mark.parametrize("lang, srcFile", testsupport.collectTestFiles(langOnly=['array']))
+def test_interpVm(lang: str, srcFile: str):
+    # The VM reports the same errors as the wasm code for array operations, but it does
+    # not run out of memory
+    err = testsupport.getExpectedError(srcFile)
+    strict = err is not None and err[1] in ['IndexError', 'ArraySizeError']
+    testsupport.runFileTest(
+        srcFile,
+        lambda captureErr, input, _extraArgs: runTest(lang, srcFile, input, 'vm'),
+        errorMode='strict' if strict else 'lenient'
+    )
+
+def test_interpLongLoop(tmp_path: str, capsys: pytest.CaptureFixture[str]):
+    """
+    The number of loop iterations must not be limited by the python stack.
+    """
+    import common.genericParser as genericParser
+    import lang_loop.loop_ast as loop_ast
+    import lang_loop.loop_interp as loop_interp
+    srcFile = shell.pjoin(tmp_path, 'loop.py')
+    with open(srcFile, 'w') as f:
+        f.write('i = 0\nwhile i < 100000:\n    if i > 10:\n        i = i + 1\n    else:\n' \
+                '        i = i + 2\nprint(i)\n')
+    loop_interp.interpModule(genericParser.parseFile(srcFile, loop_ast))
+    assert capsys.readouterr().out == '100000\n'
+
+def _runEngine(lang: str, engine: str, srcFile: str, input: str|None) -> tuple[str, str]:
+    """
+    Runs srcFile in-process, returns the output and the outcome (ok, type error or run error).
+    """
+    import common.genericParser as genericParser
+    from common.compileError import CompileError
+    astMod = importlib.import_module(f'lang_{lang}.{lang}_ast')
+    suffix = 'interp' if engine == 'tree' else f'{engine}Interp'
+    interpMod = importlib.import_module(f'lang_{lang}.{lang}_{suffix}')
+    out: list[str] = []
+    def run():
+        try:
+            interpMod.interpModule(genericParser.parseFile(srcFile, astMod))
+        finally:
+            out.append(cast(io.StringIO, sys.stdout).getvalue())
+    try:
+        testsupport.runInProcess(run, input, srcFile)
+        return (out[0], 'ok')
+    except CompileError:
+        return (out[0], 'type error')
+    except Exception:
+        return (out[0], 'run error')
+
+@pytest.mark.parametrize("lang, srcFile", testsupport.collectTestFiles())
+def test_interpPyastDifferential(lang: str, srcFile: str):
+    """
+    The pyast engine must produce the same output and outcome as the tree interpreter.
+    """
+    input = testsupport.readFileOpt(shell.removeExt(srcFile) + '.in')
+    expected = _runEngine(lang, 'tree', srcFile, input)
+    assert _runEngine(lang, 'pyast', srcFile, input) == expected
+
+# Errors of array operations, where the VM follows the wasm code and not python
+_ARRAY_ERRORS = ['IndexError', 'ArraySizeError']
+
+@pytest.mark.parametrize("lang, srcFile", testsupport.collectTestFiles(langOnly=['array']))
+def test_interpVmDifferential(lang: str, srcFile: str):
+    """
+    The VM must produce the same output and outcome as the tree interpreter, except for
+    the programs expected to fail with an IndexError or ArraySizeError. There, the VM fails
+    like the wasm code, whereas the tree interpreter may succeed (e.g. with a negative
+    index), so only the output before the error must agree.
+    """
+    input = testsupport.readFileOpt(shell.removeExt(srcFile) + '.in')
+    (expectedOut, expectedOutcome) = _runEngine(lang, 'tree', srcFile, input)
+    (out, outcome) = _runEngine(lang, 'vm', srcFile, input)
+    err = testsupport.getExpectedError(srcFile)
+    if err is not None and err[1] in _ARRAY_ERRORS:
+        assert outcome == 'run error'
+        assert expectedOut.startswith(out)
+    else:
+        assert (out, outcome) == (expectedOut, expectedOutcome)
+
+def test_interpVmNegativeIndex(tmp_path: str):
+    srcFile = shell.pjoin(tmp_path, 'neg.py')
+    with open(srcFile, 'w') as f:
+        f.write('a = [1, 2, 3]\nprint(a[0])\nprint(a[-1])\n')
+    assert _runEngine('array', 'tree', srcFile, None) == ('1\n3\n', 'ok')
+    assert _runEngine('array', 'vm', srcFile, None) == ('1\n', 'run error')
+
+def test_funTailCallsAndMaxCallDepth(tmp_path: str, capsys: pytest.CaptureFixture[str]):
+    import common.genericParser as genericParser
+    import lang_fun.fun_ast as fun_ast
+    import lang_fun.fun_interp as fun_interp
+    srcFile = shell.pjoin(tmp_path, 'calls.py')
+    with open(srcFile, 'w') as f:
+        f.write('def count(n: int, acc: int) -> int:\n    if n == 0:\n        return acc\n' \
+                '    return count(n - 1, acc + 1)\n' \
+                'def deep(n: int) -> int:\n    if n == 0:\n        return 0\n' \
+                '    return 1 + deep(n - 1)\n' \
+                'print(count(50000, 0))\nprint(deep(100))\n')
+    fun_interp.interpModule(genericParser.parseFile(srcFile, fun_ast))
+    assert capsys.readouterr().out == '50000\n100\n'
+    with pytest.raises(RecursionError):
+        fun_interp.interpModule(genericParser.parseFile(srcFile, fun_ast), maxCallDepth=50)
@@ -0,0 +1,48 @@
+import shell
+import json
+import subprocess
+import sys
+import common.cmdline as cmdline
+import common.server as server
+import main
+
+def test_serveStdio(tmp_path: str):
+    output = shell.pjoin(tmp_path, 'out.wat')
+    reqs = [
+        {'id': 1, 'argv': ['compile', f'--output={output}', 'test_files/lang_fun/simple.py']},
+        {'id': 2, 'argv': ['interp', 'test_files/lang_loop/factorial.py'], 'stdin': '5\n'},
+        {'id': 3, 'argv': ['compile', f'--output={output}', 'test_files/lang_fun/return_01.py']},
+        {'id': 4, 'argv': ['pyrun', 'test_files/lang_fun/simple.py']},
+        {'id': 5, 'argv': ['interp', 'test_files/lang_loop/factorial.py'], 'stdin': '3\n'}
+    ]
+    input = ''.join([json.dumps(r) + '\n' for r in reqs])
+    res = subprocess.run([sys.executable, 'src/main.py', 'serve'], input=input,
+                         capture_output=True, text=True, timeout=60)
+    assert res.returncode == 0
+    resps = [json.loads(l) for l in res.stdout.splitlines()]
+    assert [r['id'] for r in resps] == [1, 2, 3, 4, 5]
+    assert resps[0]['exitcode'] == 0
+    assert shell.isFile(output)
+    assert (resps[1]['exitcode'], resps[1]['stdout'].strip()) == (0, '120')
+    assert resps[2]['exitcode'] == 3
+    assert 'type error' in resps[2]['stderr']
+    assert resps[3]['exitcode'] == 1
+    assert (resps[4]['exitcode'], resps[4]['stdout'].strip()) == (0, '6')
+
+def test_commandOf():
+    assert cmdline.commandOf(['--lang', 'fun', 'compile', 'x.py']) == 'compile'
+    assert cmdline.commandOf(['--lang=fun', 'compile', '--output=x.wat', 'x.py']) == 'compile'
+    assert cmdline.commandOf(['--level', 'debug', '--lang', 'loop', 'interp', 'x.py']) == 'interp'
+    assert cmdline.commandOf(['--time-passes-json', 't.json', 'parse', 'x.py']) == 'parse'
+    assert cmdline.commandOf(['--lang', 'cobol', 'compile', 'x.py']) is None
+    assert cmdline.commandOf(['--lang']) is None
+    assert cmdline.commandOf([]) is None
+
+def test_handleRequestLangOption():
+    req = {'id': 7, 'argv': ['--lang', 'loop', 'interp', 'test_files/lang_loop/factorial.py'],
+           'stdin': '4\n'}
+    resp = server.handleRequest(main.main, req)
+    assert (resp['id'], resp['exitcode'], resp['stdout'].strip()) == (7, 0, '24')
+    resp = server.handleRequest(main.main, {'argv': ['--lang', 'loop', 'pyrun', 'x.py']})
+    assert resp['exitcode'] == 1
+    assert 'unsupported command pyrun' in resp['stderr']
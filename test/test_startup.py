@@ -0,0 +1,47 @@
+import os
+import pytest
+import re
+import subprocess
+import sys
+import common.utils as utils
+
+# Budget in milliseconds for the cold-start import time of the interp command (measured:
+# about 100ms). Wall-clock times depend on the load of the machine, so the budget is only
+# checked if the environment variable MINIPY_IMPORT_BUDGET_MS is set.
+IMPORT_BUDGET_MS = os.environ.get('MINIPY_IMPORT_BUDGET_MS')
+
+# Modules only needed for parsing with our own parser or for rendering wasm code
+FORBIDDEN_MODULES = ['lark', 'pydot', 'prettyprinter', 'common.wasm', 'common.pretty']
+
+_importTimeRe = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+def importTimes(argv: list[str]) -> tuple[float, set[str]]:
+    """
+    Runs src/main.py with python -X importtime and returns the total import time in
+    milliseconds together with the names of all imported modules.
+    """
+    res = subprocess.run([sys.executable, '-X', 'importtime', 'src/main.py'] + argv,
+                         stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=60)
+    assert res.returncode == 0, res.stderr
+    total = 0
+    mods: set[str] = set()
+    for line in res.stderr.splitlines():
+        m = _importTimeRe.match(line)
+        if m is None:
+            continue
+        mods.add(m.group(4))
+        if m.group(3) == '':
+            # Cumulative time of a top-level import, nested imports are already included
+            total += int(m.group(2))
+    return (total / 1000, mods)
+
+def test_interpImports():
+    (_, mods) = importTimes(['interp', 'test_files/lang_fun/simple.py'])
+    assert [m for m in FORBIDDEN_MODULES if m in mods] == []
+
+@pytest.mark.skipif(IMPORT_BUDGET_MS is None, reason='MINIPY_IMPORT_BUDGET_MS not set')
+def test_interpImportTime():
+    budget = int(utils.assertNotNone(IMPORT_BUDGET_MS))
+    # The minimum of several runs is less sensitive to the load of the machine
+    ms = min([importTimes(['interp', 'test_files/lang_fun/simple.py'])[0] for _ in range(3)])
+    assert ms <= budget, f'Import time of interp is {ms:.1f}ms, exceeds budget of {budget}ms'
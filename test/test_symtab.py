@@ -0,0 +1,58 @@
+from common.symtab import Symtab, VarInfo
+from common.compileError import CompileError
+import common.symtab_merge as symtab_merge
+import pytest
+
+def _symtab(n: int) -> Symtab[str, str]:
+    st = Symtab[str, str]()
+    for i in range(n):
+        st.assign(f'x{i}', 'int')
+    return st
+
+def test_copyIsLayered():
+    st = _symtab(1000)
+    c = st.copy()
+    assert list(c.assignedVars()) == []
+    c.assign('y', 'bool')
+    c.assign('x3', 'int')
+    assert list(c.assignedVars()) == ['y', 'x3']
+    assert not st.hasVar('y')
+    assert [x for (x, _) in c.items()][-2:] == ['x999', 'y']
+    with pytest.raises(CompileError):
+        c.assign('x5', 'bool')
+
+def test_copyMustNotOutliveChanges():
+    st = _symtab(3)
+    c = st.copy()
+    st.assign('y', 'int')
+    with pytest.raises(ValueError):
+        c.hasVar('x0')
+
+def test_mergeBack():
+    st = _symtab(3)
+    then = st.copy()
+    then.assign('a', 'int')
+    then.assign('b', 'int')
+    nested = then.copy()
+    nested.assign('c', 'int')
+    then.mergeBack(nested, then.copy())
+    other = st.copy()
+    other.assign('b', 'int')
+    other.assign('x1', 'int')
+    expected = symtab_merge.merge(then, other)
+    st.mergeBack(then, other)
+    assert dict(st.items()) == expected
+    assert list(expected) == ['x0', 'x1', 'x2', 'a', 'b', 'c']
+    assert st.unsafeInfo('b') == VarInfo('int', True, 'var')
+    assert st.unsafeInfo('a') == VarInfo('int', False, 'var')
+    assert st.unsafeInfo('c') == VarInfo('int', False, 'var')
+    with pytest.raises(CompileError, match='might not have been initialized'):
+        st.use('a')
+
+def test_mergeBackInconsistentTypes():
+    st = _symtab(3)
+    (st1, st2) = (st.copy(), st.copy())
+    st1.assign('y', 'int')
+    st2.assign('y', 'bool')
+    with pytest.raises(CompileError, match='Inconsistent types for variable y'):
+        st.mergeBack(st1, st2)
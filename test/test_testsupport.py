@@ -0,0 +1,21 @@
+from concurrent.futures import ProcessPoolExecutor
+import common.testsupport as testsupport
+import shell
+
+def test_runPython():
+    assert testsupport.runPython('test_files/lang_loop/factorial.py', '5\n').strip() == '120'
+
+def _golden(cacheDir: str) -> str:
+    testsupport._CACHE_DIR = cacheDir # pyright: ignore[reportPrivateUsage]
+    return testsupport.getGolden('test_files/lang_loop/factorial.py', '4\n')
+
+def test_getGoldenParallel(tmp_path: str):
+    cacheDir = shell.pjoin(tmp_path, 'cache')
+    with ProcessPoolExecutor(4) as pool:
+        goldens = list(pool.map(_golden, 8 * [cacheDir]))
+    assert goldens == 8 * ['24']
+    golden = shell.pjoin(cacheDir, 'test_files/lang_loop/factorial.golden')
+    assert shell.readFile(golden) == '24'
+    # No lock files next to the cached files
+    hashFile = shell.pjoin(cacheDir, 'test_files/lang_loop/factorial.hash')
+    assert sorted(shell.ls(shell.dirname(golden))) == [golden, hashFile]
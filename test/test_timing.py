@@ -0,0 +1,32 @@
+import common.timing as timing
+import json
+
+def test_phases():
+    assert not timing.isEnabled()
+    with timing.phase('ignored'):
+        pass
+    timing.enable()
+    try:
+        for _ in range(2):
+            with timing.phase('a'):
+                with timing.phase('b'):
+                    _ = [0] * 100000
+                with timing.phase('c'):
+                    pass
+            with timing.phase('d'):
+                pass
+        with timing.phase('a'):
+            with timing.phase('e'):
+                pass
+        stats = timing.results()
+        assert [s.path for s in stats] == [('a',), ('a', 'b'), ('a', 'c'), ('a', 'e'), ('d',)]
+        assert [s.calls for s in stats] == [3, 2, 2, 1, 2]
+        (a, b) = (stats[0], stats[1])
+        assert b.peakMem >= 800000
+        assert a.peakMem >= b.peakMem
+        assert a.wall >= b.wall
+        phases = json.loads(timing.toJson(stats))['phases']
+        assert [p['phase'] for p in phases] == ['a', 'a/b', 'a/c', 'a/e', 'd']
+    finally:
+        timing.disable()
+    assert timing.results() == []
@@ -1,4 +1,6 @@
-from common.utils import splitIf
+import os
+import threading
+from common.utils import splitIf, writeFileAtomic
 
 def test_splitIf():
     l = [1, 2, 3, 4, 5, 6]
@@ -12,3 +14,15 @@ def test_splitIf():
     assert splitIf(empty, lambda x: x == 3, 'left') == ([], [])
     assert splitIf([3], lambda x: x == 3) == ([], [3])
     assert splitIf([3], lambda x: x == 3, 'left') == ([3], [])
+
+def test_writeFileAtomic(tmp_path: str):
+    path = os.path.join(tmp_path, 'out.txt')
+    contents = [str(i).encode('utf-8') * 10000 for i in range(8)]
+    threads = [threading.Thread(target=writeFileAtomic, args=(path, c)) for c in contents]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with open(path, 'rb') as f:
+        assert f.read() in contents
+    assert os.listdir(tmp_path) == ['out.txt']
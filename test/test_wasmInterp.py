@@ -0,0 +1,66 @@
+from common.wasm import *
+import common.wasmInterp as wasmInterp
+import pytest
+
+def _module(instrs: list[WasmInstr], locals: list[tuple[WasmId, WasmValtype]] = [],
+            maxPages: int = 2) -> WasmModule:
+    imports = [WasmImport('env', 'memory', WasmImportMemory(1, maxPages)),
+               WasmImport('env', 'print_i64', WasmImportFunc(WasmId('$print_i64'), ['i64'], None)),
+               WasmImport('env', 'print_i32', WasmImportFunc(WasmId('$print_i32'), ['i32'], None))]
+    main = WasmFunc(WasmId('$main'), [], None, locals, instrs)
+    return WasmModule(imports, [WasmExport('main', WasmExportFunc(WasmId('$main')))], [], [],
+                      WasmFuncTable([]), [main])
+
+def _run(capsys: pytest.CaptureFixture[str], instrs: list[WasmInstr],
+         locals: list[tuple[WasmId, WasmValtype]] = []) -> list[str]:
+    wasmInterp.runModule(_module(instrs, locals))
+    return capsys.readouterr().out.split()
+
+def test_wrapAround(capsys: pytest.CaptureFixture[str]):
+    printI32 = WasmInstrCall(WasmId('$print_i32'))
+    out = _run(capsys, [
+        WasmInstrConst('i32', 0x7FFFFFFF), WasmInstrConst('i32', 1),
+        WasmInstrNumBinOp('i32', 'add'), printI32,
+        WasmInstrConst('i32', -1), WasmInstrConst('i32', 1),
+        WasmInstrIntRelOp('i32', 'lt_u'), printI32,
+        WasmInstrConst('i32', -1), WasmInstrConst('i32', 28),
+        WasmInstrNumBinOp('i32', 'shr_u'), printI32,
+        WasmInstrConst('i64', -1), WasmInstrConvOp('i32.wrap_i64'),
+        WasmInstrConvOp('i64.extend_i32_u'), WasmInstrCall(WasmId('$print_i64'))])
+    assert out == ['-2147483648', '0', '15', '4294967295']
+
+def test_branchUnwindsStack(capsys: pytest.CaptureFixture[str]):
+    # Sums 1..10 in a loop, the branch out of the block leaves extra values on the stack
+    i = WasmId('$i')
+    s = WasmId('$s')
+    loop = WasmInstrLoop(WasmId('$loop'), [
+        WasmInstrVarLocal('get', s), WasmInstrVarLocal('get', i),
+        WasmInstrNumBinOp('i64', 'add'), WasmInstrVarLocal('set', s),
+        WasmInstrVarLocal('get', i), WasmInstrConst('i64', 1),
+        WasmInstrNumBinOp('i64', 'add'), WasmInstrVarLocal('tee', i),
+        WasmInstrConst('i64', 10), WasmInstrIntRelOp('i64', 'le_s'),
+        WasmInstrBranch(WasmId('$loop'), True)])
+    block = WasmInstrBlock(WasmId('$exit'), 'i64', [
+        WasmInstrConst('i64', 1), WasmInstrConst('i64', 2),
+        WasmInstrVarLocal('get', s), WasmInstrBranch(WasmId('$exit'), False)])
+    out = _run(capsys, [
+        WasmInstrConst('i64', 1), WasmInstrVarLocal('set', i), loop, block,
+        WasmInstrCall(WasmId('$print_i64'))], [(i, 'i64'), (s, 'i64')])
+    assert out == ['55']
+
+def test_memory(capsys: pytest.CaptureFixture[str]):
+    out = _run(capsys, [
+        WasmInstrConst('i32', 8), WasmInstrConst('i64', -42), WasmInstrMem('i64', 'store'),
+        WasmInstrConst('i32', 8), WasmInstrMem('i64', 'load'),
+        WasmInstrCall(WasmId('$print_i64')),
+        WasmInstrConst('i32', 1), WasmInstrMemGrow(), WasmInstrCall(WasmId('$print_i32')),
+        WasmInstrConst('i32', 1), WasmInstrMemGrow(), WasmInstrCall(WasmId('$print_i32')),
+        WasmInstrMemSize(), WasmInstrCall(WasmId('$print_i32'))])
+    assert out == ['-42', '1', '-1', '2']
+
+def test_traps():
+    with pytest.raises(wasmInterp.WasmTrap, match='unreachable'):
+        wasmInterp.runModule(_module([WasmInstrTrap()]))
+    with pytest.raises(wasmInterp.WasmTrap, match='out of bounds'):
+        wasmInterp.runModule(_module([WasmInstrConst('i32', 2 * 65536 - 4),
+                                      WasmInstrMem('i64', 'load'), WasmInstrDrop()]))
@@ -0,0 +1,25 @@
+import contextlib
+import io
+from common.wasm import *
+import assembly.tac_ast as tac
+import assembly.tacInterp as tacInterp
+from assembly.wasmToTac import wasmToTac
+
+def ifPrint(cond: int, thenVal: int, elseVal: int) -> list[WasmInstr]:
+    def printConst(v: int) -> list[WasmInstr]:
+        return [WasmInstrConst('i64', v), WasmInstrCall(WasmId('$print_i64'))]
+    return [WasmInstrConst('i32', cond),
+            WasmInstrIf(None, printConst(thenVal), printConst(elseVal))]
+
+def test_freshLabelsAcrossStatements():
+    # Every statement used to be translated with fresh counters, so both ifs got the labels
+    # L_then_0 and L_end_0 and the second if jumped into the first one.
+    instrs = ifPrint(0, 1, 2) + ifPrint(1, 3, 4) + ifPrint(0, 5, 6)
+    (_, tacInstrs) = wasmToTac(cast(list[WasmInstrL], instrs))
+    labels = [i.label for i in tacInstrs if isinstance(i, tac.Label)]
+    assert len(labels) == 6
+    assert len(set(labels)) == len(labels)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        tacInterp.interpInstrs(tacInstrs)
+    assert out.getvalue().split() == ['2', '3', '6']
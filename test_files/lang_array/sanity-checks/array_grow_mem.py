@@ -0,0 +1,8 @@
+# The memory starts with 1 page (65536 bytes) and grows on demand.
+# The three arrays need 3 * 40004 bytes, so the memory must grow to 2 pages.
+arr1 = 5000 * [1]
+arr2 = 5000 * [2]
+arr3 = 5000 * [3]
+arr3[4999] = 4
+print(len(arr1) + len(arr2) + len(arr3))
+print(arr1[4999] + arr2[4999] + arr3[4999])
@@ -0,0 +1,28 @@
+# The program allocates about 320kB, but only a few arrays are alive at the same time.
+# Hence, the garbage collector allows it to run with 1 page of memory.
+keep = 10 * [[0]]
+last = [0]
+i = 0
+k = 0
+while i < 40:
+    last = 1000 * [i]
+    inner = (k + 1) * [i]
+    keep[k] = inner
+    if k == 3:
+        e = 0 * [True]
+        b = 3 * [True]
+    k = k + 1
+    if k == 10:
+        k = 0
+    i = i + 1
+sum = 0
+j = 0
+while j < 10:
+    sum = sum + keep[j][0] + len(keep[j])
+    j = j + 1
+print(sum)
+print(last[999])
+print((3 * [0]) is (3 * [0]))
+x = 5 * [1]
+y = x
+print(x is y)
@@ -0,0 +1,8 @@
+### run error
+# All arrays are alive, so the garbage collector cannot free enough memory.
+all = 100 * [[0]]
+i = 0
+while i < 100:
+    all[i] = 1000 * [i]
+    i = i + 1
+print(all[99][999])
@@ -0,0 +1,30 @@
+# The program allocates about 400kB, but only a few arrays are alive at the same time.
+# Arrays held by the variables of active function calls must survive garbage collection.
+def mk(n: int, x: int) -> list[int]:
+    return n * [x]
+
+def churn(n: int) -> int:
+    garbage = [0]
+    i = 0
+    while i < n:
+        garbage = mk(1000, i)
+        i = i + 1
+    return len(garbage)
+
+def sum2(a: list[int], b: list[int]) -> int:
+    c = churn(10)
+    return a[0] + b[len(b) - 1] + c
+
+def depth(n: int, acc: list[list[int]]) -> int:
+    keep = mk(n + 1, n)
+    if n == 0:
+        x = churn(20)
+    else:
+        x = depth(n - 1, [keep, acc[0]])
+    return x + keep[n] + acc[0][0]
+
+print(sum2(mk(3, 1), mk(4, 2)))
+print(depth(10, [[7]]))
+print(mk(2, 0) is mk(2, 0))
+a = mk(1, 5)
+print(len(a) + churn(5))
@@ -0,0 +1,5 @@
+### run error
+def f(n: int, a: list[int]) -> int:
+    return f(n + 1, a) + a[0]
+
+print(f(0, [1]))